@@ -0,0 +1,225 @@
+"""
+Admission control for uploads and archive extraction.
+
+A burst of large uploads used to be accepted until /tmp or memory ran out,
+failing every request instead of just the excess. AdmissionController
+bounds concurrent uploads per worker process and per host and the
+uncompressed bytes being extracted on the host. An upload that finds its
+worker's slots busy waits briefly in a bounded queue; beyond that, excess
+work is turned away before its body is read, with Retry-After: 429 when a
+concurrency limit is full, 503 when the extraction budget is exhausted.
+Disk space is left to WorkspaceManager, which can evict idle workspaces
+to make room before it refuses an upload.
+
+Host-wide limits are kept in a small JSON ledger guarded by flock, shared
+by every process that uses the same ADMISSION_STATE_PATH. Entries record
+their owner's pid and are dropped once that process is gone, so a crashed
+worker does not leak its reservations.
+"""
+
+import os
+import time
+import uuid
+import logging
+import threading
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+from config import Config
+from metrics import ADMISSION_REJECTED
+from host_state import locked_json, pid_alive
+
+logger = logging.getLogger(__name__)
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request is turned away; maps to an HTTP status with Retry-After"""
+
+    def __init__(self, message: str, error_code: str, status: int = 429, retry_after: int = 5):
+        super().__init__(message)
+        self.error_code = error_code
+        self.status = status
+        self.retry_after = retry_after
+
+
+class HostLedger:
+    """Reservations shared by the processes of one host: {token: [kind, pid, amount]} in a locked file"""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    @contextmanager
+    def _locked(self):
+        with locked_json(self.path) as entries:
+            for token in [token for token, entry in entries.items() if not pid_alive(entry[1])]:
+                del entries[token]
+            yield entries
+
+    def reserve(self, kind: str, amount: int, limit: int) -> Optional[str]:
+        """Record amount of kind if the host total stays within limit; returns a token, or None if it would not"""
+        with self._locked() as entries:
+            in_use = sum(entry[2] for entry in entries.values() if entry[0] == kind)
+            # One reservation larger than the limit may still run on its own
+            if in_use and in_use + amount > limit:
+                return None
+            token = uuid.uuid4().hex
+            entries[token] = [kind, os.getpid(), amount]
+            return token
+
+    def release(self, token: str):
+        with self._locked() as entries:
+            entries.pop(token, None)
+
+    def totals(self) -> Dict[str, int]:
+        with self._locked() as entries:
+            totals: Dict[str, int] = {}
+            for kind, _, amount in entries.values():
+                totals[kind] = totals.get(kind, 0) + amount
+            return totals
+
+
+class UploadTicket:
+    """An admitted upload's slots; release() is idempotent"""
+
+    def __init__(self, controller: 'AdmissionController', host_token: str):
+        self.controller = controller
+        self.host_token = host_token
+        self.start_time = time.time()
+        self.released = False
+
+    def release(self):
+        if self.released:
+            return
+        self.released = True
+        self.controller._release_upload(self)
+
+
+class AdmissionController:
+    """Per-worker and per-host limits on uploads and extraction"""
+
+    def __init__(self, ledger_path: str = Config.ADMISSION_STATE_PATH,
+                 worker_uploads: int = Config.MAX_CONCURRENT_UPLOADS,
+                 host_uploads: int = Config.HOST_MAX_CONCURRENT_UPLOADS,
+                 extraction_bytes: int = Config.MAX_EXTRACTION_BYTES,
+                 queue_size: int = Config.UPLOAD_QUEUE_SIZE,
+                 queue_timeout: float = Config.UPLOAD_QUEUE_TIMEOUT):
+        self.ledger = HostLedger(ledger_path)
+        self.worker_uploads = worker_uploads
+        self.host_uploads = host_uploads
+        self.extraction_bytes = extraction_bytes
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.lock = threading.Lock()
+        self.slot_freed = threading.Condition(self.lock)
+        self.active_uploads = 0
+        self.waiting_uploads = 0
+        self.active_extraction_bytes = 0
+        self.recent_durations = deque(maxlen=20)
+        self.counters = {'admitted': 0, 'rejected': 0}
+
+    def _reject(self, resource: str, message: str, error_code: str, status: int, retry_after: int):
+        with self.lock:
+            self.counters['rejected'] += 1
+        ADMISSION_REJECTED.labels(resource).inc()
+        logger.warning("Admission rejected (%s): %s", resource, message)
+        raise AdmissionRejected(message, error_code, status, retry_after)
+
+    def _retry_after(self, slots: int, queued: int = 0) -> int:
+        """Estimate seconds until a slot is free for a newcomer behind queued others, from recent upload durations"""
+        with self.lock:
+            durations = list(self.recent_durations)
+        if not durations:
+            return 5
+        # A later retry than that leaves the freed slot idle and costs throughput
+        return max(1, min(60, round(sum(durations) / len(durations) * (queued + 1) / max(1, slots))))
+
+    def _take_worker_slot(self) -> bool:
+        """
+        Claim one of this worker's upload slots. When all are busy, wait up to
+        queue_timeout behind at most queue_size others: a short burst is then
+        smoothed out instead of bounced back to the clients.
+        """
+        with self.lock:
+            if self.active_uploads >= self.worker_uploads:
+                if self.waiting_uploads >= self.queue_size or self.queue_timeout <= 0:
+                    return False
+                self.waiting_uploads += 1
+                try:
+                    if not self.slot_freed.wait_for(lambda: self.active_uploads < self.worker_uploads,
+                                                    self.queue_timeout):
+                        return False
+                finally:
+                    self.waiting_uploads -= 1
+            self.active_uploads += 1
+            return True
+
+    def admit_upload(self) -> UploadTicket:
+        """Take an upload slot, or raise AdmissionRejected"""
+        if not self._take_worker_slot():
+            self._reject('worker_uploads', f"Too many uploads in progress ({self.worker_uploads} per worker)",
+                         'TOO_MANY_UPLOADS', 429, self._retry_after(self.worker_uploads, self.queue_size))
+
+        host_token = self.ledger.reserve('upload', 1, self.host_uploads)
+        if host_token is None:
+            self._free_worker_slot()
+            self._reject('host_uploads', f"Too many uploads in progress ({self.host_uploads} per host)",
+                         'TOO_MANY_UPLOADS', 429, self._retry_after(self.host_uploads))
+        with self.lock:
+            self.counters['admitted'] += 1
+        return UploadTicket(self, host_token)
+
+    def _free_worker_slot(self):
+        with self.lock:
+            self.active_uploads -= 1
+            self.slot_freed.notify()
+
+    def _release_upload(self, ticket: UploadTicket):
+        self.ledger.release(ticket.host_token)
+        with self.lock:
+            self.recent_durations.append(time.time() - ticket.start_time)
+        self._free_worker_slot()
+
+    @contextmanager
+    def extraction(self, nbytes: int, timeout: float = Config.EXTRACTION_ADMIT_TIMEOUT):
+        """
+        Hold nbytes of the host's extraction budget for the with-block. The
+        upload is already on disk by now, so wait up to timeout seconds for
+        room before rejecting.
+        """
+        deadline = time.time() + timeout
+        delay = 0.05
+        while True:
+            token = self.ledger.reserve('extraction', nbytes, self.extraction_bytes)
+            if token is not None:
+                break
+            if time.time() >= deadline:
+                self._reject('extraction_bytes', "Too many archives are being extracted, please retry",
+                             'EXTRACTION_BUSY', 503, self._retry_after(1))
+            time.sleep(delay)
+            delay = min(delay * 2, 0.25)
+
+        with self.lock:
+            self.active_extraction_bytes += nbytes
+        try:
+            yield
+        finally:
+            self.ledger.release(token)
+            with self.lock:
+                self.active_extraction_bytes -= nbytes
+
+    def stats(self) -> Dict:
+        host = self.ledger.totals()
+        with self.lock:
+            return {
+                'uploads': self.active_uploads,
+                'max_uploads': self.worker_uploads,
+                'queued_uploads': self.waiting_uploads,
+                'host_uploads': host.get('upload', 0),
+                'host_max_uploads': self.host_uploads,
+                'extraction_bytes': self.active_extraction_bytes,
+                'host_extraction_bytes': host.get('extraction', 0),
+                'host_max_extraction_bytes': self.extraction_bytes,
+                'admitted': self.counters['admitted'],
+                'rejected': self.counters['rejected']
+            }
@@ -0,0 +1,263 @@
+import os
+import json
+import time
+import uuid
+import sqlite3
+import logging
+import threading
+from typing import Dict, Optional, Tuple
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+PRIORITY_VALUES = {'high': 0, 'normal': 1, 'low': 2}
+
+
+class DurableAnalysisQueue:
+    """
+    Durable analysis job queue backed by SQLite (single-host deployments).
+
+    Web workers only enqueue jobs and read results; a separate pool of
+    analysis_worker.py processes claims jobs under a lease, heartbeats while
+    running and writes the result back. A job whose lease expires (its worker
+    died or was recycled) is claimed again, so execution is at-least-once;
+    after QUEUE_MAX_ATTEMPTS the job is marked failed. Jobs carry a deadline
+    and can be cancelled; a worker notices cancellation on its next heartbeat.
+    """
+
+    def __init__(self, db_path: Optional[str] = None):
+        self.db_path = db_path or Config.QUEUE_DB_PATH
+        self.local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+        conn = self._connection()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS analysis_jobs (
+                id TEXT PRIMARY KEY,
+                session_id TEXT NOT NULL,
+                priority INTEGER NOT NULL DEFAULT 1,
+                status TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                result TEXT,
+                error TEXT,
+                partial_text TEXT NOT NULL DEFAULT '',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                max_attempts INTEGER NOT NULL,
+                worker_id TEXT,
+                lease_expires REAL,
+                deadline REAL,
+                created_at REAL NOT NULL,
+                started_at REAL,
+                heartbeat_at REAL,
+                finished_at REAL
+            )
+        """)
+        columns = {row['name'] for row in conn.execute("PRAGMA table_info(analysis_jobs)")}
+        if 'deadline' not in columns:
+            # Databases created before job deadlines existed
+            conn.execute("ALTER TABLE analysis_jobs ADD COLUMN deadline REAL")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_claim ON analysis_jobs (status, priority, created_at)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_session ON analysis_jobs (session_id)")
+
+    def _connection(self) -> sqlite3.Connection:
+        # Connections must not cross fork(), so they are keyed by pid as well
+        conn = getattr(self.local, 'conn', None)
+        if conn is None or self.local.pid != os.getpid():
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self.local.conn = conn
+            self.local.pid = os.getpid()
+        return conn
+
+    def enqueue(self, session_id: str, payload: Dict, priority: str = 'normal',
+                deadline: Optional[float] = None) -> str:
+        """Add a job; queued jobs of the same session are superseded"""
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "UPDATE analysis_jobs SET status = 'failed', error = 'Replaced by a newer request', "
+                "finished_at = ? WHERE session_id = ? AND status = 'queued'",
+                (now, session_id)
+            )
+            conn.execute(
+                "INSERT INTO analysis_jobs (id, session_id, priority, status, payload, max_attempts, deadline, "
+                "created_at) VALUES (?, ?, ?, 'queued', ?, ?, ?, ?)",
+                (job_id, session_id, PRIORITY_VALUES.get(priority, 1), json.dumps(payload),
+                 Config.QUEUE_MAX_ATTEMPTS, deadline, now)
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return job_id
+
+    def claim(self, worker_id: str) -> Optional[Tuple[str, str, Dict, Optional[float]]]:
+        """Lease the next runnable job; returns (job_id, session_id, payload, deadline) or None"""
+        now = time.time()
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            while True:
+                row = conn.execute(
+                    "SELECT id, session_id, payload, attempts, max_attempts, deadline FROM analysis_jobs "
+                    "WHERE status = 'queued' OR (status = 'running' AND lease_expires < ?) "
+                    "ORDER BY priority, created_at LIMIT 1",
+                    (now,)
+                ).fetchone()
+                if row is None:
+                    conn.execute("COMMIT")
+                    return None
+                if row['attempts'] >= row['max_attempts']:
+                    conn.execute(
+                        "UPDATE analysis_jobs SET status = 'failed', finished_at = ?, "
+                        "error = 'Analysis worker stopped responding too many times' WHERE id = ?",
+                        (now, row['id'])
+                    )
+                    continue
+                if row['deadline'] is not None and row['deadline'] <= now:
+                    conn.execute(
+                        "UPDATE analysis_jobs SET status = 'cancelled', finished_at = ?, "
+                        "error = 'Analysis deadline exceeded before it could run' WHERE id = ?",
+                        (now, row['id'])
+                    )
+                    continue
+                conn.execute(
+                    "UPDATE analysis_jobs SET status = 'running', worker_id = ?, attempts = attempts + 1, "
+                    "lease_expires = ?, started_at = ?, heartbeat_at = ?, partial_text = '' WHERE id = ?",
+                    (worker_id, now + Config.QUEUE_LEASE_SECONDS, now, now, row['id'])
+                )
+                conn.execute("COMMIT")
+                if row['attempts']:
+                    logger.warning("Re-running analysis job %s (attempt %s)", row['id'], row['attempts'] + 1)
+                return row['id'], row['session_id'], json.loads(row['payload']), row['deadline']
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def heartbeat(self, job_id: str, worker_id: str, appended: Optional[str] = None, offset: int = 0) -> bool:
+        """
+        Extend the lease and record progress; False when the lease was lost.
+        appended is the partial text produced since offset (in characters).
+        Anything stored beyond offset is replaced, so a heartbeat retried
+        after an error does not duplicate text.
+        """
+        now = time.time()
+        conn = self._connection()
+        if appended is None:
+            cursor = conn.execute(
+                "UPDATE analysis_jobs SET lease_expires = ?, heartbeat_at = ? "
+                "WHERE id = ? AND worker_id = ? AND status = 'running'",
+                (now + Config.QUEUE_LEASE_SECONDS, now, job_id, worker_id)
+            )
+        else:
+            cursor = conn.execute(
+                "UPDATE analysis_jobs SET lease_expires = ?, heartbeat_at = ?, "
+                "partial_text = substr(partial_text, 1, ?) || ? "
+                "WHERE id = ? AND worker_id = ? AND status = 'running'",
+                (now + Config.QUEUE_LEASE_SECONDS, now, offset, appended, job_id, worker_id)
+            )
+        return cursor.rowcount == 1
+
+    def complete(self, job_id: str, worker_id: str, result: Dict) -> bool:
+        """Write the result back; ignored if another worker now owns the job"""
+        cursor = self._connection().execute(
+            "UPDATE analysis_jobs SET status = 'completed', result = ?, finished_at = ?, lease_expires = NULL "
+            "WHERE id = ? AND worker_id = ? AND status = 'running'",
+            (json.dumps(result), time.time(), job_id, worker_id)
+        )
+        return cursor.rowcount == 1
+
+    def fail(self, job_id: str, worker_id: str, error: str) -> bool:
+        """Mark a job failed; ignored if another worker now owns the job"""
+        cursor = self._connection().execute(
+            "UPDATE analysis_jobs SET status = 'failed', error = ?, finished_at = ?, lease_expires = NULL "
+            "WHERE id = ? AND worker_id = ? AND status = 'running'",
+            (error, time.time(), job_id, worker_id)
+        )
+        return cursor.rowcount == 1
+
+    def cancel(self, job_id: str, reason: str = 'Analysis cancelled') -> bool:
+        """Cancel a queued or running job; False if it had already finished"""
+        cursor = self._connection().execute(
+            "UPDATE analysis_jobs SET status = 'cancelled', error = ?, finished_at = ?, lease_expires = NULL "
+            "WHERE id = ? AND status IN ('queued', 'running')",
+            (reason, time.time(), job_id)
+        )
+        return cursor.rowcount == 1
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        """Job status, result and progress (without the payload)"""
+        row = self._connection().execute(
+            "SELECT id, session_id, status, result, error, attempts, length(partial_text) AS progress_chars, "
+            "created_at, started_at, heartbeat_at, finished_at FROM analysis_jobs WHERE id = ?",
+            (job_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job['result'] = json.loads(job['result']) if job['result'] else None
+        return job
+
+    def read_partial(self, job_id: str, offset: int) -> Optional[Tuple[str, str, int]]:
+        """Return (status, partial text after offset, attempts) for following a running job"""
+        row = self._connection().execute(
+            "SELECT status, substr(partial_text, ?) AS tail, attempts FROM analysis_jobs WHERE id = ?",
+            (offset + 1, job_id)
+        ).fetchone()
+        return (row['status'], row['tail'] or '', row['attempts']) if row else None
+
+    def depth(self) -> int:
+        """Number of jobs waiting to be claimed"""
+        return self._connection().execute(
+            "SELECT COUNT(*) FROM analysis_jobs WHERE status = 'queued'"
+        ).fetchone()[0]
+
+    def stats(self) -> Dict:
+        """Job counts by status"""
+        rows = self._connection().execute("SELECT status, COUNT(*) FROM analysis_jobs GROUP BY status")
+        return {status: count for status, count in rows}
+
+    def purge(self, older_than: float):
+        """Delete finished jobs that ended more than older_than seconds ago"""
+        self._connection().execute(
+            "DELETE FROM analysis_jobs WHERE status IN ('completed', 'failed', 'cancelled') AND finished_at < ?",
+            (time.time() - older_than,)
+        )
+
+
+def follow_job(queue: DurableAnalysisQueue, job_id: str, stream, poll_interval: float = None):
+    """
+    Bridge a job running in another process into a local AnalysisStream by
+    polling its partial text. Runs until the job finishes.
+    """
+    poll_interval = poll_interval or Config.QUEUE_HEARTBEAT_INTERVAL
+    offset = 0
+    attempts = None
+
+    while not stream.finished:
+        progress = queue.read_partial(job_id, offset)
+        if progress is None:
+            stream.finish('failed', {'error': 'Analysis job not found'})
+            return
+        status, tail, job_attempts = progress
+        if attempts is not None and job_attempts != attempts:
+            # Job was re-run after a worker died; its text starts over in a new stream run
+            offset = 0
+            tail = ''
+            stream.restart()
+        attempts = job_attempts
+        if tail:
+            stream.publish_delta(tail)
+            offset += len(tail)
+        if status in ('completed', 'failed', 'cancelled'):
+            job = queue.get(job_id)
+            if status == 'completed':
+                stream.finish('completed', job['result'])
+            else:
+                stream.finish(status, {'error': job['error'] or f'Analysis {status}'})
+            return
+        time.sleep(poll_interval)
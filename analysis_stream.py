@@ -0,0 +1,343 @@
+import json
+import time
+import asyncio
+import uuid
+import logging
+import itertools
+import threading
+from collections import deque
+from typing import Dict, List, Optional, Callable, Iterator, AsyncIterator, Tuple
+from config import Config
+from json_stream import IncrementalJSONParser
+
+logger = logging.getLogger(__name__)
+
+
+def format_sse(event: Dict) -> str:
+    """Serialize an event dict as a Server-Sent Events frame"""
+    lines = []
+    if event.get('id') is not None:
+        lines.append(f"id: {event['id']}")
+    if event.get('event'):
+        lines.append(f"event: {event['event']}")
+    lines.append(f"data: {json.dumps(event.get('data', {}), separators=(',', ':'))}")
+    return "\n".join(lines) + "\n\n"
+
+
+class AnalysisStream:
+    """
+    Fan-out of one analysis run's token deltas to any number of subscribers.
+
+    The producer (the single upstream completion) never blocks on consumers:
+    events go into a bounded ring buffer and every SSE subscriber reads from it
+    with its own cursor. Subscribers that fall behind the retained window get a
+    snapshot of the accumulated text instead of the missed deltas, and pending
+    deltas are coalesced into one frame, so slow clients cost neither memory
+    nor extra writes.
+
+    Deltas are also fed through an IncrementalJSONParser so every structured
+    field (summary, each recommendation, each code change) is published as a
+    'field' event as soon as it closes in the token stream.
+
+    Subscribers may be threads (read/iter_sse) or coroutines on any event loop
+    (aread/aiter_sse); async subscribers hold no thread while they wait.
+    """
+
+    def __init__(self, session_id: str, buffer_size: int = None, job_id: Optional[str] = None):
+        self.session_id = session_id
+        self.job_id = job_id
+        self.run_id = uuid.uuid4().hex[:8]
+        self.events = deque(maxlen=buffer_size or Config.STREAM_BUFFER_EVENTS)
+        self.condition = threading.Condition()
+        self.listeners: List[Callable[[Dict], None]] = []
+        self.text_parts: List[str] = []
+        self.char_count = 0
+        self.last_seq = 0
+        self.next_seq = 1
+        self.parser = IncrementalJSONParser()
+        self.partial_result: Dict = {}
+        self.final_event: Optional[Dict] = None
+        self.started_at = time.time()
+        self.first_token_at: Optional[float] = None
+        self.async_waiters: List[Tuple[asyncio.AbstractEventLoop, asyncio.Event]] = []
+
+    @property
+    def finished(self) -> bool:
+        return self.final_event is not None
+
+    @property
+    def text(self) -> str:
+        with self.condition:
+            return self._joined_text()
+
+    def _joined_text(self) -> str:
+        """Accumulated text, folding new parts into one string; caller holds the condition"""
+        if len(self.text_parts) > 1:
+            self.text_parts[:] = ["".join(self.text_parts)]
+        return self.text_parts[0] if self.text_parts else ""
+
+    def subscribe(self, callback: Callable[[Dict], None]):
+        """Register an in-process listener called synchronously for every event"""
+        self.listeners.append(callback)
+
+    def _notify(self, event: Dict):
+        for callback in self.listeners:
+            try:
+                callback(event)
+            except Exception as e:
+                logger.warning("Stream listener failed for session %s: %s", self.session_id, e)
+
+    def publish_delta(self, text: str):
+        """Publish one token delta from the upstream completion"""
+        if not text or self.finished:
+            return
+
+        with self.condition:
+            if self.first_token_at is None:
+                self.first_token_at = time.time()
+            self.text_parts.append(text)
+            self.char_count += len(text)
+            published = [self._append('delta', {'text': text})]
+            for kind, field, index, value in self.parser.feed(text):
+                if kind == 'item':
+                    self.partial_result.setdefault(field, []).append(value)
+                    data = {'field': field, 'index': index, 'value': value}
+                else:
+                    self.partial_result[field] = value
+                    data = {'field': field, 'value': value}
+                published.append(self._append('field', data))
+            self.condition.notify_all()
+            self._wake_async_waiters()
+
+        for event in published:
+            self._notify(event)
+
+    def restart(self):
+        """
+        Start a new run after the producer started over (a durable job re-run
+        by another worker): the accumulated text and fields are dropped, the
+        run_id changes so Last-Event-ID cursors reset, and subscribers get an
+        empty snapshot to replace what they have instead of duplicate deltas.
+        """
+        with self.condition:
+            if self.finished:
+                return
+            self.run_id = uuid.uuid4().hex[:8]
+            self.text_parts = []
+            self.char_count = 0
+            self.parser = IncrementalJSONParser()
+            self.partial_result = {}
+            self.events.clear()
+            event = self._append('snapshot', {'text': '', 'partial_result': {}})
+            self.condition.notify_all()
+            self._wake_async_waiters()
+
+        self._notify(event)
+
+    def _append(self, event_type: str, data: Dict) -> Dict:
+        """Append an event to the ring buffer; caller holds the condition"""
+        event = {'id': self.next_seq, 'event': event_type, 'data': data}
+        self.events.append(event)
+        self.last_seq = self.next_seq
+        self.next_seq += 1
+        return event
+
+    def _wake_async_waiters(self):
+        """Wake coroutines blocked in aread(); caller holds the condition"""
+        for loop, event in self.async_waiters:
+            try:
+                loop.call_soon_threadsafe(event.set)
+            except RuntimeError:
+                pass  # loop already closed
+        self.async_waiters.clear()
+
+    def finish(self, status: str, result: Optional[Dict] = None):
+        """Publish the terminal event (completed or failed) and wake all subscribers"""
+        with self.condition:
+            if self.finished:
+                return
+            self.final_event = {
+                'id': self.next_seq,
+                'event': 'done',
+                'data': {'analysis_status': status, 'result': result or {}}
+            }
+            self.next_seq += 1
+            self.condition.notify_all()
+            self._wake_async_waiters()
+
+        self._notify(self.final_event)
+
+    def progress(self) -> Dict:
+        """Cheap progress summary for status responses"""
+        with self.condition:
+            ttft = self.first_token_at - self.started_at if self.first_token_at else None
+            return {
+                'events': self.last_seq,
+                'fields': list(self.partial_result),
+                'characters': self.char_count,
+                'time_to_first_token': round(ttft, 3) if ttft is not None else None
+            }
+
+    def resolve_cursor(self, last_event_id: Optional[str]) -> int:
+        """Map a Last-Event-ID ('<run_id>-<seq>') to a cursor in this run"""
+        if not last_event_id:
+            return 0
+        run_id, _, seq = last_event_id.partition('-')
+        if run_id != self.run_id or not seq.isdigit():
+            return 0
+        with self.condition:
+            return min(int(seq), self.last_seq)
+
+    def read(self, after_seq: int, timeout: float) -> List[Dict]:
+        """Return events newer than after_seq, waiting up to timeout for new ones"""
+        with self.condition:
+            if self.next_seq - 1 <= after_seq:
+                self.condition.wait(timeout)
+            return self._collect(after_seq)
+
+    async def aread(self, after_seq: int, timeout: float) -> List[Dict]:
+        """Coroutine version of read() that waits without blocking the event loop"""
+        event = asyncio.Event()
+        with self.condition:
+            if self.next_seq - 1 > after_seq:
+                return self._collect(after_seq)
+            waiter = (asyncio.get_running_loop(), event)
+            self.async_waiters.append(waiter)
+        try:
+            await asyncio.wait_for(event.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            # Also when the subscriber is cancelled (client disconnected)
+            with self.condition:
+                if waiter in self.async_waiters:
+                    self.async_waiters.remove(waiter)
+        with self.condition:
+            return self._collect(after_seq)
+
+    def _collect(self, after_seq: int) -> List[Dict]:
+        """Events newer than after_seq; caller holds the condition"""
+        pending = []
+        oldest = self.events[0]['id'] if self.events else self.last_seq + 1
+        if after_seq < self.last_seq:
+            if after_seq < oldest - 1:
+                # Subscriber fell behind the retained window
+                pending.append({
+                    'id': self.last_seq,
+                    'event': 'snapshot',
+                    'data': {'text': self._joined_text(), 'partial_result': dict(self.partial_result)}
+                })
+            else:
+                pending.extend(itertools.islice(self.events, after_seq - oldest + 1, None))
+
+        if self.final_event and self.final_event['id'] > after_seq:
+            pending.append(self.final_event)
+
+        return pending
+
+    def iter_sse(self, last_event_id: Optional[str] = None,
+                 heartbeat_interval: float = None, max_duration: float = None) -> Iterator[str]:
+        """
+        Yield SSE frames for one subscriber until the run finishes or
+        max_duration passes; clients then reconnect with Last-Event-ID.
+        """
+        heartbeat_interval = heartbeat_interval or Config.STREAM_HEARTBEAT_INTERVAL
+        deadline = time.time() + (max_duration or Config.STREAM_MAX_DURATION)
+        cursor = self.resolve_cursor(last_event_id)
+
+        yield f"retry: {Config.STREAM_RETRY_MS}\n\n"
+
+        while True:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                return
+            events = self.read(cursor, min(heartbeat_interval, remaining))
+            if not events:
+                yield ": heartbeat\n\n"
+                continue
+
+            frames, cursor = self._frames(events, cursor)
+            yield "".join(frames)
+
+            if self.final_event and cursor >= self.final_event['id']:
+                return
+
+    async def aiter_sse(self, last_event_id: Optional[str] = None,
+                        heartbeat_interval: float = None, max_duration: float = None) -> AsyncIterator[str]:
+        """Async version of iter_sse() for ASGI servers"""
+        heartbeat_interval = heartbeat_interval or Config.STREAM_HEARTBEAT_INTERVAL
+        deadline = time.time() + (max_duration or Config.STREAM_MAX_DURATION)
+        cursor = self.resolve_cursor(last_event_id)
+
+        yield f"retry: {Config.STREAM_RETRY_MS}\n\n"
+
+        while True:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                return
+            events = await self.aread(cursor, min(heartbeat_interval, remaining))
+            if not events:
+                yield ": heartbeat\n\n"
+                continue
+
+            frames, cursor = self._frames(events, cursor)
+            yield "".join(frames)
+
+            if self.final_event and cursor >= self.final_event['id']:
+                return
+
+    def _frames(self, events: List[Dict], cursor: int) -> Tuple[List[str], int]:
+        """SSE frames for a batch of events, coalescing consecutive deltas into one frame"""
+        frames = []
+        batch = []
+        for event in events:
+            if event['event'] == 'delta':
+                batch.append(event['data']['text'])
+                cursor = event['id']
+                continue
+            if batch:
+                frames.append(self._delta_frame(cursor, batch))
+                batch = []
+            cursor = event['id']
+            frames.append(format_sse(dict(event, id=f"{self.run_id}-{event['id']}")))
+        if batch:
+            frames.append(self._delta_frame(cursor, batch))
+        return frames, cursor
+
+    def _delta_frame(self, seq: int, parts: List[str]) -> str:
+        return format_sse({'id': f"{self.run_id}-{seq}", 'event': 'delta', 'data': {'text': "".join(parts)}})
+
+
+class AnalysisStreamRegistry:
+    """Per-process registry of the current analysis stream for each session"""
+
+    def __init__(self):
+        self.streams: Dict[str, AnalysisStream] = {}
+        self.lock = threading.Lock()
+
+    def start(self, session_id: str) -> AnalysisStream:
+        """Create the stream for a new analysis run, replacing any previous run"""
+        stream = AnalysisStream(session_id)
+        with self.lock:
+            self.streams[session_id] = stream
+        return stream
+
+    def get_or_start(self, session_id: str, job_id: str) -> Tuple[AnalysisStream, bool]:
+        """Return the stream following job_id, creating it if needed; the flag tells whether it is new"""
+        with self.lock:
+            stream = self.streams.get(session_id)
+            if stream is not None and stream.job_id == job_id:
+                return stream, False
+            stream = AnalysisStream(session_id, job_id=job_id)
+            self.streams[session_id] = stream
+            return stream, True
+
+    def get(self, session_id: str) -> Optional[AnalysisStream]:
+        with self.lock:
+            return self.streams.get(session_id)
+
+    def remove(self, session_id: str):
+        with self.lock:
+            stream = self.streams.pop(session_id, None)
+        if stream:
+            stream.finish('cancelled', {'error': 'Session expired'})
@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+"""
+Manus AI Platform - Analysis Worker
+Runs analyses from the durable queue (ANALYSIS_BACKEND=sqlite) in a process
+pool separate from the web workers, so gunicorn worker recycling never kills
+an in-flight analysis and analysis capacity scales independently.
+
+Usage:
+    python analysis_worker.py --concurrency 4
+"""
+
+import os
+import sys
+import time
+import signal
+import socket
+import asyncio
+import logging
+import argparse
+import threading
+from collections.abc import Mapping
+from typing import Dict, Iterator, Optional, List
+
+from config import Config
+from analysis_queue import DurableAnalysisQueue
+from file_handler import FileHandler
+from workspace_storage import workspace_storage
+from cancellation import CancelToken, AnalysisCancelled
+from metrics import ANALYSES, ERRORS
+from tracing import traced
+from log_pipeline import start as start_logging
+
+logger = logging.getLogger(__name__)
+
+
+class WorkspaceContent(Mapping):
+    """
+    The 'content' of a queued job's project structure: text files of the
+    session's workspace, read only when the prompt samples them. Files this
+    node's cache lacks are fetched from the workspace store first.
+    """
+
+    def __init__(self, session_id: str, workspace: Dict):
+        self.session_id = session_id
+        self.workspace_path = workspace['path']
+        self.paths = dict.fromkeys(workspace['content_paths'])
+        self.file_handler = FileHandler()
+
+    def __getitem__(self, path: str) -> str:
+        if path not in self.paths:
+            raise KeyError(path)
+        file_path = os.path.join(self.workspace_path, path)
+        if not os.path.exists(file_path) and not workspace_storage.local:
+            try:
+                workspace_storage.fetch(self.session_id, [path], self.workspace_path)
+            except Exception as e:
+                logger.warning("Could not fetch %s of session %s: %s", path, self.session_id, e)
+        return self.file_handler.read_file_content(file_path, 100*1024)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.paths)
+
+    def __len__(self) -> int:
+        return len(self.paths)
+
+    def __contains__(self, path) -> bool:
+        return path in self.paths
+
+
+class AnalysisWorker:
+    """Claims jobs from the durable queue and runs them on a thread pool"""
+
+    def __init__(self, queue: DurableAnalysisQueue, concurrency: int, poll_interval: float = 1.0):
+        # Imported here so the worker process alone pays for the OpenAI client
+        from openai_service import OpenAIService
+        self.queue = queue
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.openai_service = OpenAIService()
+        self.stopping = threading.Event()
+        self.worker_prefix = f"{socket.gethostname()}:{os.getpid()}"
+
+    def run(self):
+        """Run until SIGINT/SIGTERM; in-flight jobs finish before exit"""
+        threads = [
+            threading.Thread(target=self._run_slot, args=(f"{self.worker_prefix}:{i}",), name=f"analysis-slot-{i}")
+            for i in range(self.concurrency)
+        ]
+        for thread in threads:
+            thread.start()
+        signal.signal(signal.SIGTERM, lambda signum, frame: self.stopping.set())
+        logger.info("Analysis worker %s started with %s slots", self.worker_prefix, self.concurrency)
+
+        try:
+            while any(thread.is_alive() for thread in threads):
+                for thread in threads:
+                    thread.join(timeout=1.0)
+        except KeyboardInterrupt:
+            logger.info("Stopping analysis worker, waiting for in-flight jobs")
+            self.stopping.set()
+            for thread in threads:
+                thread.join()
+
+    def _run_slot(self, worker_id: str):
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        last_purge = 0.0
+
+        while not self.stopping.is_set():
+            try:
+                claimed = self.queue.claim(worker_id)
+            except Exception as e:
+                logger.error("Failed to claim analysis job: %s", e)
+                claimed = None
+
+            if claimed is None:
+                if time.time() - last_purge > 3600:
+                    last_purge = time.time()
+                    try:
+                        self.queue.purge(Config.QUEUE_RETENTION)
+                    except Exception as e:
+                        logger.warning("Failed to purge finished jobs: %s", e)
+                self.stopping.wait(self.poll_interval)
+                continue
+
+            job_id, session_id, payload, deadline = claimed
+            self._run_job(loop, worker_id, job_id, session_id, payload, deadline)
+
+    def _run_job(self, loop, worker_id: str, job_id: str, session_id: str, payload: dict,
+                 deadline: Optional[float] = None):
+        start_time = time.time()
+        parts: List[str] = []
+        done = threading.Event()
+        cancel_token = CancelToken(deadline)
+
+        def heartbeat():
+            # Only the deltas since the last heartbeat are sent, not the whole text so far
+            sent_parts = sent_chars = 0
+            while not done.wait(Config.QUEUE_HEARTBEAT_INTERVAL):
+                try:
+                    count = len(parts)
+                    appended = "".join(parts[sent_parts:count])
+                    if not self.queue.heartbeat(job_id, worker_id, appended, sent_chars):
+                        # Cancelled, or re-leased to another worker: stop the upstream call
+                        logger.warning("Lost lease on analysis job %s", job_id)
+                        cancel_token.cancel('lease lost or job cancelled')
+                        return
+                    sent_parts, sent_chars = count, sent_chars + len(appended)
+                except Exception as e:
+                    logger.warning("Heartbeat failed for job %s: %s", job_id, e)
+
+        heartbeat_thread = threading.Thread(target=heartbeat, daemon=True)
+        heartbeat_thread.start()
+
+        try:
+            project_structure = payload['project_structure']
+            if 'workspace' in payload:
+                project_structure = dict(project_structure,
+                                         content=WorkspaceContent(session_id, payload['workspace']))
+            with traced('analysis', job_id=job_id, session_id=session_id):
+                result = loop.run_until_complete(
+                    self.openai_service.analyze_code_async(
+                        payload['task_description'], project_structure,
+                        on_delta=parts.append, cancel_token=cancel_token
+                    )
+                )
+            done.set()
+            if self.queue.complete(job_id, worker_id, result):
+                ANALYSES.labels('completed').inc()
+                logger.info("Analysis job %s for session %s completed in %.2f seconds",
+                            job_id, session_id, time.time() - start_time)
+        except AnalysisCancelled as e:
+            done.set()
+            logger.info("Analysis job %s for session %s stopped: %s", job_id, session_id, e.reason)
+            ANALYSES.labels('cancelled').inc()
+            if e.reason == 'deadline exceeded':
+                # Any other worker would hit the same deadline, so end the job for good
+                self.queue.cancel(job_id, 'Analysis deadline exceeded')
+        except Exception as e:
+            done.set()
+            logger.exception("Analysis job %s for session %s failed", job_id, session_id)
+            ERRORS.labels('analysis').inc()
+            ANALYSES.labels('failed').inc()
+            self.queue.fail(job_id, worker_id, str(e))
+        finally:
+            heartbeat_thread.join()
+
+
+def main(argv: Optional[List[str]] = None):
+    """Command line entry point"""
+    parser = argparse.ArgumentParser(description='Manus AI analysis worker')
+    parser.add_argument('--concurrency', type=int, default=Config.ANALYSIS_WORKERS)
+    parser.add_argument('--db', default=Config.QUEUE_DB_PATH, help='SQLite queue database path')
+    args = parser.parse_args(argv)
+
+    Config.setup_logging()
+    start_logging()
+    if Config.ANALYSIS_BACKEND != 'sqlite':
+        logger.warning("ANALYSIS_BACKEND is not 'sqlite'; the web app will not enqueue jobs for this worker")
+
+    AnalysisWorker(DurableAnalysisQueue(args.db), args.concurrency).run()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -8,15 +8,19 @@ import os
 import sys
 import asyncio
 import logging
-from flask import Flask, request, jsonify, render_template, send_file, Response
+from flask import Flask, request, jsonify, render_template, send_file, send_from_directory, url_for, Response, g
 from flask_cors import CORS
+import hmac
 import uuid
 import time
 import datetime
+import mimetypes
 import threading
 from pathlib import Path
+from typing import Optional, Tuple
 import tempfile
 import shutil
+import zipfile
 from werkzeug.utils import secure_filename
 from werkzeug.exceptions import RequestEntityTooLarge
 
@@ -24,6 +28,27 @@ from werkzeug.exceptions import RequestEntityTooLarge
 from config import Config
 from file_handler import FileHandler
 from openai_service import OpenAIService
+from analysis_stream import AnalysisStream, AnalysisStreamRegistry
+from search_index import BM25Index
+from code_search import TrigramIndex, QueryError
+from symbol_index import SymbolTable, symbol_extractor
+from summary_cache import summary_store, summarize_project
+from job_scheduler import JobScheduler, SchedulerFull
+from admission import AdmissionController, AdmissionRejected
+from workspace_manager import workspace_manager
+from workspace_storage import workspace_storage
+from analysis_queue import DurableAnalysisQueue, follow_job
+from status_board import StatusBoard, SharedStatus
+from cancellation import CancelToken, AnalysisCancelled
+from metrics import (ACTIVE_SESSIONS, ANALYSES, CACHE_LOOKUPS, ERRORS, EXTRACTION_SECONDS, INDEXING_SECONDS,
+                     UPLOAD_BYTES, UPLOAD_SECONDS, CONTENT_TYPE_LATEST, observe_request, render_metrics, timed)
+from tracing import start_trace, finish_trace, traced, span
+from log_pipeline import request_id_from, bind_request_id, reset_request_id, current_request_id, dropped
+from log_pipeline import flush as log_flush, start as start_logging
+from workspace_reaper import reaper as workspace_reaper
+from profiler import profiler, ProfilerBusy, folded, summary
+from asset_pipeline import AssetManifest, ONE_YEAR
+from json_response import FastJSONProvider, stream_jsonify, compress_response
 
 # Initialize configuration and logging
 Config.init_directories()
@@ -32,13 +57,82 @@ logger = Config.setup_logging()
 # Create Flask app
 app = Flask(__name__)
 app.config.from_object(Config)
+# jsonify() through orjson when it is installed
+app.json = FastJSONProvider(app)
 
 # Enable CORS
 CORS(app, origins="*", methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"])
 
+# Fingerprinted, precompressed static files from `python asset_pipeline.py`
+asset_manifest = AssetManifest(app.static_folder)
+
+@app.context_processor
+def inject_asset_url():
+    def asset_url(filename):
+        built = asset_manifest.lookup(filename)
+        if built is None:
+            return url_for('static', filename=filename)
+        return url_for('serve_asset', filename=built)
+    return {'asset_url': asset_url}
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+    # Label by route pattern, not raw path, to keep the series count bounded
+    g.endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+    # Correlation ID for every log line of this request, echoed back as X-Request-ID
+    g.request_id = request_id_from(request.headers.get('X-Request-ID'))
+    g.request_id_token = bind_request_id(g.request_id)
+    g.trace = start_trace(f"{request.method} {g.endpoint}", method=request.method, route=g.endpoint,
+                          request_id=g.request_id)
+
+@app.after_request
+def record_request_metrics(response):
+    observe_request(g.endpoint, request.method, response.status_code, time.perf_counter() - g.request_start)
+    g.trace.root.attributes['status'] = response.status_code
+    finish_trace(g.trace)
+    if Config.TRACE_SERVER_TIMING:
+        response.headers['Server-Timing'] = g.trace.server_timing()
+    response.headers['X-Request-ID'] = g.request_id
+    return response
+
+@app.after_request
+def negotiate_compression(response):
+    with span('compress'):
+        return compress_response(response, request.accept_encodings)
+
+@app.teardown_request
+def unbind_request_id(exc):
+    if 'request_id_token' in g:
+        reset_request_id(g.request_id_token)
+
+@app.teardown_request
+def release_admission(exc):
+    # After a streamed response has been sent, not when the view returns
+    ticket = g.pop('upload_ticket', None)
+    if ticket is not None:
+        ticket.release()
+
+@app.teardown_request
+def release_workspace_pin(exc):
+    pin = g.pop('workspace_pin', None)
+    if pin is not None:
+        pin.release()
+
 # Initialize services
 file_handler = FileHandler()
 openai_service = OpenAIService()
+analysis_streams = AnalysisStreamRegistry()
+# Each scheduler thread's event loop closes its pooled HTTP session on shutdown
+analysis_scheduler = JobScheduler(loop_cleanup=openai_service.close_http_session)
+# Bounds concurrent uploads and extraction per worker and host
+admission = AdmissionController()
+# Wakes long-polling /api/status clients on state changes
+status_board = StatusBoard()
+# Analysis status as every process and node sees it, kept in the workspace store
+shared_status = SharedStatus(workspace_storage)
+# Durable out-of-process queue, drained by analysis_worker.py
+analysis_queue = DurableAnalysisQueue() if Config.ANALYSIS_BACKEND == 'sqlite' else None
 
 # Global session storage (in production, use Redis or database)
 active_sessions = {}
@@ -49,8 +143,10 @@ class SessionManager:
     
     def __init__(self):
         self.sessions = {}
+        self.adopting = {}
         self.cleanup_thread = None
-        self.start_cleanup_thread()
+        self.cleanup_pid = None
+        self.stopping = threading.Event()
     
     def create_session(self) -> str:
         """Create new session"""
@@ -65,20 +161,130 @@ class SessionManager:
         
         with session_lock:
             self.sessions[session_id] = session_data
+            ACTIVE_SESSIONS.set(len(self.sessions))
         
         # Create workspace directory
         os.makedirs(session_data['workspace_path'], exist_ok=True)
+        self.start_cleanup_thread()
         
-        logger.info(f"Created session: {session_id}")
+        logger.info("Created session: %s", session_id)
         return session_id
     
     def get_session(self, session_id: str) -> dict:
         """Get session data"""
+        touch = False
         with session_lock:
             session = self.sessions.get(session_id)
             if session:
-                session['last_activity'] = time.time()
-            return session
+                now = time.time()
+                if now - session.get('workspace_touched', 0) > 60:
+                    session['workspace_touched'] = now
+                    touch = True
+                session['last_activity'] = now
+        
+        if session is None:
+            return self.adopt_session(session_id)
+        if touch:
+            # Keeps the workspace_reaper from treating a live workspace as orphaned,
+            # the workspace_manager from evicting it as idle and the store from expiring it
+            try:
+                os.utime(session['workspace_path'])
+            except FileNotFoundError:
+                if workspace_storage.local:
+                    # Evicted while idle to stay within the disk budget
+                    logger.info("Session %s expired: its workspace was evicted", session_id)
+                    self.remove_session(session_id)
+                    return None
+                # Only this node's cached copy was evicted; files are fetched again when read
+                os.makedirs(session['workspace_path'], exist_ok=True)
+            except OSError:
+                pass
+            workspace_manager.touch(session_id)
+            workspace_storage.touch(session_id)
+        return session
+    
+    def adopt_session(self, session_id: str) -> Optional[dict]:
+        """
+        Take over a session published by another worker process or node: fetch
+        its workspace into the local cache and rebuild the in-memory state.
+        """
+        try:
+            uuid.UUID(session_id)
+        except ValueError:
+            return None
+        
+        # One adoption per session at a time; concurrent requests wait for it
+        with session_lock:
+            lock = self.adopting.setdefault(session_id, threading.Lock())
+        try:
+            with lock:
+                with session_lock:
+                    session = self.sessions.get(session_id)
+                if session is not None:
+                    return session
+                
+                manifest = workspace_storage.manifest(session_id)
+                workspace_path = os.path.join(Config.WORKSPACE_FOLDER, session_id)
+                if manifest is None:
+                    return None
+                if workspace_storage.local and not os.path.isdir(workspace_path):
+                    # Evicted or reaped; the manifest outlived it
+                    workspace_storage.delete(session_id)
+                    return None
+                
+                with span('adopt', session_id=session_id):
+                    pin = workspace_manager.pin(session_id)
+                    try:
+                        self.fetch_files(session_id, workspace_path, manifest['files'])
+                        search_index = BM25Index()
+                        code_index = TrigramIndex()
+                        symbols = SymbolTable()
+                        project_structure = file_handler.analyze_project_structure(workspace_path, search_index,
+                                                                                   code_index, symbols)
+                        file_summaries = summarize_project(project_structure['content'], summary_store)
+                    finally:
+                        pin.release()
+                
+                now = time.time()
+                session = {
+                    'id': session_id,
+                    'created_at': manifest['created_at'],
+                    'last_activity': now,
+                    'workspace_touched': now,
+                    'workspace_path': workspace_path,
+                    'status': 'active',
+                    'project_structure': project_structure,
+                    'search_index': search_index,
+                    'code_index': code_index,
+                    'symbols': symbols,
+                    'file_summaries': file_summaries,
+                    'stored_files': manifest['files'],
+                    'uploaded_files': manifest['uploaded_files'],
+                    'extracted_files': manifest['extracted_files']
+                }
+                with session_lock:
+                    self.sessions[session_id] = session
+                    ACTIVE_SESSIONS.set(len(self.sessions))
+                workspace_storage.touch(session_id)
+                self.start_cleanup_thread()
+                logger.info("Adopted session %s from %s workspace storage", session_id, Config.WORKSPACE_STORAGE)
+                return session
+        finally:
+            with session_lock:
+                self.adopting.pop(session_id, None)
+    
+    def fetch_files(self, session_id: str, workspace_path: str, files: dict):
+        """Read-through cache fill: fetch the stored files (path -> size) missing from the local workspace"""
+        if workspace_storage.local:
+            return
+        missing = {path: size for path, size in files.items()
+                   if not os.path.exists(os.path.join(workspace_path, path))}
+        if not missing:
+            return
+        workspace_manager.claim(session_id, sum(missing.values()))
+        os.makedirs(workspace_path, exist_ok=True)
+        with span('fetch', files=len(missing)):
+            workspace_storage.fetch(session_id, list(missing), workspace_path)
     
     def cleanup_expired_sessions(self):
         """Clean up expired sessions"""
@@ -91,41 +297,109 @@ class SessionManager:
                     expired_sessions.append(session_id)
         
         for session_id in expired_sessions:
-            self.remove_session(session_id)
+            # Other processes or nodes may have used it since; the store's touch marker is shared
+            touched = workspace_storage.touched(session_id)
+            self.remove_session(session_id, discard=touched is None or current_time - touched > Config.SESSION_TIMEOUT)
     
-    def remove_session(self, session_id: str):
-        """Remove session and cleanup files"""
+    def remove_session(self, session_id: str, discard: bool = True):
+        """Remove session and cleanup files; without discard, only this process lets go of it"""
         with session_lock:
             session_data = self.sessions.pop(session_id, None)
+            ACTIVE_SESSIONS.set(len(self.sessions))
         
         if session_data:
-            # Clean up workspace
+            # Release the worker slot and upstream request before the workspace goes away
+            cancel_session_analysis(session_data, 'session expired')
+        analysis_streams.remove(session_id)
+        status_board.remove(session_id)
+        shared_status.forget(session_id)
+        
+        if session_data and (discard or not workspace_storage.local):
+            # Clean up workspace (or, with shared storage, this node's cached copy)
             workspace_path = session_data['workspace_path']
             if os.path.exists(workspace_path):
                 try:
                     shutil.rmtree(workspace_path)
-                    logger.info(f"Cleaned up session workspace: {session_id}")
+                    logger.info("Cleaned up session workspace: %s", session_id)
                 except Exception as e:
-                    logger.error(f"Error cleaning up session {session_id}: {str(e)}")
+                    logger.error("Error cleaning up session %s: %s", session_id, e)
+            workspace_manager.forget(session_id)
+        if session_data and discard:
+            workspace_storage.delete(session_id)
     
     def start_cleanup_thread(self):
-        """Start background cleanup thread"""
-        def cleanup_worker():
-            while True:
+        """Start this process's cleanup thread; sessions live in process memory, so each worker needs one"""
+        if self.cleanup_pid == os.getpid():
+            return
+        with session_lock:
+            if self.cleanup_pid == os.getpid():
+                return
+            self.cleanup_pid = os.getpid()
+            self.stopping = threading.Event()
+        
+        def cleanup_worker(stopping):
+            while not stopping.wait(Config.CLEANUP_INTERVAL):
                 try:
                     self.cleanup_expired_sessions()
-                    time.sleep(Config.CLEANUP_INTERVAL)
                 except Exception as e:
-                    logger.error(f"Error in cleanup thread: {str(e)}")
-                    time.sleep(60)  # Wait 1 minute before retrying
+                    logger.error("Error in cleanup thread: %s", e)
         
-        self.cleanup_thread = threading.Thread(target=cleanup_worker, daemon=True)
+        self.cleanup_thread = threading.Thread(target=cleanup_worker, args=(self.stopping,),
+                                               name='session-cleanup', daemon=True)
         self.cleanup_thread.start()
         logger.info("Started session cleanup thread")
+    
+    def stop_cleanup_thread(self):
+        self.stopping.set()
+
+def cancel_session_analysis(session_data: dict, reason: str) -> bool:
+    """Cancel the session's queued or running analysis; False if there was none"""
+    if session_data.get('analysis_status') not in ('queued', 'running'):
+        return False
+    if analysis_queue is not None and session_data.get('analysis_job_id'):
+        return analysis_queue.cancel(session_data['analysis_job_id'], f'Analysis cancelled: {reason}')
+    if session_data.get('analysis_job'):
+        return analysis_scheduler.cancel(session_data['analysis_job'], reason)
+    return False
+
+def analysis_deadline(data: dict) -> float:
+    """Absolute deadline for a new analysis; a request may ask for less than ANALYSIS_DEADLINE"""
+    timeout = Config.ANALYSIS_DEADLINE
+    try:
+        if data.get('timeout') is not None:
+            timeout = min(timeout, max(1.0, float(data['timeout'])))
+    except (TypeError, ValueError):
+        pass
+    return time.time() + timeout
 
 # Initialize session manager
 session_manager = SessionManager()
 
+def start_worker_services():
+    """
+    Start this process's background threads and pools. Under preload_app the
+    app is imported in the gunicorn master and threads do not survive fork,
+    so gunicorn.conf.py calls this in post_fork; it is idempotent per process.
+    """
+    start_logging()
+    session_manager.start_cleanup_thread()
+    openai_service.start()
+    analysis_scheduler.start()
+    workspace_reaper.start()
+
+def stop_worker_services(timeout: float):
+    """Drain in-flight analyses for up to timeout seconds, then stop this process's threads and pools"""
+    if analysis_scheduler.draining:
+        return
+    session_manager.stop_cleanup_thread()
+    workspace_reaper.stop()
+    drained = analysis_scheduler.drain(timeout)
+    openai_service.shutdown()
+    symbol_extractor.shutdown()
+    logger.info("Worker services stopped (%s queued and %s running analyses cancelled)",
+                drained['cancelled_queued'], drained['cancelled_running'])
+    log_flush()
+
 # Error handlers
 @app.errorhandler(RequestEntityTooLarge)
 def handle_file_too_large(e):
@@ -140,7 +414,7 @@ def handle_file_too_large(e):
 @app.errorhandler(500)
 def handle_internal_error(e):
     """Handle internal server errors"""
-    logger.error(f"Internal server error: {str(e)}")
+    logger.error("Internal server error: %s", e)
     return jsonify({
         'status': 'error',
         'message': 'Internal server error occurred',
@@ -163,6 +437,23 @@ def home():
     logger.info("Home page accessed")
     return render_template('manus_index.html')
 
+@app.route('/assets/<path:filename>')
+def serve_asset(filename):
+    """Built asset in the best encoding the client accepts; its name changes with its content"""
+    negotiated = asset_manifest.negotiate(filename, request.accept_encodings)
+    if negotiated is None:
+        return handle_not_found(None)
+    path, encoding = negotiated
+    mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    response = send_from_directory(asset_manifest.dist, path, mimetype=mimetype, max_age=ONE_YEAR)
+    # send_file names the sibling (.br/.gz); the resource is the asset itself
+    response.headers.pop('Content-Disposition', None)
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.headers['Vary'] = 'Accept-Encoding'
+    response.headers['Cache-Control'] = f'public, max-age={ONE_YEAR}, immutable'
+    return response
+
 @app.route('/api/health')
 def health_check():
     """Health check endpoint"""
@@ -171,19 +462,82 @@ def health_check():
         'timestamp': datetime.datetime.now().isoformat(),
         'version': '2.0.0',
         'sessions': len(session_manager.sessions),
-        'openai_configured': bool(Config.OPENAI_API_KEY)
+        'analysis_scheduler': analysis_scheduler.stats() if analysis_queue is None else analysis_queue.stats(),
+        'openai_configured': openai_service.configured,
+        'models': openai_service.router.stats(),
+        'load': admission.stats(),
+        'workspaces': dict(workspace_manager.stats(), storage=Config.WORKSPACE_STORAGE),
+        'log_records_dropped': dropped()
     })
 
+@app.route('/api/admin/profile')
+def profile_worker():
+    """Sample the stacks of the worker serving this request for ?seconds=N (admin only)"""
+    if not Config.ADMIN_TOKEN:
+        return handle_not_found(None)
+    if not hmac.compare_digest(request.headers.get('X-Admin-Token', ''), Config.ADMIN_TOKEN):
+        return jsonify({
+            'status': 'error',
+            'message': 'Admin token required',
+            'error_code': 'FORBIDDEN'
+        }), 403
+    
+    try:
+        seconds = min(float(request.args.get('seconds', 10)), Config.PROFILE_MAX_SECONDS)
+        interval = max(float(request.args.get('interval_ms', 5)), 1.0) / 1000
+    except ValueError:
+        return jsonify({
+            'status': 'error',
+            'message': 'seconds and interval_ms must be numbers',
+            'error_code': 'INVALID_PARAMETERS'
+        }), 400
+    
+    try:
+        profile = profiler.capture(seconds, interval)
+    except ProfilerBusy as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e),
+            'error_code': 'PROFILER_BUSY'
+        }), 409
+    
+    if request.args.get('format') == 'json':
+        return jsonify(dict(summary(profile), status='success', pid=os.getpid()))
+    # Collapsed stacks: pipe into flamegraph.pl or open in speedscope
+    response = Response(folded(profile), mimetype='text/plain')
+    response.headers['X-Profile-Pid'] = str(os.getpid())
+    return response
+
+@app.route('/metrics')
+def prometheus_metrics():
+    """Prometheus metrics, summed over all worker processes"""
+    return Response(render_metrics(), mimetype=CONTENT_TYPE_LATEST)
+
 @app.route('/api/upload', methods=['POST'])
 def upload_files():
     """Enhanced file upload with support for multiple formats"""
     start_time = time.time()
     logger.info("Upload endpoint accessed")
+    UPLOAD_BYTES.observe(request.content_length or 0)
+    
+    # Turn excess uploads away before their body is read
+    try:
+        g.upload_ticket = admission.admit_upload()
+    except AdmissionRejected as e:
+        return admission_rejected(e)
     
     try:
         # Create new session
         session_id = session_manager.create_session()
+        g.workspace_pin = workspace_manager.pin(session_id)
         session_data = session_manager.get_session(session_id)
+        
+        # Charge the upload to the disk budget before writing it, evicting idle workspaces if needed
+        try:
+            workspace_manager.claim(session_id, request.content_length or 0)
+        except AdmissionRejected as e:
+            session_manager.remove_session(session_id)
+            return admission_rejected(e)
         workspace_path = session_data['workspace_path']
         
         # Check if files were uploaded
@@ -222,7 +576,8 @@ def upload_files():
                 
                 # Save file
                 file_path = os.path.join(workspace_path, filename)
-                file.save(file_path)
+                with span('save'):
+                    file.save(file_path)
                 
                 file_size = os.path.getsize(file_path)
                 file_type = file_handler.get_file_type(filename)
@@ -237,36 +592,79 @@ def upload_files():
                 
                 # Extract archives
                 if file_handler.is_archive_file(filename):
-                    logger.info(f"Extracting archive: {filename}")
-                    success, error_msg, files_list = file_handler.extract_archive(
-                        file_path, workspace_path
-                    )
+                    logger.info("Extracting archive: %s", filename)
+                    extracted_size = file_handler.estimate_extracted_size(file_path)
+                    workspace_manager.claim(session_id, extracted_size)
+                    with span('extract', file=filename), admission.extraction(extracted_size), \
+                            timed(EXTRACTION_SECONDS.labels(file_type)):
+                        success, error_msg, files_list = file_handler.extract_archive(
+                            file_path, workspace_path
+                        )
                     
                     if success:
                         extracted_files.extend(files_list)
                         # Remove the archive file after extraction
                         os.remove(file_path)
-                        logger.info(f"Successfully extracted {len(files_list)} files from {filename}")
+                        workspace_manager.adjust(session_id, -file_size)
+                        logger.info("Successfully extracted %s files from %s", len(files_list), filename)
                     else:
+                        ERRORS.labels('extraction').inc()
                         errors.append(f"Failed to extract {filename}: {error_msg}")
                 
+            except AdmissionRejected as e:
+                session_manager.remove_session(session_id)
+                return admission_rejected(e)
             except Exception as e:
-                logger.error(f"Error processing file {file.filename}: {str(e)}")
+                ERRORS.labels('upload_file').inc()
+                logger.error("Error processing file %s: %s", file.filename, e)
                 errors.append(f"Error processing {file.filename}: {str(e)}")
         
-        # Analyze project structure
-        project_structure = file_handler.analyze_project_structure(workspace_path)
+        # Analyze project structure and build the session's retrieval index
+        search_index = session_data.get('search_index') or BM25Index()
+        code_index = session_data.get('code_index') or TrigramIndex()
+        symbols = session_data.get('symbols') or SymbolTable()
+        with timed(INDEXING_SECONDS):
+            with span('scan'):
+                project_structure = file_handler.analyze_project_structure(workspace_path, search_index,
+                                                                           code_index, symbols)
+            # Claims were estimates; charge what the workspace actually holds
+            workspace_manager.settle(session_id, project_structure['total_size'])
+            
+            # Per-file summaries are cached by content hash across sessions
+            with span('summaries'):
+                file_summaries = summarize_project(project_structure['content'], summary_store)
+        CACHE_LOOKUPS.labels('summary', 'hit').inc(file_summaries['cache_hits'])
+        CACHE_LOOKUPS.labels('summary', 'miss').inc(file_summaries['cache_misses'])
+        logger.info("File summaries: %s cached, %s generated",
+                    file_summaries['cache_hits'], file_summaries['cache_misses'])
+        
+        # Publish the workspace so other workers and nodes can serve the session
+        stored_files = {info['path']: info['size'] for info in project_structure['files']}
+        with span('publish'):
+            workspace_storage.publish(session_id, workspace_path, {
+                'id': session_id,
+                'created_at': session_data['created_at'],
+                'files': stored_files,
+                'uploaded_files': uploaded_files,
+                'extracted_files': extracted_files
+            })
         
         # Update session with project data
         with session_lock:
             session_manager.sessions[session_id].update({
                 'project_structure': project_structure,
+                'search_index': search_index,
+                'code_index': code_index,
+                'symbols': symbols,
+                'file_summaries': file_summaries,
+                'stored_files': stored_files,
                 'uploaded_files': uploaded_files,
                 'extracted_files': extracted_files
             })
         
         end_time = time.time()
-        logger.info(f"Upload completed in {end_time - start_time:.2f} seconds")
+        UPLOAD_SECONDS.observe(end_time - start_time)
+        logger.info("Upload completed in %.2f seconds", end_time - start_time)
         
         response_data = {
             'status': 'success',
@@ -281,7 +679,8 @@ def upload_files():
                 'file_types': dict(list(project_structure['file_types'].items())[:10]),  # Top 10
                 'code_files_count': len(project_structure['code_files']),
                 'media_files_count': len(project_structure['media_files']),
-                'large_files_count': len(project_structure['large_files'])
+                'large_files_count': len(project_structure['large_files']),
+                'symbols_count': symbols.stats()['symbols']
             },
             'processing_time': round(end_time - start_time, 2)
         }
@@ -289,17 +688,170 @@ def upload_files():
         if errors:
             response_data['warnings'] = errors
         
-        return jsonify(response_data)
+        with span('encode'):
+            return stream_jsonify(response_data)
     
     except Exception as e:
         end_time = time.time()
-        logger.exception(f"Error in upload endpoint after {end_time - start_time:.2f} seconds")
+        ERRORS.labels('upload').inc()
+        logger.exception("Error in upload endpoint after %.2f seconds", end_time - start_time)
         return jsonify({
             'status': 'error',
             'message': f'Upload failed: {str(e)}',
             'error_code': 'UPLOAD_FAILED'
         }), 500
 
+def admission_rejected(error: AdmissionRejected):
+    """429/503 response for a request turned away by admission control"""
+    response = jsonify({
+        'status': 'error',
+        'message': f'Server is busy: {str(error)}',
+        'error_code': error.error_code
+    })
+    response.status_code = error.status
+    response.headers['Retry-After'] = str(error.retry_after)
+    return response
+
+def enqueue_durable_analysis(session_id: str, task_description: str, project_structure: dict,
+                             priority: str, deadline: float, start_time: float):
+    """Hand an analysis to the durable queue; analysis_worker.py processes run it"""
+    if analysis_queue.depth() >= Config.ANALYSIS_MAX_QUEUE:
+        response = jsonify({
+            'status': 'error',
+            'message': 'Server is busy: analysis queue is full',
+            'error_code': 'ANALYSIS_QUEUE_FULL'
+        })
+        response.status_code = 503
+        response.headers['Retry-After'] = '5'
+        return response
+    
+    # File contents stay in the workspace; the worker reads the few it samples from there
+    context = {key: value for key, value in project_structure.items() if key != 'content'}
+    job_id = analysis_queue.enqueue(session_id, {
+        'task_description': task_description,
+        'project_structure': context,
+        'workspace': {
+            'path': os.path.join(Config.WORKSPACE_FOLDER, session_id),
+            'content_paths': list(project_structure.get('content', {}))
+        }
+    }, priority, deadline)
+    
+    with session_lock:
+        session = session_manager.sessions[session_id]
+        session['analysis_job_id'] = job_id
+        session['analysis_run'] = run_name(time.time(), job_id)
+        session['analysis_status'] = 'queued'
+        session['task_description'] = task_description
+        session.pop('analysis_progress', None)
+    publish_status(session_id)
+    
+    end_time = time.time()
+    logger.info("Analysis job %s enqueued in %.2f seconds", job_id, end_time - start_time)
+    
+    return jsonify({
+        'status': 'success',
+        'session_id': session_id,
+        'message': 'Analysis queued',
+        'analysis_status': 'queued',
+        'job_id': job_id,
+        'processing_time': round(end_time - start_time, 2)
+    })
+
+def sync_durable_status(session_id: str, session_data: dict) -> dict:
+    """Copy the durable job's state into the session and return the updated session data"""
+    job = analysis_queue.get(session_data['analysis_job_id'])
+    if job is None:
+        return session_data
+    
+    with session_lock:
+        session = session_manager.sessions.get(session_id)
+        if session is None:
+            return session_data
+        changed = session.get('analysis_status') != job['status']
+        session['analysis_status'] = job['status']
+        if job['status'] == 'completed':
+            session['analysis_result'] = job['result']
+        elif job['status'] in ('failed', 'cancelled'):
+            session['analysis_result'] = {'error': job['error'] or f"Analysis {job['status']}"}
+        elif job['status'] == 'running':
+            progress = {
+                'characters': job['progress_chars'],
+                'attempts': job['attempts']
+            }
+            progressed = session.get('analysis_progress') != progress
+            session['analysis_progress'] = progress
+        updated = dict(session)
+    
+    if changed:
+        publish_status(session_id)
+    elif job['status'] == 'running' and progressed:
+        publish_status(session_id, Config.STATUS_PROGRESS_INTERVAL)
+    return updated
+
+# Session keys mirrored in the shared status record
+STATUS_FIELDS = ('analysis_status', 'analysis_result', 'analysis_progress', 'task_description')
+
+def run_name(submitted_at: float, job_id: str) -> str:
+    """Name of an analysis run in the shared status; newer runs sort last"""
+    return f"{int(submitted_at * 1000):013d}-{job_id}"
+
+def publish_status(session_id: str, min_interval: float = 0.0):
+    """
+    Bump the session's status revision and share the new state with the other
+    processes and nodes, if this process runs the current analysis (durable
+    jobs run elsewhere, so any web process that sees them change publishes)
+    """
+    revision = status_board.bump(session_id, min_interval)
+    if not revision:
+        return
+    with session_lock:
+        session = session_manager.sessions.get(session_id)
+        if session is None or not session.get('analysis_run'):
+            return
+        if analysis_queue is None and session.get('analysis_job') is None:
+            # Mirrors a run on another process, which publishes it
+            return
+        record = {key: session[key] for key in STATUS_FIELDS if key in session}
+        record.update(run=session['analysis_run'], job_id=session.get('analysis_job_id'), revision=revision)
+    shared_status.publish(session_id, record['run'], record)
+
+def refresh_analysis_state(session_id: str) -> Optional[dict]:
+    """
+    The session's data, brought up to date with the shared status (for runs
+    started on other processes or nodes) and the durable queue; None when
+    there is no such session
+    """
+    session_data = session_manager.get_session(session_id)
+    if not session_data:
+        return None
+    
+    record = shared_status.read(session_id, Config.STATUS_REFRESH_INTERVAL / 2)
+    replaced = None
+    if record:
+        with session_lock:
+            session = session_manager.sessions.get(session_id)
+            if session is not None and (record['run'], record['revision']) > \
+                    (session.get('analysis_run', ''), status_board.revision(session_id)):
+                if record['run'] != session.get('analysis_run'):
+                    # A newer run started elsewhere; one still going here lost
+                    replaced = session.pop('analysis_job', None)
+                for key in STATUS_FIELDS:
+                    if key in record:
+                        session[key] = record[key]
+                    else:
+                        session.pop(key, None)
+                session['analysis_run'] = record['run']
+                session['analysis_job_id'] = record['job_id']
+                session_data = dict(session)
+        status_board.advance(session_id, record['revision'])
+        if replaced is not None:
+            analysis_scheduler.cancel(replaced, 'replaced by a newer request')
+    
+    if analysis_queue is not None and session_data.get('analysis_job_id') and \
+            session_data.get('analysis_status') in ('queued', 'running'):
+        session_data = sync_durable_status(session_id, session_data)
+    return session_data
+
 @app.route('/api/analyze', methods=['POST'])
 def analyze_project():
     """Analyze project with OpenAI (async)"""
@@ -328,68 +880,248 @@ def analyze_project():
                 'error_code': 'INVALID_SESSION'
             }), 400
         
-        # Get project structure
+        # Get project structure, ranking files by relevance to the task
         project_structure = session_data.get('project_structure', {})
+        search_index = session_data.get('search_index')
+        relevant_files = []
+        if search_index is not None:
+            relevant_files = [path for path, _ in search_index.query(task_description, Config.RETRIEVAL_TOP_K)]
+            project_structure = dict(project_structure, relevant_files=relevant_files)
+        symbols = session_data.get('symbols')
+        if symbols:
+            # Outlines and call sites of the relevant code stand in for raw file prefixes
+            ranked = dict.fromkeys(relevant_files + [info['path'] for info in project_structure.get('code_files', [])])
+            project_structure = dict(project_structure, symbols=symbols.context(list(ranked)))
+        if session_data.get('file_summaries'):
+            project_structure = dict(project_structure, summaries=session_data['file_summaries'])
+        
+        priority = data.get('priority', 'normal')
+        deadline = analysis_deadline(data)
+        if analysis_queue is not None:
+            return enqueue_durable_analysis(session_id, task_description, project_structure,
+                                            priority, deadline, start_time)
         
-        # Start async analysis
-        def run_analysis():
+        # Shared by queueing, context building, the upstream call and result storage
+        cancel_token = CancelToken(deadline)
+        # The analysis logs under the request that started it
+        request_id = current_request_id()
+        
+        # One upstream completion per analysis; SSE clients and the status
+        # store all subscribe to this stream instead of issuing their own calls
+        stream = analysis_streams.start(session_id)
+        # Bound once submitted; a run may only write to the session while it is the session's job
+        job = None
+        
+        def owns(session):
+            """Caller holds session_lock"""
+            return session is not None and job is not None and session.get('analysis_job') is job
+        
+        def record_progress(event):
+            if event['event'] == 'delta':
+                with session_lock:
+                    session = session_manager.sessions.get(session_id)
+                    if owns(session):
+                        session['analysis_progress'] = stream.progress()
+                publish_status(session_id, Config.STATUS_PROGRESS_INTERVAL)
+        
+        stream.subscribe(record_progress)
+        
+        # Runs on a scheduler worker thread, on that worker's event loop
+        async def run_analysis():
             try:
-                loop = asyncio.new_event_loop()
-                asyncio.set_event_loop(loop)
+                with session_lock:
+                    session = session_manager.sessions.get(session_id)
+                    if owns(session):
+                        session['analysis_status'] = 'running'
+                publish_status(session_id)
                 
-                result = loop.run_until_complete(
-                    openai_service.analyze_code_async(task_description, project_structure)
-                )
+                with traced('analysis', session_id=session_id, request_id=request_id):
+                    result = await openai_service.analyze_code_async(
+                        task_description, project_structure, on_delta=stream.publish_delta,
+                        cancel_token=cancel_token
+                    )
                 
-                # Store result in session
+                # Store result in session unless it was cancelled or replaced meanwhile
+                cancel_token.check()
                 with session_lock:
-                    session_manager.sessions[session_id]['analysis_result'] = result
-                    session_manager.sessions[session_id]['analysis_status'] = 'completed'
+                    session = session_manager.sessions.get(session_id)
+                    current = owns(session)
+                    if current:
+                        session['analysis_result'] = result
+                        session['analysis_status'] = 'completed'
+                if not current:
+                    logger.info("Discarding result of replaced analysis for session %s", session_id)
+                    ANALYSES.labels('superseded').inc()
+                    stream.finish('failed', {'error': 'Analysis was replaced by a newer request'})
+                    return
+                publish_status(session_id)
+                stream.finish('completed', result)
+                ANALYSES.labels('completed').inc()
                 
-                logger.info(f"Analysis completed for session {session_id}")
+                logger.info("Analysis completed for session %s", session_id)
                 
+            except AnalysisCancelled as e:
+                logger.info("Analysis cancelled for session %s: %s", session_id, e.reason)
+                set_analysis_outcome('cancelled', f'Analysis cancelled: {e.reason}')
+                raise
             except Exception as e:
-                logger.error(f"Error in async analysis: {str(e)}")
-                with session_lock:
-                    session_manager.sessions[session_id]['analysis_result'] = {
-                        'error': str(e)
-                    }
-                    session_manager.sessions[session_id]['analysis_status'] = 'failed'
+                logger.error("Error in async analysis: %s", e)
+                ERRORS.labels('analysis').inc()
+                set_analysis_outcome('failed', str(e))
         
-        # Mark analysis as started
-        with session_lock:
-            session_manager.sessions[session_id]['analysis_status'] = 'running'
-            session_manager.sessions[session_id]['task_description'] = task_description
+        def set_analysis_outcome(status, message):
+            ANALYSES.labels(status).inc()
+            stream.finish(status, {'error': message})
+            with session_lock:
+                session = session_manager.sessions.get(session_id)
+                if owns(session):
+                    session['analysis_result'] = {'error': message}
+                    session['analysis_status'] = status
+            publish_status(session_id)
         
-        # Start analysis in background thread
-        analysis_thread = threading.Thread(target=run_analysis, daemon=True)
-        analysis_thread.start()
+        def discard_analysis(job, reason):
+            # Queued job dropped before it ran: superseded, shed under load or cancelled
+            if reason == 'cancelled':
+                set_analysis_outcome('cancelled', f'Analysis cancelled: {cancel_token.reason}')
+            elif reason == 'shed':
+                set_analysis_outcome('failed', 'Analysis was dropped because the server is overloaded, please retry')
+            else:
+                ANALYSES.labels('superseded').inc()
+                stream.finish('failed', {'error': 'Analysis was replaced by a newer request'})
+        
+        try:
+            job = analysis_scheduler.submit(session_id, run_analysis, priority, on_discard=discard_analysis,
+                                            cancel_token=cancel_token)
+        except SchedulerFull as e:
+            stream.finish('failed', {'error': str(e)})
+            response = jsonify({
+                'status': 'error',
+                'message': f'Server is busy: {str(e)}',
+                'error_code': 'ANALYSIS_QUEUE_FULL'
+            })
+            response.status_code = 503
+            response.headers['Retry-After'] = str(e.retry_after)
+            return response
+        
+        # Mark analysis as queued
+        with session_lock:
+            session = session_manager.sessions[session_id]
+            session['analysis_job'] = job
+            session['analysis_job_id'] = job.id
+            session['analysis_run'] = run_name(job.submitted_at, job.id)
+            session['task_description'] = task_description
+            session.pop('analysis_progress', None)
+            # The run may have started, and skipped its own status write, before this point
+            if job.status in ('queued', 'running'):
+                session['analysis_status'] = job.status
+        publish_status(session_id)
         
         end_time = time.time()
-        logger.info(f"Analysis started in {end_time - start_time:.2f} seconds")
+        logger.info("Analysis queued in %.2f seconds", end_time - start_time)
         
         return jsonify({
             'status': 'success',
             'session_id': session_id,
-            'message': 'Analysis started',
-            'analysis_status': 'running',
+            'message': 'Analysis queued',
+            'analysis_status': 'queued',
+            'job_id': job.id,
             'processing_time': round(end_time - start_time, 2)
         })
     
     except Exception as e:
         end_time = time.time()
-        logger.exception(f"Error in analyze endpoint after {end_time - start_time:.2f} seconds")
+        logger.exception("Error in analyze endpoint after %.2f seconds", end_time - start_time)
         return jsonify({
             'status': 'error',
             'message': f'Analysis failed to start: {str(e)}',
             'error_code': 'ANALYSIS_START_FAILED'
         }), 500
 
+def analysis_status_payload(session_id: str) -> Tuple[dict, int]:
+    """Status response body and HTTP status code (shared by the WSGI and ASGI routes)"""
+    session_data = refresh_analysis_state(session_id)
+    if session_data:
+        # Read before the session so a concurrent change is seen as a newer revision
+        revision = status_board.revision(session_id)
+        session_data = session_manager.get_session(session_id)
+    if not session_data:
+        return {
+            'status': 'error',
+            'message': 'Invalid or expired session',
+            'error_code': 'INVALID_SESSION'
+        }, 400
+    
+    analysis_status = session_data.get('analysis_status', 'not_started')
+    
+    response_data = {
+        'status': 'success',
+        'session_id': session_id,
+        'analysis_status': analysis_status,
+        'revision': revision
+    }
+    
+    if analysis_status == 'queued' and session_data.get('analysis_job'):
+        response_data['queue_position'] = analysis_scheduler.queue_position(session_data['analysis_job'])
+    elif analysis_status == 'running' and 'analysis_progress' in session_data:
+        response_data['progress'] = session_data['analysis_progress']
+    elif analysis_status == 'completed':
+        response_data['result'] = session_data.get('analysis_result', {})
+    elif analysis_status in ('failed', 'cancelled'):
+        response_data['error'] = session_data.get('analysis_result', {}).get('error', 'Unknown error')
+    
+    return response_data, 200
+
+def long_poll_args(args, max_wait: float) -> Tuple[Optional[int], float]:
+    """(since, wait) from status query parameters; wait is capped at max_wait"""
+    try:
+        since = int(args['since']) if args.get('since') not in (None, '') else None
+        wait = float(args.get('wait') or max_wait)
+    except ValueError:
+        return None, 0.0
+    return since, max(0.0, min(wait, max_wait))
+
+def wait_for_status_change(session_id: str, since: int, wait: float):
+    """Block until the session's status revision passes since, for at most wait seconds"""
+    if refresh_analysis_state(session_id) is None:
+        return
+    deadline = time.time() + wait
+    while True:
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            return
+        # Runs on other processes or nodes and durable jobs only show up on a refresh
+        if status_board.wait(session_id, since, min(remaining, Config.STATUS_REFRESH_INTERVAL)) > since:
+            return
+        if refresh_analysis_state(session_id) is None:
+            return
+
 @app.route('/api/status/<session_id>')
 def get_analysis_status(session_id):
-    """Get analysis status"""
+    """Get analysis status; with ?since=<revision> it long-polls until the status changes"""
     try:
-        session_data = session_manager.get_session(session_id)
+        # A waiting request holds this worker, so it waits briefly if at all and clients pace themselves
+        since, wait = long_poll_args(request.args, Config.STATUS_LONGPOLL_SYNC_TIMEOUT)
+        if since is not None:
+            wait_for_status_change(session_id, since, wait)
+        response_data, status_code = analysis_status_payload(session_id)
+        if status_code == 200:
+            response_data['long_poll'] = {'max_wait': Config.STATUS_LONGPOLL_SYNC_TIMEOUT,
+                                          'poll_interval': Config.STATUS_POLL_INTERVAL}
+        return jsonify(response_data), status_code
+    
+    except Exception as e:
+        logger.exception("Error getting analysis status: %s", e)
+        return jsonify({
+            'status': 'error',
+            'message': f'Failed to get status: {str(e)}',
+            'error_code': 'STATUS_FAILED'
+        }), 500
+
+@app.route('/api/cancel/<session_id>', methods=['POST'])
+def cancel_analysis(session_id):
+    """Cancel the session's queued or running analysis"""
+    try:
+        session_data = refresh_analysis_state(session_id)
         if not session_data:
             return jsonify({
                 'status': 'error',
@@ -397,67 +1129,115 @@ def get_analysis_status(session_id):
                 'error_code': 'INVALID_SESSION'
             }), 400
         
-        analysis_status = session_data.get('analysis_status', 'not_started')
+        if analysis_queue is None and session_data.get('analysis_job') is None and \
+                session_data.get('analysis_status') in ('queued', 'running'):
+            # In-process runs can only be cancelled by the process running them
+            return jsonify({
+                'status': 'error',
+                'message': 'The analysis runs in another worker process and cannot be cancelled from this one',
+                'error_code': 'ANALYSIS_NOT_LOCAL'
+            }), 409
         
-        response_data = {
-            'status': 'success',
-            'session_id': session_id,
-            'analysis_status': analysis_status
-        }
+        if not cancel_session_analysis(session_data, 'cancelled by user'):
+            return jsonify({
+                'status': 'error',
+                'message': 'No analysis is queued or running for this session',
+                'error_code': 'NO_ACTIVE_ANALYSIS'
+            }), 409
+        
+        with session_lock:
+            session = session_manager.sessions.get(session_id)
+            if session is not None and session.get('analysis_status') in ('queued', 'running'):
+                session['analysis_status'] = 'cancelled'
+                session['analysis_result'] = {'error': 'Analysis cancelled: cancelled by user'}
+        publish_status(session_id)
         
-        if analysis_status == 'completed':
-            response_data['result'] = session_data.get('analysis_result', {})
-        elif analysis_status == 'failed':
-            response_data['error'] = session_data.get('analysis_result', {}).get('error', 'Unknown error')
+        logger.info("Analysis cancelled for session %s", session_id)
         
-        return jsonify(response_data)
+        return jsonify({
+            'status': 'success',
+            'session_id': session_id,
+            'analysis_status': 'cancelled'
+        })
     
     except Exception as e:
-        logger.exception(f"Error getting analysis status: {str(e)}")
+        logger.exception("Error cancelling analysis: %s", e)
         return jsonify({
             'status': 'error',
-            'message': f'Failed to get status: {str(e)}',
-            'error_code': 'STATUS_FAILED'
+            'message': f'Failed to cancel analysis: {str(e)}',
+            'error_code': 'CANCEL_FAILED'
         }), 500
 
+def find_analysis_stream(session_id: str, session_data: dict) -> Optional[AnalysisStream]:
+    """The session's current analysis stream (shared by the WSGI and ASGI routes)"""
+    if analysis_queue is not None and session_data.get('analysis_job_id'):
+        # Follow the job running in an analysis worker process
+        stream, created = analysis_streams.get_or_start(session_id, session_data['analysis_job_id'])
+        if created:
+            threading.Thread(
+                target=follow_job, args=(analysis_queue, stream.job_id, stream), daemon=True
+            ).start()
+        return stream
+    if session_data.get('analysis_job') is None and session_data.get('analysis_job_id'):
+        # The run belongs to another process or node: relay its status (its token deltas stay there)
+        stream, created = analysis_streams.get_or_start(session_id, session_data['analysis_job_id'])
+        if created:
+            threading.Thread(target=follow_shared_status, args=(session_id, stream), daemon=True).start()
+        return stream
+    return analysis_streams.get(session_id)
+
+def follow_shared_status(session_id: str, stream: AnalysisStream):
+    """Finish a relayed stream once the shared status of its run reaches an end"""
+    while not stream.finished:
+        session_data = refresh_analysis_state(session_id)
+        if session_data is None:
+            stream.finish('cancelled', {'error': 'Session expired'})
+            return
+        if session_data.get('analysis_job_id') != stream.job_id:
+            stream.finish('failed', {'error': 'Analysis was replaced by a newer request'})
+            return
+        status = session_data.get('analysis_status')
+        if status == 'completed':
+            stream.finish(status, session_data.get('analysis_result'))
+            return
+        if status in ('failed', 'cancelled'):
+            stream.finish(status, {'error': session_data.get('analysis_result', {}).get('error', 'Unknown error')})
+            return
+        time.sleep(Config.STATUS_REFRESH_INTERVAL)
+
 @app.route('/api/stream/<session_id>')
 def stream_analysis(session_id):
-    """Stream analysis results (Server-Sent Events)"""
+    """Stream token deltas of the analysis started by /api/analyze (Server-Sent Events)"""
     try:
-        session_data = session_manager.get_session(session_id)
+        session_data = refresh_analysis_state(session_id)
         if not session_data:
             return jsonify({
                 'status': 'error',
-                'message': 'Invalid or expired session'
+                'message': 'Invalid or expired session',
+                'error_code': 'INVALID_SESSION'
             }), 400
         
-        def generate():
-            try:
-                # Get project structure and task
-                project_structure = session_data.get('project_structure', {})
-                task_description = session_data.get('task_description', '')
-                
-                # Stream analysis
-                loop = asyncio.new_event_loop()
-                asyncio.set_event_loop(loop)
-                
-                async def stream_wrapper():
-                    async for chunk in openai_service.stream_analysis(task_description, project_structure):
-                        yield f"data: {chunk}\n\n"
-                
-                for chunk in loop.run_until_complete(stream_wrapper()):
-                    yield chunk
-                
-                yield "data: [DONE]\n\n"
-                
-            except Exception as e:
-                logger.error(f"Error in streaming: {str(e)}")
-                yield f"data: Error: {str(e)}\n\n"
+        stream = find_analysis_stream(session_id, session_data)
+        if not stream:
+            return jsonify({
+                'status': 'error',
+                'message': 'No analysis has been started for this session',
+                'error_code': 'ANALYSIS_NOT_STARTED'
+            }), 404
         
-        return Response(generate(), mimetype='text/plain')
+        last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+        
+        return Response(
+            stream.iter_sse(last_event_id),
+            mimetype='text/event-stream',
+            headers={
+                'Cache-Control': 'no-cache',
+                'X-Accel-Buffering': 'no'
+            }
+        )
     
     except Exception as e:
-        logger.exception(f"Error in stream endpoint: {str(e)}")
+        logger.exception("Error in stream endpoint: %s", e)
         return jsonify({
             'status': 'error',
             'message': f'Streaming failed: {str(e)}'
@@ -475,6 +1255,7 @@ def download_results(session_id):
             }), 400
         
         workspace_path = session_data['workspace_path']
+        session_manager.fetch_files(session_id, workspace_path, session_data.get('stored_files', {}))
         if not os.path.exists(workspace_path):
             return jsonify({
                 'status': 'error',
@@ -483,7 +1264,8 @@ def download_results(session_id):
         
         # Create ZIP file
         zip_filename = f"manus_result_{session_id}.zip"
-        zip_path = os.path.join(tempfile.gettempdir(), zip_filename)
+        zip_fd, zip_path = tempfile.mkstemp(prefix='manus_result_', suffix='.zip')
+        os.close(zip_fd)
         
         with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
             for root, dirs, files in os.walk(workspace_path):
@@ -492,15 +1274,18 @@ def download_results(session_id):
                     arcname = os.path.relpath(file_path, workspace_path)
                     zipf.write(file_path, arcname)
         
-        return send_file(
+        response = send_file(
             zip_path,
             as_attachment=True,
             download_name=zip_filename,
             mimetype='application/zip'
         )
+        # The open file keeps the data readable until it has been sent
+        os.remove(zip_path)
+        return response
     
     except Exception as e:
-        logger.exception(f"Error in download endpoint: {str(e)}")
+        logger.exception("Error in download endpoint: %s", e)
         return jsonify({
             'status': 'error',
             'message': f'Download failed: {str(e)}'
@@ -519,14 +1304,14 @@ def get_session_files(session_id):
         
         project_structure = session_data.get('project_structure', {})
         
-        return jsonify({
+        return stream_jsonify({
             'status': 'success',
             'session_id': session_id,
             'project_structure': project_structure
         })
     
     except Exception as e:
-        logger.exception(f"Error getting session files: {str(e)}")
+        logger.exception("Error getting session files: %s", e)
         return jsonify({
             'status': 'error',
             'message': f'Failed to get files: {str(e)}'
@@ -544,15 +1329,21 @@ def get_file_content(session_id, file_path):
             }), 400
         
         workspace_path = session_data['workspace_path']
-        full_file_path = os.path.join(workspace_path, file_path)
+        full_file_path = os.path.normpath(os.path.join(workspace_path, file_path))
         
         # Security check
-        if not full_file_path.startswith(workspace_path):
+        if not full_file_path.startswith(workspace_path + os.sep):
             return jsonify({
                 'status': 'error',
                 'message': 'Invalid file path'
             }), 400
         
+        # Read-through: this node's cache may not hold the file yet
+        relative_path = os.path.relpath(full_file_path, workspace_path)
+        stored_size = session_data.get('stored_files', {}).get(relative_path)
+        if stored_size is not None and not os.path.exists(full_file_path):
+            session_manager.fetch_files(session_id, workspace_path, {relative_path: stored_size})
+        
         if not os.path.exists(full_file_path):
             return jsonify({
                 'status': 'error',
@@ -572,12 +1363,160 @@ def get_file_content(session_id, file_path):
         })
     
     except Exception as e:
-        logger.exception(f"Error getting file content: {str(e)}")
+        logger.exception("Error getting file content: %s", e)
         return jsonify({
             'status': 'error',
             'message': f'Failed to get file content: {str(e)}'
         }), 500
 
+@app.route('/api/sessions/<session_id>/search')
+def search_session(session_id):
+    """Substring or regex search over a session's file contents, a page of files at a time"""
+    try:
+        session_data = session_manager.get_session(session_id)
+        if not session_data:
+            return jsonify({
+                'status': 'error',
+                'message': 'Invalid or expired session'
+            }), 400
+        
+        code_index = session_data.get('code_index')
+        if code_index is None:
+            return jsonify({
+                'status': 'error',
+                'message': 'The session has no search index yet',
+                'error_code': 'INDEX_NOT_READY'
+            }), 409
+        
+        query = request.args.get('q', '')
+        if not query or len(query) > Config.CODE_SEARCH_MAX_QUERY:
+            return jsonify({
+                'status': 'error',
+                'message': f'Query must be 1 to {Config.CODE_SEARCH_MAX_QUERY} characters',
+                'error_code': 'INVALID_QUERY'
+            }), 400
+        regex = request.args.get('regex', 'false').lower() in ('1', 'true', 'yes')
+        case_sensitive = request.args.get('case', 'false').lower() in ('1', 'true', 'yes')
+        cursor = max(0, request.args.get('cursor', 0, type=int))
+        limit = min(max(1, request.args.get('limit', Config.CODE_SEARCH_PAGE_SIZE, type=int)),
+                    Config.CODE_SEARCH_MAX_PAGE_SIZE)
+        
+        workspace_path = session_data['workspace_path']
+        stored_files = session_data.get('stored_files', {})
+        
+        def read(path):
+            full_path = os.path.join(workspace_path, path)
+            if not os.path.exists(full_path) and path in stored_files:
+                session_manager.fetch_files(session_id, workspace_path, {path: stored_files[path]})
+            with open(full_path, 'rb') as f:
+                return f.read()
+        
+        with span('search', regex=regex):
+            page = code_index.search(query, read, regex=regex, case_sensitive=case_sensitive, cursor=cursor,
+                                     limit=limit, max_matches=Config.CODE_SEARCH_MATCHES_PER_FILE,
+                                     time_budget=Config.CODE_SEARCH_TIME_BUDGET)
+        
+        return jsonify(dict(page, status='success', session_id=session_id, query=query, regex=regex))
+    
+    except QueryError as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e),
+            'error_code': 'INVALID_QUERY'
+        }), 400
+    except Exception as e:
+        logger.exception("Error searching session files: %s", e)
+        return jsonify({
+            'status': 'error',
+            'message': f'Search failed: {str(e)}'
+        }), 500
+
+def session_symbols(session_id: str):
+    """The session's symbol table, or the error response to return instead"""
+    session_data = session_manager.get_session(session_id)
+    if not session_data:
+        return None, (jsonify({
+            'status': 'error',
+            'message': 'Invalid or expired session'
+        }), 400)
+    symbols = session_data.get('symbols')
+    if symbols is None:
+        return None, (jsonify({
+            'status': 'error',
+            'message': 'The session has no symbol index yet',
+            'error_code': 'INDEX_NOT_READY'
+        }), 409)
+    return symbols, None
+
+@app.route('/api/sessions/<session_id>/symbols')
+def get_session_symbols(session_id):
+    """Outline of one file (?path=), definitions by name prefix (?q=), or the table's totals"""
+    try:
+        symbols, error = session_symbols(session_id)
+        if error:
+            return error
+        
+        path = request.args.get('path')
+        query = request.args.get('q')
+        if path:
+            outline = symbols.outline(path)
+            if outline is None:
+                return jsonify({
+                    'status': 'error',
+                    'message': 'No symbols for this file',
+                    'error_code': 'NOT_FOUND'
+                }), 404
+            return jsonify(dict(outline, status='success', session_id=session_id))
+        if query:
+            limit = min(max(1, request.args.get('limit', 50, type=int)), 500)
+            return jsonify({
+                'status': 'success',
+                'session_id': session_id,
+                'query': query,
+                'symbols': symbols.find(query, request.args.get('kind'), limit)
+            })
+        return jsonify(dict(symbols.stats(), status='success', session_id=session_id))
+    
+    except Exception as e:
+        logger.exception("Error getting session symbols: %s", e)
+        return jsonify({
+            'status': 'error',
+            'message': f'Failed to get symbols: {str(e)}'
+        }), 500
+
+@app.route('/api/sessions/<session_id>/symbols/<name>')
+def get_symbol(session_id, name):
+    """Where a name is defined, with signatures, and where it is called"""
+    try:
+        symbols, error = session_symbols(session_id)
+        if error:
+            return error
+        
+        limit = min(max(1, request.args.get('limit', 100, type=int)), 1000)
+        definitions = symbols.definitions(name)
+        call_sites = symbols.call_sites(name, limit)
+        if not definitions and not call_sites:
+            return jsonify({
+                'status': 'error',
+                'message': f'Symbol not found: {name}',
+                'error_code': 'NOT_FOUND'
+            }), 404
+        
+        return jsonify({
+            'status': 'success',
+            'session_id': session_id,
+            'name': name,
+            'definitions': definitions,
+            'call_sites': call_sites
+        })
+    
+    except Exception as e:
+        logger.exception("Error getting symbol %s: %s", name, e)
+        return jsonify({
+            'status': 'error',
+            'message': f'Failed to get symbol: {str(e)}'
+        }), 500
+
 # Legacy endpoint for backward compatibility
 @app.route('/api/process', methods=['POST'])
 def process_task_legacy():
@@ -586,6 +1525,7 @@ def process_task_legacy():
 
 if __name__ == '__main__':
     logger.info("Starting Manus AI Platform in development mode")
+    start_worker_services()
     app.run(
         host=Config.HOST,
         port=Config.PORT,
@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""
+Manus AI Platform - ASGI entry point
+Serves the long-lived, I/O-bound endpoints (/api/stream, /api/status) as
+coroutines on the server's event loop and hands every other route to the
+Flask app on a thread pool. Analyses run on the same loop, so each worker
+process has exactly one event loop and an idle SSE client costs a suspended
+coroutine instead of a whole sync worker.
+
+Usage:
+    WORKER_CLASS=uvicorn.workers.UvicornWorker gunicorn --config gunicorn.conf.py asgi:application
+    uvicorn asgi:application --port 5001
+"""
+
+import json
+import time
+import asyncio
+import logging
+from urllib.parse import parse_qs
+
+from a2wsgi import WSGIMiddleware
+
+from config import Config
+from metrics import observe_request
+from log_pipeline import request_id_from, bind_request_id
+from wsgi import application as wsgi_application
+from app import (analysis_scheduler, openai_service, status_board, start_worker_services, stop_worker_services,
+                 analysis_status_payload, find_analysis_stream, long_poll_args, refresh_analysis_state)
+
+logger = logging.getLogger(__name__)
+
+SSE_HEADERS = [
+    (b'content-type', b'text/event-stream; charset=utf-8'),
+    (b'cache-control', b'no-cache'),
+    (b'x-accel-buffering', b'no')
+]
+
+
+async def send_json(send, status: int, payload: dict):
+    body = json.dumps(payload).encode('utf-8')
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(b'content-type', b'application/json'), (b'content-length', str(len(body)).encode())]
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+
+class ManusASGI:
+    """ASGI app: native async routes in front of the Flask WSGI app"""
+
+    def __init__(self, wsgi_app):
+        self.wsgi = WSGIMiddleware(wsgi_app, workers=Config.ASGI_WSGI_THREADS)
+        self.routes = {
+            '/api/stream/': self.stream_analysis,
+            '/api/status/': self.get_analysis_status
+        }
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self.lifespan(receive, send)
+
+        if scope['type'] == 'http' and scope['method'] == 'GET':
+            for prefix, handler in self.routes.items():
+                if scope['path'].startswith(prefix):
+                    session_id = scope['path'][len(prefix):]
+                    if session_id and '/' not in session_id:
+                        return await self.timed_route(handler, prefix, scope, receive, send, session_id)
+
+        await self.wsgi(scope, receive, send)
+
+    async def timed_route(self, handler, prefix: str, scope, receive, send, session_id: str):
+        """Run a native route, recording it under the same metric labels as the Flask route"""
+        start_time = time.perf_counter()
+        status = {'code': 500}
+        header = dict(scope.get('headers') or []).get(b'x-request-id', b'').decode('latin-1')
+        request_id = request_id_from(header)
+        # Each request runs in its own task, so the binding ends with it
+        bind_request_id(request_id)
+
+        async def send_and_record(message):
+            if message['type'] == 'http.response.start':
+                status['code'] = message['status']
+                message = dict(message, headers=list(message.get('headers', [])) +
+                               [(b'x-request-id', request_id.encode('latin-1'))])
+            await send(message)
+
+        try:
+            await handler(scope, receive, send_and_record, session_id)
+        finally:
+            observe_request(f'{prefix}<session_id>', 'GET', status['code'], time.perf_counter() - start_time)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                start_worker_services()
+                # Analyses share the server's loop from now on
+                analysis_scheduler.bind_loop(asyncio.get_running_loop())
+                logger.info("ASGI worker started; analyses run on the server event loop")
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                # Draining blocks, and the analyses it waits for run on this loop
+                await asyncio.get_running_loop().run_in_executor(
+                    None, stop_worker_services, Config.SHUTDOWN_DRAIN_TIMEOUT)
+                analysis_scheduler.bind_loop(None)
+                await openai_service.close_http_session()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def get_analysis_status(self, scope, receive, send, session_id: str):
+        try:
+            query = parse_qs(scope.get('query_string', b'').decode('latin-1'))
+            since, wait = long_poll_args({key: values[0] for key, values in query.items()},
+                                         Config.STATUS_LONGPOLL_TIMEOUT)
+            if since is not None:
+                await self.wait_for_status_change(session_id, since, wait)
+            # Reads the shared status and the durable queue, and may adopt the session; keep it off the loop
+            loop = asyncio.get_running_loop()
+            payload, status_code = await loop.run_in_executor(None, analysis_status_payload, session_id)
+            if status_code == 200:
+                # Waiting costs a suspended coroutine here, so clients can ask again right away
+                payload['long_poll'] = {'max_wait': Config.STATUS_LONGPOLL_TIMEOUT, 'poll_interval': 0}
+        except Exception as e:
+            logger.exception("Error getting analysis status: %s", e)
+            payload, status_code = {
+                'status': 'error',
+                'message': f'Failed to get status: {str(e)}',
+                'error_code': 'STATUS_FAILED'
+            }, 500
+        await send_json(send, status_code, payload)
+
+    async def wait_for_status_change(self, session_id: str, since: int, wait: float):
+        """Long-poll without holding a thread: the coroutine sleeps until the revision changes"""
+        loop = asyncio.get_running_loop()
+        # Store and queue reads (and adopting the session) run on the executor, never on the loop
+        if await loop.run_in_executor(None, refresh_analysis_state, session_id) is None:
+            return
+        deadline = loop.time() + wait
+        while True:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                return
+            # Runs on other processes or nodes and durable jobs only show up on a refresh
+            step = min(remaining, Config.STATUS_REFRESH_INTERVAL)
+            if await status_board.await_change(session_id, since, step) > since:
+                return
+            if await loop.run_in_executor(None, refresh_analysis_state, session_id) is None:
+                return
+
+    async def stream_analysis(self, scope, receive, send, session_id: str):
+        loop = asyncio.get_running_loop()
+        session_data = await loop.run_in_executor(None, refresh_analysis_state, session_id)
+        if not session_data:
+            return await send_json(send, 400, {
+                'status': 'error',
+                'message': 'Invalid or expired session',
+                'error_code': 'INVALID_SESSION'
+            })
+
+        stream = await loop.run_in_executor(None, find_analysis_stream, session_id, session_data)
+        if not stream:
+            return await send_json(send, 404, {
+                'status': 'error',
+                'message': 'No analysis has been started for this session',
+                'error_code': 'ANALYSIS_NOT_STARTED'
+            })
+
+        headers = dict(scope['headers'])
+        last_event_id = headers.get(b'last-event-id', b'').decode('latin-1') or \
+            parse_qs(scope.get('query_string', b'').decode('latin-1')).get('last_event_id', [None])[0]
+
+        await send({'type': 'http.response.start', 'status': 200, 'headers': SSE_HEADERS})
+
+        async def wait_for_disconnect():
+            while (await receive())['type'] != 'http.disconnect':
+                pass
+
+        disconnect = asyncio.ensure_future(wait_for_disconnect())
+        frames = stream.aiter_sse(last_event_id)
+        next_frame = None
+        try:
+            while True:
+                next_frame = asyncio.ensure_future(frames.__anext__())
+                await asyncio.wait({next_frame, disconnect}, return_when=asyncio.FIRST_COMPLETED)
+                if not next_frame.done():
+                    # Client went away while waiting for the next event
+                    return
+                try:
+                    frame = next_frame.result()
+                except StopAsyncIteration:
+                    break
+                await send({'type': 'http.response.body', 'body': frame.encode('utf-8'), 'more_body': True})
+            await send({'type': 'http.response.body', 'body': b''})
+        finally:
+            disconnect.cancel()
+            if next_frame is not None and not next_frame.done():
+                # The generator cannot be closed while that task is still running it
+                next_frame.cancel()
+                await asyncio.wait({next_frame})
+            await frames.aclose()
+
+
+application = ManusASGI(wsgi_application)
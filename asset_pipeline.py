@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+"""
+Static asset pipeline: minify, fingerprint and precompress.
+
+    python asset_pipeline.py          # writes static/dist/ and its manifest
+
+Each asset in ASSETS is minified, named after a hash of its content
+(css/manus_style.3f2a9c1b0d4e.css) and written next to .gz and .br
+siblings. The app serves these from /assets/ with immutable cache headers,
+choosing the precompressed sibling the client accepts, so a returning
+browser never asks again and a first visit is never compressed on a
+worker. Without a build, or when a source changed since the last build,
+templates fall back to the plain /static/ URL.
+"""
+
+import os
+import re
+import sys
+import gzip
+import json
+import shutil
+import hashlib
+import logging
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+STATIC_FOLDER = os.path.join(ROOT, 'static')
+MANIFEST_NAME = 'manifest.json'
+
+# Paths relative to static/ that templates reference through asset_url()
+ASSETS = ('css/manus_style.css', 'js/manus_app.js')
+
+# Encodings in server preference order, with the sibling suffix each is stored under
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+ONE_YEAR = 365 * 24 * 3600
+
+
+# --- Minifiers ---------------------------------------------------------------
+#
+# Conservative on purpose: comments are removed and whitespace collapsed, but
+# line breaks are kept in JavaScript (so automatic semicolon insertion is
+# unaffected) and nothing inside strings, template literals or regular
+# expressions is touched.
+
+_JS_REGEX_PRECEDERS = set('(,=:[!&|?{};+-*%<>~^')
+_JS_REGEX_KEYWORDS = {'return', 'typeof', 'case', 'do', 'else', 'in', 'of', 'void', 'yield',
+                      'await', 'delete', 'throw', 'new', 'instanceof'}
+
+
+def _skip_quoted(text: str, start: int, quote: str) -> int:
+    """Index just past the string or regex body that opens at start"""
+    i = start + 1
+    in_class = False
+    while i < len(text):
+        char = text[i]
+        if char == '\\':
+            i += 2
+            continue
+        if quote == '/' and char == '[':
+            in_class = True
+        elif quote == '/' and char == ']':
+            in_class = False
+        elif char == quote and not in_class:
+            return i + 1
+        elif char == '\n' and quote != '`':
+            break
+        i += 1
+    return i
+
+
+def _regex_allowed(out: List[str]) -> bool:
+    """Whether a '/' here starts a regular expression rather than a division"""
+    tail = ''.join(out[-3:]).rstrip()
+    if not tail:
+        return True
+    if tail[-1] in _JS_REGEX_PRECEDERS:
+        return True
+    word = re.search(r'[A-Za-z_$][\w$]*$', tail)
+    return bool(word) and word.group() in _JS_REGEX_KEYWORDS
+
+
+def minify_js(text: str) -> str:
+    out: List[str] = []
+    # Brace depth of each open ${...} inside a template literal
+    template_stack: List[int] = []
+    i = 0
+
+    def emit_space(newline: bool):
+        if not out:
+            return
+        if newline:
+            while out and out[-1] == ' ':
+                out.pop()
+            if out and out[-1] != '\n':
+                out.append('\n')
+        elif out[-1] not in (' ', '\n'):
+            out.append(' ')
+
+    while i < len(text):
+        char = text[i]
+        if char in ' \t\r\n':
+            j = i
+            while j < len(text) and text[j] in ' \t\r\n':
+                j += 1
+            emit_space('\n' in text[i:j])
+            i = j
+        elif text.startswith('//', i):
+            j = text.find('\n', i)
+            i = len(text) if j < 0 else j
+        elif text.startswith('/*', i):
+            j = text.find('*/', i + 2)
+            i = len(text) if j < 0 else j + 2
+            emit_space(False)
+        elif char in '"\'' or (char == '/' and _regex_allowed(out)):
+            j = _skip_quoted(text, i, char)
+            if char == '/':
+                while j < len(text) and text[j].isalpha():
+                    j += 1
+            out.append(text[i:j])
+            i = j
+        elif char == '`' or (char == '}' and template_stack and template_stack[-1] == 0):
+            if char == '}':
+                template_stack.pop()
+            # Copy template text verbatim up to its end or the next ${
+            j = i + 1
+            while j < len(text):
+                if text[j] == '\\':
+                    j += 2
+                elif text[j] == '`':
+                    j += 1
+                    break
+                elif text.startswith('${', j):
+                    j += 2
+                    template_stack.append(0)
+                    break
+                else:
+                    j += 1
+            out.append(text[i:j])
+            i = j
+        else:
+            if template_stack and char == '{':
+                template_stack[-1] += 1
+            elif template_stack and char == '}':
+                template_stack[-1] -= 1
+            out.append(char)
+            i += 1
+    return ''.join(out).strip() + '\n'
+
+
+def minify_css(text: str) -> str:
+    out: List[str] = []
+    i = 0
+    while i < len(text):
+        char = text[i]
+        if text.startswith('/*', i):
+            j = text.find('*/', i + 2)
+            i = len(text) if j < 0 else j + 2
+        elif char in '"\'':
+            j = _skip_quoted(text, i, char)
+            out.append(text[i:j])
+            i = j
+        elif char in ' \t\r\n':
+            while i < len(text) and text[i] in ' \t\r\n':
+                i += 1
+            out.append(' ')
+        else:
+            j = i
+            while j < len(text) and text[j] not in ' \t\r\n"\'' and not text.startswith('/*', j):
+                j += 1
+            out.append(text[i:j])
+            i = j
+    css = ''.join(out)
+    # Strings were copied whole above, so only split them back out for these rewrites
+    parts = re.split(r'("(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\')', css)
+    for index in range(0, len(parts), 2):
+        part = re.sub(r'\s*([{};,>])\s*', r'\1', parts[index])
+        part = re.sub(r':\s+', ':', part)
+        parts[index] = part.replace(';}', '}')
+    return ''.join(parts).strip() + '\n'
+
+
+MINIFIERS = {'.js': minify_js, '.css': minify_css}
+
+
+# --- Build -------------------------------------------------------------------
+
+def _compress(data: bytes) -> Dict[str, bytes]:
+    variants = {'gzip': gzip.compress(data, compresslevel=9, mtime=0)}
+    try:
+        import brotli
+    except ImportError:
+        logger.warning("brotli is not installed; building without .br assets")
+    else:
+        variants['br'] = brotli.compress(data, quality=11)
+    return variants
+
+
+def _sha256(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def build(static_folder: str = STATIC_FOLDER, assets=ASSETS) -> Dict:
+    """Write minified, fingerprinted and precompressed assets plus the manifest; returns the manifest"""
+    dist = os.path.join(static_folder, 'dist')
+    staging = dist + '.partial'
+    shutil.rmtree(staging, ignore_errors=True)
+    manifest = {'assets': {}, 'files': {}}
+
+    for logical in assets:
+        with open(os.path.join(static_folder, logical), 'rb') as f:
+            source = f.read()
+        root, extension = os.path.splitext(logical)
+        minify = MINIFIERS.get(extension)
+        data = minify(source.decode('utf-8')).encode('utf-8') if minify else source
+        hashed = f"{root}.{_sha256(data)[:12]}{extension}"
+
+        path = os.path.join(staging, hashed)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(data)
+        sizes = {'identity': len(data)}
+        variants = _compress(data)
+        for encoding, suffix in ENCODINGS:
+            compressed = variants.get(encoding)
+            # A variant that is not smaller is not worth a negotiation
+            if compressed is not None and len(compressed) < len(data):
+                with open(path + suffix, 'wb') as f:
+                    f.write(compressed)
+                sizes[encoding] = len(compressed)
+
+        manifest['assets'][logical] = {'path': hashed, 'source_sha256': _sha256(source)}
+        manifest['files'][hashed] = {'encodings': [e for e, _ in ENCODINGS if e in sizes], 'sizes': sizes}
+        logger.info("Built %s: %s bytes -> %s", logical, len(source), sizes)
+
+    with open(os.path.join(staging, MANIFEST_NAME), 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    # Swap in the new build whole so a running server never sees half of it
+    shutil.rmtree(dist, ignore_errors=True)
+    os.replace(staging, dist)
+    return manifest
+
+
+# --- Serving -----------------------------------------------------------------
+
+class AssetManifest:
+    """The build's manifest, checked against the current sources when loaded"""
+
+    def __init__(self, static_folder: str = STATIC_FOLDER):
+        self.dist = os.path.join(static_folder, 'dist')
+        self.urls: Dict[str, str] = {}
+        self.files: Dict[str, Dict] = {}
+        try:
+            with open(os.path.join(self.dist, MANIFEST_NAME)) as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            logger.info("No asset build found; serving unversioned static files")
+            return
+
+        for logical, entry in manifest['assets'].items():
+            try:
+                with open(os.path.join(static_folder, logical), 'rb') as f:
+                    current = _sha256(f.read())
+            except OSError:
+                continue
+            if current != entry['source_sha256']:
+                logger.warning("%s changed since the last asset build; serving it unversioned", logical)
+                continue
+            self.urls[logical] = entry['path']
+            self.files[entry['path']] = manifest['files'][entry['path']]
+
+    def lookup(self, logical: str) -> Optional[str]:
+        """Fingerprinted path for a static file, or None to use the plain one"""
+        return self.urls.get(logical)
+
+    def negotiate(self, filename: str, accept_encoding) -> Optional[tuple]:
+        """(file to send, Content-Encoding or None) for a built file, or None if unknown"""
+        entry = self.files.get(filename)
+        if entry is None:
+            return None
+        for encoding, suffix in ENCODINGS:
+            if encoding in entry['encodings'] and accept_encoding[encoding]:
+                return filename + suffix, encoding
+        return filename, None
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    build()
+    sys.exit(0)
@@ -0,0 +1,67 @@
+"""
+Compare two benchmark result files written by benchmarks/run.py.
+
+Usage:
+    python -m benchmarks.compare benchmarks/results/<old>.json benchmarks/results/<new>.json [--threshold 10]
+
+Exits with status 1 when any case got slower (best time) or grew its peak
+allocations by more than the threshold percentage.
+"""
+
+import sys
+import json
+import argparse
+from typing import List, Optional
+
+METRICS = [
+    ('min_s', 'best', lambda v: f"{v * 1000:.2f}ms"),
+    ('median_s', 'median', lambda v: f"{v * 1000:.2f}ms"),
+    ('alloc_peak_bytes', 'allocs', lambda v: f"{v / 2 ** 20:.1f}MB"),
+    ('peak_rss_bytes', 'rss', lambda v: f"{v / 2 ** 20:.1f}MB")
+]
+# Best-of-N time is the least noisy on shared machines; median and peak RSS (which
+# includes the interpreter and fixtures) are reported but never fail the comparison
+GATED = {'min_s', 'alloc_peak_bytes'}
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Compare two benchmark result files")
+    parser.add_argument('baseline')
+    parser.add_argument('candidate')
+    parser.add_argument('--threshold', type=float, default=10.0, help='Allowed regression in percent')
+    args = parser.parse_args(argv)
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.candidate) as f:
+        candidate = json.load(f)
+    print(f"baseline {baseline['meta']['commit']} ({baseline['meta']['suite']}) -> "
+          f"candidate {candidate['meta']['commit']} ({candidate['meta']['suite']})")
+
+    regressions = []
+    print(f"{'case':<36}" + "".join(f"{label:>28}" for _, label, _ in METRICS))
+    for name in sorted(set(baseline['results']) & set(candidate['results'])):
+        old, new = baseline['results'][name], candidate['results'][name]
+        cells = []
+        for key, label, fmt in METRICS:
+            change = (new[key] - old[key]) / old[key] * 100 if old[key] else 0.0
+            flag = ''
+            if key in GATED and change > args.threshold:
+                flag = ' !'
+                regressions.append(f"{name} {label} +{change:.1f}%")
+            cells.append(f"{fmt(old[key])} -> {fmt(new[key])} {change:+.0f}%{flag}".rjust(28))
+        print(f"{name:<36}" + "".join(cells))
+
+    for name in sorted(set(baseline['results']) ^ set(candidate['results'])):
+        print(f"{name:<36} only in {'baseline' if name in baseline['results'] else 'candidate'}")
+
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) over {args.threshold:.0f}%:")
+        for regression in regressions:
+            print(f"  {regression}")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
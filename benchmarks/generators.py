@@ -0,0 +1,227 @@
+"""
+Deterministic synthetic workspaces and archives for the benchmarks.
+
+Every generator takes a seed and produces byte-identical output for it, so
+two commits are always measured against the same inputs. Fixtures are
+written once into a cache directory and reused by later runs.
+"""
+
+import os
+import json
+import random
+import shutil
+import tarfile
+import zipfile
+from typing import Callable, Dict, Tuple
+
+WORDS = (
+    "request response session index token stream cache buffer worker queue "
+    "parse render encode decode upload extract analyze summary context model "
+    "config handler result status error retry limit batch chunk offset value"
+).split()
+
+# Bump when a generator changes so stale cached fixtures are rebuilt
+FIXTURE_VERSION = 1
+
+
+def _identifier(rng: random.Random) -> str:
+    return "_".join(rng.choice(WORDS) for _ in range(rng.randint(1, 3)))
+
+
+def python_source(rng: random.Random, functions: int) -> str:
+    lines = ["import os", "import json", ""]
+    for _ in range(functions):
+        name = _identifier(rng)
+        args = ", ".join(_identifier(rng) for _ in range(rng.randint(0, 3)))
+        lines.append(f"def {name}({args}):")
+        lines.append(f'    """{" ".join(rng.choice(WORDS) for _ in range(rng.randint(4, 12)))}"""')
+        for _ in range(rng.randint(2, 8)):
+            lines.append(f"    {_identifier(rng)} = {_identifier(rng)}({rng.randint(0, 999)})")
+        lines.append(f"    return {_identifier(rng)}")
+        lines.append("")
+    return "\n".join(lines)
+
+
+def javascript_source(rng: random.Random, functions: int) -> str:
+    lines = []
+    for _ in range(functions):
+        lines.append(f"export function {_identifier(rng)}(a, b) {{")
+        for _ in range(rng.randint(2, 6)):
+            lines.append(f"    const {_identifier(rng)} = a.{_identifier(rng)}(b, {rng.randint(0, 99)});")
+        lines.append("    return a;")
+        lines.append("}")
+        lines.append("")
+    return "\n".join(lines)
+
+
+def markdown_source(rng: random.Random, paragraphs: int) -> str:
+    return "\n\n".join(
+        f"## {_identifier(rng)}\n\n" + " ".join(rng.choice(WORDS) for _ in range(rng.randint(20, 80)))
+        for _ in range(paragraphs)
+    )
+
+
+def json_source(rng: random.Random, keys: int) -> str:
+    return json.dumps({_identifier(rng) + str(i): rng.randint(0, 10 ** 6) for i in range(keys)}, indent=2)
+
+
+def _text_file(rng: random.Random, scale: int) -> Tuple[str, str]:
+    kind = rng.random()
+    if kind < 0.55:
+        return 'py', python_source(rng, scale)
+    if kind < 0.8:
+        return 'js', javascript_source(rng, scale)
+    if kind < 0.9:
+        return 'md', markdown_source(rng, scale)
+    return 'json', json_source(rng, scale * 4)
+
+
+def code_tree(root: str, files: int, depth: int, seed: int, max_functions: int = 12):
+    """A source tree of `files` text files spread over directories up to `depth` deep"""
+    rng = random.Random(seed)
+    directories = [""]
+    for _ in range(max(1, files // 12)):
+        parent = rng.choice(directories)
+        if parent.count("/") < depth - 1:
+            directories.append(os.path.join(parent, _identifier(rng)) if parent else _identifier(rng))
+    for i in range(files):
+        extension, content = _text_file(rng, rng.randint(1, max_functions))
+        directory = rng.choice(directories)
+        path = os.path.join(root, directory, f"{_identifier(rng)}_{i}.{extension}")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(content)
+
+
+def deep_tree(root: str, depth: int, files_per_level: int, seed: int):
+    """One directory chain `depth` levels deep with a few files at every level"""
+    rng = random.Random(seed)
+    directory = root
+    for level in range(depth):
+        directory = os.path.join(directory, f"d{level}")
+        os.makedirs(directory, exist_ok=True)
+        for i in range(files_per_level):
+            with open(os.path.join(directory, f"m{i}.py"), 'w', encoding='utf-8') as f:
+                f.write(python_source(rng, 2))
+
+
+def tiny_files(root: str, files: int, seed: int):
+    """Many 16 to 64 byte files in a flat-ish layout (100 per directory)"""
+    rng = random.Random(seed)
+    for i in range(files):
+        directory = os.path.join(root, f"pkg{i // 100}")
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, f"c{i}.py"), 'w', encoding='utf-8') as f:
+            f.write(f"{_identifier(rng)} = {rng.randint(0, 10 ** 6)}\n"[:rng.randint(16, 64)])
+
+
+def binaries(root: str, count: int, size: int, seed: int):
+    """Incompressible binary blobs next to a small code tree"""
+    rng = random.Random(seed)
+    code_tree(os.path.join(root, "src"), 20, 2, seed)
+    assets = os.path.join(root, "assets")
+    os.makedirs(assets, exist_ok=True)
+    for i in range(count):
+        with open(os.path.join(assets, f"blob{i}.png"), 'wb') as f:
+            f.write(rng.randbytes(size))
+
+
+def mixed_binary_text(seed: int, size: int) -> str:
+    """Binary content decoded as latin-1, as read_file_content sees it for a mislabelled file"""
+    rng = random.Random(seed)
+    return rng.randbytes(size).replace(b"\x00", b"\x01").decode('latin-1')
+
+
+def make_zip(source: str, archive: str):
+    with zipfile.ZipFile(archive, 'w', zipfile.ZIP_DEFLATED) as zf:
+        for path in sorted(_walk(source)):
+            info = zipfile.ZipInfo(os.path.relpath(path, source), date_time=(2020, 1, 1, 0, 0, 0))
+            info.compress_type = zipfile.ZIP_DEFLATED
+            with open(path, 'rb') as f:
+                zf.writestr(info, f.read())
+
+
+def make_tar(source: str, archive: str, compression: str):
+    def normalize(info: tarfile.TarInfo) -> tarfile.TarInfo:
+        info.mtime = 0
+        info.uid = info.gid = 0
+        info.uname = info.gname = ""
+        return info
+
+    with tarfile.open(archive, f"w:{compression}") as tf:
+        for path in sorted(_walk(source)):
+            tf.add(path, arcname=os.path.relpath(path, source), filter=normalize)
+
+
+def zip_bomb(archive: str, entries: int = 11, entry_size: int = 100 * 1024 * 1024):
+    """Small archive declaring entries * entry_size bytes of zeros (over the 1GB extraction limit)"""
+    chunk = b"\x00" * (1024 * 1024)
+    with zipfile.ZipFile(archive, 'w', zipfile.ZIP_DEFLATED, compresslevel=9) as zf:
+        for i in range(entries):
+            info = zipfile.ZipInfo(f"zeros{i}.txt", date_time=(2020, 1, 1, 0, 0, 0))
+            info.compress_type = zipfile.ZIP_DEFLATED
+            with zf.open(info, 'w', force_zip64=True) as f:
+                for _ in range(entry_size // len(chunk)):
+                    f.write(chunk)
+
+
+def _walk(root: str):
+    for directory, _, files in os.walk(root):
+        for name in files:
+            yield os.path.join(directory, name)
+
+
+# Tree fixture name -> suite -> builder(path); a fixture missing from a suite is skipped there
+FIXTURES: Dict[str, Dict[str, Callable[[str], None]]] = {
+    'small': {
+        'quick': lambda path: code_tree(path, 50, 3, seed=1),
+        'full': lambda path: code_tree(path, 50, 3, seed=1)
+    },
+    'medium': {
+        'quick': lambda path: code_tree(path, 500, 5, seed=2),
+        'full': lambda path: code_tree(path, 2000, 5, seed=2)
+    },
+    'huge': {
+        'full': lambda path: code_tree(path, 20000, 6, seed=3)
+    },
+    'deep': {
+        'quick': lambda path: deep_tree(path, 40, 2, seed=4),
+        'full': lambda path: deep_tree(path, 120, 3, seed=4)
+    },
+    'tiny': {
+        'quick': lambda path: tiny_files(path, 2000, seed=5),
+        'full': lambda path: tiny_files(path, 20000, seed=5)
+    },
+    'binaries': {
+        'quick': lambda path: binaries(path, 2, 4 * 1024 * 1024, seed=6),
+        'full': lambda path: binaries(path, 4, 32 * 1024 * 1024, seed=6)
+    }
+}
+
+
+def fixture(cache_dir: str, suite: str, name: str) -> str:
+    """Path of a tree fixture, generating it on first use"""
+    path = os.path.join(cache_dir, f"v{FIXTURE_VERSION}", suite, name)
+    if not os.path.exists(os.path.join(path, '.complete')):
+        shutil.rmtree(path, ignore_errors=True)
+        FIXTURES[name][suite](os.path.join(path, 'tree'))
+        open(os.path.join(path, '.complete'), 'w').close()
+    return os.path.join(path, 'tree')
+
+
+def archive_fixture(cache_dir: str, suite: str, tree: str, fmt: str) -> str:
+    """Path of `tree` packed as zip, tar.gz or tar.xz ('bomb' for the zip bomb), built on first use"""
+    directory = os.path.join(cache_dir, f"v{FIXTURE_VERSION}", suite, 'archives')
+    os.makedirs(directory, exist_ok=True)
+    extension = 'zip' if fmt == 'bomb' else fmt
+    path = os.path.join(directory, f"{tree}.{extension}")
+    if not os.path.exists(path):
+        partial = path + '.partial'
+        if fmt == 'bomb':
+            zip_bomb(partial)
+        elif fmt == 'zip':
+            make_zip(fixture(cache_dir, suite, tree), partial)
+        else:
+            make_tar(fixture(cache_dir, suite, tree), partial, fmt.split('.')[-1])
+        os.replace(partial, path)
+    return path
@@ -0,0 +1,126 @@
+"""
+Tail latency of streamed analyses with and without hedged requests.
+
+Starts openai_stub.py with a heavy-tailed time to first token, then runs the
+same number of analyses through OpenAIService.analyze_code_async twice: once
+with HEDGE_ENABLED off and once with it on. Each pass starts with a fresh
+router and first runs --warmup analyses (not measured) so the hedge delay is
+the observed p95 rather than HEDGE_DEFAULT_DELAY. Reports latency
+percentiles and how many upstream requests the stub received per analysis.
+
+Usage:
+    python -m benchmarks.hedging
+    python -m benchmarks.hedging --latency lognormal:-1.2,1.5 --analyses 400 --concurrency 20
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+import subprocess
+import urllib.request
+from typing import Dict, List, Optional
+
+# Keep benchmark processes out of the server's shared metrics store
+os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', tempfile.mkdtemp(prefix='manus-bench-metrics-'))
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.loadtest import REPO_ROOT, TASKS, percentile, wait_for, stop_servers
+
+PROJECT = {'total_files': 3, 'total_size': 4096, 'file_categories': {'code': 3},
+           'code_files': [{'path': path, 'formatted_size': '1.3 KB'} for path in ('app.py', 'cache.py', 'retry.py')]}
+
+
+def stub_requests(base_url: str) -> int:
+    with urllib.request.urlopen(f'{base_url}/stats', timeout=5) as response:
+        return json.load(response)['requests']
+
+
+async def run_pass(service, analyses: int, concurrency: int) -> List[float]:
+    """Run analyses with at most concurrency in flight; returns each one's seconds"""
+    limit = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one(number: int):
+        async with limit:
+            start = time.perf_counter()
+            result = await service.analyze_code_async(TASKS[number % len(TASKS)], PROJECT,
+                                                      on_delta=lambda delta: None)
+            latencies.append(time.perf_counter() - start)
+            if result['analysis'].get('task_type') == 'error':
+                raise RuntimeError(result['summary'])
+
+    try:
+        await asyncio.gather(*(one(number) for number in range(analyses)))
+    finally:
+        await service.close_http_session()
+    return latencies
+
+
+def measure(base_url: str, hedge: bool, args) -> Dict:
+    from config import Config
+    from openai_service import OpenAIService
+
+    Config.HEDGE_ENABLED = hedge
+    service = OpenAIService()
+    asyncio.run(run_pass(service, args.warmup, args.concurrency))
+    before = stub_requests(base_url)
+    latencies = sorted(asyncio.run(run_pass(service, args.analyses, args.concurrency)))
+    upstream = stub_requests(base_url) - before
+    service.shutdown()
+    return {
+        'hedge': hedge,
+        'p50_s': percentile(latencies, 0.50),
+        'p95_s': percentile(latencies, 0.95),
+        'p99_s': percentile(latencies, 0.99),
+        'max_s': latencies[-1],
+        'upstream_per_analysis': upstream / args.analyses,
+        'hedge_delay_s': service.router.hedge_delay(Config.OPENAI_MODEL),
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Compare analysis latency with and without hedged requests")
+    parser.add_argument('--latency', default='lognormal:-1.2,1.5', help='Stub time-to-first-token distribution')
+    parser.add_argument('--token-rate', type=float, default=400, help='Stub tokens per second')
+    parser.add_argument('--analyses', type=int, default=400, help='Measured analyses per pass')
+    parser.add_argument('--warmup', type=int, default=40, help='Unmeasured analyses before each pass')
+    parser.add_argument('--concurrency', type=int, default=20)
+    parser.add_argument('--port', type=int, default=8098)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help='Write the measurements as JSON')
+    args = parser.parse_args(argv)
+
+    base_url = f'http://127.0.0.1:{args.port}/v1'
+    os.environ.update(OPENAI_API_KEY='sk-bench', OPENAI_API_BASE=base_url)
+    stub = subprocess.Popen(
+        [sys.executable, 'openai_stub.py', '--port', str(args.port), '--latency', args.latency,
+         '--token-rate', str(args.token_rate), '--seed', str(args.seed)],
+        cwd=REPO_ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        wait_for(f'{base_url}/models')
+        results = {'latency': args.latency, 'analyses': args.analyses, 'concurrency': args.concurrency,
+                   'passes': [measure(base_url, hedge, args) for hedge in (False, True)]}
+    finally:
+        stop_servers([stub])
+
+    print(f"stub latency {args.latency}, {args.analyses} analyses, {args.concurrency} concurrent\n")
+    print(f"{'hedging':<8} {'p50':>7} {'p95':>7} {'p99':>7} {'max':>7} {'upstream/analysis':>18} {'delay':>7}")
+    for measured in results['passes']:
+        print(f"{'on' if measured['hedge'] else 'off':<8} {measured['p50_s']:>6.2f}s {measured['p95_s']:>6.2f}s "
+              f"{measured['p99_s']:>6.2f}s {measured['max_s']:>6.2f}s {measured['upstream_per_analysis']:>18.2f} "
+              f"{measured['hedge_delay_s']:>6.2f}s")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,441 @@
+"""
+End-to-end load test for the HTTP API.
+
+Virtual users replay whole sessions: upload an archive, start an analysis,
+follow it by long-polling /api/status or streaming /api/stream, browse the
+file list and a few files, then download the results. The report gives
+throughput, latency percentiles and error rates per endpoint, end-to-end
+analysis time, and the RSS of the server's worker processes.
+
+With --spawn the harness starts openai_stub.py and gunicorn itself, so
+worker classes, worker counts and settings can be compared in one command:
+
+    python -m benchmarks.loadtest --spawn --workers 4 --users 50 --duration 60
+    python -m benchmarks.loadtest --spawn --worker-class uvicorn.workers.UvicornWorker \\
+        --app asgi:application --workers 2 --users 200 --follow stream
+    python -m benchmarks.loadtest --url http://127.0.0.1:5001 --server-pid $(cat /tmp/manus-platform.pid)
+"""
+
+import os
+import io
+import sys
+import json
+import time
+import random
+import signal
+import asyncio
+import argparse
+import tempfile
+import subprocess
+import urllib.request
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+import aiohttp
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.generators import code_tree, make_zip
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TASKS = [
+    "Fix the bug in the retry handling",
+    "Optimize the slow cache lookups",
+    "Review the upload code for security issues",
+    "Add a feature to export results",
+    "General code review"
+]
+
+
+def percentile(sorted_values: List[float], q: float) -> Optional[float]:
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+class Stats:
+    """Latencies and errors per endpoint, plus end-to-end analysis times"""
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+        self.analysis_times: List[float] = []
+        self.sessions = 0
+        self.failed_sessions = 0
+
+    def record(self, endpoint: str, seconds: float, error: Optional[str] = None):
+        self.latencies[endpoint].append(seconds)
+        if error:
+            self.errors[endpoint][error] += 1
+
+    def report(self, elapsed: float) -> Dict:
+        endpoints = {}
+        for endpoint, values in sorted(self.latencies.items()):
+            values = sorted(values)
+            errors = sum(self.errors[endpoint].values())
+            endpoints[endpoint] = {
+                'requests': len(values),
+                'rps': round(len(values) / elapsed, 2),
+                'errors': errors,
+                'error_rate': round(errors / len(values), 4),
+                'error_kinds': dict(self.errors[endpoint]),
+                'p50_ms': round(percentile(values, 0.5) * 1000, 1),
+                'p90_ms': round(percentile(values, 0.9) * 1000, 1),
+                'p99_ms': round(percentile(values, 0.99) * 1000, 1),
+                'max_ms': round(values[-1] * 1000, 1)
+            }
+        analysis = sorted(self.analysis_times)
+        total_requests = sum(len(values) for values in self.latencies.values())
+        return {
+            'elapsed_s': round(elapsed, 2),
+            'sessions': self.sessions,
+            'failed_sessions': self.failed_sessions,
+            'sessions_per_s': round(self.sessions / elapsed, 3),
+            'requests': total_requests,
+            'requests_per_s': round(total_requests / elapsed, 2),
+            'analysis_p50_s': round(percentile(analysis, 0.5), 3) if analysis else None,
+            'analysis_p99_s': round(percentile(analysis, 0.99), 3) if analysis else None,
+            'endpoints': endpoints
+        }
+
+
+class SessionFailed(Exception):
+    pass
+
+
+class VirtualUser:
+    """Replays upload -> analyze -> follow -> browse -> download sessions in a loop"""
+
+    def __init__(self, base_url: str, http: aiohttp.ClientSession, archive: bytes, stats: Stats,
+                 follow: str, rng: random.Random, think_time: float, timeout: float, retries: int = 5):
+        self.base_url = base_url.rstrip('/')
+        self.http = http
+        self.archive = archive
+        self.stats = stats
+        self.follow = follow
+        self.rng = rng
+        self.think_time = think_time
+        self.timeout = timeout
+        self.retries = retries
+
+    async def request(self, endpoint: str, method: str, path: str, parse: str = 'json', data=None, **kwargs):
+        """
+        Timed request; returns the parsed body, raising SessionFailed on errors.
+        Like the browser client, a 429/503 with Retry-After is recorded and
+        retried after that delay (data may be a factory for a fresh body).
+        """
+        for attempt in range(self.retries + 1):
+            start_time = time.perf_counter()
+            retry_after = None
+            try:
+                async with self.http.request(method, self.base_url + path, data=data() if callable(data) else data,
+                                             timeout=aiohttp.ClientTimeout(total=self.timeout), **kwargs) as response:
+                    body = await (response.json(content_type=None) if parse == 'json' else response.read())
+                    error = None if response.status < 400 else str(response.status)
+                    if response.status in (429, 503):
+                        retry_after = response.headers.get('Retry-After')
+            except asyncio.TimeoutError:
+                body, error = None, 'timeout'
+            except (aiohttp.ClientError, json.JSONDecodeError) as e:
+                body, error = None, type(e).__name__
+            self.stats.record(endpoint, time.perf_counter() - start_time, error)
+            if retry_after is None or attempt == self.retries:
+                break
+            await asyncio.sleep(float(retry_after) * (1 + self.rng.random() * 0.5))
+        if error:
+            raise SessionFailed(f"{endpoint}: {error}")
+        return body
+
+    def upload_form(self) -> aiohttp.FormData:
+        form = aiohttp.FormData()
+        form.add_field('files', io.BytesIO(self.archive), filename='project.zip', content_type='application/zip')
+        return form
+
+    async def run_session(self):
+        upload = await self.request('POST /api/upload', 'POST', '/api/upload', data=self.upload_form)
+        session_id = upload['session_id']
+        await self.think()
+
+        analysis_start = time.perf_counter()
+        await self.request('POST /api/analyze', 'POST', '/api/analyze',
+                           json={'session_id': session_id, 'task_description': self.rng.choice(TASKS)})
+        follow = self.follow if self.follow != 'mixed' else self.rng.choice(['poll', 'stream'])
+        if follow == 'stream':
+            await self.stream(session_id)
+        else:
+            await self.poll(session_id)
+        self.stats.analysis_times.append(time.perf_counter() - analysis_start)
+        await self.think()
+
+        files = await self.request('GET /api/sessions/<id>/files', 'GET', f'/api/sessions/{session_id}/files')
+        paths = [f['path'] for f in files.get('project_structure', {}).get('files', [])]
+        for path in self.rng.sample(paths, min(3, len(paths))):
+            await self.request('GET /api/sessions/<id>/file/<path>', 'GET',
+                               f'/api/sessions/{session_id}/file/{path}')
+        await self.think()
+
+        await self.request('GET /api/download/<id>', 'GET', f'/api/download/{session_id}', parse='bytes')
+
+    async def poll(self, session_id: str):
+        revision, wait, pause = 0, 0, 0
+        while True:
+            status = await self.request('GET /api/status/<id>', 'GET',
+                                        f'/api/status/{session_id}?since={revision}&wait={wait}')
+            revision = status.get('revision', revision)
+            if status.get('analysis_status') in ('completed', 'failed', 'cancelled'):
+                if status['analysis_status'] != 'completed':
+                    raise SessionFailed(f"analysis {status['analysis_status']}")
+                return
+            # Like the browser: hold requests as long as the server allows, pause as long as it asks
+            hint = status.get('long_poll') or {}
+            wait, pause = hint.get('max_wait', wait), hint.get('poll_interval', pause)
+            if pause:
+                await asyncio.sleep(pause)
+
+    async def stream(self, session_id: str):
+        start_time = time.perf_counter()
+        error = 'no done event'
+        try:
+            async with self.http.get(f'{self.base_url}/api/stream/{session_id}',
+                                     timeout=aiohttp.ClientTimeout(total=self.timeout)) as response:
+                if response.status >= 400:
+                    error = str(response.status)
+                else:
+                    async for line in response.content:
+                        if line.startswith(b'event: done'):
+                            error = None
+                            break
+        except asyncio.TimeoutError:
+            error = 'timeout'
+        except aiohttp.ClientError as e:
+            error = type(e).__name__
+        self.stats.record('GET /api/stream/<id>', time.perf_counter() - start_time, error)
+        if error:
+            raise SessionFailed(f"stream: {error}")
+
+    async def think(self):
+        if self.think_time:
+            await asyncio.sleep(self.rng.expovariate(1 / self.think_time))
+
+    async def run(self, stop_at: float):
+        while time.time() < stop_at:
+            try:
+                await self.run_session()
+                self.stats.sessions += 1
+            except SessionFailed:
+                self.stats.failed_sessions += 1
+                # Back off a little so a failing server is not hammered in a tight loop
+                await asyncio.sleep(0.5)
+
+
+class MemorySampler:
+    """Samples the RSS of a server process and its children (gunicorn master and workers)"""
+
+    def __init__(self, pid: Optional[int], interval: float = 1.0):
+        self.pid = pid
+        self.interval = interval
+        self.samples: List[Dict[int, int]] = []
+
+    @staticmethod
+    def _rss(pid: int) -> Optional[int]:
+        try:
+            with open(f'/proc/{pid}/status') as f:
+                for line in f:
+                    if line.startswith('VmRSS:'):
+                        return int(line.split()[1]) * 1024
+        except OSError:
+            return None
+        return None
+
+    def _children(self) -> List[int]:
+        children = []
+        for entry in os.listdir('/proc'):
+            if entry.isdigit():
+                try:
+                    with open(f'/proc/{entry}/stat') as f:
+                        if int(f.read().rsplit(')', 1)[1].split()[1]) == self.pid:
+                            children.append(int(entry))
+                except (OSError, IndexError, ValueError):
+                    continue
+        return children
+
+    async def run(self, stop_at: float):
+        if not self.pid or not os.path.exists('/proc'):
+            return
+        while time.time() < stop_at:
+            sample = {}
+            for pid in [self.pid] + self._children():
+                rss = self._rss(pid)
+                if rss is not None:
+                    sample[pid] = rss
+            self.samples.append(sample)
+            await asyncio.sleep(self.interval)
+
+    def report(self) -> Optional[Dict]:
+        if not self.samples:
+            return None
+        totals = [sum(sample.values()) for sample in self.samples]
+        workers = [rss for sample in self.samples for pid, rss in sample.items() if pid != self.pid]
+        return {
+            'processes': len(self.samples[-1]),
+            'total_rss_mb_peak': round(max(totals) / 2 ** 20, 1),
+            'total_rss_mb_end': round(totals[-1] / 2 ** 20, 1),
+            'worker_rss_mb_peak': round(max(workers) / 2 ** 20, 1) if workers else None
+        }
+
+
+def build_archive(files: int, seed: int) -> bytes:
+    with tempfile.TemporaryDirectory() as directory:
+        code_tree(os.path.join(directory, 'tree'), files, 3, seed)
+        make_zip(os.path.join(directory, 'tree'), os.path.join(directory, 'project.zip'))
+        with open(os.path.join(directory, 'project.zip'), 'rb') as f:
+            return f.read()
+
+
+def wait_for(url: str, timeout: float = 30.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with urllib.request.urlopen(url, timeout=2):
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"{url} did not come up within {timeout:.0f} seconds")
+
+
+def spawn_servers(args) -> List[subprocess.Popen]:
+    """Start the OpenAI stub and gunicorn; returns the processes (gunicorn last)"""
+    log = open(os.path.join(tempfile.gettempdir(), 'manus-loadtest-server.log'), 'w')
+    stub = subprocess.Popen(
+        [sys.executable, 'openai_stub.py', '--port', str(args.stub_port), '--latency', args.stub_latency,
+         '--token-rate', str(args.stub_token_rate), '--seed', str(args.seed)],
+        cwd=REPO_ROOT, stdout=log, stderr=subprocess.STDOUT
+    )
+    env = dict(os.environ, OPENAI_API_KEY='sk-loadtest', OPENAI_API_BASE=f'http://127.0.0.1:{args.stub_port}/v1',
+               WORKERS=str(args.workers), WORKER_CLASS=args.worker_class, PORT=str(args.port))
+    env.update(item.split('=', 1) for item in args.env)
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '--config', 'gunicorn.conf.py',
+         '--pid', os.path.join(tempfile.gettempdir(), 'manus-loadtest.pid'), args.app],
+        cwd=REPO_ROOT, env=env, stdout=log, stderr=subprocess.STDOUT
+    )
+    processes = [stub, server]
+    try:
+        wait_for(f'http://127.0.0.1:{args.stub_port}/v1/models')
+        wait_for(f'http://127.0.0.1:{args.port}/api/health')
+    except RuntimeError:
+        stop_servers(processes)
+        raise
+    return processes
+
+
+def stop_servers(processes: List[subprocess.Popen]):
+    for process in reversed(processes):
+        process.send_signal(signal.SIGTERM)
+        try:
+            process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+async def run_load(args, base_url: str, server_pid: Optional[int]) -> Dict:
+    archive = build_archive(args.files, args.seed)
+    stats = Stats()
+    sampler = MemorySampler(server_pid)
+    # Room for every user's request plus an open stream
+    connector_limit = max(4, args.users * 2)
+    async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=connector_limit)) as http:
+        start_time = time.time()
+        stop_at = start_time + args.duration
+        users = [
+            VirtualUser(base_url, http, archive, stats, args.follow, random.Random(args.seed + i),
+                        args.think_time, args.timeout, args.retries)
+            for i in range(args.users)
+        ]
+
+        async def ramped(index: int, user: VirtualUser):
+            await asyncio.sleep(args.ramp_up * index / max(1, args.users))
+            await user.run(stop_at)
+
+        await asyncio.gather(sampler.run(stop_at), *(ramped(i, user) for i, user in enumerate(users)))
+        elapsed = time.time() - start_time
+
+    report = stats.report(elapsed)
+    report['memory'] = sampler.report()
+    return report
+
+
+def print_report(report: Dict):
+    print(f"\n{report['sessions']} sessions ({report['failed_sessions']} failed) in {report['elapsed_s']}s: "
+          f"{report['sessions_per_s']} sessions/s, {report['requests_per_s']} requests/s")
+    if report['analysis_p50_s'] is not None:
+        print(f"analysis end to end: p50 {report['analysis_p50_s']}s, p99 {report['analysis_p99_s']}s")
+    print(f"\n{'endpoint':<36} {'reqs':>7} {'rps':>8} {'err%':>7} {'p50':>9} {'p90':>9} {'p99':>9} {'max':>9}")
+    for endpoint, row in report['endpoints'].items():
+        print(f"{endpoint:<36} {row['requests']:>7} {row['rps']:>8} {row['error_rate'] * 100:>6.1f}% "
+              f"{row['p50_ms']:>7}ms {row['p90_ms']:>7}ms {row['p99_ms']:>7}ms {row['max_ms']:>7}ms")
+        if row['error_kinds']:
+            print(f"{'':<36} errors: {row['error_kinds']}")
+    if report.get('memory'):
+        memory = report['memory']
+        print(f"\nserver memory: {memory['processes']} processes, total RSS peak {memory['total_rss_mb_peak']} MB "
+              f"(end {memory['total_rss_mb_end']} MB), largest worker {memory['worker_rss_mb_peak']} MB")
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Replay realistic sessions against the HTTP API")
+    parser.add_argument('--url', help='Target server (default: the spawned one)')
+    parser.add_argument('--server-pid', type=int, help='Server (gunicorn master) PID for memory sampling')
+    parser.add_argument('--users', type=int, default=10, help='Concurrent virtual users')
+    parser.add_argument('--duration', type=float, default=30.0, help='Seconds to run')
+    parser.add_argument('--ramp-up', type=float, default=5.0, help='Seconds over which users start')
+    parser.add_argument('--think-time', type=float, default=0.5, help='Mean pause between steps (seconds)')
+    parser.add_argument('--follow', choices=['poll', 'stream', 'mixed'], default='mixed')
+    parser.add_argument('--files', type=int, default=40, help='Files in the uploaded archive')
+    parser.add_argument('--timeout', type=float, default=120.0, help='Per-request timeout (seconds)')
+    parser.add_argument('--retries', type=int, default=5,
+                        help='Retries of a request answered 429/503 with Retry-After (0 counts it as failed)')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help='Write the report as JSON to this file')
+    spawn = parser.add_argument_group('spawned servers')
+    spawn.add_argument('--spawn', action='store_true', help='Start openai_stub.py and gunicorn for the run')
+    spawn.add_argument('--app', default='wsgi:application')
+    spawn.add_argument('--worker-class', default='sync')
+    spawn.add_argument('--workers', type=int, default=2)
+    spawn.add_argument('--port', type=int, default=5099)
+    spawn.add_argument('--env', action='append', default=[], help='Extra server setting KEY=VALUE (repeatable)')
+    spawn.add_argument('--stub-port', type=int, default=8099)
+    spawn.add_argument('--stub-latency', default='lognormal:-1.2,0.4')
+    spawn.add_argument('--stub-token-rate', type=float, default=200)
+    args = parser.parse_args(argv)
+
+    processes = []
+    server_pid = args.server_pid
+    base_url = args.url
+    if args.spawn:
+        processes = spawn_servers(args)
+        server_pid = processes[-1].pid
+        base_url = base_url or f'http://127.0.0.1:{args.port}'
+    elif not base_url:
+        parser.error('--url is required without --spawn')
+
+    try:
+        report = asyncio.run(run_load(args, base_url, server_pid))
+    finally:
+        stop_servers(processes)
+
+    report['config'] = {
+        'url': base_url, 'users': args.users, 'duration': args.duration, 'follow': args.follow,
+        'think_time': args.think_time, 'files': args.files,
+        'spawned': {'app': args.app, 'worker_class': args.worker_class, 'workers': args.workers,
+                    'env': args.env} if args.spawn else None
+    }
+    print_report(report)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
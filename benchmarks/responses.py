@@ -0,0 +1,146 @@
+"""
+Encode time and bytes on the wire for large JSON responses.
+
+Builds the /api/sessions/<id>/files payload of a synthetic project
+(default 50k files) and measures, for Flask's stock jsonify and for the
+json_response layer (orjson when installed, buffered and streamed), the
+encode time and peak traced memory, then the compressed size and time per
+content coding.
+
+Usage:
+    python -m benchmarks.responses
+    python -m benchmarks.responses --files 50000 --content-every 4 --repeats 5
+    python -m benchmarks.responses --output responses.json
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import tracemalloc
+from typing import Callable, Dict, List, Optional
+
+# Keep benchmark processes out of the server's shared metrics store
+os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', tempfile.mkdtemp(prefix='manus-bench-metrics-'))
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.generators import python_source, _identifier
+
+EXTENSIONS = (('.py', 'code'), ('.js', 'code'), ('.json', 'data'), ('.md', 'documentation'),
+              ('.png', 'image'), ('.txt', 'documentation'))
+
+
+def project_payload(files: int, content_every: int, seed: int = 0) -> Dict:
+    """A get_session_files response for a project of `files` files, shaped like analyze_project_structure"""
+    rng = random.Random(seed)
+    structure = {'files': [], 'directories': [], 'total_files': 0, 'total_size': 0, 'file_types': {},
+                 'file_categories': {}, 'content': {}, 'large_files': [], 'binary_files': [],
+                 'code_files': [], 'media_files': []}
+    directories = [f"src/{_identifier(rng)}/{_identifier(rng)}" for _ in range(max(1, files // 40))]
+    structure['directories'] = directories
+    for number in range(files):
+        extension, file_type = rng.choice(EXTENSIONS)
+        path = f"{rng.choice(directories)}/{_identifier(rng)}_{number}{extension}"
+        size = rng.randint(100, 200_000)
+        info = {'path': path, 'size': size, 'extension': extension, 'type': file_type,
+                'formatted_size': f"{size / 1024:.1f} KB"}
+        structure['files'].append(info)
+        structure['total_files'] += 1
+        structure['total_size'] += size
+        structure['file_types'][extension] = structure['file_types'].get(extension, 0) + 1
+        structure['file_categories'][file_type] = structure['file_categories'].get(file_type, 0) + 1
+        if file_type == 'code':
+            structure['code_files'].append(info)
+        elif file_type == 'image':
+            structure['media_files'].append(info)
+        if content_every and number % content_every == 0 and file_type != 'image':
+            structure['content'][path] = python_source(rng, rng.randint(1, 4))
+    return {'status': 'success', 'session_id': 'benchmark', 'project_structure': structure}
+
+
+def _time(function: Callable, repeats: int) -> Dict:
+    function()  # warm-up
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = function()
+        timings.append((time.perf_counter() - start) * 1000)
+    tracemalloc.start()
+    function()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    timings.sort()
+    return {'median_ms': timings[len(timings) // 2], 'min_ms': timings[0], 'peak_mb': peak / 1e6,
+            'result': result}
+
+
+def encoders(payload: Dict) -> Dict[str, Callable[[], int]]:
+    """Name -> function encoding the payload and returning its size in bytes"""
+    from flask import Flask
+    from json_response import FastJSONProvider, iter_json
+    from config import Config
+
+    stock = Flask('stock')
+    fast = Flask('fast')
+    fast.json = FastJSONProvider(fast)
+
+    def through(app: Flask) -> Callable[[], int]:
+        return lambda: len(app.json.response(payload).get_data())
+
+    return {
+        'flask jsonify (stdlib)': through(stock),
+        'FastJSONProvider': through(fast),
+        # Consumed chunk by chunk as the server would send it; only one chunk is alive at a time
+        'stream_jsonify': lambda: sum(len(chunk) for chunk in iter_json(
+            payload, Config.JSON_STREAM_CHUNK_ITEMS, Config.JSON_STREAM_MIN_ITEMS))
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Measure JSON encoding and compression of large responses")
+    parser.add_argument('--files', type=int, default=50_000, help='Files in the synthetic project')
+    parser.add_argument('--content-every', type=int, default=4,
+                        help='Include file content for every Nth file (0 for none)')
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('--output', help='Write the measurements as JSON')
+    args = parser.parse_args(argv)
+
+    import json_response
+    payload = project_payload(args.files, args.content_every)
+    results = {'files': args.files, 'json_encoder': 'orjson' if json_response.orjson else 'stdlib',
+               'encode': {}, 'wire': {}}
+
+    print(f"{args.files} files, {len(payload['project_structure']['content'])} with content; "
+          f"encoder: {results['json_encoder']}\n")
+    print(f"{'encoder':<26} {'median':>9} {'min':>9} {'peak mem':>10} {'bytes':>12}")
+    for name, encode in encoders(payload).items():
+        measured = _time(encode, args.repeats)
+        measured['bytes'] = measured.pop('result')
+        results['encode'][name] = measured
+        print(f"{name:<26} {measured['median_ms']:>7.1f}ms {measured['min_ms']:>7.1f}ms "
+              f"{measured['peak_mb']:>8.1f}MB {measured['bytes']:>12,}")
+
+    body = json_response.dumps(payload)
+    print(f"\n{'content coding':<26} {'bytes':>12} {'ratio':>7} {'time':>9}")
+    print(f"{'identity':<26} {len(body):>12,} {1:>7.2f} {'-':>9}")
+    results['wire']['identity'] = {'bytes': len(body)}
+    for encoding in json_response.ENCODINGS:
+        measured = _time(lambda: json_response.compress(body, encoding), args.repeats)
+        size = len(measured.pop('result'))
+        results['wire'][encoding] = {'bytes': size, 'median_ms': measured['median_ms']}
+        print(f"{encoding:<26} {size:>12,} {len(body) / size:>7.2f} {measured['median_ms']:>7.1f}ms")
+    if 'zstd' not in json_response.ENCODINGS:
+        print("(install zstandard to measure zstd)")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,323 @@
+"""
+Benchmarks for the FileHandler hot paths and context building.
+
+Every case runs in a fresh process so its peak RSS is its own. Each case
+reports wall time over several repeats (after a warm-up), peak RSS, and
+peak traced allocations from one extra run under tracemalloc. Results are
+written as JSON, one file per commit, for benchmarks/compare.py.
+
+Usage:
+    python -m benchmarks.run                                  # quick suite
+    python -m benchmarks.run --suite full --only extract_ analyze_
+    python -m benchmarks.compare benchmarks/results/<old>.json benchmarks/results/<new>.json
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import resource
+import tempfile
+import subprocess
+import tracemalloc
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+# Keep benchmark processes out of the server's shared metrics store
+os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', tempfile.mkdtemp(prefix='manus-bench-metrics-'))
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.generators import fixture, archive_fixture, python_source, mixed_binary_text
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_CACHE = os.path.join(tempfile.gettempdir(), 'manus-bench-fixtures')
+
+
+class Case:
+    """
+    One benchmark: prepare(cache_dir, suite) builds the state once per
+    process, run(state) is the timed call, reset(state) undoes its side
+    effects between repeats without being timed.
+    """
+
+    def __init__(self, name: str, prepare: Callable, run: Callable, reset: Optional[Callable] = None,
+                 suites=('quick', 'full')):
+        self.name = name
+        self.prepare = prepare
+        self.run = run
+        self.reset = reset or (lambda state: None)
+        self.suites = suites
+
+
+def _file_handler():
+    from file_handler import FileHandler
+    return FileHandler()
+
+
+def extract_case(tree: str, fmt: str, expect_success: bool = True, suites=('quick', 'full')) -> Case:
+    def prepare(cache_dir, suite):
+        return {
+            'handler': _file_handler(),
+            'archive': archive_fixture(cache_dir, suite, tree, fmt),
+            'target': tempfile.mkdtemp(prefix='manus-bench-extract-')
+        }
+
+    def run(state):
+        success, error, _ = state['handler'].extract_archive(state['archive'], state['target'])
+        if success != expect_success:
+            raise RuntimeError(f"Unexpected extraction result for {tree}.{fmt}: {error}")
+
+    def reset(state):
+        shutil.rmtree(state['target'], ignore_errors=True)
+
+    name = 'extract_zip_bomb' if fmt == 'bomb' else f"extract_{fmt.replace('.', '')}_{tree}"
+    return Case(name, prepare, run, reset, suites)
+
+
+def analyze_case(tree: str, reindex: bool = False, suites=('quick', 'full')) -> Case:
+    def prepare(cache_dir, suite):
+        from search_index import BM25Index
+        state = {'handler': _file_handler(), 'path': fixture(cache_dir, suite, tree), 'index_class': BM25Index}
+        if reindex:
+            # Incremental path: every file is already indexed and unchanged
+            state['index'] = BM25Index()
+            state['handler'].analyze_project_structure(state['path'], state['index'])
+        return state
+
+    def run(state):
+        index = state['index'] if reindex else state['index_class']()
+        state['handler'].analyze_project_structure(state['path'], index)
+
+    return Case(f"analyze_{tree}{'_reindex' if reindex else ''}", prepare, run, suites=suites)
+
+
+def symbols_case(tree: str, workers: int = 1, suites=('quick', 'full')) -> Case:
+    def prepare(cache_dir, suite):
+        from symbol_index import SymbolExtractor, language_of
+        root = fixture(cache_dir, suite, tree)
+        files = {}
+        for directory, _, names in os.walk(root):
+            for name in names:
+                if language_of(name) is not None:
+                    path = os.path.join(directory, name)
+                    files[os.path.relpath(path, root)] = (os.path.getsize(path), None)
+        # Every batch goes to the pool when there is one, so the case measures it
+        return {'root': root, 'files': files, 'extractor': SymbolExtractor(workers, parallel_min_bytes=0)}
+
+    def run(state):
+        from symbol_index import SymbolTable
+        SymbolTable().update(state['root'], state['files'], state['extractor'])
+
+    return Case(f"symbols_{tree}{f'_{workers}procs' if workers > 1 else ''}", prepare, run, suites=suites)
+
+
+def read_tree_case(tree: str) -> Case:
+    def prepare(cache_dir, suite):
+        root = fixture(cache_dir, suite, tree)
+        paths = sorted(os.path.join(directory, name) for directory, _, files in os.walk(root) for name in files)
+        return {'handler': _file_handler(), 'paths': paths}
+
+    def run(state):
+        for path in state['paths']:
+            state['handler'].read_file_content(path)
+
+    return Case(f"read_file_content_{tree}", prepare, run)
+
+
+def read_binary_case(size: int) -> Case:
+    # A mislabelled binary under the size limit: every encoding is tried and scanned
+    def prepare(cache_dir, suite):
+        path = os.path.join(cache_dir, f"binary_{size}.py")
+        if not os.path.exists(path):
+            with open(path, 'w', encoding='latin-1') as f:
+                f.write(mixed_binary_text(7, size))
+        return {'handler': _file_handler(), 'path': path}
+
+    def run(state):
+        state['handler'].read_file_content(state['path'])
+
+    return Case(f"read_file_content_binary_{size // 1024}k", prepare, run)
+
+
+def is_text_case(kind: str, size: int) -> Case:
+    def prepare(cache_dir, suite):
+        import random
+        if kind == 'code':
+            text = python_source(random.Random(8), 400)
+            text = (text * (size // len(text) + 1))[:size]
+        else:
+            text = mixed_binary_text(9, size)
+        return {'handler': _file_handler(), 'text': text}
+
+    def run(state):
+        state['handler']._is_text_content(state['text'])
+
+    return Case(f"is_text_content_{kind}_{size // 1024}k", prepare, run)
+
+
+def prepare_context_case(tree: str, suites=('quick', 'full')) -> Case:
+    def prepare(cache_dir, suite):
+        from search_index import BM25Index
+        from summary_cache import summarize_project
+        from openai_service import OpenAIService
+        index = BM25Index()
+        structure = _file_handler().analyze_project_structure(fixture(cache_dir, suite, tree), index)
+        structure['summaries'] = summarize_project(structure['content'])
+        structure['relevant_files'] = [path for path, _ in index.query('fix the cache retry bug', 10)]
+        return {'service': OpenAIService(), 'structure': structure}
+
+    def run(state):
+        state['service']._prepare_context(state['structure'])
+
+    return Case(f"prepare_context_{tree}", prepare, run, suites=suites)
+
+
+CASES: Dict[str, Case] = {case.name: case for case in [
+    extract_case('medium', 'zip'),
+    extract_case('medium', 'tar.gz'),
+    extract_case('medium', 'tar.xz'),
+    extract_case('tiny', 'zip'),
+    extract_case('binaries', 'zip'),
+    extract_case('bomb', 'bomb', expect_success=False),
+    analyze_case('small'),
+    analyze_case('medium'),
+    analyze_case('medium', reindex=True),
+    analyze_case('huge', suites=('full',)),
+    analyze_case('deep'),
+    analyze_case('tiny'),
+    analyze_case('binaries'),
+    symbols_case('medium'),
+    symbols_case('medium', workers=4, suites=('full',)),
+    symbols_case('huge', suites=('full',)),
+    symbols_case('huge', workers=4, suites=('full',)),
+    read_tree_case('medium'),
+    read_binary_case(512 * 1024),
+    is_text_case('code', 100 * 1024),
+    is_text_case('binary', 512 * 1024),
+    prepare_context_case('medium'),
+    prepare_context_case('huge', suites=('full',))
+]}
+
+
+def _max_rss_bytes() -> int:
+    # VmHWM is this process's own peak; Linux ru_maxrss also inherits the parent's peak across fork
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    # ru_maxrss is kilobytes on Linux, bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if sys.platform == 'darwin' else rss * 1024
+
+
+def measure(name: str, suite: str, cache_dir: str, repeats: int, warmup: int) -> Dict:
+    """Run one case in this (fresh) process"""
+    case = CASES[name]
+    state = case.prepare(cache_dir, suite)
+    baseline_rss = _max_rss_bytes()
+
+    times = []
+    for i in range(warmup + repeats):
+        start_time = time.perf_counter()
+        case.run(state)
+        elapsed = time.perf_counter() - start_time
+        case.reset(state)
+        if i >= warmup:
+            times.append(elapsed)
+    peak_rss = _max_rss_bytes()
+
+    # Separate run: tracemalloc slows allocation-heavy code several times over
+    tracemalloc.start()
+    case.run(state)
+    _, alloc_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    case.reset(state)
+
+    times.sort()
+    return {
+        'repeats': repeats,
+        'median_s': times[len(times) // 2],
+        'min_s': times[0],
+        'max_s': times[-1],
+        'peak_rss_bytes': peak_rss,
+        'rss_growth_bytes': peak_rss - baseline_rss,
+        'alloc_peak_bytes': alloc_peak
+    }
+
+
+def _git(*args: str) -> str:
+    try:
+        return subprocess.run(['git', *args], cwd=REPO_ROOT, capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ''
+
+
+def run_suite(suite: str, cache_dir: str, names: List[str], repeats: int, warmup: int) -> Dict:
+    results = {}
+    context = multiprocessing.get_context('spawn')
+    print(f"{'case':<36} {'median':>10} {'min':>10} {'peak rss':>10} {'allocs':>10}")
+    for name in names:
+        # Build fixtures here so generating them never counts towards a case's RSS
+        state = CASES[name].prepare(cache_dir, suite)
+        CASES[name].reset(state)
+        del state
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+            result = pool.submit(measure, name, suite, cache_dir, repeats, warmup).result()
+        results[name] = result
+        print(f"{name:<36} {result['median_s'] * 1000:>8.2f}ms {result['min_s'] * 1000:>8.2f}ms "
+              f"{result['peak_rss_bytes'] / 2 ** 20:>8.1f}MB {result['alloc_peak_bytes'] / 2 ** 20:>8.1f}MB")
+    return results
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Benchmark FileHandler hot paths on synthetic repositories")
+    parser.add_argument('--suite', choices=['quick', 'full'], default='quick')
+    parser.add_argument('--only', nargs='*', default=[], help='Run cases whose name starts with any prefix')
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('--warmup', type=int, default=1)
+    parser.add_argument('--fixtures', default=DEFAULT_CACHE, help='Fixture cache directory')
+    parser.add_argument('--output', help='Result file (default: benchmarks/results/<commit>-<suite>.json)')
+    parser.add_argument('--list', action='store_true', help='List cases and exit')
+    args = parser.parse_args(argv)
+
+    names = [name for name, case in CASES.items() if args.suite in case.suites
+             and (not args.only or any(name.startswith(prefix) for prefix in args.only))]
+    if args.list:
+        print("\n".join(names))
+        return
+
+    os.makedirs(args.fixtures, exist_ok=True)
+    commit = _git('rev-parse', '--short', 'HEAD') or 'unknown'
+    dirty = bool(_git('status', '--porcelain', '--untracked-files=no'))
+    results = run_suite(args.suite, args.fixtures, names, args.repeats, args.warmup)
+
+    output = args.output or os.path.join(REPO_ROOT, 'benchmarks', 'results',
+                                         f"{commit}{'-dirty' if dirty else ''}-{args.suite}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump({
+            'meta': {
+                'commit': commit,
+                'dirty': dirty,
+                'suite': args.suite,
+                'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'cpu_count': os.cpu_count()
+            },
+            'results': results
+        }, f, indent=2, sort_keys=True)
+    print(f"Results written to {output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,129 @@
+"""
+Code search latency over a large synthetic workspace.
+
+Writes a workspace of --mb megabytes of Python source (each file also
+defines one identifier found nowhere else), builds the TrigramIndex over it
+as ingest would, then times one page of results for queries ranging from a
+rare literal to a regex with no literal to filter on.
+
+Usage:
+    python -m benchmarks.search
+    python -m benchmarks.search --mb 1024 --output search.json
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import resource
+import tempfile
+from typing import Dict, List, Optional
+
+# Keep benchmark processes out of the server's shared metrics store
+os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', tempfile.mkdtemp(prefix='manus-bench-metrics-'))
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.generators import python_source, _identifier
+
+FILE_FUNCTIONS = 40  # about 50KB per file
+
+
+def unique_name(number: int) -> str:
+    return f"handler_{number:06d}_{(number * 2654435761) % 2**32:08x}"
+
+
+def write_workspace(root: str, megabytes: int, seed: int = 0) -> List[str]:
+    """Files under root totalling about megabytes; returns their relative paths"""
+    rng = random.Random(seed)
+    paths, written, number = [], 0, 0
+    while written < megabytes * 1024 * 1024:
+        path = f"pkg_{number % 50:02d}/{_identifier(rng)}_{number}.py"
+        source = python_source(rng, FILE_FUNCTIONS) + f"\n\ndef {unique_name(number)}():\n    return {number}\n"
+        os.makedirs(os.path.join(root, os.path.dirname(path)), exist_ok=True)
+        with open(os.path.join(root, path), 'w') as f:
+            f.write(source)
+        paths.append(path)
+        written += len(source)
+        number += 1
+    return paths
+
+
+def queries(files: int) -> Dict[str, Dict]:
+    return {
+        'rare literal': {'pattern': unique_name(files // 2)},
+        'common literal': {'pattern': 'return'},
+        'absent literal, common trigrams': {'pattern': 'render_status(offset_value_cache)'},
+        'regex with literals': {'pattern': unique_name(files // 3)[:14] + r'\w+\(\)', 'regex': True},
+        'regex alternation': {'pattern': f"({unique_name(7)}|{unique_name(files - 1)})", 'regex': True},
+        'regex without literal': {'pattern': r'\(\d\d\d\)$', 'regex': True},
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Measure code search latency on a large workspace")
+    parser.add_argument('--mb', type=int, default=256, help='Workspace size in megabytes')
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('--output', help='Write the measurements as JSON')
+    args = parser.parse_args(argv)
+
+    from code_search import TrigramIndex
+    from config import Config
+
+    root = tempfile.mkdtemp(prefix='manus-search-bench-')
+    try:
+        start = time.perf_counter()
+        paths = write_workspace(root, args.mb)
+        print(f"Wrote {len(paths)} files ({args.mb}MB) in {time.perf_counter() - start:.1f}s")
+
+        index = TrigramIndex()
+        rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        start = time.perf_counter()
+        for path in paths:
+            full_path = os.path.join(root, path)
+            with open(full_path, 'rb') as f:
+                stat = os.fstat(f.fileno())
+                index.add_document(path, f.read(), (stat.st_size, stat.st_mtime_ns))
+        build_seconds = time.perf_counter() - start
+        stats = index.stats()
+        rss_growth = (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss_before) / 1024
+        print(f"Indexed in {build_seconds:.1f}s ({stats['bytes_indexed'] / build_seconds / 1e6:.1f} MB/s): "
+              f"{stats['trigrams']:,} trigrams, {stats['postings']:,} postings, RSS +{rss_growth:.0f}MB\n")
+        results = {'megabytes': args.mb, 'files': len(paths), 'build_seconds': build_seconds,
+                   'rss_growth_mb': rss_growth, 'index': stats, 'queries': {}}
+
+        def read(path):
+            with open(os.path.join(root, path), 'rb') as f:
+                return f.read()
+
+        print(f"{'query':<34} {'median':>9} {'max':>9} {'candidates':>11} {'scanned':>8} {'files':>6}")
+        for name, query in queries(len(paths)).items():
+            timings = []
+            for _ in range(args.repeats):
+                page = index.search(query['pattern'], read, regex=query.get('regex', False),
+                                    limit=Config.CODE_SEARCH_PAGE_SIZE,
+                                    max_matches=Config.CODE_SEARCH_MATCHES_PER_FILE,
+                                    time_budget=Config.CODE_SEARCH_TIME_BUDGET)
+                timings.append(page['elapsed_ms'])
+            timings.sort()
+            measured = {'median_ms': timings[len(timings) // 2], 'max_ms': timings[-1],
+                        'candidates': page['candidates'], 'scanned': page['scanned'],
+                        'files': len(page['results']), 'truncated': page['truncated']}
+            results['queries'][name] = measured
+            print(f"{name:<34} {measured['median_ms']:>7.1f}ms {measured['max_ms']:>7.1f}ms "
+                  f"{measured['candidates']:>11,} {measured['scanned']:>8,} {measured['files']:>6}"
+                  f"{'  (time budget hit)' if measured['truncated'] else ''}")
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,146 @@
+"""
+Cold-start time of the application entry point.
+
+Imports the target (default wsgi:application) in fresh interpreters and
+reports the wall time of that import, the whole process time including
+interpreter startup, and the modules that dominate it from
+`python -X importtime`. Exits non-zero when the median import time exceeds
+--budget-ms, so CI can hold the line on startup cost.
+
+Usage:
+    python -m benchmarks.startup
+    python -m benchmarks.startup --target asgi:application --runs 7 --top 30
+    python -m benchmarks.startup --budget-ms 300 --output startup.json
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import subprocess
+from typing import Dict, List, Optional
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Prints the import's own wall time; __import__ (unlike importlib) keeps the target at the top of -X importtime's tree
+PROBE = (
+    "import sys, time\n"
+    "start = time.perf_counter()\n"
+    "__import__({module!r})\n"
+    "getattr(sys.modules[{module!r}], {attribute!r})\n"
+    "print('STARTUP_MS', (time.perf_counter() - start) * 1000)\n"
+)
+
+
+def _environment(scratch: str) -> Dict[str, str]:
+    # Keep logs, metrics and workspaces of the probe away from the real ones
+    env = dict(os.environ)
+    env.update({
+        'PYTHONPATH': REPO_ROOT + os.pathsep + env.get('PYTHONPATH', ''),
+        'PYTHONDONTWRITEBYTECODE': '1',
+        'LOG_FILE': os.path.join(scratch, 'startup.log'),
+        'PROMETHEUS_MULTIPROC_DIR': os.path.join(scratch, 'metrics'),
+        'UPLOAD_FOLDER': os.path.join(scratch, 'uploads'),
+        'WORKSPACE_FOLDER': os.path.join(scratch, 'workspace'),
+        'SUMMARY_CACHE_PATH': os.path.join(scratch, 'summaries.db')
+    })
+    os.makedirs(env['PROMETHEUS_MULTIPROC_DIR'], exist_ok=True)
+    return env
+
+
+def parse_importtime(stderr: str) -> List[Dict]:
+    """Rows of `-X importtime` output as {module, depth, self_us, cumulative_us}"""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        rows.append({
+            'module': name.strip(),
+            'depth': (len(name) - len(name.lstrip()) - 1) // 2,
+            'self_us': int(self_us),
+            'cumulative_us': int(cumulative_us)
+        })
+    return rows
+
+
+def measure(target: str, scratch: str, importtime: bool) -> Dict:
+    module, _, attribute = target.partition(':')
+    command = [sys.executable] + (['-X', 'importtime'] if importtime else []) + \
+        ['-c', PROBE.format(module=module, attribute=attribute or '__name__')]
+    start_time = time.perf_counter()
+    completed = subprocess.run(command, cwd=scratch, env=_environment(scratch), capture_output=True, text=True)
+    process_ms = (time.perf_counter() - start_time) * 1000
+    marker = [line for line in completed.stdout.splitlines() if line.startswith('STARTUP_MS')]
+    if completed.returncode != 0 or not marker:
+        raise RuntimeError(f"Importing {target} failed:\n{completed.stderr[-4000:]}")
+    return {
+        'import_ms': float(marker[-1].split()[1]),
+        'process_ms': process_ms,
+        'modules': parse_importtime(completed.stderr) if importtime else []
+    }
+
+
+def report(rows: List[Dict], top: int, max_depth: int):
+    print(f"\n{'cumulative':>11} {'self':>9}  module (import tree, depth <= {max_depth})")
+    # importtime lists children before their parent; reverse for a top-down tree
+    shown = 0
+    for row in reversed(rows):
+        if row['depth'] > max_depth or row['cumulative_us'] < 1000:
+            continue
+        print(f"{row['cumulative_us'] / 1000:>9.1f}ms {row['self_us'] / 1000:>7.1f}ms  "
+              f"{'  ' * row['depth']}{row['module']}")
+        shown += 1
+        if shown >= top:
+            break
+
+    print(f"\n{'self':>9}  slowest modules by own time")
+    for row in sorted(rows, key=lambda r: r['self_us'], reverse=True)[:10]:
+        print(f"{row['self_us'] / 1000:>7.1f}ms  {row['module']}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Measure cold-start import time of the app entry point")
+    parser.add_argument('--target', default='wsgi:application', help='module:attribute to import')
+    parser.add_argument('--runs', type=int, default=5, help='Timed runs (median is reported)')
+    parser.add_argument('--budget-ms', type=float, default=300.0,
+                        help='Fail when the median import time exceeds this (0 disables)')
+    parser.add_argument('--top', type=int, default=25, help='Rows of the import tree to print')
+    parser.add_argument('--depth', type=int, default=3, help='Deepest import tree level to print')
+    parser.add_argument('--output', help='Write the measurements as JSON')
+    args = parser.parse_args(argv)
+
+    scratch = tempfile.mkdtemp(prefix='manus-startup-')
+    try:
+        # One run under -X importtime for the breakdown; timed runs without its overhead
+        breakdown = measure(args.target, scratch, importtime=True)
+        runs = [measure(args.target, scratch, importtime=False) for _ in range(args.runs)]
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    import_ms = sorted(run['import_ms'] for run in runs)
+    process_ms = sorted(run['process_ms'] for run in runs)
+    median_import = import_ms[len(import_ms) // 2]
+    report(breakdown['modules'], args.top, args.depth)
+    print(f"\nimport {args.target}: median {median_import:.1f}ms, min {import_ms[0]:.1f}ms, "
+          f"max {import_ms[-1]:.1f}ms over {args.runs} runs")
+    print(f"process (interpreter start + import + exit): median {process_ms[len(process_ms) // 2]:.1f}ms")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'target': args.target, 'import_ms': import_ms, 'process_ms': process_ms,
+                       'budget_ms': args.budget_ms, 'modules': breakdown['modules']}, f, indent=2)
+
+    if args.budget_ms and median_import > args.budget_ms:
+        print(f"FAIL: cold start {median_import:.1f}ms exceeds the {args.budget_ms:.0f}ms budget")
+        return 1
+    if args.budget_ms:
+        print(f"OK: within the {args.budget_ms:.0f}ms budget")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
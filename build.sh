@@ -28,6 +28,10 @@ python -m pip install --upgrade pip
 echo "📚 Installing Python dependencies..."
 pip install -r requirements.txt
 
+# Minify, fingerprint and precompress static assets
+echo "🗜️ Building static assets..."
+python asset_pipeline.py
+
 # Create necessary directories
 echo "📁 Creating application directories..."
 mkdir -p /tmp/manus_uploads
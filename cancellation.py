@@ -0,0 +1,99 @@
+import time
+import asyncio
+import logging
+import threading
+from typing import Optional, Callable, List, Awaitable, Any
+
+logger = logging.getLogger(__name__)
+
+
+class AnalysisCancelled(Exception):
+    """Raised when an analysis is cancelled or runs past its deadline"""
+
+    def __init__(self, reason: str = 'cancelled'):
+        super().__init__(reason)
+        self.reason = reason
+
+
+class CancelToken:
+    """
+    Thread-safe cancellation and deadline shared by every stage of one analysis.
+
+    Stages call check() between steps. Awaitables run through run() are
+    cancelled as soon as cancel() is called from any thread or the deadline
+    passes, which aborts in-flight upstream HTTP requests and streams.
+    """
+
+    def __init__(self, deadline: Optional[float] = None):
+        self.deadline = deadline
+        self.reason: Optional[str] = None
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._callbacks: List[Callable[[str], None]] = []
+
+    @classmethod
+    def with_timeout(cls, timeout: Optional[float]) -> 'CancelToken':
+        return cls(time.time() + timeout if timeout else None)
+
+    @property
+    def cancelled(self) -> bool:
+        if not self._event.is_set() and self.deadline is not None and time.time() >= self.deadline:
+            self.cancel('deadline exceeded')
+        return self._event.is_set()
+
+    def remaining(self) -> Optional[float]:
+        """Seconds left before the deadline (None when there is no deadline)"""
+        if self.deadline is None:
+            return None
+        return max(0.0, self.deadline - time.time())
+
+    def cancel(self, reason: str = 'cancelled'):
+        """Cancel the analysis; callbacks run once, on the calling thread"""
+        with self._lock:
+            if self._event.is_set():
+                return
+            self.reason = reason
+            self._event.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            try:
+                callback(reason)
+            except Exception as e:
+                logger.warning("Cancel callback failed: %s", e)
+
+    def add_callback(self, callback: Callable[[str], None]) -> Callable[[], None]:
+        """Register callback(reason) for cancellation; returns a function that unregisters it"""
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+                return lambda: self._remove_callback(callback)
+        callback(self.reason)
+        return lambda: None
+
+    def _remove_callback(self, callback: Callable[[str], None]):
+        with self._lock:
+            if callback in self._callbacks:
+                self._callbacks.remove(callback)
+
+    def check(self):
+        """Raise AnalysisCancelled if cancelled or past the deadline"""
+        if self.cancelled:
+            raise AnalysisCancelled(self.reason)
+
+    async def run(self, awaitable: Awaitable[Any]) -> Any:
+        """Await awaitable, aborting it on cancel() or at the deadline"""
+        self.check()
+        loop = asyncio.get_running_loop()
+        task = asyncio.ensure_future(awaitable)
+        unregister = self.add_callback(lambda reason: loop.call_soon_threadsafe(task.cancel))
+        try:
+            return await asyncio.wait_for(task, timeout=self.remaining())
+        except asyncio.TimeoutError:
+            self.cancel('deadline exceeded')
+            raise AnalysisCancelled(self.reason)
+        except asyncio.CancelledError:
+            if self._event.is_set():
+                raise AnalysisCancelled(self.reason)
+            raise
+        finally:
+            unregister()
@@ -0,0 +1,287 @@
+"""
+Trigram index for substring and regex search over a session's files.
+
+Every text file is indexed by the distinct byte trigrams it contains (ASCII
+case-folded). A query is reduced to the trigrams any match must contain:
+all of a literal's, or for a regex those of the literal runs it cannot
+match without, as an OR of ANDs when it has alternations. Intersecting
+their posting lists leaves the few files worth opening; only those are
+read and matched to produce snippets. A regex with no usable literal
+(`\\w+\\d`) falls back to reading files in order until a page is full.
+
+Results are files in path order, a page at a time; `next_cursor` resumes
+after the last file examined, so a page costs the same wherever it starts.
+"""
+
+import re
+import time
+import logging
+import threading
+from array import array
+from bisect import bisect_left
+from collections import defaultdict
+from itertools import islice
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+try:
+    from re import _parser as sre_parse
+except ImportError:  # Python < 3.11
+    import sre_parse
+
+logger = logging.getLogger(__name__)
+
+# Past this many alternatives a regex is filtered on fewer literals
+MAX_ALTERNATIVES = 16
+
+_REPEATS = tuple(getattr(sre_parse, name) for name in ('MAX_REPEAT', 'MIN_REPEAT', 'POSSESSIVE_REPEAT')
+                 if hasattr(sre_parse, name))
+_ATOMIC_GROUP = getattr(sre_parse, 'ATOMIC_GROUP', None)
+
+
+class QueryError(ValueError):
+    """Raised for a query that cannot be run: an invalid regex or one matching the empty string"""
+
+
+def trigrams(data: bytes) -> Set[Tuple[int, int, int]]:
+    """Distinct trigrams of data, ASCII case-folded"""
+    data = data.lower()
+    return set(zip(data, data[1:], data[2:]))
+
+
+def _cross(left: List[List[str]], right: List[List[str]]) -> List[List[str]]:
+    combined = [a + b for a in left for b in right]
+    # Dropping the right-hand literals only weakens the filter
+    return combined if len(combined) <= MAX_ALTERNATIVES else left
+
+
+def _alternatives(items) -> List[List[str]]:
+    """
+    Literal strings a match of the parsed regex items must contain, as
+    alternatives: a match contains every string of at least one of them.
+    """
+    result: List[List[str]] = [[]]
+    run: List[str] = []
+
+    def flush():
+        nonlocal result
+        if run:
+            result = [alternative + [''.join(run)] for alternative in result]
+            run.clear()
+
+    for op, arg in items:
+        # Non-ASCII characters are left out: the index folds ASCII case only
+        if op is sre_parse.LITERAL and arg < 128:
+            run.append(chr(arg))
+            continue
+        flush()
+        if op is sre_parse.SUBPATTERN:
+            inner = _alternatives(arg[-1])
+        elif _ATOMIC_GROUP is not None and op is _ATOMIC_GROUP:
+            inner = _alternatives(arg)
+        elif op is sre_parse.BRANCH:
+            inner = [alternative for branch in arg[1] for alternative in _alternatives(branch)]
+            if len(inner) > MAX_ALTERNATIVES:
+                inner = [[]]
+        elif op in _REPEATS and arg[0] >= 1:
+            inner = _alternatives(arg[2])
+        else:
+            continue
+        result = _cross(result, inner)
+    flush()
+    return result
+
+
+def query_trigrams(pattern: str, regex: bool, flags: int = 0) -> Optional[List[Set[Tuple[int, int, int]]]]:
+    """
+    Trigram sets a matching file must contain one of; None when the query
+    has no literal of three characters to filter on.
+    """
+    if regex:
+        alternatives = _alternatives(sre_parse.parse(pattern, flags))
+    else:
+        alternatives = [[pattern]]
+    plan = []
+    for alternative in alternatives:
+        required = set()
+        for literal in alternative:
+            required |= trigrams(literal.encode('utf-8'))
+        if not required:
+            return None
+        plan.append(required)
+    return plan
+
+
+def _contains(postings: array, doc_id: int) -> bool:
+    position = bisect_left(postings, doc_id)
+    return position < len(postings) and postings[position] == doc_id
+
+
+class TrigramIndex:
+    """
+    Per-session trigram index. Documents are keyed by workspace-relative path
+    and carry a signature (size, mtime) like BM25Index's, so re-indexing only
+    reads changed files. Posting lists are arrays of ascending document ids.
+    """
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.postings: Dict[Tuple[int, int, int], array] = defaultdict(lambda: array('I'))
+        self.doc_ids: Dict[str, int] = {}
+        self.paths: Dict[int, str] = {}
+        self.signatures: Dict[str, Tuple] = {}
+        self.bytes_indexed = 0
+        self.next_id = 0
+
+    def __len__(self) -> int:
+        return len(self.doc_ids)
+
+    def is_current(self, path: str, signature: Tuple) -> bool:
+        return self.signatures.get(path) == signature
+
+    def add_document(self, path: str, data: bytes, signature: Optional[Tuple] = None) -> bool:
+        """Index (or re-index) a file's bytes; binary files (NUL in the first 8KB) are skipped"""
+        if b'\0' in data[:8192]:
+            self.remove_document(path)
+            return False
+        document_trigrams = trigrams(data)
+        with self.lock:
+            self.remove_document(path)
+            doc_id = self.next_id
+            self.next_id += 1
+            self.doc_ids[path] = doc_id
+            self.paths[doc_id] = path
+            self.signatures[path] = signature
+            self.bytes_indexed += len(data)
+            postings = self.postings
+            for trigram in document_trigrams:
+                postings[trigram].append(doc_id)
+        return True
+
+    def remove_document(self, path: str):
+        # Postings keep the old id; it is skipped at query time because it has no path
+        with self.lock:
+            doc_id = self.doc_ids.pop(path, None)
+            if doc_id is not None:
+                self.signatures.pop(path, None)
+                self.paths.pop(doc_id, None)
+
+    def retain(self, paths: Iterable[str]):
+        """Drop every document whose path is not in paths (files deleted from the workspace)"""
+        keep = set(paths)
+        with self.lock:
+            for path in [p for p in self.doc_ids if p not in keep]:
+                self.remove_document(path)
+
+    def candidates(self, plan: Optional[List[Set[Tuple[int, int, int]]]]) -> List[str]:
+        """Paths of the files that can match a query plan, in path order"""
+        with self.lock:
+            if plan is None:
+                return sorted(self.doc_ids)
+            found = set()
+            empty = array('I')
+            for required in plan:
+                lists = sorted((self.postings.get(trigram, empty) for trigram in required), key=len)
+                docs = set(lists[0])
+                for postings in lists[1:]:
+                    if not docs:
+                        break
+                    if len(docs) * 16 < len(postings):
+                        docs = {doc_id for doc_id in docs if _contains(postings, doc_id)}
+                    else:
+                        docs.intersection_update(postings)
+                found |= docs
+            return sorted(self.paths[doc_id] for doc_id in found if doc_id in self.paths)
+
+    def search(self, pattern: str, read: Callable[[str], bytes], regex: bool = False,
+               case_sensitive: bool = False, cursor: int = 0, limit: int = 20, max_matches: int = 5,
+               time_budget: float = 0.5, max_line: int = 300) -> Dict:
+        """
+        Files matching a literal or regex query, with snippets: up to limit
+        files from position cursor of the candidate list. read(path) returns a
+        file's bytes. Stops early, with truncated set, once time_budget
+        seconds have been spent matching.
+        """
+        start_time = time.perf_counter()
+        flags = re.MULTILINE | (0 if case_sensitive else re.IGNORECASE)
+        try:
+            compiled = re.compile(pattern if regex else re.escape(pattern), flags)
+            plan = query_trigrams(pattern, regex, flags)
+        except re.error as e:
+            raise QueryError(f"Invalid regular expression: {e}")
+        if compiled.fullmatch(''):
+            raise QueryError("The query matches the empty string")
+
+        candidates = self.candidates(plan)
+        results = []
+        position = cursor
+        truncated = False
+        while position < len(candidates) and len(results) < limit:
+            if time.perf_counter() - start_time > time_budget:
+                truncated = True
+                break
+            path = candidates[position]
+            position += 1
+            try:
+                text = read(path).decode('utf-8', 'replace')
+            except OSError as e:
+                logger.warning("Search skipped %s: %s", path, e)
+                continue
+            found = list(islice(compiled.finditer(text), max_matches + 1))
+            if found:
+                results.append({
+                    'path': path,
+                    'matches': self._snippets(text, found[:max_matches], max_line),
+                    'more_matches': len(found) > max_matches
+                })
+
+        return {
+            'results': results,
+            'next_cursor': position if position < len(candidates) else None,
+            'candidates': len(candidates),
+            'scanned': position - cursor,
+            'truncated': truncated,
+            'filtered': plan is not None,
+            'elapsed_ms': round((time.perf_counter() - start_time) * 1000, 2)
+        }
+
+    @staticmethod
+    def _snippets(text: str, found: List[re.Match], max_line: int) -> List[Dict]:
+        """
+        Matches grouped by line: 1-based line number, the line's text (a
+        window starting at column offset if the line is long) and the match
+        ranges within that text.
+        """
+        snippets = []
+        line_number, counted_to = 1, 0
+        for match in found:
+            line_number += text.count('\n', counted_to, match.start())
+            counted_to = match.start()
+            line_start = text.rfind('\n', 0, match.start()) + 1
+            line_end = text.find('\n', match.start())
+            if line_end == -1:
+                line_end = len(text)
+            column = match.start() - line_start
+            if snippets and snippets[-1]['line'] == line_number:
+                snippet = snippets[-1]
+            else:
+                offset = 0
+                if line_end - line_start > max_line:
+                    offset = max(0, column - max_line // 3)
+                window_end = min(line_end, line_start + offset + max_line)
+                snippet = {'line': line_number, 'text': text[line_start + offset:window_end],
+                           'ranges': [], 'offset': offset}
+                snippets.append(snippet)
+            begin = column - snippet['offset']
+            end = min(match.end(), line_end) - line_start - snippet['offset']
+            if 0 <= begin < len(snippet['text']):
+                snippet['ranges'].append([begin, min(end, len(snippet['text']))])
+        return snippets
+
+    def stats(self) -> Dict:
+        with self.lock:
+            return {
+                'documents': len(self.doc_ids),
+                'trigrams': len(self.postings),
+                'postings': sum(len(p) for p in self.postings.values()),
+                'bytes_indexed': self.bytes_indexed
+            }
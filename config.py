@@ -13,23 +13,137 @@ class Config:
     MAX_CONTENT_LENGTH = int(os.getenv('MAX_UPLOAD_SIZE', 500 * 1024 * 1024))  # 500MB default
     UPLOAD_FOLDER = os.getenv('UPLOAD_FOLDER', '/tmp/manus_uploads')
     WORKSPACE_FOLDER = os.getenv('WORKSPACE_FOLDER', '/tmp/manus_workspace')
+    # Where workspaces are stored: local (WORKSPACE_FOLDER only), shared (a mount all nodes see) or s3;
+    # with shared or s3, WORKSPACE_FOLDER is each node's read-through cache
+    WORKSPACE_STORAGE = os.getenv('WORKSPACE_STORAGE', 'local')
+    WORKSPACE_SHARED_ROOT = os.getenv('WORKSPACE_SHARED_ROOT', '')
+    WORKSPACE_S3_BUCKET = os.getenv('WORKSPACE_S3_BUCKET', '')
+    WORKSPACE_S3_PREFIX = os.getenv('WORKSPACE_S3_PREFIX', 'workspaces/')
+    WORKSPACE_S3_ENDPOINT = os.getenv('WORKSPACE_S3_ENDPOINT', '')  # e.g. http://127.0.0.1:9000 for MinIO
+    WORKSPACE_STORAGE_THREADS = int(os.getenv('WORKSPACE_STORAGE_THREADS', 8))  # parallel object transfers
     
     # OpenAI configuration
     OPENAI_API_KEY = os.getenv('OPENAI_API_KEY', '')
     OPENAI_MODEL = os.getenv('OPENAI_MODEL', 'gpt-4')
     OPENAI_MAX_TOKENS = int(os.getenv('OPENAI_MAX_TOKENS', 2000))
     OPENAI_TEMPERATURE = float(os.getenv('OPENAI_TEMPERATURE', 0.7))
+    # Point at an OpenAI-compatible endpoint such as openai_stub.py (e.g. http://127.0.0.1:8001/v1)
+    OPENAI_API_BASE = os.getenv('OPENAI_API_BASE', '')
+    # Model routing: small/large models by context size (characters), per task type, fallbacks on errors
+    OPENAI_SMALL_MODEL = os.getenv('OPENAI_SMALL_MODEL', '')
+    OPENAI_LARGE_MODEL = os.getenv('OPENAI_LARGE_MODEL', '')
+    OPENAI_TASK_MODELS = os.getenv('OPENAI_TASK_MODELS', '')  # e.g. security_review=gpt-4,bug_fix=gpt-4
+    OPENAI_FALLBACK_MODELS = os.getenv('OPENAI_FALLBACK_MODELS', '')  # comma separated
+    ROUTING_SMALL_CONTEXT = int(os.getenv('ROUTING_SMALL_CONTEXT', 4000))
+    ROUTING_LARGE_CONTEXT = int(os.getenv('ROUTING_LARGE_CONTEXT', 16000))
+    # Hedging: send a second request when no first token arrived by the model's p95
+    HEDGE_ENABLED = os.getenv('HEDGE_ENABLED', 'false').lower() == 'true'
+    HEDGE_MIN_SAMPLES = int(os.getenv('HEDGE_MIN_SAMPLES', 20))  # observations before p95 is trusted
+    HEDGE_DEFAULT_DELAY = float(os.getenv('HEDGE_DEFAULT_DELAY', 2.0))  # seconds, until then
+    HEDGE_MIN_DELAY = float(os.getenv('HEDGE_MIN_DELAY', 0.05))
+    HEDGE_MAX_DELAY = float(os.getenv('HEDGE_MAX_DELAY', 10.0))
     
+    # Retrieval configuration (BM25 index over workspace files)
+    RETRIEVAL_TOP_K = int(os.getenv('RETRIEVAL_TOP_K', 10))
+    
+    # Code search (trigram index over text files, /api/sessions/<id>/search)
+    CODE_SEARCH_MAX_FILE_BYTES = int(os.getenv('CODE_SEARCH_MAX_FILE_BYTES', 1024 * 1024))  # larger files are not indexed
+    CODE_SEARCH_PAGE_SIZE = int(os.getenv('CODE_SEARCH_PAGE_SIZE', 20))  # files per page by default
+    CODE_SEARCH_MAX_PAGE_SIZE = int(os.getenv('CODE_SEARCH_MAX_PAGE_SIZE', 100))
+    CODE_SEARCH_MATCHES_PER_FILE = int(os.getenv('CODE_SEARCH_MATCHES_PER_FILE', 5))
+    CODE_SEARCH_MAX_QUERY = int(os.getenv('CODE_SEARCH_MAX_QUERY', 256))  # characters
+    CODE_SEARCH_TIME_BUDGET = float(os.getenv('CODE_SEARCH_TIME_BUDGET', 0.5))  # seconds of matching per page
+    
+    # Symbol index (definitions, imports and call sites, /api/sessions/<id>/symbols)
+    SYMBOL_WORKERS = int(os.getenv('SYMBOL_WORKERS', min(4, os.cpu_count() or 1)))  # extraction processes per worker
+    SYMBOL_PARALLEL_MIN_BYTES = int(os.getenv('SYMBOL_PARALLEL_MIN_BYTES', 2 * 1024 * 1024))  # smaller batches run inline
+    SYMBOL_MAX_FILE_BYTES = int(os.getenv('SYMBOL_MAX_FILE_BYTES', 1024 * 1024))  # larger files are not parsed
+    CONTEXT_SYMBOL_CHARS = int(os.getenv('CONTEXT_SYMBOL_CHARS', 8000))  # prompt budget for outlines and call sites
+    
+    # Context building configuration
+    CONTEXT_MAX_CHARS = int(os.getenv('CONTEXT_MAX_CHARS', 24000))  # ~6k tokens
+    SUMMARY_CACHE_PATH = os.getenv('SUMMARY_CACHE_PATH', '/tmp/manus_cache/summaries.db')
+    SUMMARY_CACHE_MAX_AGE = float(os.getenv('SUMMARY_CACHE_MAX_AGE', 7 * 86400))  # seconds a cached summary is kept
+    SUMMARY_CACHE_MAX_ENTRIES = int(os.getenv('SUMMARY_CACHE_MAX_ENTRIES', 200000))  # about 60MB on disk
+    
+    # Analysis scheduling configuration
+    ANALYSIS_WORKERS = int(os.getenv('ANALYSIS_WORKERS', 4))  # concurrent analyses per worker process
+    ANALYSIS_MAX_QUEUE = int(os.getenv('ANALYSIS_MAX_QUEUE', 64))
+    ANALYSIS_PER_SESSION_LIMIT = int(os.getenv('ANALYSIS_PER_SESSION_LIMIT', 1))
+    ANALYSIS_OVERFLOW_POLICY = os.getenv('ANALYSIS_OVERFLOW_POLICY', 'reject')  # reject | shed
+    ANALYSIS_DEADLINE = float(os.getenv('ANALYSIS_DEADLINE', 300))  # seconds from submit, queue wait included
+    # 'inprocess' runs analyses in the web worker; 'sqlite' hands them to analysis_worker.py processes
+    ANALYSIS_BACKEND = os.getenv('ANALYSIS_BACKEND', 'inprocess')
+    QUEUE_DB_PATH = os.getenv('QUEUE_DB_PATH', '/tmp/manus_cache/analysis_queue.db')
+    QUEUE_LEASE_SECONDS = int(os.getenv('QUEUE_LEASE_SECONDS', 30))
+    QUEUE_HEARTBEAT_INTERVAL = float(os.getenv('QUEUE_HEARTBEAT_INTERVAL', 1.0))
+    QUEUE_MAX_ATTEMPTS = int(os.getenv('QUEUE_MAX_ATTEMPTS', 3))
+    QUEUE_RETENTION = int(os.getenv('QUEUE_RETENTION', 86400))  # keep finished jobs for a day
+    
+    # Admission control: excess uploads get 429/503 with Retry-After instead of exhausting disk or memory
+    MAX_CONCURRENT_UPLOADS = int(os.getenv('MAX_CONCURRENT_UPLOADS', 4))  # per worker process
+    UPLOAD_QUEUE_SIZE = int(os.getenv('UPLOAD_QUEUE_SIZE', 4))  # uploads per worker waiting for a slot before 429s
+    UPLOAD_QUEUE_TIMEOUT = float(os.getenv('UPLOAD_QUEUE_TIMEOUT', 5))  # seconds an upload waits for a slot
+    HOST_MAX_CONCURRENT_UPLOADS = int(os.getenv('HOST_MAX_CONCURRENT_UPLOADS', 8))  # across all processes on the host
+    MAX_EXTRACTION_BYTES = int(os.getenv('MAX_EXTRACTION_BYTES', 2 * 1024 * 1024 * 1024))  # uncompressed, host-wide
+    EXTRACTION_ADMIT_TIMEOUT = float(os.getenv('EXTRACTION_ADMIT_TIMEOUT', 10))  # seconds to wait for extraction budget
+    ADMISSION_STATE_PATH = os.getenv('ADMISSION_STATE_PATH', '/tmp/manus_cache/admission.json')  # host-wide ledger
+    
+    # Workspace disk budget: idle workspaces are evicted LRU-first above the high watermark
+    WORKSPACE_MAX_BYTES = int(os.getenv('WORKSPACE_MAX_BYTES', 10 * 1024 * 1024 * 1024))  # all workspaces on the host
+    WORKSPACE_HIGH_WATERMARK = float(os.getenv('WORKSPACE_HIGH_WATERMARK', 0.9))  # fraction of the budget that starts eviction
+    WORKSPACE_LOW_WATERMARK = float(os.getenv('WORKSPACE_LOW_WATERMARK', 0.75))  # fraction eviction brings usage back to
+    WORKSPACE_IDLE_SECONDS = int(os.getenv('WORKSPACE_IDLE_SECONDS', 300))  # unused this long before a workspace may go
+    MIN_FREE_DISK_BYTES = int(os.getenv('MIN_FREE_DISK_BYTES', 512 * 1024 * 1024))  # free space workspaces must leave
+    WORKSPACE_STATE_PATH = os.getenv('WORKSPACE_STATE_PATH', '/tmp/manus_cache/workspaces.json')  # host-wide account
+
     # Session configuration
     SESSION_TIMEOUT = int(os.getenv('SESSION_TIMEOUT', 3600))  # 1 hour
     CLEANUP_INTERVAL = int(os.getenv('CLEANUP_INTERVAL', 1800))  # 30 minutes
     
+    # Streaming configuration (Server-Sent Events)
+    STREAM_HEARTBEAT_INTERVAL = float(os.getenv('STREAM_HEARTBEAT_INTERVAL', 15))  # seconds
+    STREAM_BUFFER_EVENTS = int(os.getenv('STREAM_BUFFER_EVENTS', 2048))  # retained deltas per run
+    STREAM_RETRY_MS = int(os.getenv('STREAM_RETRY_MS', 3000))  # client reconnect delay
+    STREAM_MAX_DURATION = float(os.getenv('STREAM_MAX_DURATION', 300))  # seconds per SSE connection
+    STATUS_LONGPOLL_TIMEOUT = float(os.getenv('STATUS_LONGPOLL_TIMEOUT', 25))  # max seconds a status request waits under asgi.py
+    # The same for wsgi:application, where a waiting request holds a whole worker (raise it for gevent/gthread workers)
+    STATUS_LONGPOLL_SYNC_TIMEOUT = float(os.getenv('STATUS_LONGPOLL_SYNC_TIMEOUT', 0))
+    STATUS_POLL_INTERVAL = float(os.getenv('STATUS_POLL_INTERVAL', 2.0))  # seconds clients pause between status requests there
+    STATUS_PROGRESS_INTERVAL = float(os.getenv('STATUS_PROGRESS_INTERVAL', 10.0))  # min seconds between progress wakeups
+    STATUS_REFRESH_INTERVAL = float(os.getenv('STATUS_REFRESH_INTERVAL', 1.0))  # seconds between status re-reads by waiters on runs in other processes
+    SHUTDOWN_DRAIN_TIMEOUT = float(os.getenv('SHUTDOWN_DRAIN_TIMEOUT', 25))  # seconds for in-flight analyses on worker exit
+    ASGI_WSGI_THREADS = int(os.getenv('ASGI_WSGI_THREADS', 32))  # threads for Flask routes under asgi.py
+    
+    # Response encoding: orjson/zstandard are used when installed
+    COMPRESS_MIN_BYTES = int(os.getenv('COMPRESS_MIN_BYTES', 1024))  # smaller bodies are sent as-is
+    GZIP_LEVEL = int(os.getenv('GZIP_LEVEL', 4))  # per-request cost: level 6 takes ~3x as long for ~12% fewer bytes
+    ZSTD_LEVEL = int(os.getenv('ZSTD_LEVEL', 3))
+    JSON_STREAM_MIN_ITEMS = int(os.getenv('JSON_STREAM_MIN_ITEMS', 2000))  # stream payloads with containers this large
+    JSON_STREAM_CHUNK_ITEMS = int(os.getenv('JSON_STREAM_CHUNK_ITEMS', 500))  # entries encoded per chunk
+
+    # Metrics: preforked workers share samples through files in this directory
+    METRICS_DIR = os.getenv('PROMETHEUS_MULTIPROC_DIR', '/tmp/manus_metrics')
+    
+    # Tracing: per-request phase spans, logged when slow and sent in a Server-Timing header
+    TRACE_SLOW_MS = float(os.getenv('TRACE_SLOW_MS', 500))  # log traces at least this slow; 0 logs all
+    TRACE_SERVER_TIMING = os.getenv('TRACE_SERVER_TIMING', 'true').lower() == 'true'
+    # OTLP/HTTP collector, e.g. http://127.0.0.1:4318; empty disables export
+    OTEL_EXPORTER_ENDPOINT = os.getenv('OTEL_EXPORTER_OTLP_ENDPOINT', '')
+    OTEL_SERVICE_NAME = os.getenv('OTEL_SERVICE_NAME', 'manus-platform')
+    
     # Security configuration
     SECRET_KEY = os.getenv('SECRET_KEY', 'dev-key-change-in-production')
+    # Enables /api/admin/* endpoints (sent as X-Admin-Token); empty disables them
+    ADMIN_TOKEN = os.getenv('ADMIN_TOKEN', '')
+    PROFILE_MAX_SECONDS = float(os.getenv('PROFILE_MAX_SECONDS', 60))
     
     # Logging configuration
     LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
     LOG_FILE = os.getenv('LOG_FILE', 'manus_platform.log')
+    LOG_MAX_BYTES = int(os.getenv('LOG_MAX_BYTES', 50 * 1024 * 1024))  # rotate the log file at this size
+    LOG_BACKUP_COUNT = int(os.getenv('LOG_BACKUP_COUNT', 5))
+    LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', 10000))  # records buffered per process before dropping
     
     # Supported file extensions
     ALLOWED_EXTENSIONS = {
@@ -72,30 +186,8 @@ class Config:
     
     @classmethod
     def setup_logging(cls):
-        """Setup structured logging"""
+        """Setup structured logging (JSON lines through log_pipeline, one writer per host)"""
+        import log_pipeline
         log_level = getattr(logging, cls.LOG_LEVEL.upper(), logging.INFO)
-        
-        # Create formatter
-        formatter = logging.Formatter(
-            '%(asctime)s - %(name)s - %(levelname)s - %(funcName)s:%(lineno)d - %(message)s'
-        )
-        
-        # Setup file handler
-        file_handler = logging.FileHandler(cls.LOG_FILE)
-        file_handler.setLevel(log_level)
-        file_handler.setFormatter(formatter)
-        
-        # Setup console handler
-        console_handler = logging.StreamHandler()
-        console_handler.setLevel(log_level)
-        console_handler.setFormatter(formatter)
-        
-        # Configure root logger
-        root_logger = logging.getLogger()
-        root_logger.setLevel(log_level)
-        root_logger.handlers.clear()
-        root_logger.addHandler(file_handler)
-        root_logger.addHandler(console_handler)
-        
-        return root_logger
-
+        return log_pipeline.configure(log_level, cls.LOG_FILE, cls.LOG_MAX_BYTES, cls.LOG_BACKUP_COUNT,
+                                      cls.LOG_QUEUE_SIZE)
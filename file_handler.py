@@ -1,6 +1,4 @@
 import os
-import zipfile
-import tarfile
 import shutil
 import tempfile
 import logging
@@ -8,6 +6,9 @@ from pathlib import Path
 from typing import List, Dict, Optional, Tuple
 from werkzeug.utils import secure_filename
 from config import Config
+from search_index import BM25Index
+from code_search import TrigramIndex
+from symbol_index import SymbolTable, language_of
 
 logger = logging.getLogger(__name__)
 
@@ -107,11 +108,13 @@ class FileHandler:
                 return False, f"Unsupported archive format: {extension}", []
                 
         except Exception as e:
-            logger.error(f"Error extracting archive {archive_path}: {str(e)}")
+            logger.error("Error extracting archive %s: %s", archive_path, e)
             return False, f"Extraction failed: {str(e)}", []
     
     def _extract_zip(self, zip_path: str, extract_to: str) -> Tuple[bool, str, List[str]]:
         """Extract ZIP file with security checks"""
+        # Archive modules load their codecs (zlib, bz2, lzma) on import; only pay for them when extracting
+        import zipfile
         try:
             extracted_files = []
             total_size = 0
@@ -139,19 +142,20 @@ class FileHandler:
                             zip_ref.extract(file_info, extract_to)
                             extracted_files.append(file_info.filename)
                         except Exception as e:
-                            logger.warning(f"Failed to extract {file_info.filename}: {str(e)}")
+                            logger.warning("Failed to extract %s: %s", file_info.filename, e)
             
-            logger.info(f"Successfully extracted {len(extracted_files)} files from ZIP")
+            logger.info("Successfully extracted %s files from ZIP", len(extracted_files))
             return True, "", extracted_files
             
         except zipfile.BadZipFile:
             return False, "Invalid or corrupted ZIP file", []
         except Exception as e:
-            logger.error(f"ZIP extraction error: {str(e)}")
+            logger.error("ZIP extraction error: %s", e)
             return False, f"ZIP extraction failed: {str(e)}", []
     
     def _extract_tar(self, tar_path: str, extract_to: str) -> Tuple[bool, str, List[str]]:
         """Extract TAR file with security checks"""
+        import tarfile
         try:
             extracted_files = []
             
@@ -189,17 +193,42 @@ class FileHandler:
                             tar_ref.extract(member, extract_to)
                             extracted_files.append(member.name)
                         except Exception as e:
-                            logger.warning(f"Failed to extract {member.name}: {str(e)}")
+                            logger.warning("Failed to extract %s: %s", member.name, e)
             
-            logger.info(f"Successfully extracted {len(extracted_files)} files from TAR")
+            logger.info("Successfully extracted %s files from TAR", len(extracted_files))
             return True, "", extracted_files
             
         except tarfile.TarError as e:
             return False, f"Invalid or corrupted TAR file: {str(e)}", []
         except Exception as e:
-            logger.error(f"TAR extraction error: {str(e)}")
+            logger.error("TAR extraction error: %s", e)
             return False, f"TAR extraction failed: {str(e)}", []
-    
+
+    def estimate_extracted_size(self, archive_path: str) -> int:
+        """
+        Bytes an archive will take once extracted, read from its index where
+        that is cheap: exact for ZIP, the size trailer for gzip, and a
+        guess for bzip2/xz. Capped at the 1GB extraction limit.
+        """
+        limit = 1024 * 1024 * 1024
+        size = os.path.getsize(archive_path)
+        name = archive_path.lower()
+        try:
+            if name.endswith('.zip'):
+                import zipfile
+                with zipfile.ZipFile(archive_path) as zip_ref:
+                    size = sum(info.file_size for info in zip_ref.filelist)
+            elif name.endswith(('.gz', '.tgz')) and size >= 4:
+                # ISIZE: uncompressed length modulo 2^32 in the last four bytes
+                with open(archive_path, 'rb') as f:
+                    f.seek(-4, os.SEEK_END)
+                    size = max(size, int.from_bytes(f.read(4), 'little'))
+            elif name.endswith(('.bz2', '.xz', '.tbz2')):
+                size *= 8
+        except Exception as e:
+            logger.warning("Could not read the size of %s: %s", archive_path, e)
+        return min(size, limit)
+
     def read_file_content(self, file_path: str, max_size: int = 1024*1024) -> str:
         """Read file content safely with size limits"""
         try:
@@ -227,7 +256,7 @@ class FileHandler:
             return f"[Binary file: {self.format_file_size(file_size)}]"
             
         except Exception as e:
-            logger.error(f"Error reading file {file_path}: {str(e)}")
+            logger.error("Error reading file %s: %s", file_path, e)
             return f"[Error reading file: {str(e)}]"
     
     def _is_text_content(self, content: str) -> bool:
@@ -258,8 +287,17 @@ class FileHandler:
         
         return f"{size_bytes:.1f} {size_names[i]}"
     
-    def analyze_project_structure(self, workspace_path: str) -> Dict:
-        """Analyze project structure with enhanced metadata"""
+    def analyze_project_structure(self, workspace_path: str, index: Optional[BM25Index] = None,
+                                  code_index: Optional[TrigramIndex] = None,
+                                  symbols: Optional[SymbolTable] = None) -> Dict:
+        """
+        Analyze project structure with enhanced metadata.
+        When an index is given, every file is (re-)indexed into it; files whose
+        size and mtime are unchanged since the last run are skipped. A
+        code_index gets every text file up to CODE_SEARCH_MAX_FILE_BYTES, and
+        symbols the code files up to SYMBOL_MAX_FILE_BYTES, parsed as one batch
+        once the walk is done.
+        """
         structure = {
             "files": [],
             "directories": [],
@@ -274,6 +312,11 @@ class FileHandler:
             "media_files": []
         }
         
+        indexed_paths = []
+        code_indexed_paths = []
+        symbol_paths = []
+        pending_symbols = {}
+        
         try:
             for root, dirs, files in os.walk(workspace_path):
                 rel_root = os.path.relpath(root, workspace_path)
@@ -285,7 +328,8 @@ class FileHandler:
                     rel_path = os.path.relpath(file_path, workspace_path)
                     
                     try:
-                        file_size = os.path.getsize(file_path)
+                        file_stat = os.stat(file_path)
+                        file_size = file_stat.st_size
                         file_type = self.get_file_type(file)
                         extension = Path(file).suffix.lower()
                         
@@ -315,18 +359,55 @@ class FileHandler:
                             structure["media_files"].append(file_info)
                         
                         # Read content for small text files
+                        content = None
                         if (file_type in ['code', 'data', 'documentation'] and 
                             file_size < 100*1024):  # 100KB limit
                             content = self.read_file_content(file_path, 100*1024)
                             if not content.startswith('['):  # Not an error message
                                 structure["content"][rel_path] = content
+                            else:
+                                content = None
+                        
+                        if index is not None:
+                            signature = (file_size, file_stat.st_mtime_ns)
+                            if not index.is_current(rel_path, signature):
+                                index.add_document(rel_path, content or "", signature)
+                            indexed_paths.append(rel_path)
+                        
+                        # Scripts, Makefiles and the like are text too; add_document skips binaries
+                        if (code_index is not None and file_type not in ['audio', 'video', 'image', 'archive'] and
+                                file_size <= self.config.CODE_SEARCH_MAX_FILE_BYTES):
+                            signature = (file_size, file_stat.st_mtime_ns)
+                            if not code_index.is_current(rel_path, signature):
+                                with open(file_path, 'rb') as f:
+                                    code_index.add_document(rel_path, f.read(), signature)
+                            code_indexed_paths.append(rel_path)
+                        
+                        if (symbols is not None and file_type == 'code' and language_of(file) is not None and
+                                file_size <= self.config.SYMBOL_MAX_FILE_BYTES):
+                            signature = (file_size, file_stat.st_mtime_ns)
+                            if not symbols.is_current(rel_path, signature):
+                                pending_symbols[rel_path] = (file_size, signature)
+                            symbol_paths.append(rel_path)
                         
                     except Exception as e:
-                        logger.warning(f"Error analyzing file {rel_path}: {str(e)}")
+                        logger.warning("Error analyzing file %s: %s", rel_path, e)
                         continue
         
         except Exception as e:
-            logger.error(f"Error analyzing project structure: {str(e)}")
+            logger.error("Error analyzing project structure: %s", e)
+        
+        if index is not None:
+            index.retain(indexed_paths)
+            index.optimize()
+        if code_index is not None:
+            code_index.retain(code_indexed_paths)
+        if symbols is not None:
+            try:
+                symbols.update(workspace_path, pending_symbols)
+            except Exception as e:
+                logger.error("Error extracting symbols: %s", e)
+            symbols.retain(symbol_paths)
         
         return structure
     
@@ -336,10 +417,10 @@ class FileHandler:
             session_workspace = os.path.join(self.config.WORKSPACE_FOLDER, session_id)
             if os.path.exists(session_workspace):
                 shutil.rmtree(session_workspace)
-                logger.info(f"Cleaned up session: {session_id}")
+                logger.info("Cleaned up session: %s", session_id)
                 return True
             return False
         except Exception as e:
-            logger.error(f"Error cleaning up session {session_id}: {str(e)}")
+            logger.error("Error cleaning up session %s: %s", session_id, e)
             return False
 
@@ -5,6 +5,7 @@ Optimized for production deployment
 """
 
 import os
+import glob
 import multiprocessing
 
 # Server socket
@@ -13,7 +14,8 @@ backlog = 2048
 
 # Worker processes
 workers = int(os.getenv('WORKERS', multiprocessing.cpu_count() * 2 + 1))
-worker_class = "sync"
+# "sync" for wsgi:application; "uvicorn.workers.UvicornWorker" for asgi:application
+worker_class = os.getenv('WORKER_CLASS', 'sync')
 worker_connections = 1000
 timeout = 120
 keepalive = 2
@@ -51,6 +53,16 @@ limit_request_line = 4094
 limit_request_fields = 100
 limit_request_field_size = 8190
 
+def on_starting(server):
+    """Called just before the master process is initialized."""
+    # Empty the shared metrics store (see metrics.py) so a previous run's samples are not summed in
+    for path in glob.glob(os.path.join(os.getenv('PROMETHEUS_MULTIPROC_DIR', '/tmp/manus_metrics'), '*.db')):
+        os.remove(path)
+    # Likewise the admission ledger (see admission.py); its owners are gone
+    from config import Config
+    if os.path.exists(Config.ADMISSION_STATE_PATH):
+        os.remove(Config.ADMISSION_STATE_PATH)
+
 def when_ready(server):
     """Called just after the server is started."""
     server.log.info("Manus AI Platform server is ready. Listening on: %s", server.address)
@@ -66,11 +78,26 @@ def pre_fork(server, worker):
 def post_fork(server, worker):
     """Called just after a worker has been forked."""
     server.log.info("Worker spawned (pid: %s)", worker.pid)
+    # Threads and pools do not survive fork: give this worker its own
+    from app import start_worker_services
+    start_worker_services()
+
+def worker_exit(server, worker):
+    """Called just after a worker has exited, in the worker process."""
+    # Let in-flight analyses finish before the master's graceful timeout runs out
+    from config import Config
+    from app import stop_worker_services
+    stop_worker_services(max(0.0, min(Config.SHUTDOWN_DRAIN_TIMEOUT, server.cfg.graceful_timeout - 2)))
 
 def post_worker_init(worker):
     """Called just after a worker has initialized the application."""
     worker.log.info("Worker initialized (pid: %s)", worker.pid)
 
+def child_exit(server, worker):
+    """Called just after a worker has exited, in the master process."""
+    from metrics import mark_process_dead
+    mark_process_dead(worker.pid)
+
 def worker_abort(worker):
     """Called when a worker received the SIGABRT signal."""
     worker.log.info("Worker received SIGABRT signal")
@@ -0,0 +1,38 @@
+import os
+import json
+import fcntl
+from contextlib import contextmanager
+
+
+def pid_alive(pid: int) -> bool:
+    """Whether a process with this pid still exists on the host"""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+@contextmanager
+def locked_json(path: str):
+    """
+    A JSON object shared by the processes of one host: yields it under an
+    exclusive flock on path and writes it back when the block exits normally.
+    """
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'a+') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            f.seek(0)
+            try:
+                state = json.loads(f.read() or '{}')
+            except ValueError:
+                state = {}
+            yield state
+            f.seek(0)
+            f.truncate()
+            f.write(json.dumps(state))
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
@@ -0,0 +1,364 @@
+import time
+import uuid
+import asyncio
+import logging
+import threading
+from collections import deque, OrderedDict
+from typing import Dict, List, Optional, Callable, Any, Awaitable
+from config import Config
+from cancellation import CancelToken, AnalysisCancelled
+
+logger = logging.getLogger(__name__)
+
+PRIORITIES = ('high', 'normal', 'low')
+
+
+class SchedulerFull(Exception):
+    """Raised when a job cannot be queued under the configured overflow policy"""
+
+    def __init__(self, message: str, retry_after: int = 5):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class Job:
+    """A unit of analysis work scheduled for one session"""
+
+    def __init__(self, session_id: str, fn: Callable[[], Any], priority: str = 'normal',
+                 on_discard: Optional[Callable[['Job', str], None]] = None,
+                 cancel_token: Optional[CancelToken] = None):
+        self.id = uuid.uuid4().hex
+        self.session_id = session_id
+        self.fn = fn
+        self.priority = priority
+        self.on_discard = on_discard
+        self.cancel_token = cancel_token or CancelToken()
+        self.status = 'queued'
+        self.submitted_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+
+    @property
+    def wait_time(self) -> Optional[float]:
+        return self.started_at - self.submitted_at if self.started_at else None
+
+
+class JobScheduler:
+    """
+    Bounded, fair in-process scheduler for analysis jobs.
+
+    A fixed pool of worker threads, each with one long-lived event loop,
+    replaces the thread-and-loop-per-request model. Jobs are queued per
+    session and sessions are served round-robin within each priority level,
+    so one busy session cannot starve the others. A per-session cap limits
+    concurrent jobs for the same session and the queue is bounded: when full,
+    the 'reject' policy refuses new jobs while 'shed' evicts the oldest job of
+    a lower priority first.
+
+    Under an ASGI server, bind_loop() makes every worker run its coroutines on
+    the server's event loop instead, so each process has a single loop.
+
+    Worker threads are per process: start() creates them after a fork and
+    drain() lets in-flight jobs finish before the process exits. loop_cleanup
+    is awaited on each worker's own loop before that loop is closed.
+    """
+
+    def __init__(self, max_workers: int = None, max_queue: int = None,
+                 per_session_limit: int = None, overflow_policy: str = None,
+                 loop_cleanup: Optional[Callable[[], Awaitable]] = None):
+        self.max_workers = max_workers or Config.ANALYSIS_WORKERS
+        self.max_queue = max_queue if max_queue is not None else Config.ANALYSIS_MAX_QUEUE
+        self.per_session_limit = per_session_limit or Config.ANALYSIS_PER_SESSION_LIMIT
+        self.overflow_policy = overflow_policy or Config.ANALYSIS_OVERFLOW_POLICY
+        self.condition = threading.Condition()
+        # priority -> session_id -> deque of jobs (OrderedDict gives round-robin order)
+        self.queues: Dict[str, 'OrderedDict[str, deque]'] = {p: OrderedDict() for p in PRIORITIES}
+        self.queued = 0
+        self.running: Dict[str, int] = {}
+        self.running_jobs: Dict[str, Job] = {}
+        self.workers: List[threading.Thread] = []
+        self.counters = {'submitted': 0, 'completed': 0, 'failed': 0,
+                         'rejected': 0, 'shed': 0, 'superseded': 0, 'cancelled': 0}
+        self.recent_waits = deque(maxlen=256)
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.loop_cleanup = loop_cleanup
+        self.draining = False
+
+    def bind_loop(self, loop: Optional[asyncio.AbstractEventLoop]):
+        """Run job coroutines on loop (e.g. the ASGI server's) instead of per-worker loops"""
+        self.loop = loop
+
+    def submit(self, session_id: str, fn: Callable[[], Any], priority: str = 'normal',
+               on_discard: Optional[Callable[[Job, str], None]] = None,
+               cancel_token: Optional[CancelToken] = None) -> Job:
+        """
+        Queue fn for session_id. fn runs on a worker thread; if it returns a
+        coroutine, the coroutine runs on that worker's event loop. A job still
+        queued for the same session is superseded by the new one.
+        on_discard(job, reason) is called when a queued job never runs,
+        including when its cancel_token is cancelled or expires while queued.
+        """
+        if priority not in PRIORITIES:
+            priority = 'normal'
+        job = Job(session_id, fn, priority, on_discard, cancel_token)
+        discarded = []
+
+        with self.condition:
+            if self.draining:
+                self.counters['rejected'] += 1
+                raise SchedulerFull("Worker is shutting down", retry_after=1)
+            self._ensure_workers()
+
+            # Newest task for a session wins over one still waiting
+            superseded = sum(len(self.queues[level].get(session_id, ())) for level in PRIORITIES)
+            if self.queued - superseded >= self.max_queue:
+                victim = self._shed_victim(priority) if self.overflow_policy == 'shed' else None
+                if victim is None:
+                    self.counters['rejected'] += 1
+                    raise SchedulerFull(f"Analysis queue is full ({self.queued} jobs waiting)",
+                                        retry_after=self._retry_after())
+                self.counters['shed'] += 1
+                discarded.append((victim, 'shed'))
+
+            for level in PRIORITIES:
+                pending = self.queues[level].pop(session_id, None)
+                if pending:
+                    self.queued -= len(pending)
+                    self.counters['superseded'] += len(pending)
+                    discarded.extend((old, 'superseded') for old in pending)
+
+            self.queues[priority].setdefault(session_id, deque()).append(job)
+            self.queued += 1
+            self.counters['submitted'] += 1
+            self.condition.notify()
+
+        for old, reason in discarded:
+            self._discard(old, reason)
+        return job
+
+    def _discard(self, job: Job, reason: str):
+        job.status = reason
+        job.finished_at = time.time()
+        if job.on_discard:
+            try:
+                job.on_discard(job, reason)
+            except Exception as e:
+                logger.warning("Discard callback failed for job %s: %s", job.id, e)
+
+    def cancel(self, job: Job, reason: str = 'cancelled') -> bool:
+        """
+        Cancel a job. A queued job is removed and discarded; a running job has
+        its cancel token cancelled, which aborts its upstream request and frees
+        the worker slot. Returns False if the job had already finished.
+        """
+        with self.condition:
+            if job.status == 'running':
+                running = True
+            elif job.status == 'queued' and self._remove_queued(job):
+                running = False
+                self.counters['cancelled'] += 1
+            else:
+                return False
+        
+        job.cancel_token.cancel(reason)
+        if not running:
+            self._discard(job, 'cancelled')
+        return True
+
+    def _remove_queued(self, job: Job) -> bool:
+        sessions = self.queues[job.priority]
+        pending = sessions.get(job.session_id)
+        if not pending or job not in pending:
+            return False
+        pending.remove(job)
+        if not pending:
+            del sessions[job.session_id]
+        self.queued -= 1
+        return True
+
+    def _shed_victim(self, priority: str) -> Optional[Job]:
+        """Remove and return the oldest queued job with a lower priority than priority"""
+        for level in reversed(PRIORITIES):
+            if PRIORITIES.index(level) <= PRIORITIES.index(priority):
+                return None
+            sessions = self.queues[level]
+            if not sessions:
+                continue
+            oldest_session = min(sessions, key=lambda s: sessions[s][0].submitted_at)
+            pending = sessions[oldest_session]
+            victim = pending.popleft()
+            if not pending:
+                del sessions[oldest_session]
+            self.queued -= 1
+            return victim
+        return None
+
+    def _retry_after(self) -> int:
+        """Estimate seconds until a queue slot frees, from recent wait times"""
+        if not self.recent_waits:
+            return 5
+        return max(1, int(sum(self.recent_waits) / len(self.recent_waits)))
+
+    def start(self):
+        """Start this process's worker threads (otherwise they start with the first job)"""
+        with self.condition:
+            self._ensure_workers()
+
+    def drain(self, timeout: float) -> Dict:
+        """
+        Stop accepting jobs and give queued and running ones up to timeout
+        seconds to finish; what is left after that is cancelled. Worker
+        threads exit once idle. Returns how many jobs were cancelled.
+        """
+        deadline = time.time() + timeout
+        with self.condition:
+            self.draining = True
+            while (self.queued or self.running_jobs) and time.time() < deadline:
+                self.condition.wait(deadline - time.time())
+            leftover = [job for level in PRIORITIES for pending in self.queues[level].values() for job in pending]
+            for job in leftover:
+                self._remove_queued(job)
+            self.counters['cancelled'] += len(leftover)
+            running = list(self.running_jobs.values())
+            self.condition.notify_all()
+
+        for job in leftover:
+            job.cancel_token.cancel('worker shutting down')
+            self._discard(job, 'cancelled')
+        for job in running:
+            job.cancel_token.cancel('worker shutting down')
+        # Cancelled jobs unwind quickly; give them a moment to record their outcome
+        for worker in self.workers:
+            worker.join(timeout=max(1.0, deadline - time.time()))
+        return {'cancelled_queued': len(leftover), 'cancelled_running': len(running)}
+
+    def _ensure_workers(self):
+        # Started lazily so no threads exist before a fork
+        alive = [w for w in self.workers if w.is_alive()]
+        for i in range(len(alive), self.max_workers):
+            worker = threading.Thread(target=self._worker_loop, name=f"analysis-worker-{i}", daemon=True)
+            worker.start()
+            alive.append(worker)
+        self.workers = alive
+
+    def _next_job(self) -> Optional[Job]:
+        """Pick the next runnable job: highest priority, round-robin across sessions"""
+        for level in PRIORITIES:
+            sessions = self.queues[level]
+            for session_id in list(sessions):
+                if self.running.get(session_id, 0) >= self.per_session_limit:
+                    continue
+                pending = sessions.pop(session_id)
+                job = pending.popleft()
+                if pending:
+                    # Re-append so this session goes to the back of the rotation
+                    sessions[session_id] = pending
+                self.queued -= 1
+                return job
+        return None
+
+    def _worker_loop(self):
+        loop = None
+
+        while True:
+            expired = []
+            with self.condition:
+                job = self._next_job()
+                while job is None or job.cancel_token.cancelled:
+                    if job is not None:
+                        # Deadline passed while queued: never start it
+                        self.counters['cancelled'] += 1
+                        expired.append(job)
+                    elif expired or self.draining:
+                        break
+                    else:
+                        self.condition.wait()
+                    job = self._next_job()
+                if job is not None:
+                    self.running[job.session_id] = self.running.get(job.session_id, 0) + 1
+                    self.running_jobs[job.id] = job
+                    job.status = 'running'
+                    job.started_at = time.time()
+                    self.recent_waits.append(job.wait_time)
+
+            # Discard callbacks run outside the scheduler lock
+            for stale in expired:
+                self._discard(stale, 'cancelled')
+            if job is None:
+                if self.draining and not expired:
+                    self._close_loop(loop)
+                    return
+                continue
+
+            try:
+                result = job.fn()
+                if asyncio.iscoroutine(result):
+                    if self.loop is not None and self.loop.is_running():
+                        # Slot stays held until the coroutine finishes on the shared loop
+                        asyncio.run_coroutine_threadsafe(result, self.loop).result()
+                    else:
+                        if loop is None:
+                            loop = asyncio.new_event_loop()
+                            asyncio.set_event_loop(loop)
+                        loop.run_until_complete(result)
+                job.status = 'completed'
+            except AnalysisCancelled as e:
+                job.status = 'cancelled'
+                logger.info("Analysis job %s for session %s cancelled: %s", job.id, job.session_id, e.reason)
+            except Exception as e:
+                job.status = 'failed'
+                logger.exception("Analysis job %s for session %s failed: %s", job.id, job.session_id, e)
+            finally:
+                job.finished_at = time.time()
+                with self.condition:
+                    self.counters[job.status if job.status in ('completed', 'cancelled') else 'failed'] += 1
+                    self.running_jobs.pop(job.id, None)
+                    remaining = self.running.get(job.session_id, 1) - 1
+                    if remaining > 0:
+                        self.running[job.session_id] = remaining
+                    else:
+                        self.running.pop(job.session_id, None)
+                    # A session slot freed up; another worker may be able to proceed
+                    self.condition.notify_all()
+
+    def _close_loop(self, loop: Optional[asyncio.AbstractEventLoop]):
+        if loop is None:
+            return
+        try:
+            if self.loop_cleanup is not None:
+                loop.run_until_complete(self.loop_cleanup())
+            loop.run_until_complete(loop.shutdown_asyncgens())
+        except Exception as e:
+            logger.warning("Failed to clean up worker event loop: %s", e)
+        finally:
+            loop.close()
+
+    def queue_position(self, job: Job) -> Optional[int]:
+        """1-based position of a queued job in dispatch order (approximate for round-robin)"""
+        with self.condition:
+            position = 0
+            for level in PRIORITIES:
+                for pending in self.queues[level].values():
+                    if job in pending:
+                        return position + pending.index(job) + 1
+                    position += len(pending)
+        return None
+
+    def stats(self) -> Dict:
+        """Queue depth, utilisation and counters"""
+        with self.condition:
+            waits = sorted(self.recent_waits)
+            return {
+                'workers': self.max_workers,
+                'running': len(self.running_jobs),
+                'queued': self.queued,
+                'queued_by_priority': {
+                    level: sum(len(p) for p in self.queues[level].values()) for level in PRIORITIES
+                },
+                'max_queue': self.max_queue,
+                'overflow_policy': self.overflow_policy,
+                'draining': self.draining,
+                'wait_p50': round(waits[len(waits) // 2], 3) if waits else 0.0,
+                'wait_max': round(waits[-1], 3) if waits else 0.0,
+                **self.counters
+            }
@@ -0,0 +1,189 @@
+"""
+Response encoding: fast JSON, streamed large payloads, negotiated compression.
+
+FastJSONProvider replaces Flask's stdlib encoder with orjson when it is
+installed, so every jsonify() gets it. stream_jsonify() sends payloads with
+thousands of entries (a project's file list and contents) a slice at a time
+instead of building one multi-megabyte string. compress_response() is an
+after_request hook that applies zstd or gzip, whichever the client prefers,
+to JSON and text bodies above COMPRESS_MIN_BYTES, streamed ones included.
+"""
+
+import json
+import zlib
+from itertools import islice
+from typing import Iterable, Iterator, Optional
+
+from flask import current_app, Response
+from flask.json.provider import DefaultJSONProvider
+
+from config import Config
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Server preference order; a client's q-values still decide between them
+ENCODINGS = (('zstd',) if zstandard is not None else ()) + ('gzip',)
+
+COMPRESSIBLE_TYPES = ('application/json', 'application/javascript', 'text/', 'image/svg+xml')
+# Compressors buffer, which would hold back server-sent events
+UNBUFFERED_TYPES = ('text/event-stream',)
+
+if orjson is not None:
+    # Dates are handed to Flask's default so they render as they always have (HTTP dates)
+    ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+
+
+def dumps(value) -> bytes:
+    """Compact UTF-8 JSON for value, with Flask's handling of dates, UUIDs and dataclasses"""
+    if orjson is not None:
+        return orjson.dumps(value, default=DefaultJSONProvider.default, option=ORJSON_OPTIONS)
+    return json.dumps(value, default=DefaultJSONProvider.default, ensure_ascii=False,
+                      separators=(',', ':')).encode('utf-8')
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """Flask's JSON provider, encoding and decoding with orjson when it is installed"""
+
+    def dumps(self, obj, **kwargs) -> str:
+        if orjson is None or kwargs:
+            return super().dumps(obj, **kwargs)
+        return dumps(obj).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        if orjson is None or kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs) -> Response:
+        # Pretty-printed debug output stays with the stdlib encoder
+        if orjson is None or (self.compact is None and self._app.debug) or self.compact is False:
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(dumps(obj) + b'\n', mimetype=self.mimetype)
+
+
+def _needs_streaming(value, min_items: int, depth: int = 2) -> bool:
+    """Whether value holds a dict or list with more than min_items entries within depth levels"""
+    if not isinstance(value, (dict, list)):
+        return False
+    if len(value) > min_items:
+        return True
+    if depth == 0:
+        return False
+    children = value.values() if isinstance(value, dict) else value
+    return any(_needs_streaming(child, min_items, depth - 1) for child in children)
+
+
+def iter_json(value, chunk_items: int, min_items: Optional[int] = None) -> Iterator[bytes]:
+    """
+    The JSON encoding of value in pieces. Containers larger than min_items
+    are encoded chunk_items entries at a time; everything else whole.
+    """
+    min_items = chunk_items if min_items is None else min_items
+    if not _needs_streaming(value, min_items):
+        yield dumps(value)
+        return
+
+    if isinstance(value, dict):
+        yield b'{'
+        if len(value) > min_items:
+            # Encode a slice as a dict and drop its braces: one encoder call per chunk
+            items = iter(value.items())
+            separator = b''
+            while True:
+                batch = dict(islice(items, chunk_items))
+                if not batch:
+                    break
+                yield separator + dumps(batch)[1:-1]
+                separator = b','
+        else:
+            for index, (key, child) in enumerate(value.items()):
+                yield (b',' if index else b'') + dumps(key if isinstance(key, str) else str(key)) + b':'
+                yield from iter_json(child, chunk_items, min_items)
+        yield b'}'
+    else:
+        yield b'['
+        if len(value) > min_items:
+            for start in range(0, len(value), chunk_items):
+                yield (b',' if start else b'') + dumps(value[start:start + chunk_items])[1:-1]
+        else:
+            for index, child in enumerate(value):
+                if index:
+                    yield b','
+                yield from iter_json(child, chunk_items, min_items)
+        yield b']'
+
+
+def stream_jsonify(payload) -> Response:
+    """jsonify() for payloads that may be very large: streamed when they hold big containers"""
+    if not _needs_streaming(payload, Config.JSON_STREAM_MIN_ITEMS):
+        return current_app.json.response(payload)
+    chunks = iter_json(payload, Config.JSON_STREAM_CHUNK_ITEMS, Config.JSON_STREAM_MIN_ITEMS)
+    return current_app.response_class(_with_newline(chunks), mimetype=current_app.json.mimetype)
+
+
+def _with_newline(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    yield from chunks
+    yield b'\n'
+
+
+def compressor(encoding: str):
+    """A streaming compressor object (compress/flush) for a content coding"""
+    if encoding == 'zstd':
+        return zstandard.ZstdCompressor(level=Config.ZSTD_LEVEL).compressobj()
+    # wbits=31 writes a gzip header and trailer around the deflate stream
+    return zlib.compressobj(Config.GZIP_LEVEL, zlib.DEFLATED, 31)
+
+
+def compress(data: bytes, encoding: str) -> bytes:
+    engine = compressor(encoding)
+    return engine.compress(data) + engine.flush()
+
+
+def _compress_chunks(chunks: Iterable, encoding: str) -> Iterator[bytes]:
+    engine = compressor(encoding)
+    try:
+        for chunk in chunks:
+            data = engine.compress(chunk.encode('utf-8') if isinstance(chunk, str) else chunk)
+            if data:
+                yield data
+        yield engine.flush()
+    finally:
+        # Pass a client disconnect on to the wrapped body
+        close = getattr(chunks, 'close', None)
+        if close is not None:
+            close()
+
+
+def compress_response(response: Response, accept_encodings) -> Response:
+    """Compress a JSON or text response in the best coding the client accepts (after_request hook)"""
+    if (response.status_code < 200 or response.status_code in (204, 304)
+            or response.direct_passthrough
+            or 'Content-Encoding' in response.headers
+            or not (response.mimetype or '').startswith(COMPRESSIBLE_TYPES)
+            or response.mimetype in UNBUFFERED_TYPES):
+        return response
+    response.vary.add('Accept-Encoding')
+    encoding = accept_encodings.best_match(ENCODINGS)
+    if encoding is None:
+        return response
+
+    if response.is_streamed:
+        # Length is unknown up front; streamed bodies are the large ones
+        response.response = _compress_chunks(response.response, encoding)
+        response.headers.pop('Content-Length', None)
+    else:
+        body = response.get_data()
+        if len(body) < Config.COMPRESS_MIN_BYTES:
+            return response
+        response.set_data(compress(body, encoding))
+    response.headers['Content-Encoding'] = encoding
+    return response
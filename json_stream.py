@@ -0,0 +1,290 @@
+import re
+import json
+import logging
+from typing import Dict, List, Optional, Tuple, Any
+
+logger = logging.getLogger(__name__)
+
+_CLOSERS = {'{': '}', '[': ']'}
+_STRING_SPECIAL = re.compile(r'["\\]')
+
+
+def strip_trailing_commas(text: str) -> str:
+    """Remove commas directly before a closing bracket, ignoring string contents"""
+    out = []
+    in_string = False
+    escape = False
+    pending_comma = None
+    for ch in text:
+        if in_string:
+            out.append(ch)
+            if escape:
+                escape = False
+            elif ch == '\\':
+                escape = True
+            elif ch == '"':
+                in_string = False
+            continue
+        if ch == ',':
+            if pending_comma is not None:
+                out.append(pending_comma)
+            pending_comma = ','
+            continue
+        if pending_comma is not None:
+            if ch.isspace():
+                pending_comma += ch
+                continue
+            if ch not in '}]':
+                out.append(pending_comma)
+            else:
+                out.append(pending_comma[1:])
+            pending_comma = None
+        if ch == '"':
+            in_string = True
+        out.append(ch)
+    if pending_comma is not None:
+        out.append(pending_comma)
+    return "".join(out)
+
+
+def loads_tolerant(text: str) -> Any:
+    """json.loads that also accepts trailing commas"""
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        return json.loads(strip_trailing_commas(text))
+
+
+class IncrementalJSONParser:
+    """
+    Streaming, tolerant parser for the analysis JSON object.
+
+    feed() scans each new chunk once and returns the fields that closed in it:
+    ('field', key, None, value) for every completed top-level value and
+    ('item', key, index, value) for every completed element of a top-level
+    array (each recommendation, each code change). Text before the first '{'
+    (such as a ```json fence) and after the root object is ignored. close()
+    returns the final object, repairing trailing commas or a truncated tail.
+    """
+
+    def __init__(self):
+        self.buffer: List[str] = []
+        self.length = 0
+        # Offset of buffer[-1] in the whole text
+        self.tail_start = 0
+        self.root_start: Optional[int] = None
+        self.root_end: Optional[int] = None
+        self.stack: List[str] = []
+        self.in_string = False
+        self.scan_pos = 0
+        self.string_start = 0
+        self.string_is_key = False
+        self.expect_key: List[bool] = []
+        self.value_start: List[Optional[int]] = []
+        self.value_char: List[Optional[str]] = []
+        self.keys: List[Optional[str]] = []
+        self.item_counts: List[int] = []
+        # Last position where the document could be cut and closed validly
+        self.safe_cut: Optional[Tuple[int, List[str]]] = None
+
+    @property
+    def text(self) -> str:
+        """The whole text fed so far; joins the buffer only when chunks arrived since the last call"""
+        if len(self.buffer) > 1:
+            self.buffer = ["".join(self.buffer)]
+            self.tail_start = 0
+        return self.buffer[0] if self.buffer else ""
+
+    def _slice(self, start: int, end: int) -> str:
+        """text[start:end], reading only the latest chunk when the span lies inside it"""
+        if start >= self.tail_start:
+            return self.buffer[-1][start - self.tail_start:end - self.tail_start]
+        return self.text[start:end]
+
+    def feed(self, chunk: str) -> List[Tuple[str, str, Optional[int], Any]]:
+        """Consume a chunk of the token stream and return newly completed fields"""
+        if not chunk:
+            return []
+
+        base = self.length
+        self.tail_start = base
+        self.buffer.append(chunk)
+        self.length += len(chunk)
+        if self.root_end is not None:
+            return []
+
+        # Scan only the new chunk; positions handed to the helpers are offsets in the whole text
+        events = []
+        pos = self.scan_pos - base
+        end = len(chunk)
+
+        while pos < end:
+            if self.in_string:
+                match = _STRING_SPECIAL.search(chunk, pos)
+                if not match:
+                    pos = end
+                    break
+                pos = match.start()
+                if chunk[pos] == '\\':
+                    pos += 2
+                    continue
+                self.in_string = False
+                pos += 1
+                self._on_string_end(base + pos, events)
+                continue
+
+            ch = chunk[pos]
+
+            if self.root_start is None:
+                if ch == '{':
+                    self.root_start = base + pos
+                    self._push('{')
+                pos += 1
+                continue
+
+            if ch.isspace():
+                pos += 1
+                continue
+
+            if ch == '"':
+                self.in_string = True
+                self.string_start = base + pos
+                self.string_is_key = self.stack[-1] == '{' and self.expect_key[-1]
+                if not self.string_is_key and self.value_start[-1] is None:
+                    self._start_value(base + pos, ch)
+            elif ch in '{[':
+                if self.value_start[-1] is None:
+                    self._start_value(base + pos, ch)
+                self._push(ch)
+            elif ch in '}]':
+                self._finish_primitive(base + pos, events)
+                self.stack.pop()
+                self.expect_key.pop()
+                self.value_start.pop()
+                self.value_char.pop()
+                self.keys.pop()
+                self.item_counts.pop()
+                if not self.stack:
+                    self.root_end = base + pos + 1
+                    self.safe_cut = (self.root_end, [])
+                    pos += 1
+                    break
+                self._complete_value(base + pos + 1, events)
+            elif ch == ',':
+                self._finish_primitive(base + pos, events)
+                if self.stack[-1] == '{':
+                    self.expect_key[-1] = True
+            elif ch == ':':
+                self.expect_key[-1] = False
+            elif self.value_start[-1] is None:
+                # Start of a number, true, false or null
+                self._start_value(base + pos, ch)
+            pos += 1
+
+        # May point one past the end when a chunk ends on a backslash escape
+        self.scan_pos = base + pos
+        return events
+
+    def _push(self, opener: str):
+        self.stack.append(opener)
+        self.expect_key.append(opener == '{')
+        self.value_start.append(None)
+        self.value_char.append(None)
+        self.keys.append(None)
+        self.item_counts.append(0)
+
+    def _start_value(self, pos: int, first_char: str):
+        self.value_start[-1] = pos
+        self.value_char[-1] = first_char
+
+    def _on_string_end(self, end: int, events: List):
+        if self.string_is_key:
+            # Only top-level keys name events; nested keys are never read
+            if len(self.stack) == 1:
+                raw = self._slice(self.string_start, end)
+                try:
+                    self.keys[-1] = json.loads(raw)
+                except json.JSONDecodeError:
+                    self.keys[-1] = raw[1:-1]
+            return
+        self._complete_value(end, events)
+
+    def _finish_primitive(self, pos: int, events: List):
+        """Close a pending number/literal value that ends at a ',' or closer"""
+        if self.value_start[-1] is not None and self.value_char[-1] not in '"{[':
+            self._complete_value(pos, events)
+
+    def _complete_value(self, end: int, events: List):
+        """Handle a value that ended at `end` inside the innermost container"""
+        start = self.value_start[-1]
+        if start is None:
+            return
+        self.value_start[-1] = None
+        self.value_char[-1] = None
+        depth = len(self.stack)
+        self.safe_cut = (end, list(self.stack))
+
+        if depth == 1:
+            fragment = self._slice(start, end)
+            value = self._load(fragment)
+            if value is not None or fragment.strip() == 'null':
+                events.append(('field', self.keys[0], None, value))
+        elif depth == 2 and self.stack[1] == '[':
+            index = self.item_counts[1]
+            self.item_counts[1] += 1
+            value = self._load(self._slice(start, end))
+            events.append(('item', self.keys[0], index, value))
+        elif self.stack[-1] == '[':
+            self.item_counts[-1] += 1
+
+    @staticmethod
+    def _load(fragment: str) -> Any:
+        try:
+            return loads_tolerant(fragment.strip())
+        except json.JSONDecodeError:
+            return None
+
+    def close(self) -> Optional[Dict]:
+        """Return the final object, repairing a truncated or malformed tail"""
+        text = self.text
+        if self.root_start is None:
+            return None
+
+        if self.root_end is not None:
+            try:
+                return loads_tolerant(text[self.root_start:self.root_end])
+            except json.JSONDecodeError:
+                pass
+
+        candidates = []
+        if self.in_string and not self.string_is_key and self.stack:
+            # Keep the partial string value (e.g. a cut-off summary)
+            body = text[self.root_start:]
+            if body.endswith('\\') and not body.endswith('\\\\'):
+                body = body[:-1]
+            candidates.append(body + '"' + self._closers(self.stack))
+        if self.safe_cut:
+            cut, stack = self.safe_cut
+            candidates.append(text[self.root_start:cut] + self._closers(stack))
+        candidates.append('{}')
+
+        for candidate in candidates:
+            try:
+                value = loads_tolerant(candidate)
+                if isinstance(value, dict):
+                    logger.info("Repaired truncated JSON analysis response")
+                    return value
+            except json.JSONDecodeError:
+                continue
+        return None
+
+    @staticmethod
+    def _closers(stack: List[str]) -> str:
+        return "".join(_CLOSERS[opener] for opener in reversed(stack))
+
+
+def parse_json_tolerant(content: str) -> Optional[Dict]:
+    """Parse a complete (possibly fenced, trailing or truncated) JSON object response"""
+    parser = IncrementalJSONParser()
+    parser.feed(content)
+    return parser.close()
@@ -0,0 +1,352 @@
+import os
+import re
+import sys
+import json
+import time
+import fcntl
+import queue
+import secrets
+import atexit
+import socket
+import logging
+import threading
+import contextvars
+import logging.handlers
+from typing import Optional
+from tracing import current_trace
+
+# Largest JSON line sent as one datagram; longer messages are truncated
+MAX_LINE_BYTES = 60 * 1024
+
+# Attributes every LogRecord has; anything else came in through `extra=` and is emitted as a field
+_STANDARD_ATTRS = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime', 'request_id', 'trace_id', 'session_id'}
+
+# Client-supplied X-Request-ID values are kept only if they look like an ID
+_REQUEST_ID_PATTERN = re.compile(r'^[A-Za-z0-9._:-]{1,128}$')
+
+_request_id: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar('request_id', default=None)
+
+
+def current_request_id() -> Optional[str]:
+    return _request_id.get()
+
+
+def request_id_from(header: Optional[str]) -> str:
+    """The caller's X-Request-ID when usable, otherwise a new one"""
+    if header and _REQUEST_ID_PATTERN.match(header):
+        return header
+    return secrets.token_hex(8)
+
+
+def bind_request_id(request_id: Optional[str]):
+    """Tag every record logged from this context with `request_id` until the token is reset"""
+    return _request_id.set(request_id)
+
+
+def reset_request_id(token):
+    _request_id.reset(token)
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: fixed fields, correlation IDs, then any `extra=` fields"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'ts': time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(record.created)) + f'.{int(record.msecs):03d}Z',
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.message if hasattr(record, 'message') else record.getMessage(),
+            'pid': record.process,
+            'thread': record.threadName,
+            'func': f'{record.module}.{record.funcName}:{record.lineno}'
+        }
+        for key in ('request_id', 'trace_id', 'session_id'):
+            value = getattr(record, key, None)
+            if value:
+                entry[key] = value
+        for key, value in vars(record).items():
+            if key not in _STANDARD_ATTRS and key not in entry:
+                entry[key] = value
+        if record.exc_text:
+            entry['exc'] = record.exc_text
+        line = json.dumps(entry, default=str)
+        if len(line) > MAX_LINE_BYTES:
+            entry['message'] = entry['message'][:MAX_LINE_BYTES // 2] + '...[truncated]'
+            entry.pop('exc', None)
+            line = json.dumps(entry, default=str)[:MAX_LINE_BYTES]
+        return line
+
+
+class EnqueueHandler(logging.handlers.QueueHandler):
+    """
+    Handler on the calling thread: stamps correlation IDs, renders the
+    message and puts the record on a bounded in-process queue. It never
+    blocks or touches a file; when the queue is full the record is counted
+    and dropped.
+    """
+
+    def __init__(self, pipeline: 'LogPipeline', maxsize: int):
+        super().__init__(queue.Queue(maxsize=maxsize))
+        self.pipeline = pipeline
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record.request_id = _request_id.get()
+        trace = current_trace()
+        if trace is not None:
+            record.trace_id = trace.trace_id
+            record.session_id = getattr(record, 'session_id', None) or trace.root.attributes.get('session_id')
+            record.request_id = record.request_id or trace.root.attributes.get('request_id')
+        # Render now: args may change after this call, and tracebacks keep whole frames alive
+        record.message = record.getMessage()
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.msg, record.args, record.exc_info = record.message, None, None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        if self.pipeline.started_pid != os.getpid():
+            self.pipeline.deliver(record)
+            return
+        self.pipeline.ensure_sender()
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class LogPipeline:
+    """
+    Queue-based logging with one writer per host.
+
+    Each process formats records as JSON lines on its own sender thread and
+    sends every line as one datagram to a Unix socket next to the log file
+    (LOG_FILE.sock). The process holding an flock on LOG_FILE.lock is the
+    writer: it binds that socket and is the only one that writes the
+    rotating log file and the console, so lines from different processes
+    never interleave and rollovers never race. Only processes that called
+    start() (gunicorn and uvicorn workers, analysis_worker.py) run these
+    threads and stand for election. Before that, as in the gunicorn master
+    under preload_app, records are delivered on the calling thread: sent to
+    the writer, or appended to the file under the lock while there is none,
+    so no logging thread exists when the process forks. When the writer
+    exits its lock is released and the next process whose send fails takes
+    over.
+    """
+
+    def __init__(self, level: int, path: str, max_bytes: int, backup_count: int, queue_size: int,
+                 console: bool = True):
+        path = os.path.abspath(path)
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.socket_path = path + '.sock'
+        self.lock_path = path + '.lock'
+        self.lock_file = None
+        self.reader: Optional[socket.socket] = None
+        self.file: Optional[logging.handlers.RotatingFileHandler] = None
+        self.writer_pid = None
+        self.console = sys.stderr if console else None
+        self.formatter = JsonFormatter()
+        self.handler = EnqueueHandler(self, queue_size)
+        self.handler.setLevel(level)
+        self.owner_pid = os.getpid()
+        self.sender: Optional[socket.socket] = None
+        self.sender_pid = None
+        self.started_pid = None
+        self.direct: Optional[socket.socket] = None
+        self.direct_pid = None
+        self.lock = threading.Lock()
+        os.register_at_fork(after_in_child=self._after_fork)
+        atexit.register(self.flush)
+
+    def start(self):
+        """Run this process's sender thread and stand for election as the writer (idempotent per process)"""
+        with self.lock:
+            if self.started_pid == os.getpid():
+                return
+            self.started_pid = os.getpid()
+        self.elect()
+        self.ensure_sender()
+
+    def elect(self) -> bool:
+        """Become the host's writer unless a live process already holds the lock"""
+        with self.lock:
+            if self.writer_pid == os.getpid():
+                return True
+            lock_file = open(self.lock_path, 'a')
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                lock_file.close()
+                return False
+            # The lock guarantees the socket file, if any, belongs to a writer that exited
+            try:
+                os.unlink(self.socket_path)
+            except FileNotFoundError:
+                pass
+            reader = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            reader.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4 * 1024 * 1024)
+            reader.bind(self.socket_path)
+            self.file = self._open_file()
+            self.lock_file, self.reader, self.writer_pid = lock_file, reader, os.getpid()
+            threading.Thread(target=self._write_loop, args=(reader,), name='log-writer', daemon=True).start()
+            return True
+
+    def _after_fork(self):
+        self.lock = threading.Lock()
+        if self.writer_pid is not None:
+            # A forked child of the writer only sends. Closing its copies neither
+            # releases the parent's lock nor keeps it held after the parent exits
+            self.reader.close()
+            self.lock_file.close()
+            self.reader = self.lock_file = self.file = self.writer_pid = None
+
+    def ensure_sender(self):
+        # Threads do not survive fork: start one sender per process on first use
+        if self.sender_pid == os.getpid():
+            return
+        with self.lock:
+            if self.sender_pid != os.getpid():
+                self.sender_pid = os.getpid()
+                if self.sender_pid != self.owner_pid:
+                    # The inherited queue may hold the parent's unsent records
+                    self.handler.queue = queue.Queue(maxsize=self.handler.queue.maxsize)
+                self.sender = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+                self.sender.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 4 * 1024 * 1024)
+                threading.Thread(target=self._send_loop, name='log-sender', daemon=True).start()
+
+    def _send_loop(self):
+        while True:
+            self._send(self.handler.queue.get())
+
+    def _send(self, record: logging.LogRecord):
+        line = self.formatter.format(record).encode('utf-8', 'replace')
+        try:
+            self.sender.sendto(line, self.socket_path)
+        except (ConnectionRefusedError, FileNotFoundError):
+            # The writer exited: take over, or give the process that just did time to bind
+            for _ in range(5):
+                try:
+                    self.elect()
+                    self.sender.sendto(line, self.socket_path)
+                    return
+                except OSError:
+                    time.sleep(0.01)
+            self.handler.dropped += 1
+        except OSError:
+            self.handler.dropped += 1
+
+    def deliver(self, record: logging.LogRecord):
+        """Send or write one record on the calling thread (a process that has not called start())"""
+        line = self.formatter.format(record).encode('utf-8', 'replace')
+        if self.direct_pid != os.getpid():
+            self.direct = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            # Blocks the caller for at most a second when the writer is behind
+            self.direct.settimeout(1.0)
+            self.direct_pid = os.getpid()
+        for _ in range(5):
+            try:
+                self.direct.sendto(line, self.socket_path)
+                return
+            except (ConnectionRefusedError, FileNotFoundError):
+                if self._append(line):
+                    return
+                # A process holds the lock but has not bound the socket yet
+                time.sleep(0.01)
+            except OSError:
+                break
+        self.handler.dropped += 1
+
+    def _append(self, line: bytes) -> bool:
+        """Write line to the file while no writer holds the lock; False if one does"""
+        with open(self.lock_path, 'a') as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return False
+            # Closing the lock file releases the lock; the file is reopened each time so a
+            # writer elected in between can rotate it
+            file = self._open_file()
+            try:
+                self._write(line, file)
+            finally:
+                file.close()
+            return True
+
+    def _open_file(self) -> logging.handlers.RotatingFileHandler:
+        file = logging.handlers.RotatingFileHandler(self.path, maxBytes=self.max_bytes,
+                                                    backupCount=self.backup_count, encoding='utf-8')
+        file.setFormatter(logging.Formatter('%(message)s'))
+        return file
+
+    def _write_loop(self, reader: socket.socket):
+        while True:
+            try:
+                line = reader.recv(MAX_LINE_BYTES + 1024)
+            except OSError:
+                return
+            self._write(line)
+
+    def _write(self, line: bytes, file: Optional[logging.handlers.RotatingFileHandler] = None):
+        file = file or self.file
+        text = line.decode('utf-8', 'replace')
+        try:
+            file.emit(logging.makeLogRecord({'msg': text}))
+            if self.console is not None:
+                self.console.write(text + '\n')
+                self.console.flush()
+        except Exception:
+            file.handleError(logging.makeLogRecord({'msg': text}))
+
+    def flush(self, timeout: float = 1.0):
+        """Send what this process still has queued; the writer also writes what is waiting in the socket"""
+        deadline = time.time() + timeout
+        # A child that never logged still holds the parent's queue, whose lock may have been copied held
+        while self.sender_pid == os.getpid() and time.time() < deadline:
+            try:
+                self._send(self.handler.queue.get_nowait())
+            except queue.Empty:
+                break
+        if os.getpid() == self.writer_pid:
+            self.reader.setblocking(False)
+            while time.time() < deadline:
+                try:
+                    self._write(self.reader.recv(MAX_LINE_BYTES + 1024))
+                except OSError:
+                    break
+            self.file.flush()
+
+
+_pipeline: Optional[LogPipeline] = None
+
+
+def configure(level: int, path: str, max_bytes: int, backup_count: int, queue_size: int) -> logging.Logger:
+    """
+    Route the root logger through the pipeline. Idempotent, and a forked
+    child keeps its parent's pipeline; either way the host has one writer.
+    """
+    global _pipeline
+    root_logger = logging.getLogger()
+    root_logger.setLevel(level)
+    if _pipeline is None:
+        _pipeline = LogPipeline(level, path, max_bytes, backup_count, queue_size)
+    root_logger.handlers.clear()
+    root_logger.addHandler(_pipeline.handler)
+    return root_logger
+
+
+def start():
+    """Start this process's logging threads (see LogPipeline.start)"""
+    if _pipeline is not None:
+        _pipeline.start()
+
+
+def flush(timeout: float = 1.0):
+    if _pipeline is not None:
+        _pipeline.flush(timeout)
+
+
+def dropped() -> int:
+    """Records this process dropped because its queue or the socket was full"""
+    return _pipeline.handler.dropped if _pipeline is not None else 0
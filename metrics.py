@@ -0,0 +1,77 @@
+import os
+import time
+import logging
+from contextlib import contextmanager
+from config import Config
+
+# prometheus_client chooses its value store on import: point it at the shared
+# directory first, so every preforked worker (and analysis_worker.py) writes
+# its samples there and /metrics can sum them across processes
+os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', Config.METRICS_DIR)
+os.makedirs(os.environ['PROMETHEUS_MULTIPROC_DIR'], exist_ok=True)
+
+from prometheus_client import (CollectorRegistry, Counter, Gauge, Histogram,
+                               CONTENT_TYPE_LATEST, generate_latest, multiprocess)
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+BYTES_BUCKETS = tuple(1024 * 4 ** i for i in range(12))  # 1 KB to 4 GB
+CHARS_BUCKETS = (500, 1000, 2000, 4000, 8000, 16000, 24000, 32000, 64000, 128000)
+TOKEN_BUCKETS = (16, 64, 128, 256, 512, 1024, 2048, 4096, 8192)
+
+HTTP_REQUEST_SECONDS = Histogram(
+    'manus_http_request_duration_seconds', 'HTTP request latency by route',
+    ['endpoint', 'method', 'status'], buckets=LATENCY_BUCKETS
+)
+UPLOAD_BYTES = Histogram('manus_upload_bytes', 'Bytes received per upload request', buckets=BYTES_BUCKETS)
+UPLOAD_SECONDS = Histogram('manus_upload_duration_seconds', 'Upload request processing time',
+                           buckets=LATENCY_BUCKETS)
+EXTRACTION_SECONDS = Histogram('manus_extraction_duration_seconds', 'Archive extraction time',
+                               ['format'], buckets=LATENCY_BUCKETS)
+INDEXING_SECONDS = Histogram('manus_indexing_duration_seconds',
+                             'Project scan, retrieval index and summary build time', buckets=LATENCY_BUCKETS)
+CONTEXT_CHARS = Histogram('manus_context_chars', 'Prompt size sent upstream in characters',
+                          buckets=CHARS_BUCKETS)
+LLM_SECONDS = Histogram('manus_llm_request_duration_seconds', 'Upstream completion time per model',
+                        ['model'], buckets=LATENCY_BUCKETS)
+LLM_FIRST_TOKEN_SECONDS = Histogram('manus_llm_time_to_first_token_seconds', 'Upstream time to first token',
+                                    ['model'], buckets=LATENCY_BUCKETS)
+LLM_TOKENS = Histogram('manus_llm_tokens', 'Tokens per completion (kind: prompt or completion)',
+                       ['model', 'kind'], buckets=TOKEN_BUCKETS)
+CACHE_LOOKUPS = Counter('manus_cache_lookups_total', 'Cache lookups by cache and result (hit or miss)',
+                        ['cache', 'result'])
+ERRORS = Counter('manus_errors_total', 'Errors by stage', ['stage'])
+ANALYSES = Counter('manus_analyses_total', 'Finished analyses by outcome', ['status'])
+ADMISSION_REJECTED = Counter('manus_admission_rejected_total', 'Requests turned away by admission control',
+                             ['resource'])
+WORKSPACE_EVICTIONS = Counter('manus_workspace_evictions_total', 'Idle workspaces evicted to stay within the disk budget',
+                              ['reason'])
+ACTIVE_SESSIONS = Gauge('manus_active_sessions', 'Sessions held in worker memory',
+                        multiprocess_mode='livesum')
+
+
+@contextmanager
+def timed(histogram):
+    """Observe the duration of the with-block on a histogram (or labelled child)"""
+    start_time = time.perf_counter()
+    try:
+        yield
+    finally:
+        histogram.observe(time.perf_counter() - start_time)
+
+
+def observe_request(endpoint: str, method: str, status: int, seconds: float):
+    HTTP_REQUEST_SECONDS.labels(endpoint, method, str(status)).observe(seconds)
+
+
+def render_metrics() -> bytes:
+    """Prometheus text exposition summed over every process writing to the shared store"""
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return generate_latest(registry)
+
+
+def mark_process_dead(pid: int):
+    """Drop a dead process's live gauges (call from the gunicorn master)"""
+    multiprocess.mark_process_dead(pid, os.environ['PROMETHEUS_MULTIPROC_DIR'])
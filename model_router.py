@@ -0,0 +1,183 @@
+import math
+import logging
+import threading
+from typing import Dict, List, Optional
+from config import Config
+from metrics import ERRORS, LLM_FIRST_TOKEN_SECONDS, LLM_SECONDS
+
+logger = logging.getLogger(__name__)
+
+
+def classify_task(task_description: str) -> str:
+    """Coarse task type from keywords in the task description"""
+    task_lower = task_description.lower()
+    if any(word in task_lower for word in ['bug', 'fix', 'error', 'issue']):
+        return "bug_fix"
+    if any(word in task_lower for word in ['optimize', 'performance', 'speed', 'slow']):
+        return "optimization"
+    if any(word in task_lower for word in ['security', 'secure', 'vulnerability']):
+        return "security_review"
+    if any(word in task_lower for word in ['feature', 'add', 'implement', 'new']):
+        return "feature_development"
+    return "general_review"
+
+
+def parse_model_map(spec: str) -> Dict[str, str]:
+    """Parse 'task_type=model,task_type=model' into a dict"""
+    mapping = {}
+    for item in spec.split(','):
+        if '=' in item:
+            key, model = item.split('=', 1)
+            if key.strip() and model.strip():
+                mapping[key.strip()] = model.strip()
+    return mapping
+
+
+class LatencyHistogram:
+    """
+    Thread-safe latency histogram with log-spaced buckets (about 10% wide),
+    cheap enough to update on every request and accurate enough for p50/p95/p99.
+    """
+
+    GROWTH = 1.1
+    MIN_VALUE = 0.001  # 1ms
+
+    def __init__(self):
+        self.buckets: Dict[int, int] = {}
+        self.count = 0
+        self.total = 0.0
+        self.lock = threading.Lock()
+
+    def observe(self, seconds: float):
+        index = max(0, int(math.log(max(seconds, self.MIN_VALUE) / self.MIN_VALUE, self.GROWTH)))
+        with self.lock:
+            self.buckets[index] = self.buckets.get(index, 0) + 1
+            self.count += 1
+            self.total += seconds
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Upper bound of the bucket holding quantile q, None without samples"""
+        with self.lock:
+            if not self.count:
+                return None
+            rank = q * self.count
+            seen = 0
+            for index in sorted(self.buckets):
+                seen += self.buckets[index]
+                if seen >= rank:
+                    return self.MIN_VALUE * self.GROWTH ** (index + 1)
+            return self.MIN_VALUE * self.GROWTH ** (max(self.buckets) + 1)
+
+    def snapshot(self) -> Dict:
+        p50, p95, p99 = (self.quantile(q) for q in (0.5, 0.95, 0.99))
+        return {
+            'count': self.count,
+            'mean': round(self.total / self.count, 4) if self.count else None,
+            'p50': round(p50, 4) if p50 else None,
+            'p95': round(p95, 4) if p95 else None,
+            'p99': round(p99, 4) if p99 else None
+        }
+
+
+class ModelRouter:
+    """
+    Chooses upstream models per analysis and tracks how each one performs.
+
+    Routing is by context size (OPENAI_SMALL_MODEL below ROUTING_SMALL_CONTEXT,
+    OPENAI_LARGE_MODEL above ROUTING_LARGE_CONTEXT) and task type
+    (OPENAI_TASK_MODELS), falling back to OPENAI_MODEL. OPENAI_FALLBACK_MODELS
+    are tried on errors, fastest observed first. Time-to-first-token
+    histograms per model set the hedging delay (their p95).
+    """
+
+    def __init__(self):
+        self.default_model = Config.OPENAI_MODEL
+        self.small_model = Config.OPENAI_SMALL_MODEL
+        self.large_model = Config.OPENAI_LARGE_MODEL
+        self.task_models = parse_model_map(Config.OPENAI_TASK_MODELS)
+        self.fallback_models = [m.strip() for m in Config.OPENAI_FALLBACK_MODELS.split(',') if m.strip()]
+        self.first_token: Dict[str, LatencyHistogram] = {}
+        self.total: Dict[str, LatencyHistogram] = {}
+        self.counters: Dict[str, Dict[str, int]] = {}
+        self.lock = threading.Lock()
+
+    def candidates(self, context_chars: int, task_type: str) -> List[str]:
+        """Models to try in order: the routed model, then fallbacks by observed latency"""
+        if self.large_model and context_chars >= Config.ROUTING_LARGE_CONTEXT:
+            primary = self.large_model
+        elif task_type in self.task_models:
+            primary = self.task_models[task_type]
+        elif self.small_model and context_chars <= Config.ROUTING_SMALL_CONTEXT:
+            primary = self.small_model
+        else:
+            primary = self.default_model
+
+        fallbacks = [m for m in dict.fromkeys(self.fallback_models + [self.default_model]) if m != primary]
+        # Measured models fastest first; the rest keep their configured order
+        observed = {m: self._p95_or_none(m) for m in fallbacks}
+        fallbacks.sort(key=lambda m: (observed[m] is None, observed[m] or 0.0))
+        return [primary] + fallbacks
+
+    def _p95_or_none(self, model: str) -> Optional[float]:
+        histogram = self.first_token.get(model)
+        if histogram is None or histogram.count < Config.HEDGE_MIN_SAMPLES:
+            return None
+        return histogram.quantile(0.95)
+
+    def hedge_delay(self, model: str) -> float:
+        """Seconds to wait for a first token before sending a hedged request"""
+        p95 = self._p95_or_none(model)
+        delay = p95 if p95 is not None else Config.HEDGE_DEFAULT_DELAY
+        return min(max(delay, Config.HEDGE_MIN_DELAY), Config.HEDGE_MAX_DELAY)
+
+    def _model_stats(self, model: str):
+        # Caller holds self.lock
+        if model not in self.counters:
+            self.first_token[model] = LatencyHistogram()
+            self.total[model] = LatencyHistogram()
+            self.counters[model] = {'requests': 0, 'errors': 0, 'hedges': 0, 'hedge_wins': 0, 'cancelled': 0}
+        return self.counters[model]
+
+    def record_start(self, model: str, hedge: bool = False):
+        with self.lock:
+            counters = self._model_stats(model)
+            counters['requests'] += 1
+            if hedge:
+                counters['hedges'] += 1
+
+    def record_first_token(self, model: str, seconds: float, hedge_win: bool = False):
+        with self.lock:
+            counters = self._model_stats(model)
+            if hedge_win:
+                counters['hedge_wins'] += 1
+        self.first_token[model].observe(seconds)
+        LLM_FIRST_TOKEN_SECONDS.labels(model).observe(seconds)
+
+    def record_completion(self, model: str, seconds: float):
+        with self.lock:
+            self._model_stats(model)
+        self.total[model].observe(seconds)
+        LLM_SECONDS.labels(model).observe(seconds)
+
+    def record_error(self, model: str):
+        with self.lock:
+            self._model_stats(model)['errors'] += 1
+        ERRORS.labels('llm').inc()
+
+    def record_cancelled(self, model: str):
+        with self.lock:
+            self._model_stats(model)['cancelled'] += 1
+
+    def stats(self) -> Dict:
+        """Per-model counters and latency histograms"""
+        with self.lock:
+            models = list(self.counters)
+            counters = {m: dict(self.counters[m]) for m in models}
+        return {
+            model: dict(
+                counters[model],
+                first_token=self.first_token[model].snapshot(),
+                total=self.total[model].snapshot()
+            )
+            for model in models
+        }
@@ -1,11 +1,19 @@
+import os
 import asyncio
-import openai
 import logging
 import json
 import time
-from typing import Dict, List, Optional, AsyncGenerator
+from typing import Dict, List, Optional, Callable, Tuple, TYPE_CHECKING
 from concurrent.futures import ThreadPoolExecutor
 from config import Config
+from json_stream import parse_json_tolerant
+from cancellation import CancelToken, AnalysisCancelled
+from model_router import ModelRouter, classify_task
+from metrics import CONTEXT_CHARS, LLM_TOKENS
+from tracing import span
+
+if TYPE_CHECKING:
+    import aiohttp
 
 logger = logging.getLogger(__name__)
 
@@ -14,108 +22,290 @@ class OpenAIService:
     
     def __init__(self):
         self.config = Config
-        self.client = None
-        self.executor = ThreadPoolExecutor(max_workers=4)
-        self._initialize_client()
+        # The openai SDK and aiohttp are imported on first use: together they are
+        # over half of the app's import time, which every cold start pays
+        self._client = None
+        self.configured = bool(self.config.OPENAI_API_KEY or self.config.OPENAI_API_BASE)
+        # Created per process by start(): a pool copied across fork has no threads
+        self.executor: Optional[ThreadPoolExecutor] = None
+        self.executor_pid = None
+        self.router = ModelRouter()
+        # One pooled HTTP session per event loop (each scheduler worker owns a loop)
+        self.http_sessions: Dict[asyncio.AbstractEventLoop, 'aiohttp.ClientSession'] = {}
+        if not self.configured:
+            logger.warning("OpenAI API key not configured - using simulation mode")
+    
+    def start(self):
+        """Create this process's thread pool for blocking upstream calls"""
+        if self.executor_pid != os.getpid():
+            self.executor = ThreadPoolExecutor(max_workers=self.config.ANALYSIS_WORKERS,
+                                               thread_name_prefix='openai-sync')
+            self.executor_pid = os.getpid()
+        return self.executor
+    
+    def shutdown(self):
+        """Stop the thread pool; blocking calls already running still finish before the process exits"""
+        if self.executor is not None and self.executor_pid == os.getpid():
+            self.executor.shutdown(wait=False, cancel_futures=True)
+        self.executor = self.executor_pid = None
+    
+    @property
+    def client(self):
+        """The configured openai module, or None in simulation mode"""
+        if self._client is None and self.configured:
+            self._initialize_client()
+        return self._client
     
     def _initialize_client(self):
         """Initialize OpenAI client"""
-        if not self.config.OPENAI_API_KEY:
-            logger.warning("OpenAI API key not configured - using simulation mode")
-            return
-        
         try:
-            openai.api_key = self.config.OPENAI_API_KEY
-            self.client = openai
+            import openai
+            # Local OpenAI-compatible endpoints (openai_stub.py) accept any key
+            openai.api_key = self.config.OPENAI_API_KEY or 'local-stub'
+            if self.config.OPENAI_API_BASE:
+                openai.api_base = self.config.OPENAI_API_BASE
+                logger.info("Using OpenAI-compatible endpoint: %s", self.config.OPENAI_API_BASE)
+            self._client = openai
             logger.info("OpenAI client initialized successfully")
         except Exception as e:
-            logger.error(f"Failed to initialize OpenAI client: {str(e)}")
+            logger.error("Failed to initialize OpenAI client: %s", e)
     
-    async def analyze_code_async(self, task_description: str, project_structure: Dict) -> Dict:
-        """Analyze code asynchronously"""
+    async def analyze_code_async(self, task_description: str, project_structure: Dict,
+                                 on_delta: Optional[Callable[[str], None]] = None,
+                                 cancel_token: Optional[CancelToken] = None) -> Dict:
+        """
+        Analyze code asynchronously.
+        When on_delta is given the completion is streamed and every token delta
+        is passed to it as it arrives; the parsed result is returned at the end.
+        cancel_token aborts the analysis between stages and closes the upstream
+        request as soon as it is cancelled or its deadline passes; this raises
+        AnalysisCancelled instead of returning an error response.
+        """
+        cancel_token = cancel_token or CancelToken()
         try:
+            cancel_token.check()
             if not self.client:
-                return self._simulate_analysis(task_description, project_structure)
+                result = self._simulate_analysis(task_description, project_structure)
+                if on_delta:
+                    self._simulate_deltas(result, on_delta)
+                return result
+            
+            # Ranking files and rendering outlines is CPU work: keep it off the event loop
+            loop = asyncio.get_running_loop()
+            with span('context'):
+                messages = await cancel_token.run(loop.run_in_executor(
+                    self.start(), self._build_messages, task_description, project_structure
+                ))
+            cancel_token.check()
+            context_chars = sum(len(message['content']) for message in messages)
+            CONTEXT_CHARS.observe(context_chars)
+            models = self.router.candidates(context_chars, classify_task(task_description))
+            
+            if on_delta:
+                # Native async request: cancelling the task closes the HTTP stream
+                with span('llm', model=models[0], stream=True, context_chars=context_chars):
+                    content = await cancel_token.run(
+                        self._stream_completion(messages, on_delta, cancel_token, models)
+                    )
+                with span('parse'):
+                    return self._parse_openai_response(content)
             
             # Run OpenAI call in thread pool to avoid blocking
-            loop = asyncio.get_event_loop()
-            result = await loop.run_in_executor(
-                self.executor,
-                self._analyze_code_sync,
-                task_description,
-                project_structure
-            )
+            with span('llm', model=models[0], stream=False, context_chars=context_chars):
+                result = await cancel_token.run(loop.run_in_executor(
+                    self.start(),
+                    self._analyze_code_sync,
+                    messages,
+                    self._request_timeout(cancel_token),
+                    models
+                ))
             
             return result
             
+        except AnalysisCancelled:
+            raise
         except Exception as e:
-            logger.error(f"Error in async code analysis: {str(e)}")
+            logger.error("Error in async code analysis: %s", e)
             return self._create_error_response(str(e))
     
-    def _analyze_code_sync(self, task_description: str, project_structure: Dict) -> Dict:
-        """Synchronous OpenAI analysis"""
-        try:
-            # Prepare context from project structure
-            context = self._prepare_context(project_structure)
-            
-            # Create system prompt
-            system_prompt = self._create_system_prompt()
-            
-            # Create user prompt
-            user_prompt = self._create_user_prompt(task_description, context)
+    def _request_timeout(self, cancel_token: CancelToken) -> float:
+        """Upstream request timeout: 30 seconds, or less if the deadline is closer"""
+        remaining = cancel_token.remaining()
+        return 30.0 if remaining is None else max(1.0, min(30.0, remaining))
+    
+    def _analyze_code_sync(self, messages: List[Dict], request_timeout: float = 30.0,
+                           models: Optional[List[str]] = None) -> Dict:
+        """Synchronous OpenAI analysis, trying fallback models on errors"""
+        error = None
+        for model in models or [self.config.OPENAI_MODEL]:
+            start_time = time.monotonic()
+            self.router.record_start(model)
+            try:
+                # Make OpenAI API call
+                response = self.client.ChatCompletion.create(
+                    model=model,
+                    messages=messages,
+                    max_tokens=self.config.OPENAI_MAX_TOKENS,
+                    temperature=self.config.OPENAI_TEMPERATURE,
+                    request_timeout=request_timeout
+                )
+            except Exception as e:
+                self.router.record_error(model)
+                logger.warning("OpenAI API error from %s: %s", model, e)
+                error = e
+                continue
             
-            # Make OpenAI API call
-            response = self.client.ChatCompletion.create(
-                model=self.config.OPENAI_MODEL,
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt}
-                ],
-                max_tokens=self.config.OPENAI_MAX_TOKENS,
-                temperature=self.config.OPENAI_TEMPERATURE,
-                timeout=30
-            )
+            elapsed = time.monotonic() - start_time
+            self.router.record_first_token(model, elapsed)
+            self.router.record_completion(model, elapsed)
+            usage = response.get('usage') or {}
+            if usage:
+                LLM_TOKENS.labels(model, 'prompt').observe(usage.get('prompt_tokens', 0))
+                LLM_TOKENS.labels(model, 'completion').observe(usage.get('completion_tokens', 0))
             
             # Parse response
             content = response.choices[0].message.content
             return self._parse_openai_response(content)
-            
-        except Exception as e:
-            logger.error(f"OpenAI API error: {str(e)}")
-            return self._create_error_response(f"OpenAI API error: {str(e)}")
+        
+        logger.error("OpenAI API error: %s", error)
+        return self._create_error_response(f"OpenAI API error: {str(error)}")
     
-    async def stream_analysis(self, task_description: str, project_structure: Dict) -> AsyncGenerator[str, None]:
-        """Stream OpenAI response for real-time updates"""
-        try:
-            if not self.client:
-                async for chunk in self._simulate_streaming(task_description, project_structure):
-                    yield chunk
-                return
-            
-            # Prepare context
-            context = self._prepare_context(project_structure)
-            system_prompt = self._create_system_prompt()
-            user_prompt = self._create_user_prompt(task_description, context)
-            
-            # Stream OpenAI response
-            response = self.client.ChatCompletion.create(
-                model=self.config.OPENAI_MODEL,
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt}
-                ],
+    def _http_session(self) -> 'aiohttp.ClientSession':
+        """Keep-alive session for the running loop, reused across upstream requests"""
+        loop = asyncio.get_running_loop()
+        session = self.http_sessions.get(loop)
+        if session is None or session.closed:
+            import aiohttp
+            session = aiohttp.ClientSession()
+            self.http_sessions[loop] = session
+        return session
+    
+    async def close_http_session(self):
+        """Close the running loop's pooled session (call before the loop is discarded)"""
+        session = self.http_sessions.pop(asyncio.get_running_loop(), None)
+        if session is not None:
+            await session.close()
+    
+    async def _open_stream(self, model: str, messages: List[Dict], cancel_token: CancelToken,
+                           hedge: bool = False):
+        """Start a streaming completion and wait for its first content delta"""
+        with span('first_token', model=model, hedge=hedge):
+            start_time = time.monotonic()
+            self.router.record_start(model, hedge)
+            remaining = cancel_token.remaining()
+            response = await self.client.ChatCompletion.acreate(
+                model=model,
+                messages=messages,
                 max_tokens=self.config.OPENAI_MAX_TOKENS,
                 temperature=self.config.OPENAI_TEMPERATURE,
-                stream=True
+                stream=True,
+                # (connect, total) for aiohttp; the deadline bounds the whole stream
+                request_timeout=(10, remaining if remaining is not None else 600)
             )
-            
-            for chunk in response:
-                if chunk.choices[0].delta.get('content'):
-                    yield chunk.choices[0].delta.content
-                    
-        except Exception as e:
-            logger.error(f"Error in streaming analysis: {str(e)}")
-            yield f"Error: {str(e)}"
+            try:
+                while True:
+                    chunk = await response.__anext__()
+                    first = chunk.choices[0].delta.get('content')
+                    if first:
+                        return response, first, start_time
+            except StopAsyncIteration:
+                return response, '', start_time
+            except BaseException:
+                await response.aclose()
+                raise
+    
+    async def _stream_completion(self, messages: List[Dict], on_delta: Callable[[str], None],
+                                 cancel_token: CancelToken, models: Optional[List[str]] = None) -> str:
+        """
+        Run one streaming completion, forwarding deltas and returning the full text.
+        Models are tried in order until one produces a first token. With
+        HEDGE_ENABLED, a second request (next model, or the same one) is sent
+        if no first token arrived within the model's p95; whichever answers
+        first is kept and the other request is cancelled.
+        """
+        # Requests made in this task (and the attempts it spawns) share the pooled session
+        self.client.aiosession.set(self._http_session())
+        pending = list(models or [self.config.OPENAI_MODEL])
+        attempts: Dict[asyncio.Task, Tuple[str, bool]] = {}
+        hedged = not self.config.HEDGE_ENABLED
+        error = None
+        winner = None
+        
+        def launch(model: str, hedge: bool = False):
+            task = asyncio.ensure_future(self._open_stream(model, messages, cancel_token, hedge))
+            attempts[task] = (model, hedge)
+        
+        primary = pending.pop(0)
+        launch(primary)
+        hedge_at = time.monotonic() + self.router.hedge_delay(primary)
+        
+        try:
+            while attempts and winner is None:
+                timeout = None if hedged else max(0.0, hedge_at - time.monotonic())
+                done, _ = await asyncio.wait(attempts, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    hedged = True
+                    launch(pending.pop(0) if pending else primary, hedge=True)
+                    continue
+                
+                for task in done:
+                    model, hedge = attempts.pop(task)
+                    if task.exception() is not None:
+                        self.router.record_error(model)
+                        logger.warning("OpenAI stream from %s failed: %s", model, task.exception())
+                        error = task.exception()
+                    elif winner is None:
+                        response, first, start_time = task.result()
+                        winner = (model, response, first, start_time)
+                        self.router.record_first_token(model, time.monotonic() - start_time, hedge_win=hedge)
+                    else:
+                        # Both answered in the same tick; keep the first
+                        await task.result()[0].aclose()
+                
+                if winner is None and not attempts and pending:
+                    # Fall back to the next model right away
+                    launch(pending.pop(0))
+        finally:
+            for task, (model, _) in attempts.items():
+                task.cancel()
+                self.router.record_cancelled(model)
+            if attempts:
+                for outcome in await asyncio.gather(*attempts, return_exceptions=True):
+                    if isinstance(outcome, tuple):
+                        # Finished before the cancel landed; close its stream
+                        await outcome[0].aclose()
+        
+        if winner is None:
+            raise error or RuntimeError("No model produced a response")
+        
+        model, response, first, start_time = winner
+        parts = [first] if first else []
+        # Streamed chunks carry no usage; each content chunk is one token
+        chunks = 1 if first else 0
+        if first:
+            on_delta(first)
+        try:
+            async for chunk in response:
+                delta = chunk.choices[0].delta.get('content')
+                if delta:
+                    parts.append(delta)
+                    chunks += 1
+                    on_delta(delta)
+        finally:
+            # Releases the upstream connection when the stream is abandoned early
+            await response.aclose()
+        self.router.record_completion(model, time.monotonic() - start_time)
+        LLM_TOKENS.labels(model, 'completion').observe(chunks)
+        
+        return "".join(parts)
+    
+    def _build_messages(self, task_description: str, project_structure: Dict) -> List[Dict]:
+        """Build chat messages from the task and project context"""
+        context = self._prepare_context(project_structure)
+        return [
+            {"role": "system", "content": self._create_system_prompt()},
+            {"role": "user", "content": self._create_user_prompt(task_description, context)}
+        ]
     
     def _prepare_context(self, project_structure: Dict) -> str:
         """Prepare project context for OpenAI"""
@@ -131,6 +321,13 @@ class OpenAIService:
         if categories:
             context_parts.append(f"- File categories: {', '.join(f'{k}: {v}' for k, v in categories.items())}")
         
+        # Files ranked by relevance to the task (BM25 over the workspace index)
+        relevant_files = project_structure.get('relevant_files', [])
+        if relevant_files:
+            context_parts.append(f"\nMost Relevant Files ({len(relevant_files)}):")
+            for file_path in relevant_files:
+                context_parts.append(f"- {file_path}")
+        
         # Code files
         code_files = project_structure.get('code_files', [])
         if code_files:
@@ -138,20 +335,98 @@ class OpenAIService:
             for file_info in code_files[:10]:  # Limit to first 10
                 context_parts.append(f"- {file_info['path']} ({file_info['formatted_size']})")
         
-        # File contents (limited)
+        # Signatures and call sites of the relevant code (symbol index)
+        outlined = set()
+        symbols = project_structure.get('symbols')
+        if symbols:
+            outlined = self._append_symbols(context_parts, symbols)
+        
+        # File contents (limited), most relevant files first; outlined files are already covered
         content = project_structure.get('content', {})
-        if content:
+        ranked_paths = [path for path in relevant_files if path in content and path not in outlined]
+        ranked_paths += [path for path in content if path not in relevant_files and path not in outlined]
+        if ranked_paths:
             context_parts.append(f"\nFile Contents (sample):")
-            for file_path, file_content in list(content.items())[:5]:  # Limit to 5 files
+            for file_path in ranked_paths[:5]:  # Limit to 5 files
+                file_content = content[file_path]
                 context_parts.append(f"\n--- {file_path} ---")
                 # Truncate content if too long
                 if len(file_content) > 2000:
                     context_parts.append(file_content[:2000] + "... [truncated]")
                 else:
                     context_parts.append(file_content)
+            sampled = set(ranked_paths[:5]) | outlined
+        else:
+            sampled = outlined
+        
+        # Cached per-file and per-directory summaries fill the remaining budget
+        summaries = project_structure.get('summaries')
+        if summaries:
+            self._append_summaries(context_parts, summaries, relevant_files, sampled)
         
         return "\n".join(context_parts)
     
+    def _append_symbols(self, context_parts: List[str], symbols: Dict) -> set:
+        """Append file outlines and call sites within CONTEXT_SYMBOL_CHARS; returns the outlined paths"""
+        budget = self.config.CONTEXT_SYMBOL_CHARS
+        outlined = set()
+        lines = ["\nCode Outline (line: signature):"]
+        for path, outline in symbols.get('outlines', {}).items():
+            block = [f"\n--- {path} ---"] + outline
+            size = sum(len(line) + 1 for line in block)
+            if size > budget:
+                break
+            lines.extend(block)
+            budget -= size
+            outlined.add(path)
+        if not outlined:
+            return outlined
+        call_sites = symbols.get('call_sites', {})
+        if call_sites:
+            lines.append("\nCalled From:")
+            for name, sites in call_sites.items():
+                line = f"- {name}: {', '.join(sites)}"
+                if len(line) + 1 > budget:
+                    break
+                lines.append(line)
+                budget -= len(line) + 1
+        context_parts.extend(lines)
+        return outlined
+    
+    def _append_summaries(self, context_parts: List[str], summaries: Dict,
+                          relevant_files: List[str], sampled: set):
+        """Append project, directory and file summaries until CONTEXT_MAX_CHARS is reached"""
+        budget = self.config.CONTEXT_MAX_CHARS - sum(len(part) + 1 for part in context_parts)
+        
+        def add(line: str) -> bool:
+            nonlocal budget
+            if len(line) + 1 > budget:
+                return False
+            context_parts.append(line)
+            budget -= len(line) + 1
+            return True
+        
+        if not add(f"\nProject Summary: {summaries.get('project', '')}"):
+            return
+        
+        directories = summaries.get('directories', {})
+        file_summaries = summaries.get('files', {})
+        if directories and add("\nDirectory Summaries:"):
+            # Shallow directories first
+            for directory in sorted(directories, key=lambda d: (d.count('/'), d)):
+                if directory != '.' and not add(f"- {directory}/: {directories[directory]}"):
+                    break
+        
+        if file_summaries and add("\nFile Summaries:"):
+            relevant = set(relevant_files)
+            ordered = [path for path in relevant_files if path in file_summaries]
+            ordered += sorted(path for path in file_summaries if path not in relevant)
+            for path in ordered:
+                if path in sampled:
+                    continue
+                if not add(f"- {path}: {file_summaries[path]}"):
+                    break
+    
     def _create_system_prompt(self) -> str:
         """Create system prompt for OpenAI"""
         return """You are Manus AI, an expert code analyst and software engineer. Your role is to:
@@ -207,31 +482,31 @@ Please provide a comprehensive analysis focusing on the specific task requested.
     
     def _parse_openai_response(self, content: str) -> Dict:
         """Parse OpenAI response into structured format"""
-        try:
-            # Try to parse as JSON first
-            if content.strip().startswith('{'):
-                return json.loads(content)
-            
-            # If not JSON, create structured response from text
-            return {
-                "analysis": {
-                    "task_type": "general",
-                    "main_language": "mixed",
-                    "complexity": "medium",
-                    "files_analyzed": 0,
-                    "estimated_time": "5-10 minutes"
-                },
-                "summary": content[:500] + "..." if len(content) > 500 else content,
-                "recommendations": self._extract_recommendations(content),
-                "code_changes": [],
-                "security_issues": [],
-                "performance_issues": [],
-                "next_steps": ["Review the analysis", "Implement suggested changes"]
-            }
-            
-        except json.JSONDecodeError:
+        # Tolerates code fences, trailing text/commas and truncated completions
+        parsed = parse_json_tolerant(content)
+        if parsed:
+            return parsed
+        
+        if content.strip().startswith('{'):
             logger.warning("Failed to parse OpenAI response as JSON")
             return self._create_fallback_response(content)
+        
+        # If not JSON, create structured response from text
+        return {
+            "analysis": {
+                "task_type": "general",
+                "main_language": "mixed",
+                "complexity": "medium",
+                "files_analyzed": 0,
+                "estimated_time": "5-10 minutes"
+            },
+            "summary": content[:500] + "..." if len(content) > 500 else content,
+            "recommendations": self._extract_recommendations(content),
+            "code_changes": [],
+            "security_issues": [],
+            "performance_issues": [],
+            "next_steps": ["Review the analysis", "Implement suggested changes"]
+        }
     
     def _extract_recommendations(self, content: str) -> List[str]:
         """Extract recommendations from text content"""
@@ -297,17 +572,7 @@ Please provide a comprehensive analysis focusing on the specific task requested.
         logger.info("Using simulation mode for code analysis")
         
         # Analyze task type
-        task_lower = task_description.lower()
-        if any(word in task_lower for word in ['bug', 'fix', 'error', 'issue']):
-            task_type = "bug_fix"
-        elif any(word in task_lower for word in ['optimize', 'performance', 'speed', 'slow']):
-            task_type = "optimization"
-        elif any(word in task_lower for word in ['security', 'secure', 'vulnerability']):
-            task_type = "security_review"
-        elif any(word in task_lower for word in ['feature', 'add', 'implement', 'new']):
-            task_type = "feature_development"
-        else:
-            task_type = "general_review"
+        task_type = classify_task(task_description)
         
         # Determine main language
         file_types = project_structure.get('file_types', {})
@@ -452,19 +717,8 @@ def improved_function():
             ]
         return []
     
-    async def _simulate_streaming(self, task_description: str, project_structure: Dict) -> AsyncGenerator[str, None]:
-        """Simulate streaming response"""
-        response_parts = [
-            "Analyzing project structure...\n",
-            "Identifying main programming language...\n",
-            "Reviewing code patterns...\n",
-            "Checking for common issues...\n",
-            "Generating recommendations...\n",
-            "Preparing code examples...\n",
-            "Finalizing analysis...\n"
-        ]
-        
-        for part in response_parts:
-            yield part
-            await asyncio.sleep(0.5)  # Simulate processing time
-
+    def _simulate_deltas(self, result: Dict, on_delta: Callable[[str], None], chunk_size: int = 48):
+        """Emit a simulated result as JSON text deltas"""
+        content = json.dumps(result, indent=2)
+        for i in range(0, len(content), chunk_size):
+            on_delta(content[i:i + chunk_size])
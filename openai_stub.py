@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+"""
+Local OpenAI-compatible stub server for Manus AI Platform
+Speaks the chat-completions protocol (normal and streaming) so the real
+client path can be exercised and load-tested offline.
+
+Usage:
+    python openai_stub.py --port 8001 --latency lognormal:-1.2,0.4 --token-rate 80
+    OPENAI_API_BASE=http://127.0.0.1:8001/v1 gunicorn --config gunicorn.conf.py wsgi:application
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import uuid
+import random
+import logging
+import argparse
+import threading
+from typing import Dict, List, Optional, Callable
+from flask import Flask, request, jsonify, Response
+
+logger = logging.getLogger(__name__)
+
+# Canned analysis returned when no --canned-file is given; mirrors the schema
+# requested by OpenAIService._create_system_prompt
+DEFAULT_CANNED_BODY = {
+    "analysis": {
+        "task_type": "general_review",
+        "main_language": "Python",
+        "complexity": "medium",
+        "files_analyzed": 12,
+        "estimated_time": "10-20 minutes"
+    },
+    "summary": "Stubbed analysis: the project is a small web service with a clear module split.",
+    "recommendations": [
+        "Add unit tests for the request handlers",
+        "Move configuration parsing out of module import time",
+        "Stream large responses instead of buffering them"
+    ],
+    "code_changes": [
+        {
+            "file": "app.py",
+            "type": "modification",
+            "description": "Validate request payloads before use",
+            "code": "data = request.get_json(silent=True) or {}",
+            "line_numbers": "10-12"
+        }
+    ],
+    "security_issues": ["CORS allows every origin"],
+    "performance_issues": ["Session lookups take a global lock"],
+    "next_steps": ["Review the stubbed recommendations", "Run the benchmark suite"]
+}
+
+
+def parse_latency_spec(spec: str) -> Callable[[random.Random], float]:
+    """
+    Parse a latency distribution spec into a sampler returning seconds.
+    Supported: fixed:S, uniform:LO,HI, normal:MEAN,STD, lognormal:MU,SIGMA, exp:MEAN
+    """
+    if not spec:
+        return lambda rng: 0.0
+
+    name, _, raw_args = spec.partition(':')
+    name = name.strip().lower()
+    try:
+        args = [float(a) for a in raw_args.split(',') if a.strip()]
+    except ValueError:
+        raise ValueError(f"Invalid latency spec arguments: {spec}")
+
+    if name == 'fixed' and len(args) == 1:
+        return lambda rng: args[0]
+    if name == 'uniform' and len(args) == 2:
+        return lambda rng: rng.uniform(args[0], args[1])
+    if name == 'normal' and len(args) == 2:
+        return lambda rng: max(0.0, rng.gauss(args[0], args[1]))
+    if name == 'lognormal' and len(args) == 2:
+        return lambda rng: rng.lognormvariate(args[0], args[1])
+    if name == 'exp' and len(args) == 1:
+        return lambda rng: rng.expovariate(1.0 / args[0]) if args[0] > 0 else 0.0
+
+    raise ValueError(f"Unsupported latency spec: {spec}")
+
+
+def split_tokens(text: str) -> List[str]:
+    """Split text into pseudo-tokens (words with trailing whitespace, punctuation)"""
+    return re.findall(r'\w+\s*|[^\w\s]\s*|\s+', text)
+
+
+class StubSettings:
+    """Runtime settings for the stub server"""
+
+    def __init__(self, latency: str = 'fixed:0.05', token_rate: float = 50.0,
+                 error_rate: float = 0.0, rate_limit_rate: float = 0.0,
+                 retry_after: int = 1, canned_file: Optional[str] = None,
+                 seed: Optional[int] = None):
+        self.latency_spec = latency
+        self.sample_latency = parse_latency_spec(latency)
+        self.token_rate = token_rate
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+        self.canned_bodies = self._load_canned(canned_file)
+        self.rng = random.Random(seed)
+        self.rng_lock = threading.Lock()
+        self.counter = 0
+
+    @staticmethod
+    def _load_canned(canned_file: Optional[str]) -> List[str]:
+        """Load canned response bodies; a JSON list yields one body per item"""
+        if not canned_file:
+            return [json.dumps(DEFAULT_CANNED_BODY, indent=2)]
+
+        with open(canned_file, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+
+        items = data if isinstance(data, list) else [data]
+        return [item if isinstance(item, str) else json.dumps(item, indent=2) for item in items]
+
+    def next_body(self) -> str:
+        """Return the next canned body (round-robin)"""
+        with self.rng_lock:
+            body = self.canned_bodies[self.counter % len(self.canned_bodies)]
+            self.counter += 1
+        return body
+
+    def roll(self) -> Dict:
+        """Draw the random outcome for one request"""
+        with self.rng_lock:
+            return {
+                'latency': self.sample_latency(self.rng),
+                'rate_limited': self.rng.random() < self.rate_limit_rate,
+                'error': self.rng.random() < self.error_rate
+            }
+
+
+def create_stub_app(settings: StubSettings) -> Flask:
+    """Create the stub Flask application"""
+    app = Flask(__name__)
+    stats = {'requests': 0, 'streams': 0, 'rate_limited': 0, 'errors': 0}
+    stats_lock = threading.Lock()
+
+    def count(key: str):
+        with stats_lock:
+            stats[key] += 1
+
+    def error_body(message: str, error_type: str, code: str) -> Dict:
+        return {'error': {'message': message, 'type': error_type, 'param': None, 'code': code}}
+
+    @app.route('/v1/models')
+    def list_models():
+        return jsonify({
+            'object': 'list',
+            'data': [{'id': 'stub-model', 'object': 'model', 'owned_by': 'local'}]
+        })
+
+    @app.route('/v1/stats')
+    def get_stats():
+        with stats_lock:
+            return jsonify(dict(stats, latency=settings.latency_spec, token_rate=settings.token_rate))
+
+    @app.route('/v1/chat/completions', methods=['POST'])
+    def chat_completions():
+        count('requests')
+        payload = request.get_json(silent=True) or {}
+        if not payload.get('messages'):
+            return jsonify(error_body("'messages' is a required property", 'invalid_request_error', None)), 400
+
+        outcome = settings.roll()
+        if outcome['rate_limited']:
+            count('rate_limited')
+            response = jsonify(error_body('Rate limit reached (stub)', 'requests', 'rate_limit_exceeded'))
+            response.status_code = 429
+            response.headers['Retry-After'] = str(settings.retry_after)
+            return response
+
+        model = payload.get('model', 'stub-model')
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+        created = int(time.time())
+        tokens = split_tokens(settings.next_body())
+        max_tokens = payload.get('max_tokens')
+        if max_tokens:
+            tokens = tokens[:int(max_tokens)]
+        finish_reason = 'length' if max_tokens and len(tokens) >= int(max_tokens) else 'stop'
+        prompt_tokens = sum(len(split_tokens(str(m.get('content', '')))) for m in payload['messages'])
+        usage = {
+            'prompt_tokens': prompt_tokens,
+            'completion_tokens': len(tokens),
+            'total_tokens': prompt_tokens + len(tokens)
+        }
+
+        # Time to first token
+        time.sleep(outcome['latency'])
+
+        if outcome['error']:
+            count('errors')
+            return jsonify(error_body('The server had an error while processing your request (stub)',
+                                      'server_error', None)), 500
+
+        if not payload.get('stream'):
+            # Non-streaming responses still pay for generation time
+            if settings.token_rate > 0:
+                time.sleep(len(tokens) / settings.token_rate)
+            return jsonify({
+                'id': completion_id,
+                'object': 'chat.completion',
+                'created': created,
+                'model': model,
+                'choices': [{
+                    'index': 0,
+                    'message': {'role': 'assistant', 'content': ''.join(tokens)},
+                    'finish_reason': finish_reason
+                }],
+                'usage': usage
+            })
+
+        count('streams')
+
+        def chunk(delta: Dict, reason: Optional[str] = None) -> str:
+            data = {
+                'id': completion_id,
+                'object': 'chat.completion.chunk',
+                'created': created,
+                'model': model,
+                'choices': [{'index': 0, 'delta': delta, 'finish_reason': reason}]
+            }
+            return f"data: {json.dumps(data)}\n\n"
+
+        def generate():
+            interval = 1.0 / settings.token_rate if settings.token_rate > 0 else 0.0
+            yield chunk({'role': 'assistant'})
+            for token in tokens:
+                if interval:
+                    time.sleep(interval)
+                yield chunk({'content': token})
+            yield chunk({}, finish_reason)
+            yield "data: [DONE]\n\n"
+
+        return Response(generate(), mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache'})
+
+    return app
+
+
+def main(argv: Optional[List[str]] = None):
+    """Command line entry point"""
+    parser = argparse.ArgumentParser(description='Local OpenAI-compatible stub server')
+    parser.add_argument('--host', default=os.getenv('STUB_HOST', '127.0.0.1'))
+    parser.add_argument('--port', type=int, default=int(os.getenv('STUB_PORT', 8001)))
+    parser.add_argument('--latency', default=os.getenv('STUB_LATENCY', 'fixed:0.05'),
+                        help='Time-to-first-token distribution, e.g. fixed:0.2, uniform:0.1,0.5, '
+                             'normal:0.3,0.05, lognormal:-1.2,0.4, exp:0.3')
+    parser.add_argument('--token-rate', type=float, default=float(os.getenv('STUB_TOKEN_RATE', 50)),
+                        help='Generated tokens per second (0 = instant)')
+    parser.add_argument('--error-rate', type=float, default=float(os.getenv('STUB_ERROR_RATE', 0)),
+                        help='Fraction of requests answered with HTTP 500')
+    parser.add_argument('--rate-limit-rate', type=float, default=float(os.getenv('STUB_RATE_LIMIT_RATE', 0)),
+                        help='Fraction of requests answered with HTTP 429')
+    parser.add_argument('--retry-after', type=int, default=int(os.getenv('STUB_RETRY_AFTER', 1)))
+    parser.add_argument('--canned-file', default=os.getenv('STUB_CANNED_FILE'),
+                        help='JSON file with a response body or a list of bodies')
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    try:
+        settings = StubSettings(
+            latency=args.latency,
+            token_rate=args.token_rate,
+            error_rate=args.error_rate,
+            rate_limit_rate=args.rate_limit_rate,
+            retry_after=args.retry_after,
+            canned_file=args.canned_file,
+            seed=args.seed
+        )
+    except (ValueError, OSError) as e:
+        print(f"Invalid stub configuration: {str(e)}", file=sys.stderr)
+        sys.exit(2)
+
+    logger.info(f"Starting OpenAI stub on {args.host}:{args.port} (latency={args.latency}, "
+                f"token_rate={args.token_rate}, errors={args.error_rate}, 429s={args.rate_limit_rate})")
+    create_stub_app(settings).run(host=args.host, port=args.port, threaded=True)
+
+
+if __name__ == '__main__':
+    main()
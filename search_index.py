@@ -0,0 +1,178 @@
+import re
+import math
+import heapq
+import logging
+import threading
+from collections import Counter
+from typing import Dict, List, Optional, Tuple, Iterable
+
+logger = logging.getLogger(__name__)
+
+_WORD = re.compile(r'[A-Za-z0-9_]+')
+_CAMEL = re.compile(r'[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|[0-9]+')
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Identifier-aware tokenisation for code and prose.
+    'parseHTTPResponse_v2' yields the full identifier plus its parts:
+    parsehttpresponse_v2, parse, http, response, v2
+    """
+    tokens = []
+    for word in _WORD.findall(text):
+        lower = word.lower()
+        if len(lower) > 1:
+            tokens.append(lower)
+        pieces = word.split('_') if '_' in word else [word]
+        for piece in pieces:
+            if piece != word and len(piece) > 1:
+                tokens.append(piece.lower())
+            if not (piece.islower() or piece.isupper()):
+                parts = _CAMEL.findall(piece)
+                if len(parts) > 1:
+                    tokens.extend(p.lower() for p in parts if len(p) > 1)
+    return tokens
+
+
+class BM25Index:
+    """
+    In-memory inverted index over workspace files with BM25 scoring.
+
+    Documents are keyed by workspace-relative path and carry a signature
+    (size, mtime) so re-indexing a workspace only re-tokenises changed files.
+    Long posting lists are kept impact-ordered and only their head is scored,
+    which bounds query time on very large workspaces.
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75, prune_limit: int = 2000):
+        self.k1 = k1
+        self.b = b
+        self.prune_limit = prune_limit
+        self.lock = threading.RLock()
+        self.postings: Dict[str, Dict[int, int]] = {}
+        self.doc_ids: Dict[str, int] = {}
+        self.paths: Dict[int, str] = {}
+        self.doc_terms: Dict[int, Dict[str, int]] = {}
+        self.doc_lengths: Dict[int, int] = {}
+        self.signatures: Dict[str, Tuple] = {}
+        self.total_length = 0
+        self.next_id = 0
+        self._impact_order: Dict[str, List[int]] = {}
+
+    def __len__(self) -> int:
+        return len(self.doc_ids)
+
+    def is_current(self, path: str, signature: Tuple) -> bool:
+        """Check whether a document is indexed with the given signature"""
+        return self.signatures.get(path) == signature
+
+    def add_document(self, path: str, content: str = "", signature: Optional[Tuple] = None):
+        """Index (or re-index) a document; path components are weighted twice"""
+        path_tokens = tokenize(path.replace('/', ' ').replace('.', ' '))
+        term_counts = Counter(tokenize(content)) if content else Counter()
+        for token in path_tokens:
+            term_counts[token] += 2
+
+        with self.lock:
+            self.remove_document(path)
+            doc_id = self.next_id
+            self.next_id += 1
+            self.doc_ids[path] = doc_id
+            self.paths[doc_id] = path
+            self.doc_terms[doc_id] = dict(term_counts)
+            length = sum(term_counts.values())
+            self.doc_lengths[doc_id] = length
+            self.total_length += length
+            self.signatures[path] = signature
+            for term, tf in term_counts.items():
+                self.postings.setdefault(term, {})[doc_id] = tf
+                self._impact_order.pop(term, None)
+
+    def remove_document(self, path: str):
+        """Remove a document and its postings"""
+        with self.lock:
+            doc_id = self.doc_ids.pop(path, None)
+            if doc_id is None:
+                return
+            self.signatures.pop(path, None)
+            self.paths.pop(doc_id, None)
+            self.total_length -= self.doc_lengths.pop(doc_id, 0)
+            for term in self.doc_terms.pop(doc_id, {}):
+                term_postings = self.postings.get(term)
+                if term_postings is None:
+                    continue
+                term_postings.pop(doc_id, None)
+                self._impact_order.pop(term, None)
+                if not term_postings:
+                    del self.postings[term]
+
+    def retain(self, paths: Iterable[str]):
+        """Drop every document whose path is not in paths (files deleted from the workspace)"""
+        keep = set(paths)
+        with self.lock:
+            for path in [p for p in self.doc_ids if p not in keep]:
+                self.remove_document(path)
+
+    def _ordered_postings(self, term: str, term_postings: Dict[int, int], avgdl: float) -> List[int]:
+        """Head of a long posting list, highest BM25 term impact first (cached)"""
+        order = self._impact_order.get(term)
+        if order is None:
+            k1, b, lengths = self.k1, self.b, self.doc_lengths
+            order = heapq.nlargest(
+                self.prune_limit,
+                term_postings,
+                key=lambda d: term_postings[d] / (term_postings[d] + k1 * (1 - b + b * lengths[d] / avgdl))
+            )
+            self._impact_order[term] = order
+        return order
+
+    def optimize(self):
+        """Precompute impact-ordered heads of long posting lists so queries stay fast after (re-)indexing"""
+        with self.lock:
+            if not self.doc_ids:
+                return
+            avgdl = self.total_length / len(self.doc_ids) or 1.0
+            for term, term_postings in self.postings.items():
+                if len(term_postings) > self.prune_limit and term not in self._impact_order:
+                    self._ordered_postings(term, term_postings, avgdl)
+
+    def query(self, text: str, k: int = 10) -> List[Tuple[str, float]]:
+        """Return the top-k (path, score) pairs for a free-text query"""
+        terms = set(tokenize(text))
+        if not terms:
+            return []
+
+        with self.lock:
+            n_docs = len(self.doc_ids)
+            if not n_docs:
+                return []
+            avgdl = self.total_length / n_docs or 1.0
+            k1, b, lengths = self.k1, self.b, self.doc_lengths
+            scores: Dict[int, float] = {}
+
+            for term in terms:
+                term_postings = self.postings.get(term)
+                if not term_postings:
+                    continue
+                df = len(term_postings)
+                idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+                if df > self.prune_limit:
+                    doc_ids = self._ordered_postings(term, term_postings, avgdl)
+                else:
+                    doc_ids = term_postings
+                for doc_id in doc_ids:
+                    tf = term_postings[doc_id]
+                    norm = tf + k1 * (1 - b + b * lengths[doc_id] / avgdl)
+                    scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (k1 + 1) / norm
+
+            top = heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+            return [(self.paths[doc_id], round(score, 4)) for doc_id, score in top]
+
+    def stats(self) -> Dict:
+        """Index size summary"""
+        with self.lock:
+            return {
+                'documents': len(self.doc_ids),
+                'terms': len(self.postings),
+                'postings': sum(len(p) for p in self.postings.values())
+            }
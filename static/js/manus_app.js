@@ -10,6 +10,8 @@ class ManusApp {
         this.analysisResult = null;
         this.sessionStartTime = Date.now();
         this.notificationTimeout = 5000;
+        this.searchTimer = null;
+        this.searchRequest = 0;
         
         this.init();
     }
@@ -47,12 +49,18 @@ class ManusApp {
         const toggleExplorer = document.getElementById('toggle-file-explorer');
         const closeExplorer = document.getElementById('close-file-explorer');
         const fileSearch = document.getElementById('file-search');
+        const explorerContent = document.getElementById('file-explorer-content');
         const listView = document.getElementById('list-view');
         const gridView = document.getElementById('grid-view');
         
         toggleExplorer?.addEventListener('click', () => this.toggleFileExplorer());
         closeExplorer?.addEventListener('click', () => this.closeFileExplorer());
         fileSearch?.addEventListener('input', (e) => this.searchFiles(e.target.value));
+        // Paths come from uploads: read them from data-path, never from inline handlers
+        explorerContent?.addEventListener('click', (e) => {
+            const item = e.target.closest('.file-tree-item[data-path]');
+            if (item) this.selectFile(item.dataset.path);
+        });
         listView?.addEventListener('click', () => this.setViewMode('list'));
         gridView?.addEventListener('click', () => this.setViewMode('grid'));
 
@@ -276,9 +284,11 @@ class ManusApp {
         try {
             const startTime = Date.now();
             
-            const response = await fetch('/api/upload', {
+            const response = await this.fetchWithBackoff('/api/upload', {
                 method: 'POST',
                 body: formData
+            }, {
+                onRetry: (delay) => this.showLoading(`Server is busy, retrying upload in ${Math.ceil(delay / 1000)}s...`)
             });
 
             const result = await response.json();
@@ -309,6 +319,33 @@ class ManusApp {
         }
     }
 
+    // Requests turned away under load (429/503) are retried after the server's
+    // Retry-After, plus jitter so rejected clients do not return in lockstep
+    async fetchWithBackoff(url, options = {}, { attempts = 5, onRetry = null } = {}) {
+        for (let attempt = 1; ; attempt++) {
+            const response = await fetch(url, options);
+            if (![429, 503].includes(response.status) || attempt >= attempts) {
+                return response;
+            }
+            const delay = this.retryDelay(response, attempt);
+            onRetry?.(delay, attempt);
+            await new Promise(resolve => setTimeout(resolve, delay));
+        }
+    }
+
+    retryDelay(response, attempt) {
+        // Retry-After is either seconds or an HTTP date
+        const header = response.headers.get('Retry-After');
+        let seconds = Number(header);
+        if (header && Number.isNaN(seconds)) {
+            seconds = (Date.parse(header) - Date.now()) / 1000;
+        }
+        if (!header || !Number.isFinite(seconds) || seconds < 0) {
+            seconds = Math.min(2 ** attempt, 30);
+        }
+        return seconds * 1000 * (1 + Math.random() * 0.5);
+    }
+
     showUploadProgress() {
         const progressSection = document.getElementById('upload-progress');
         if (progressSection) {
@@ -355,7 +392,7 @@ class ManusApp {
         this.showAnalysisProgress();
 
         try {
-            const response = await fetch('/api/analyze', {
+            const response = await this.fetchWithBackoff('/api/analyze', {
                 method: 'POST',
                 headers: {
                     'Content-Type': 'application/json'
@@ -364,6 +401,8 @@ class ManusApp {
                     session_id: this.sessionId,
                     task_description: taskDescription
                 })
+            }, {
+                onRetry: (delay) => this.showLoading(`Server is busy, retrying in ${Math.ceil(delay / 1000)}s...`)
             });
 
             const result = await response.json();
@@ -385,15 +424,44 @@ class ManusApp {
     }
 
     async pollAnalysisStatus() {
-        const pollInterval = 2000; // 2 seconds
+        // Long-poll: the server answers as soon as the status revision moves past
+        // the one we saw, or after `wait` seconds with no change. Each response says
+        // how long the server will hold a request (`max_wait`) and how long to pause
+        // before the next one (`poll_interval`); sync workers hold none and ask for a pause.
+        const minBackoff = 1000;
+        const maxBackoff = 30000;
+        let revision = 0;
+        let longPollWait = 0;
+        let pollInterval = 0;
+        let backoff = minBackoff;
         
         const poll = async () => {
+            let result;
+            try {
+                const response = await fetch(`/api/status/${this.sessionId}?since=${revision}&wait=${longPollWait}`);
+                if (response.status === 429 || response.status >= 500) {
+                    // Wait as long as the server asks when it says
+                    if (response.headers.has('Retry-After')) {
+                        backoff = Math.min(this.retryDelay(response, 1), maxBackoff);
+                    }
+                    throw new Error(`Server error ${response.status}`);
+                }
+                result = await response.json();
+            } catch (error) {
+                // Network or server trouble: reconnect with exponential back-off
+                console.warn(`Status connection lost, retrying in ${backoff}ms:`, error);
+                setTimeout(poll, backoff);
+                backoff = Math.min(backoff * 2, maxBackoff);
+                return;
+            }
+            backoff = minBackoff;
+            
             try {
-                const response = await fetch(`/api/status/${this.sessionId}`);
-                const result = await response.json();
-                
                 if (result.status === 'success') {
                     const analysisStatus = result.analysis_status;
+                    revision = result.revision ?? revision;
+                    longPollWait = result.long_poll?.max_wait ?? longPollWait;
+                    pollInterval = result.long_poll?.poll_interval ?? pollInterval;
                     
                     this.updateAnalysisProgress(analysisStatus);
                     
@@ -405,12 +473,16 @@ class ManusApp {
                         this.goToStep(3);
                         this.showNotification('Analysis completed!', 'success');
                         return;
-                    } else if (analysisStatus === 'failed') {
-                        throw new Error(result.error || 'Analysis failed');
+                    } else if (analysisStatus === 'failed' || analysisStatus === 'cancelled') {
+                        throw new Error(result.error || `Analysis ${analysisStatus}`);
                     }
                     
-                    // Continue polling
-                    setTimeout(poll, pollInterval);
+                    // Wait for the next change
+                    if (pollInterval > 0) {
+                        setTimeout(poll, pollInterval * 1000);
+                    } else {
+                        poll();
+                    }
                 } else {
                     throw new Error(result.message || 'Failed to get analysis status');
                 }
@@ -450,6 +522,10 @@ class ManusApp {
         let statusText = 'Starting analysis...';
         
         switch (status) {
+            case 'queued':
+                percentage = 10;
+                statusText = 'Waiting for an analysis slot...';
+                break;
             case 'running':
                 percentage = 50;
                 statusText = 'AI analysis in progress...';
@@ -462,6 +538,10 @@ class ManusApp {
                 percentage = 0;
                 statusText = 'Analysis failed';
                 break;
+            case 'cancelled':
+                percentage = 0;
+                statusText = 'Analysis cancelled';
+                break;
         }
         
         if (progressFill) {
@@ -679,11 +759,12 @@ class ManusApp {
         const files = structure.files || [];
         
         content.innerHTML = `
+            <div id="file-search-results" class="file-search-results"></div>
             <div class="file-tree">
                 ${files.map(file => `
-                    <div class="file-tree-item" onclick="app.selectFile('${file.path}')">
+                    <div class="file-tree-item" data-path="${this.escapeHtml(file.path)}">
                         <i class="${this.getFileIcon(file.type)}"></i>
-                        <span class="file-name">${file.path}</span>
+                        <span class="file-name">${this.escapeHtml(file.path)}</span>
                         <span class="file-size">${file.formatted_size}</span>
                     </div>
                 `).join('')}
@@ -720,6 +801,70 @@ class ManusApp {
             const matches = fileName.includes(query.toLowerCase());
             item.style.display = matches ? 'flex' : 'none';
         });
+
+        // File contents are searched on the server, once typing pauses
+        clearTimeout(this.searchTimer);
+        const results = document.getElementById('file-search-results');
+        if (results) results.innerHTML = '';
+        if (query.length >= 3 && this.sessionId) {
+            this.searchTimer = setTimeout(() => this.searchContents(query), 250);
+        }
+    }
+
+    async searchContents(query, cursor = 0) {
+        const results = document.getElementById('file-search-results');
+        if (!results) return;
+        const request = ++this.searchRequest;
+
+        try {
+            const params = new URLSearchParams({ q: query, cursor });
+            const response = await fetch(`/api/sessions/${this.sessionId}/search?${params}`);
+            const result = await response.json();
+            // A newer query has been typed meanwhile
+            if (request !== this.searchRequest || result.status !== 'success') return;
+
+            results.querySelector('.search-more')?.remove();
+            results.insertAdjacentHTML('beforeend', result.results.map(file => `
+                <div class="search-file">
+                    <div class="file-tree-item" data-path="${this.escapeHtml(file.path)}">
+                        <i class="fas fa-file-code"></i>
+                        <span class="file-name">${this.escapeHtml(file.path)}</span>
+                    </div>
+                    ${file.matches.map(match => `
+                        <div class="search-match">
+                            <span class="line-number">${match.line}</span>
+                            <code>${this.highlightRanges(match.text, match.ranges)}</code>
+                        </div>
+                    `).join('')}
+                </div>
+            `).join(''));
+
+            if (result.next_cursor !== null) {
+                const more = document.createElement('button');
+                more.className = 'search-more';
+                more.textContent = 'More results';
+                more.addEventListener('click', () => this.searchContents(query, result.next_cursor));
+                results.appendChild(more);
+            } else if (!cursor && !result.results.length) {
+                results.innerHTML = '<div class="search-empty">No matches in file contents</div>';
+            }
+        } catch (error) {
+            console.error('Error searching files:', error);
+        }
+    }
+
+    highlightRanges(text, ranges) {
+        let html = '';
+        let position = 0;
+        for (const [start, end] of ranges) {
+            html += this.escapeHtml(text.slice(position, start)) + `<mark>${this.escapeHtml(text.slice(start, end))}</mark>`;
+            position = end;
+        }
+        return html + this.escapeHtml(text.slice(position));
+    }
+
+    escapeHtml(text) {
+        return text.replace(/[&<>"']/g, c => ({ '&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;', "'": '&#39;' })[c]);
     }
 
     setViewMode(mode) {
@@ -0,0 +1,185 @@
+import os
+import time
+import asyncio
+import logging
+import threading
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class StatusBoard:
+    """
+    Per-session status revisions for long-polling clients.
+
+    Every state transition bumps the session's revision and wakes anyone
+    waiting on it, whether a request thread (wait) or a coroutine on any
+    event loop (await_change). Clients pass back the last revision they saw
+    and are answered only when something changed, instead of polling.
+
+    Revisions are millisecond timestamps, strictly increasing per session, so
+    revisions published by different processes (see SharedStatus) compare.
+
+    A removed session's last revision is kept as a tombstone for
+    tombstone_ttl seconds (longer than any long-poll), so a waiter that
+    wakes after the removal still sees a change instead of sleeping on.
+    """
+
+    def __init__(self, tombstone_ttl: float = 120.0):
+        self.condition = threading.Condition()
+        self.revisions: Dict[str, int] = {}
+        self.last_bump: Dict[str, float] = {}
+        self.removed: Dict[str, float] = {}
+        self.tombstone_ttl = tombstone_ttl
+        self.async_waiters: Dict[str, List[Tuple[asyncio.AbstractEventLoop, asyncio.Event]]] = {}
+
+    def revision(self, session_id: str) -> int:
+        with self.condition:
+            return self.revisions.get(session_id, 0)
+
+    def bump(self, session_id: str, min_interval: float = 0.0) -> int:
+        """
+        Record a change, wake waiters and return the new revision. With
+        min_interval, changes closer together than that are folded into the
+        next bump (for progress updates) and 0 is returned.
+        """
+        now = time.time()
+        with self.condition:
+            if min_interval and now - self.last_bump.get(session_id, 0.0) < min_interval:
+                return 0
+            revision = max(self.revisions.get(session_id, 0) + 1, int(now * 1000))
+            self.revisions[session_id] = revision
+            self.last_bump[session_id] = now
+            self.removed.pop(session_id, None)
+            self._wake(session_id)
+        return revision
+
+    def advance(self, session_id: str, revision: int):
+        """Catch up with a revision published by another process, waking waiters if it is newer"""
+        with self.condition:
+            if revision > self.revisions.get(session_id, 0):
+                self.revisions[session_id] = revision
+                self.removed.pop(session_id, None)
+                self._wake(session_id)
+
+    def _wake(self, session_id: str):
+        """Caller holds the condition"""
+        self.condition.notify_all()
+        for loop, event in self.async_waiters.pop(session_id, ()):
+            try:
+                loop.call_soon_threadsafe(event.set)
+            except RuntimeError:
+                pass  # loop already closed
+
+    def wait(self, session_id: str, since: int, timeout: float) -> int:
+        """Block until the revision exceeds since or timeout passes; returns the revision"""
+        deadline = time.time() + timeout
+        with self.condition:
+            while self.revisions.get(session_id, 0) <= since:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                self.condition.wait(remaining)
+            return self.revisions.get(session_id, 0)
+
+    async def await_change(self, session_id: str, since: int, timeout: float) -> int:
+        """Coroutine version of wait() that does not block the event loop"""
+        event = asyncio.Event()
+        with self.condition:
+            if self.revisions.get(session_id, 0) > since:
+                return self.revisions[session_id]
+            waiter = (asyncio.get_running_loop(), event)
+            self.async_waiters.setdefault(session_id, []).append(waiter)
+        try:
+            await asyncio.wait_for(event.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        with self.condition:
+            waiters = self.async_waiters.get(session_id)
+            if waiters and waiter in waiters:
+                waiters.remove(waiter)
+                if not waiters:
+                    del self.async_waiters[session_id]
+            return self.revisions.get(session_id, 0)
+
+    def remove(self, session_id: str):
+        """Forget a session and release its waiters; its revision stays behind as a tombstone"""
+        self.bump(session_id)
+        now = time.time()
+        with self.condition:
+            self.last_bump.pop(session_id, None)
+            self.removed[session_id] = now
+            expired = [sid for sid, removed_at in self.removed.items() if now - removed_at > self.tombstone_ttl]
+            for sid in expired:
+                del self.removed[sid]
+                self.revisions.pop(sid, None)
+
+
+class SharedStatus:
+    """
+    Each session's analysis status, shared through the workspace store so
+    that every worker process and node reports the same state and revision.
+
+    The process running an analysis publishes a record per status change
+    (one record per run, named so that newer runs sort last); the others read
+    the newest run's record. publish() never blocks: a writer thread per
+    process stores the latest pending record of each run. read() reuses a
+    record fetched less than max_age seconds ago, so many waiters on one
+    session cost one store read per interval.
+    """
+
+    def __init__(self, storage):
+        self.storage = storage
+        self.condition = threading.Condition()
+        self.pending: Dict[Tuple[str, str], Dict] = {}
+        self.published: Dict[str, Dict] = {}
+        self.fetched: Dict[str, Tuple[float, Optional[Dict]]] = {}
+        self.pruned: Dict[str, str] = {}
+        self.writer_pid = None
+
+    def publish(self, session_id: str, run: str, record: Dict):
+        with self.condition:
+            if self.writer_pid != os.getpid():
+                # Threads do not survive fork: one writer per process, started on first use
+                self.writer_pid = os.getpid()
+                threading.Thread(target=self._write_loop, name='status-writer', daemon=True).start()
+            self.pending[(session_id, run)] = record
+            self.published[session_id] = record
+            self.condition.notify()
+
+    def _write_loop(self):
+        while True:
+            with self.condition:
+                while not self.pending:
+                    self.condition.wait()
+                (session_id, run), record = self.pending.popitem()
+            try:
+                self.storage.save_status(session_id, run, record)
+                if self.pruned.get(session_id) != run:
+                    self.pruned[session_id] = run
+                    self.storage.prune_status(session_id, run)
+            except Exception as e:
+                logger.warning("Could not store the status of session %s: %s", session_id, e)
+
+    def read(self, session_id: str, max_age: float = 0.0) -> Optional[Dict]:
+        """The newest record: the stored one, or this process's own while it is not stored yet"""
+        now = time.time()
+        with self.condition:
+            fetched_at, stored = self.fetched.get(session_id, (0.0, None))
+        if now - fetched_at >= max_age:
+            try:
+                stored = self.storage.status(session_id)
+            except Exception as e:
+                logger.warning("Could not read the status of session %s: %s", session_id, e)
+            with self.condition:
+                self.fetched[session_id] = (now, stored)
+        with self.condition:
+            own = self.published.get(session_id)
+        records = [record for record in (stored, own) if record]
+        return max(records, key=lambda record: (record['run'], record['revision']), default=None)
+
+    def forget(self, session_id: str):
+        with self.condition:
+            self.published.pop(session_id, None)
+            self.fetched.pop(session_id, None)
+            self.pruned.pop(session_id, None)
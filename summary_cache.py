@@ -0,0 +1,219 @@
+import os
+import re
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from collections import defaultdict
+from typing import Dict, List, Optional, Iterable
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# Top-level definitions per language family (kept deliberately cheap)
+_DEFINITION_PATTERNS = {
+    '.py': re.compile(r'^(?:async\s+def|def|class)\s+([A-Za-z_]\w*)', re.M),
+    '.js': re.compile(r'^(?:export\s+)?(?:default\s+)?(?:async\s+)?(?:function\*?|class)\s+([A-Za-z_$][\w$]*)'
+                      r'|^(?:export\s+)?(?:const|let|var)\s+([A-Za-z_$][\w$]*)\s*=\s*(?:async\s*)?(?:\(|function)',
+                      re.M),
+    '.go': re.compile(r'^func\s+(?:\([^)]*\)\s*)?([A-Za-z_]\w*)|^type\s+([A-Za-z_]\w*)', re.M),
+    '.rs': re.compile(r'^\s*(?:pub\s+)?(?:fn|struct|enum|trait)\s+([A-Za-z_]\w*)', re.M),
+    '.java': re.compile(r'^\s*(?:public|protected|private)?\s*(?:static\s+)?(?:final\s+)?'
+                        r'(?:class|interface|enum)\s+([A-Za-z_]\w*)', re.M),
+    '.rb': re.compile(r'^\s*(?:def|class|module)\s+([A-Za-z_][\w.?!]*)', re.M),
+    '.php': re.compile(r'^\s*(?:abstract\s+|final\s+)?(?:function|class|interface|trait)\s+([A-Za-z_]\w*)', re.M),
+}
+for _ext in ('.ts', '.jsx', '.tsx'):
+    _DEFINITION_PATTERNS[_ext] = _DEFINITION_PATTERNS['.js']
+for _ext in ('.kt', '.scala', '.cs', '.swift'):
+    _DEFINITION_PATTERNS[_ext] = _DEFINITION_PATTERNS['.java']
+
+_DOC_LINE = re.compile(r'^\s*(?:#+|//+|/\*+|\*|"""|\'\'\'|--)\s*(.+?)\s*(?:\*/|"""|\'\'\')?\s*$')
+
+
+def content_hash(content: str) -> str:
+    """Stable hash of file content used as the summary cache key"""
+    return hashlib.sha256(content.encode('utf-8', 'surrogatepass')).hexdigest()
+
+
+def summarize_file(path: str, content: str, max_length: int = 240) -> str:
+    """Extractive one-line summary: size, leading doc/comment line and top-level definitions"""
+    extension = os.path.splitext(path)[1].lower()
+    line_count = content.count('\n') + (1 if content and not content.endswith('\n') else 0)
+    parts = [f"{line_count} lines"]
+
+    for line in content.splitlines()[:15]:
+        match = _DOC_LINE.match(line)
+        if match and len(match.group(1)) > 3 and not match.group(1).startswith('!'):
+            parts.append(match.group(1)[:100])
+            break
+
+    pattern = _DEFINITION_PATTERNS.get(extension)
+    if pattern:
+        names = []
+        for match in pattern.finditer(content):
+            name = next((g for g in match.groups() if g), None)
+            if name and name not in names:
+                names.append(name)
+        if names:
+            shown = ", ".join(names[:12])
+            more = f" (+{len(names) - 12} more)" if len(names) > 12 else ""
+            parts.append(f"defines {shown}{more}")
+    elif extension in ('.md', '.rst', '.adoc', '.org'):
+        headings = re.findall(r'^#{1,3}\s+(.+)$', content, re.M)[:6]
+        if headings:
+            parts.append("sections: " + "; ".join(headings))
+    elif extension in ('.json', '.yaml', '.yml', '.toml'):
+        keys = re.findall(r'^\s{0,2}"?([A-Za-z_][\w-]*)"?\s*[:=]', content, re.M)
+        if keys:
+            parts.append("keys: " + ", ".join(dict.fromkeys(keys[:10])))
+
+    summary = "; ".join(parts)
+    return summary if len(summary) <= max_length else summary[:max_length - 3] + "..."
+
+
+class SummaryStore:
+    """
+    Persistent summary cache keyed by content hash, shared by all sessions and
+    workers on a host (SQLite in WAL mode, one connection per thread).
+
+    Entries expire max_age seconds after they were written and the table is
+    capped at max_entries, oldest first; the workspace reaper calls prune()
+    on every sweep. The database is opened on first use.
+    """
+
+    def __init__(self, db_path: Optional[str] = None, max_age: Optional[float] = None,
+                 max_entries: Optional[int] = None):
+        self.db_path = db_path or Config.SUMMARY_CACHE_PATH
+        self.max_age = max_age if max_age is not None else Config.SUMMARY_CACHE_MAX_AGE
+        self.max_entries = max_entries if max_entries is not None else Config.SUMMARY_CACHE_MAX_ENTRIES
+        self.local = threading.local()
+
+    def _connection(self) -> sqlite3.Connection:
+        # Connections must not cross fork(), so they are keyed by pid as well
+        conn = getattr(self.local, 'conn', None)
+        if conn is None or self.local.pid != os.getpid():
+            os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+            conn = sqlite3.connect(self.db_path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            with conn:
+                conn.execute("""
+                    CREATE TABLE IF NOT EXISTS file_summaries (
+                        content_hash TEXT PRIMARY KEY,
+                        summary TEXT NOT NULL,
+                        created_at REAL NOT NULL
+                    )
+                """)
+                conn.execute("CREATE INDEX IF NOT EXISTS idx_summaries_created ON file_summaries (created_at)")
+            self.local.conn = conn
+            self.local.pid = os.getpid()
+        return conn
+
+    def get_many(self, hashes: Iterable[str]) -> Dict[str, str]:
+        """Fetch cached summaries for the given content hashes"""
+        hashes = list(hashes)
+        found = {}
+        conn = self._connection()
+        for i in range(0, len(hashes), 500):
+            batch = hashes[i:i + 500]
+            placeholders = ",".join("?" * len(batch))
+            rows = conn.execute(
+                f"SELECT content_hash, summary FROM file_summaries WHERE content_hash IN ({placeholders})",
+                batch
+            )
+            found.update(rows)
+        return found
+
+    def put_many(self, summaries: Dict[str, str]):
+        """Store summaries (existing entries are kept)"""
+        if not summaries:
+            return
+        now = time.time()
+        with self._connection() as conn:
+            conn.executemany(
+                "INSERT OR IGNORE INTO file_summaries (content_hash, summary, created_at) VALUES (?, ?, ?)",
+                [(h, s, now) for h, s in summaries.items()]
+            )
+
+    def prune(self, now: Optional[float] = None) -> int:
+        """Delete entries older than max_age, then the oldest beyond max_entries; returns how many"""
+        cutoff = (now or time.time()) - self.max_age
+        with self._connection() as conn:
+            removed = conn.execute("DELETE FROM file_summaries WHERE created_at < ?", (cutoff,)).rowcount
+            excess = conn.execute("SELECT COUNT(*) FROM file_summaries").fetchone()[0] - self.max_entries
+            if excess > 0:
+                removed += conn.execute(
+                    "DELETE FROM file_summaries WHERE content_hash IN "
+                    "(SELECT content_hash FROM file_summaries ORDER BY created_at LIMIT ?)",
+                    (excess,)
+                ).rowcount
+        if removed:
+            logger.info("Pruned %s cached file summaries", removed)
+        return removed
+
+
+# Host-wide: every worker reads and writes the same database
+summary_store = SummaryStore()
+
+
+def summarize_project(contents: Dict[str, str], store: Optional[SummaryStore] = None) -> Dict:
+    """
+    Build file, directory and project summaries for a workspace.
+    File summaries come from the store when the content hash is known;
+    only new content is summarised and written back.
+    """
+    hashes = {path: content_hash(text) for path, text in contents.items()}
+    cached = {}
+    if store is not None:
+        try:
+            cached = store.get_many(set(hashes.values()))
+        except sqlite3.Error as e:
+            logger.warning("Summary cache unavailable: %s", e)
+
+    file_summaries = {}
+    new_entries = {}
+    for path, text in contents.items():
+        digest = hashes[path]
+        summary = cached.get(digest)
+        if summary is None:
+            summary = summarize_file(path, text)
+            new_entries[digest] = summary
+        file_summaries[path] = summary
+
+    if store is not None and new_entries:
+        try:
+            store.put_many(new_entries)
+        except sqlite3.Error as e:
+            logger.warning("Failed to persist file summaries: %s", e)
+
+    # Roll file summaries up into every ancestor directory
+    dir_files = defaultdict(list)
+    for path in contents:
+        directory = os.path.dirname(path)
+        while True:
+            dir_files[directory].append(path)
+            if not directory:
+                break
+            directory = os.path.dirname(directory)
+
+    directory_summaries = {}
+    for directory, paths in dir_files.items():
+        extensions = defaultdict(int)
+        for path in paths:
+            extensions[os.path.splitext(path)[1].lower() or 'no extension'] += 1
+        top_ext = ", ".join(f"{ext} x{n}" for ext, n in sorted(extensions.items(), key=lambda i: -i[1])[:4])
+        direct = [os.path.basename(p) for p in paths if os.path.dirname(p) == directory]
+        summary = f"{len(paths)} files ({top_ext})"
+        if direct:
+            summary += f"; contains {', '.join(sorted(direct)[:8])}{' ...' if len(direct) > 8 else ''}"
+        directory_summaries[directory or '.'] = summary
+
+    return {
+        'files': file_summaries,
+        'directories': directory_summaries,
+        'project': directory_summaries.get('.', 'Empty project'),
+        'cache_hits': len(contents) - len(new_entries),
+        'cache_misses': len(new_entries)
+    }
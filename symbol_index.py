@@ -0,0 +1,625 @@
+"""
+Symbol table of a session's code: definitions, imports and call sites.
+
+Python definitions and imports come from `ast`. The other languages of
+get_file_type's code set get a lightweight line parser: a few anchored
+patterns per language find definitions and imports, and indentation gives
+their enclosing class. It misses what only a real parser would see
+(multi-line signatures, definitions generated by macros), but it costs one
+regex pass per pattern and never fails on code it cannot parse. Call sites
+are `name(` occurrences in every language, matched by name only.
+
+Extraction runs at ingest. Batches of at least SYMBOL_PARALLEL_MIN_BYTES
+go to a per-worker process pool (SYMBOL_WORKERS processes, started through
+a forkserver), so a large upload is not parsed on one core while the
+worker's request threads wait on the GIL. Results are plain tuples; the
+per-session SymbolTable keeps them per file, with definitions and call
+sites inverted on demand for lookups.
+"""
+
+import os
+import re
+import ast
+import sys
+import logging
+import threading
+import multiprocessing
+from bisect import bisect_right
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# Call sites kept per file; the rest are dropped
+MAX_CALLS_PER_FILE = 2000
+MAX_SIGNATURE = 200
+
+# Kinds that give their members the 'method' kind
+CLASS_KINDS = {'class', 'scope'}
+
+_IDENT = r'[A-Za-z_$][\w$]*'
+_CALL = re.compile(r'(?<![\w$])([A-Za-z_$][\w$]*)\s*\(')
+_NOT_CALLS = frozenset((
+    'if', 'for', 'while', 'switch', 'catch', 'return', 'function', 'sizeof', 'typeof', 'elif', 'and', 'or',
+    'not', 'in', 'with', 'foreach', 'until', 'unless', 'when', 'match', 'fn', 'func', 'def', 'sub', 'new',
+    'await', 'yield', 'throw', 'case', 'do', 'else', 'lambda', 'assert', 'defined', 'instanceof', 'delete',
+    'void', 'super', 'this', 'self', 'import', 'require', 'include', 'using', 'alignof', 'decltype', 'local',
+))
+_JAVA_MODIFIERS = (r'(?:(?:public|private|protected|internal|static|final|abstract|synchronized|native|'
+                   r'virtual|override|async|sealed|default|open|data|partial|inner|export|readonly|extern|'
+                   r'unsafe|new|transient|strictfp)\s+)*')
+_CLASS_LIKE = _JAVA_MODIFIERS + r'(?:class|interface|enum|record|struct|trait|object|protocol|extension)\s+(?P<name>\w+)'
+_C_FUNCTION = (r'^[ \t]*(?!(?:return|else|case|goto|typedef|do|throw|delete|new|using)\b)'
+               r'(?:[\w:*&<>,]+[ \t*&]+)+(?P<name>[A-Za-z_~][\w:~]*)[ \t]*\([^;{}]*\)[ \t]*(?:const[ \t]*)?'
+               r'(?:noexcept[ \t]*)?(?:override[ \t]*)?\{?[ \t]*$')
+
+_JS = {
+    'definitions': [
+        ('function', r'^[ \t]*(?:export[ \t]+)?(?:default[ \t]+)?(?:async[ \t]+)?function[ \t]*\*?[ \t]*'
+                     r'(?P<name>' + _IDENT + r')'),
+        ('class', r'^[ \t]*(?:export[ \t]+)?(?:default[ \t]+)?(?:abstract[ \t]+)?class[ \t]+(?P<name>' + _IDENT + r')'),
+        ('class', r'^[ \t]*(?:export[ \t]+)?(?:interface|enum|type)[ \t]+(?P<name>' + _IDENT + r')'),
+        ('function', r'^[ \t]*(?:export[ \t]+)?(?:const|let|var)[ \t]+(?P<name>' + _IDENT + r')[ \t]*(?::[^=\n]+)?='
+                     r'[ \t]*(?:async[ \t]+)?(?:function\b|\([^)\n]*\)[ \t]*(?::[^=\n]+)?=>|' + _IDENT + r'[ \t]*=>)'),
+        ('method', r'^[ \t]+(?:(?:public|private|protected|static|async|readonly|override|abstract|get|set)[ \t]+)*'
+                   r'(?!(?:if|for|while|switch|catch|function|return|with)\b)(?P<name>#?' + _IDENT + r')[ \t]*'
+                   r'(?:<[^>\n]*>)?\([^;\n]*\)[ \t]*(?::[^{;\n]+)?\{[ \t]*$'),
+    ],
+    'imports': [r'^[ \t]*import[ \t]+(?:[^;\'"]*?[ \t]+from[ \t]+)?[\'"]([^\'"]+)[\'"]',
+                r'^[ \t]*export[ \t]+[^;\'"]*?[ \t]+from[ \t]+[\'"]([^\'"]+)[\'"]',
+                r'\brequire\([ \t]*[\'"]([^\'"]+)[\'"][ \t]*\)'],
+}
+
+_JAVA_METHOD = ('method', r'^[ \t]+' + _JAVA_MODIFIERS + r'(?!(?:return|new|else|throw|await|yield|case)\b)'
+                          r'(?:<[^>\n]+>[ \t]+)?[\w<>\[\],.?]+[ \t]+(?P<name>\w+)[ \t]*\([^;\n]*$')
+
+_LANGUAGES = {
+    'py': {
+        # Only used when ast cannot parse the file (Python 2, syntax errors)
+        'definitions': [('function', r'^[ \t]*(?:async[ \t]+)?def[ \t]+(?P<name>\w+)'),
+                        ('class', r'^[ \t]*class[ \t]+(?P<name>\w+)')],
+        'imports': [r'^[ \t]*import[ \t]+([\w.]+)', r'^[ \t]*from[ \t]+([\w.]+)[ \t]+import\b'],
+    },
+    'js': _JS,
+    'go': {
+        'definitions': [('function', r'^func[ \t]*(?:\([ \t]*\w*[ \t]*\*?(?P<parent>\w+)[^)\n]*\)[ \t]*)?'
+                                     r'(?P<name>\w+)[ \t]*(?:\[[^\]\n]*\])?\('),
+                        ('class', r'^type[ \t]+(?P<name>\w+)')],
+        'imports': [r'^import[ \t]+(?:\w+[ \t]+)?"([^"]+)"', r'^import[ \t]*\(([^)]*)\)'],
+    },
+    'rs': {
+        'definitions': [('function', r'^[ \t]*(?:pub(?:\([^)\n]*\))?[ \t]+)?(?:(?:const|async|unsafe)[ \t]+)*'
+                                     r'(?:extern[ \t]+"[^"\n]*"[ \t]+)?fn[ \t]+(?P<name>\w+)'),
+                        ('class', r'^[ \t]*(?:pub(?:\([^)\n]*\))?[ \t]+)?(?:struct|enum|trait|union|mod)[ \t]+(?P<name>\w+)'),
+                        ('scope', r'^[ \t]*impl(?:<[^>\n]*>)?[ \t]+(?:[\w:<>, ]+[ \t]+for[ \t]+)?(?P<name>\w+)')],
+        'imports': [r'^[ \t]*(?:pub[ \t]+)?use[ \t]+([\w:]+)', r'^[ \t]*extern[ \t]+crate[ \t]+(\w+)'],
+    },
+    'java': {
+        'definitions': [('class', r'^[ \t]*' + _CLASS_LIKE), _JAVA_METHOD],
+        'imports': [r'^[ \t]*import[ \t]+(?:static[ \t]+)?([\w.]+)'],
+    },
+    'cs': {
+        'definitions': [('class', r'^[ \t]*' + _CLASS_LIKE), ('scope', r'^[ \t]*namespace[ \t]+(?P<name>[\w.]+)'),
+                        _JAVA_METHOD],
+        'imports': [r'^[ \t]*using[ \t]+(?:static[ \t]+)?([\w.]+)[ \t]*;'],
+    },
+    'kt': {
+        'definitions': [('class', r'^[ \t]*' + _CLASS_LIKE),
+                        ('function', r'^[ \t]*' + _JAVA_MODIFIERS + r'fun[ \t]+(?:<[^>\n]+>[ \t]*)?(?:[\w.]+\.)?'
+                                     r'(?P<name>\w+)[ \t]*\(')],
+        'imports': [r'^[ \t]*import[ \t]+([\w.]+)'],
+    },
+    'scala': {
+        'definitions': [('class', r'^[ \t]*' + _CLASS_LIKE),
+                        ('function', r'^[ \t]*' + _JAVA_MODIFIERS + r'def[ \t]+(?P<name>\w+)')],
+        'imports': [r'^[ \t]*import[ \t]+([\w.]+)'],
+    },
+    'swift': {
+        'definitions': [('class', r'^[ \t]*' + _CLASS_LIKE),
+                        ('function', r'^[ \t]*' + _JAVA_MODIFIERS + r'(?:@\w+[ \t]+)*func[ \t]+(?P<name>\w+)')],
+        'imports': [r'^[ \t]*import[ \t]+(\w+)'],
+    },
+    'c': {
+        'definitions': [('class', r'^[ \t]*(?:typedef[ \t]+)?(?:struct|union|enum)[ \t]+(?P<name>\w+)[ \t]*\{?[ \t]*$'),
+                        ('function', _C_FUNCTION)],
+        'imports': [r'^[ \t]*#[ \t]*include[ \t]*[<"]([^>"]+)[>"]'],
+    },
+    'cpp': {
+        'definitions': [('class', r'^[ \t]*(?:template[ \t]*<[^>\n]*>[ \t]*)?(?:class|struct|union|enum(?:[ \t]+class)?)'
+                                  r'[ \t]+(?P<name>\w+)[^;\n]*$'),
+                        ('scope', r'^[ \t]*namespace[ \t]+(?P<name>\w+)'),
+                        ('function', _C_FUNCTION)],
+        'imports': [r'^[ \t]*#[ \t]*include[ \t]*[<"]([^>"]+)[>"]'],
+    },
+    'php': {
+        'definitions': [('class', r'^[ \t]*(?:(?:abstract|final|readonly)[ \t]+)*(?:class|interface|trait|enum)[ \t]+'
+                                  r'(?P<name>\w+)'),
+                        ('function', r'^[ \t]*(?:(?:public|private|protected|static|abstract|final)[ \t]+)*'
+                                     r'function[ \t]+&?(?P<name>\w+)[ \t]*\(')],
+        'imports': [r'^[ \t]*use[ \t]+([\w\\]+)',
+                    r'\b(?:require|include)(?:_once)?[ \t]*\(?[ \t]*[\'"]([^\'"]+)[\'"]'],
+    },
+    'rb': {
+        'definitions': [('function', r'^[ \t]*def[ \t]+(?:self\.)?(?P<name>[\w?!=]+)'),
+                        ('class', r'^[ \t]*(?:class|module)[ \t]+(?P<name>[\w:]+)')],
+        'imports': [r'^[ \t]*require(?:_relative)?[ \t]*\(?[ \t]*[\'"]([^\'"]+)[\'"]'],
+    },
+    'lua': {
+        'definitions': [('function', r'^[ \t]*(?:local[ \t]+)?function[ \t]+(?P<name>[\w.:]+)'),
+                        ('function', r'^[ \t]*(?:local[ \t]+)?(?P<name>[\w.]+)[ \t]*=[ \t]*function\b')],
+        'imports': [r'\brequire[ \t]*\(?[ \t]*[\'"]([^\'"]+)[\'"]'],
+    },
+    'pl': {
+        'definitions': [('function', r'^[ \t]*sub[ \t]+(?P<name>\w+)'),
+                        ('class', r'^[ \t]*package[ \t]+(?P<name>[\w:]+)')],
+        'imports': [r'^[ \t]*(?:use|require)[ \t]+([\w:]+)'],
+    },
+    'r': {
+        'definitions': [('function', r'^[ \t]*(?P<name>[\w.]+)[ \t]*(?:<-|=)[ \t]*function[ \t]*\(')],
+        'imports': [r'\b(?:library|require)\([ \t]*[\'"]?([\w.]+)'],
+    },
+    'hs': {
+        'definitions': [('function', r"^(?P<name>[a-z_][\w']*)[ \t]*::"),
+                        ('class', r'^(?:data|newtype|class|type)[ \t]+(?P<name>[A-Z]\w*)')],
+        'imports': [r'^import[ \t]+(?:qualified[ \t]+)?([\w.]+)'],
+    },
+    'ml': {
+        'definitions': [('function', r"^[ \t]*let[ \t]+(?:rec[ \t]+|inline[ \t]+|private[ \t]+)*(?P<name>[a-z_][\w']*)"),
+                        ('class', r'^[ \t]*(?:type|module)[ \t]+(?:rec[ \t]+)?(?P<name>\w+)')],
+        'imports': [r'^[ \t]*open[ \t]+([\w.]+)'],
+    },
+    'clj': {
+        'definitions': [('function', r'^[ \t]*\((?:defn-?|defmacro|defmulti)[ \t]+(?P<name>[\w\-?!*<>=/.]+)'),
+                        ('class', r'^[ \t]*\((?:defprotocol|defrecord|deftype)[ \t]+(?P<name>[\w\-]+)')],
+        'imports': [r'^\(ns[ \t]+([\w.\-]+)', r'\(:?require[ \t]+\[?([\w.\-]+)'],
+    },
+    'vb': {
+        'flags': re.IGNORECASE,
+        'definitions': [('class', r'^[ \t]*(?:(?:public|private|friend|partial|mustinherit|notinheritable)[ \t]+)*'
+                                  r'(?:class|module|interface|structure)[ \t]+(?P<name>\w+)'),
+                        ('function', r'^[ \t]*(?:(?:public|private|protected|friend|shared|overrides|overridable|async)'
+                                     r'[ \t]+)*(?:function|sub)[ \t]+(?P<name>\w+)')],
+        'imports': [r'^[ \t]*imports[ \t]+([\w.]+)'],
+    },
+    'pas': {
+        'flags': re.IGNORECASE,
+        'definitions': [('function', r'^[ \t]*(?:class[ \t]+)?(?:function|procedure|constructor|destructor)[ \t]+'
+                                     r'(?:(?P<parent>\w+)\.)?(?P<name>\w+)'),
+                        ('class', r'^[ \t]*(?P<name>\w+)[ \t]*=[ \t]*(?:packed[ \t]+)?(?:class|record|interface)\b')],
+        'imports': [r'^[ \t]*uses[ \t]+([\w.]+)'],
+    },
+}
+
+# Extensions of get_file_type's code set that have symbols; markup and stylesheets have none
+EXTENSIONS = {
+    'py': 'py', 'js': 'js', 'jsx': 'js', 'ts': 'js', 'tsx': 'js', 'go': 'go', 'rs': 'rs', 'java': 'java',
+    'cs': 'cs', 'kt': 'kt', 'scala': 'scala', 'swift': 'swift', 'c': 'c', 'h': 'cpp', 'cpp': 'cpp', 'hpp': 'cpp',
+    'php': 'php', 'rb': 'rb', 'lua': 'lua', 'pl': 'pl', 'r': 'r', 'hs': 'hs', 'ml': 'ml', 'fs': 'ml',
+    'clj': 'clj', 'vb': 'vb', 'pas': 'pas',
+}
+
+_COMPILED = {
+    language: {
+        'definitions': [(kind, re.compile(pattern, re.M | spec.get('flags', 0))) for kind, pattern in spec['definitions']],
+        'imports': [re.compile(pattern, re.M | spec.get('flags', 0)) for pattern in spec['imports']],
+    }
+    for language, spec in _LANGUAGES.items()
+}
+
+
+def language_of(path: str) -> Optional[str]:
+    """Parser used for a file, by extension; None if it has no symbols"""
+    extension = path.rsplit('.', 1)[-1].lower() if '.' in path else ''
+    return EXTENSIONS.get(extension)
+
+
+def _signature(text: str) -> str:
+    text = ' '.join(text.split())
+    if len(text) > MAX_SIGNATURE:
+        text = text[:MAX_SIGNATURE - 3] + '...'
+    return sys.intern(text)
+
+
+def _compact_calls(calls: List[Tuple[str, int]]) -> Dict[str, Tuple[int, ...]]:
+    grouped = defaultdict(list)
+    for name, line in calls[:MAX_CALLS_PER_FILE]:
+        grouped[sys.intern(name)].append(line)
+    return {name: tuple(lines) for name, lines in grouped.items()}
+
+
+_DEFINITIONS = (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)
+_NESTED = ('body', 'orelse', 'finalbody', 'handlers', 'cases')
+
+
+def _python_definitions(body: List[ast.stmt], parent: str, parent_kind: Optional[str],
+                        symbols: List[Tuple], imports: List[str]):
+    # Statements only: expressions hold no definitions, and visiting them is most of a full walk's cost
+    for node in body:
+        if isinstance(node, _DEFINITIONS):
+            if isinstance(node, ast.ClassDef):
+                kind = 'class'
+                bases = ', '.join(ast.unparse(base) for base in node.bases + node.keywords)
+                signature = f"class {node.name}({bases})" if bases else f"class {node.name}"
+            else:
+                kind = 'method' if parent_kind == 'class' else 'function'
+                prefix = 'async def' if isinstance(node, ast.AsyncFunctionDef) else 'def'
+                returns = f" -> {ast.unparse(node.returns)}" if node.returns is not None else ''
+                signature = f"{prefix} {node.name}({ast.unparse(node.args)}){returns}"
+            symbols.append((sys.intern(node.name), kind, node.lineno, _signature(signature), sys.intern(parent)))
+            _python_definitions(node.body, node.name, 'class' if kind == 'class' else 'function', symbols, imports)
+        elif isinstance(node, ast.Import):
+            imports.extend(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom):
+            imports.append('.' * node.level + (node.module or ''))
+        else:
+            for field in _NESTED:
+                for child in getattr(node, field, None) or ():
+                    # except handlers and match cases are not statements but hold a body
+                    nested = child.body if isinstance(child, (ast.excepthandler, getattr(ast, 'match_case', ()))) \
+                        else [child]
+                    _python_definitions(nested, parent, parent_kind, symbols, imports)
+
+
+def _extract_python(source: str) -> Optional[Tuple]:
+    try:
+        tree = ast.parse(source)
+    except (SyntaxError, ValueError, RecursionError):
+        return None
+    symbols, imports = [], []
+    _python_definitions(tree.body, '', None, symbols, imports)
+    return symbols, tuple(dict.fromkeys(imports)), _call_sites(source, _line_starts(source), symbols)
+
+
+def _line_starts(source: str) -> List[int]:
+    return [0] + [match.end() for match in re.finditer('\n', source)]
+
+
+def _call_sites(source: str, line_starts: List[int], symbols: List[Tuple]) -> Dict[str, Tuple[int, ...]]:
+    """Lines where each name is followed by '(', other than its own definitions"""
+    defined = {(symbol[2], symbol[0]) for symbol in symbols}
+    calls = []
+    for match in _CALL.finditer(source):
+        name = match.group(1)
+        if name in _NOT_CALLS:
+            continue
+        line = bisect_right(line_starts, match.start())
+        if (line, name) not in defined:
+            calls.append((name, line))
+            if len(calls) >= MAX_CALLS_PER_FILE:
+                break
+    return _compact_calls(calls)
+
+
+def _extract_lines(source: str, language: str) -> Tuple:
+    """Definitions, imports and calls of source from the line patterns of language"""
+    spec = _COMPILED[language]
+    line_starts = _line_starts(source)
+
+    found = []
+    for kind, pattern in spec['definitions']:
+        for match in pattern.finditer(source):
+            found.append((match.start(), kind, match))
+    found.sort(key=lambda item: item[0])
+
+    symbols = []
+    definition_lines = set()
+    scopes: List[Tuple[int, str, str]] = []  # (indent, name, kind) of the enclosing definitions
+    for position, kind, match in found:
+        line = bisect_right(line_starts, position)
+        if line in definition_lines:
+            continue
+        line_start = line_starts[line - 1]
+        line_end = source.find('\n', line_start)
+        text = source[line_start:line_end if line_end != -1 else len(source)]
+        indent = len(text) - len(text.lstrip())
+        while scopes and scopes[-1][0] >= indent:
+            scopes.pop()
+        name = match.group('name')
+        # An explicit owner: a Go receiver, Pascal's TFoo.Bar, or a qualified Foo::bar / M.helper / M:method
+        parent = match.groupdict().get('parent') or ''
+        if not parent:
+            separator = '::' if '::' in name else '.' if '.' in name else ':' if ':' in name else None
+            if separator:
+                head, _, tail = name.rpartition(separator)
+                if head and tail:
+                    parent, name = head, tail
+        in_class = bool(scopes) and scopes[-1][2] in CLASS_KINDS
+        if kind == 'method' and not in_class:
+            continue
+        if not parent and scopes:
+            parent = scopes[-1][1]
+        elif parent:
+            in_class = True
+        if kind == 'function' and in_class:
+            kind = 'method'
+        scopes.append((indent, name, kind))
+        definition_lines.add(line)
+        if kind == 'scope':
+            continue
+        signature = text.strip()
+        brace = signature.find('{')
+        if brace > 0:
+            signature = signature[:brace]
+        symbols.append((sys.intern(name), kind, line, _signature(signature.rstrip(' :')), sys.intern(parent)))
+
+    imports = []
+    for pattern in spec['imports']:
+        for match in pattern.finditer(source):
+            value = match.group(1)
+            if '"' in value:
+                # A block of imports, as in Go's import ( ... )
+                imports.extend((match.start(), name) for name in re.findall(r'"([^"]+)"', value))
+            else:
+                imports.append((match.start(), value))
+    imports = tuple(dict.fromkeys(name for _, name in sorted(imports)))
+    return symbols, imports, _call_sites(source, line_starts, symbols)
+
+
+def extract_symbols(path: str, source: str) -> Optional[Tuple]:
+    """
+    (symbols, imports, calls) of a source file, or None if its language has
+    no parser. symbols are (name, kind, line, signature, parent) tuples; kind
+    is 'class', 'function' or 'method'. calls maps called names to lines.
+    """
+    language = language_of(path)
+    if language is None:
+        return None
+    if language == 'py':
+        extracted = _extract_python(source)
+        if extracted is not None:
+            return extracted
+    return _extract_lines(source, language)
+
+
+def extract_file(full_path: str, path: str, max_bytes: int) -> Optional[Tuple]:
+    """extract_symbols for a file on disk; runs in pool processes"""
+    try:
+        with open(full_path, 'rb') as f:
+            data = f.read(max_bytes + 1)
+    except OSError as e:
+        logger.warning("Could not read %s for symbols: %s", path, e)
+        return None
+    if len(data) > max_bytes or b'\0' in data[:8192]:
+        return None
+    return extract_symbols(path, data.decode('utf-8', 'replace'))
+
+
+def _extract_batch(workspace_path: str, paths: List[str], max_bytes: int) -> List[Optional[Tuple]]:
+    return [extract_file(os.path.join(workspace_path, path), path, max_bytes) for path in paths]
+
+
+class SymbolExtractor:
+    """
+    Runs symbol extraction for a batch of files, across a process pool when
+    the batch is large enough to pay for it. The pool belongs to the process
+    that created it and is rebuilt after a fork.
+    """
+
+    def __init__(self, workers: int = Config.SYMBOL_WORKERS,
+                 parallel_min_bytes: int = Config.SYMBOL_PARALLEL_MIN_BYTES,
+                 max_bytes: int = Config.SYMBOL_MAX_FILE_BYTES):
+        self.workers = workers
+        self.parallel_min_bytes = parallel_min_bytes
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.pool: Optional[ProcessPoolExecutor] = None
+        self.pool_pid = None
+
+    def _pool(self) -> ProcessPoolExecutor:
+        with self.lock:
+            if self.pool is None or self.pool_pid != os.getpid():
+                # Forking a threaded web worker can copy held locks into the children;
+                # a forkserver forks from a clean single-threaded process instead
+                if 'forkserver' in multiprocessing.get_all_start_methods():
+                    context = multiprocessing.get_context('forkserver')
+                    context.set_forkserver_preload(['symbol_index'])
+                else:
+                    context = multiprocessing.get_context('spawn')
+                self.pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=context)
+                self.pool_pid = os.getpid()
+            return self.pool
+
+    def extract(self, workspace_path: str, files: Dict[str, int]) -> Dict[str, Optional[Tuple]]:
+        """Symbols of the files ({path: size}) under workspace_path"""
+        paths = sorted(files)
+        total = sum(files.values())
+        if self.workers <= 1 or total < self.parallel_min_bytes or len(paths) < 2:
+            return dict(zip(paths, _extract_batch(workspace_path, paths, self.max_bytes)))
+
+        # Batches of about equal bytes, a few per process so a slow one does not hold up the rest
+        target = max(total // (self.workers * 4), 1)
+        batches, batch, batch_bytes = [], [], 0
+        for path in paths:
+            batch.append(path)
+            batch_bytes += files[path]
+            if batch_bytes >= target:
+                batches.append(batch)
+                batch, batch_bytes = [], 0
+        if batch:
+            batches.append(batch)
+
+        results = {}
+        try:
+            pool = self._pool()
+            futures = [(batch, pool.submit(_extract_batch, workspace_path, batch, self.max_bytes))
+                       for batch in batches]
+            for batch, future in futures:
+                results.update(zip(batch, future.result()))
+        except BrokenProcessPool as e:
+            # A pool process died (OOM, crash); extract what is left here and start a new pool next time
+            logger.warning("Symbol extraction pool failed, extracting inline: %s", e)
+            with self.lock:
+                self.pool = None
+            missing = [path for path in paths if path not in results]
+            results.update(zip(missing, _extract_batch(workspace_path, missing, self.max_bytes)))
+        return results
+
+    def shutdown(self):
+        with self.lock:
+            if self.pool is not None and self.pool_pid == os.getpid():
+                self.pool.shutdown(wait=False, cancel_futures=True)
+            self.pool = self.pool_pid = None
+
+
+class SymbolTable:
+    """
+    Per-session symbol table: for each file, its symbols, imports and call
+    sites, with a signature (size, mtime) like BM25Index's so that re-indexing
+    only parses changed files. Definitions and call sites by name are built
+    on first lookup after a change.
+    """
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.files: Dict[str, Tuple] = {}
+        self.signatures: Dict[str, Tuple] = {}
+        self._definitions = None
+        self._callers = None
+
+    def __len__(self) -> int:
+        return len(self.files)
+
+    def is_current(self, path: str, signature: Tuple) -> bool:
+        return self.signatures.get(path) == signature
+
+    def update(self, workspace_path: str, files: Dict[str, Tuple[int, Tuple]],
+               extractor: Optional[SymbolExtractor] = None):
+        """(Re-)extract the files given as {path: (size, signature)}"""
+        if not files:
+            return
+        extractor = extractor or symbol_extractor
+        extracted = extractor.extract(workspace_path, {path: size for path, (size, _) in files.items()})
+        with self.lock:
+            for path, symbols in extracted.items():
+                self.signatures[path] = files[path][1]
+                if symbols is None:
+                    self.files.pop(path, None)
+                else:
+                    self.files[path] = symbols
+            self._definitions = self._callers = None
+
+    def retain(self, paths: Iterable[str]):
+        """Drop every file whose path is not in paths (files deleted from the workspace)"""
+        keep = set(paths)
+        with self.lock:
+            for path in [p for p in self.signatures if p not in keep]:
+                self.signatures.pop(path, None)
+                self.files.pop(path, None)
+            self._definitions = self._callers = None
+
+    def _inverted(self) -> Tuple[Dict, Dict]:
+        with self.lock:
+            if self._definitions is None:
+                definitions = defaultdict(list)
+                callers = defaultdict(list)
+                for path in sorted(self.files):
+                    symbols, _, calls = self.files[path]
+                    for symbol in symbols:
+                        definitions[symbol[0]].append((path, symbol))
+                    for name, lines in calls.items():
+                        callers[name].append((path, lines))
+                self._definitions, self._callers = dict(definitions), dict(callers)
+            return self._definitions, self._callers
+
+    @staticmethod
+    def _symbol_dict(path: str, symbol: Tuple) -> Dict:
+        name, kind, line, signature, parent = symbol
+        return {'name': name, 'kind': kind, 'path': path, 'line': line, 'signature': signature, 'parent': parent}
+
+    def outline(self, path: str) -> Optional[Dict]:
+        """Symbols and imports of one file, in line order"""
+        with self.lock:
+            entry = self.files.get(path)
+        if entry is None:
+            return None
+        symbols, imports, calls = entry
+        return {
+            'path': path,
+            'symbols': [self._symbol_dict(path, symbol) for symbol in symbols],
+            'imports': list(imports),
+            'calls': sum(len(lines) for lines in calls.values())
+        }
+
+    def find(self, query: str, kind: Optional[str] = None, limit: int = 50) -> List[Dict]:
+        """Definitions whose name starts with query (case-insensitive), exact matches first"""
+        definitions, _ = self._inverted()
+        query = query.lower()
+        matches = [name for name in definitions if name.lower().startswith(query)]
+        matches.sort(key=lambda name: (name.lower() != query, len(name), name))
+        found = []
+        for name in matches:
+            for path, symbol in definitions[name]:
+                if kind is None or symbol[1] == kind:
+                    found.append(self._symbol_dict(path, symbol))
+                    if len(found) >= limit:
+                        return found
+        return found
+
+    def definitions(self, name: str) -> List[Dict]:
+        definitions, _ = self._inverted()
+        return [self._symbol_dict(path, symbol) for path, symbol in definitions.get(name, [])]
+
+    def call_sites(self, name: str, limit: int = 100) -> List[Dict]:
+        """Where name is called, by file and line; calls are matched by name only"""
+        _, callers = self._inverted()
+        sites = []
+        for path, lines in callers.get(name, []):
+            for line in lines:
+                sites.append({'path': path, 'line': line})
+                if len(sites) >= limit:
+                    return sites
+        return sites
+
+    def context(self, paths: List[str], max_files: int = 10, max_symbols: int = 40,
+                max_sites: int = 3) -> Dict:
+        """
+        Outlines of the given files (in order, up to max_files that have symbols)
+        and, for their definitions whose name is unique in the project, where
+        they are called from in other files. Plain data, for the analysis prompt.
+        """
+        definitions, callers = self._inverted()
+        outlines = {}
+        call_sites = {}
+        for path in paths:
+            if len(outlines) >= max_files:
+                break
+            with self.lock:
+                entry = self.files.get(path)
+            if not entry or not entry[0]:
+                continue
+            symbols = entry[0][:max_symbols]
+            outlines[path] = [f"{line}: {'  ' if parent else ''}{signature}"
+                              for _, _, line, signature, parent in symbols]
+            for name, _, _, _, _ in symbols:
+                if name in call_sites or len(definitions.get(name, ())) != 1:
+                    continue
+                sites = [f"{caller}:{lines[0]}" for caller, lines in callers.get(name, []) if caller != path]
+                if sites:
+                    call_sites[name] = sites[:max_sites] + ([f"+{len(sites) - max_sites} more files"]
+                                                            if len(sites) > max_sites else [])
+        return {'outlines': outlines, 'call_sites': call_sites}
+
+    def stats(self) -> Dict:
+        with self.lock:
+            kinds = defaultdict(int)
+            calls = imports = 0
+            for symbols, file_imports, file_calls in self.files.values():
+                for symbol in symbols:
+                    kinds[symbol[1]] += 1
+                imports += len(file_imports)
+                calls += sum(len(lines) for lines in file_calls.values())
+            return {
+                'files': len(self.files),
+                'symbols': sum(kinds.values()),
+                'kinds': dict(kinds),
+                'imports': imports,
+                'call_sites': calls
+            }
+
+
+# One pool per worker process, shared by its sessions
+symbol_extractor = SymbolExtractor()
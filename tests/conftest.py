@@ -0,0 +1,14 @@
+import os
+import sys
+import tempfile
+
+# Keep logs, metrics, workspaces and host-wide state of the tests away from the real ones
+SCRATCH = tempfile.mkdtemp(prefix='manus-tests-')
+for name, path in (('LOG_FILE', 'manus_platform.log'), ('PROMETHEUS_MULTIPROC_DIR', 'metrics'),
+                   ('UPLOAD_FOLDER', 'uploads'), ('WORKSPACE_FOLDER', 'workspace'),
+                   ('SUMMARY_CACHE_PATH', 'summaries.db'), ('QUEUE_DB_PATH', 'analysis_queue.db'),
+                   ('ADMISSION_STATE_PATH', 'admission.json'), ('WORKSPACE_STATE_PATH', 'workspaces.json')):
+    os.environ.setdefault(name, os.path.join(SCRATCH, path))
+os.makedirs(os.environ['PROMETHEUS_MULTIPROC_DIR'], exist_ok=True)
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
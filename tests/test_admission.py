@@ -0,0 +1,79 @@
+import os
+import threading
+import multiprocessing
+
+import pytest
+
+from admission import AdmissionController, AdmissionRejected, HostLedger
+
+
+@pytest.fixture
+def ledger_path(tmp_path):
+    return str(tmp_path / 'admission.json')
+
+
+def controller(ledger_path, **kwargs):
+    kwargs.setdefault('worker_uploads', 2)
+    kwargs.setdefault('host_uploads', 2)
+    kwargs.setdefault('extraction_bytes', 100)
+    kwargs.setdefault('queue_size', 0)
+    kwargs.setdefault('queue_timeout', 0)
+    return AdmissionController(ledger_path, **kwargs)
+
+
+def test_host_limit_is_shared_by_workers(ledger_path):
+    first, second = controller(ledger_path), controller(ledger_path)
+    tickets = [first.admit_upload(), second.admit_upload()]
+    with pytest.raises(AdmissionRejected) as rejected:
+        second.admit_upload()
+    assert (rejected.value.status, rejected.value.error_code) == (429, 'TOO_MANY_UPLOADS')
+    # The rejected upload gave its worker slot back
+    assert second.stats()['uploads'] == 1
+
+    tickets[0].release()
+    tickets[0].release()
+    assert first.stats()['host_uploads'] == 1
+    second.admit_upload().release()
+    tickets[1].release()
+
+
+def test_busy_worker_queues_briefly(ledger_path):
+    admission = controller(ledger_path, worker_uploads=1, queue_size=1, queue_timeout=5)
+    ticket = admission.admit_upload()
+    threading.Timer(0.05, ticket.release).start()
+    # Waits for the slot instead of being turned away
+    admission.admit_upload().release()
+
+    busy = controller(ledger_path, worker_uploads=1, queue_size=1, queue_timeout=0.05)
+    held = busy.admit_upload()
+    with pytest.raises(AdmissionRejected):
+        busy.admit_upload()
+    held.release()
+    assert busy.stats()['rejected'] == 1
+
+
+def test_reservations_of_dead_processes_are_dropped(ledger_path):
+    def reserve_and_crash():
+        HostLedger(ledger_path).reserve('upload', 1, 10)
+        os._exit(0)
+
+    process = multiprocessing.get_context('fork').Process(target=reserve_and_crash)
+    process.start()
+    process.join(10)
+    assert process.exitcode == 0
+    assert HostLedger(ledger_path).totals() == {}
+
+
+def test_extraction_budget(ledger_path):
+    admission = controller(ledger_path)
+    other = controller(ledger_path)
+    with admission.extraction(80):
+        assert other.stats()['host_extraction_bytes'] == 80
+        with pytest.raises(AdmissionRejected) as rejected:
+            with other.extraction(40, timeout=0.1):
+                pass
+        assert (rejected.value.status, rejected.value.error_code) == (503, 'EXTRACTION_BUSY')
+    # An archive larger than the whole budget still runs on its own
+    with other.extraction(500):
+        assert other.stats()['extraction_bytes'] == 500
+    assert admission.stats()['host_extraction_bytes'] == 0
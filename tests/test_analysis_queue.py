@@ -0,0 +1,133 @@
+import time
+
+import pytest
+
+from analysis_queue import DurableAnalysisQueue
+from config import Config
+
+
+@pytest.fixture
+def queue(tmp_path, monkeypatch):
+    monkeypatch.setattr(Config, 'QUEUE_LEASE_SECONDS', 30)
+    monkeypatch.setattr(Config, 'QUEUE_MAX_ATTEMPTS', 3)
+    return DurableAnalysisQueue(str(tmp_path / 'queue.db'))
+
+
+def expire_lease(queue, job_id):
+    queue._connection().execute("UPDATE analysis_jobs SET lease_expires = ? WHERE id = ?",
+                                (time.time() - 1, job_id))
+
+
+def test_claim_in_priority_order(queue):
+    low = queue.enqueue('s1', {'n': 1}, 'low')
+    high = queue.enqueue('s2', {'n': 2}, 'high')
+    assert queue.claim('w1')[:3] == (high, 's2', {'n': 2})
+    assert queue.claim('w1')[0] == low
+    assert queue.claim('w1') is None
+
+
+def test_newer_job_supersedes_queued_one(queue):
+    old = queue.enqueue('s', {})
+    new = queue.enqueue('s', {})
+    assert queue.get(old)['status'] == 'failed'
+    assert queue.claim('w1')[0] == new
+
+
+def test_lease_holder_heartbeats_and_completes(queue):
+    job_id = queue.enqueue('s', {})
+    queue.claim('w1')
+    assert queue.heartbeat(job_id, 'w1', '{"summary": "pa')
+    assert not queue.heartbeat(job_id, 'w2')
+    assert queue.read_partial(job_id, 12) == ('running', '"pa', 1)
+    assert queue.complete(job_id, 'w1', {'summary': 'done'})
+    job = queue.get(job_id)
+    assert (job['status'], job['result']) == ('completed', {'summary': 'done'})
+
+
+def test_heartbeats_append_partial_text(queue):
+    job_id = queue.enqueue('s', {})
+    queue.claim('w1')
+    assert queue.heartbeat(job_id, 'w1', '{"summary": ', 0)
+    assert queue.heartbeat(job_id, 'w1', '"part', 12)
+    # A retried heartbeat rewrites from its offset instead of appending twice
+    assert queue.heartbeat(job_id, 'w1', '"partial"', 12)
+    assert queue.heartbeat(job_id, 'w1', '', 21)
+    assert queue.read_partial(job_id, 0) == ('running', '{"summary": "partial"', 1)
+
+
+def test_expired_lease_is_claimed_again(queue):
+    job_id = queue.enqueue('s', {'task': 't'})
+    queue.claim('w1')
+    queue.heartbeat(job_id, 'w1', 'stale progress')
+    # A live lease is not handed out twice
+    assert queue.claim('w2') is None
+
+    expire_lease(queue, job_id)
+    assert queue.claim('w2')[:3] == (job_id, 's', {'task': 't'})
+    assert queue.read_partial(job_id, 0) == ('running', '', 2)
+
+    # The first worker lost the job: its heartbeat and result are ignored
+    assert not queue.heartbeat(job_id, 'w1')
+    assert not queue.complete(job_id, 'w1', {'summary': 'late'})
+    assert queue.complete(job_id, 'w2', {'summary': 'ok'})
+    assert queue.get(job_id)['result'] == {'summary': 'ok'}
+
+
+def test_job_fails_after_max_attempts(queue):
+    job_id = queue.enqueue('s', {})
+    for attempt in range(Config.QUEUE_MAX_ATTEMPTS):
+        assert queue.claim(f'w{attempt}')[0] == job_id
+        expire_lease(queue, job_id)
+    assert queue.claim('w-last') is None
+    job = queue.get(job_id)
+    assert (job['status'], job['attempts']) == ('failed', Config.QUEUE_MAX_ATTEMPTS)
+
+
+def test_expired_deadline_is_not_run(queue):
+    job_id = queue.enqueue('s', {}, deadline=time.time() - 1)
+    assert queue.claim('w1') is None
+    assert queue.get(job_id)['status'] == 'cancelled'
+
+
+def test_cancel_revokes_the_lease(queue):
+    job_id = queue.enqueue('s', {})
+    queue.claim('w1')
+    assert queue.cancel(job_id)
+    assert not queue.heartbeat(job_id, 'w1')
+    assert not queue.complete(job_id, 'w1', {})
+    assert not queue.cancel(job_id)
+
+
+def test_worker_heartbeats_send_only_new_text(queue, monkeypatch):
+    import asyncio
+    from analysis_worker import AnalysisWorker
+
+    class StreamingService:
+        async def analyze_code_async(self, task_description, project_structure, on_delta, cancel_token):
+            for delta in ('{"summary": ', '"streamed ', 'in parts"}'):
+                on_delta(delta)
+                await asyncio.sleep(0.12)
+            return {'summary': 'streamed in parts'}
+
+    monkeypatch.setattr(Config, 'QUEUE_HEARTBEAT_INTERVAL', 0.05)
+    sent = []
+    heartbeat = queue.heartbeat
+    monkeypatch.setattr(queue, 'heartbeat', lambda *args: sent.append(args[2:]) or heartbeat(*args))
+    worker = AnalysisWorker(queue, concurrency=1)
+    worker.openai_service = StreamingService()
+    job_id = queue.enqueue('s', {'task_description': 'review', 'project_structure': {}})
+    claimed = queue.claim('w1')
+
+    loop = asyncio.new_event_loop()
+    try:
+        worker._run_job(loop, 'w1', *claimed)
+    finally:
+        loop.close()
+
+    assert queue.read_partial(job_id, 0) == ('completed', '{"summary": "streamed in parts"}', 1)
+    # Each heartbeat carries only the text added since the previous one
+    offset = 0
+    for appended, at in sent:
+        assert at == offset
+        offset += len(appended)
+    assert ''.join(appended for appended, at in sent) == '{"summary": "streamed in parts"}'
@@ -0,0 +1,80 @@
+import json
+import threading
+
+from analysis_stream import AnalysisStream, AnalysisStreamRegistry
+
+
+def parse_frames(chunks):
+    """SSE frames as (id, event, data) tuples, skipping retry lines and heartbeats"""
+    frames = []
+    for block in "".join(chunks).split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.splitlines() if not line.startswith((':', 'retry')))
+        if 'data' in fields:
+            frames.append((fields.get('id'), fields.get('event'), json.loads(fields['data'])))
+    return frames
+
+
+def test_every_subscriber_gets_every_delta():
+    stream = AnalysisStream('s')
+    received = {name: [] for name in ('a', 'b', 'c')}
+
+    def subscribe(name):
+        received[name] = list(stream.iter_sse(heartbeat_interval=0.05, max_duration=5))
+
+    threads = [threading.Thread(target=subscribe, args=(name,)) for name in received]
+    for thread in threads:
+        thread.start()
+    for delta in ('{"summary": ', '"fan', ' out"}'):
+        stream.publish_delta(delta)
+    stream.finish('completed', {'summary': 'fan out'})
+    for thread in threads:
+        thread.join(5)
+
+    for chunks in received.values():
+        frames = parse_frames(chunks)
+        text = "".join(data['text'] for _, event, data in frames if event == 'delta')
+        assert text == '{"summary": "fan out"}'
+        assert ('field', {'field': 'summary', 'value': 'fan out'}) in [(e, d) for _, e, d in frames]
+        assert frames[-1][1:] == ('done', {'analysis_status': 'completed', 'result': {'summary': 'fan out'}})
+
+
+def test_resume_from_last_event_id():
+    stream = AnalysisStream('s')
+    stream.publish_delta('one ')
+    first = parse_frames(list(stream.iter_sse(heartbeat_interval=0.01, max_duration=0.05)))
+    last_id = first[-1][0]
+
+    stream.publish_delta('two')
+    stream.finish('completed')
+    resumed = parse_frames(list(stream.iter_sse(last_event_id=last_id, max_duration=5)))
+    assert [(event, data.get('text')) for _, event, data in resumed] == [('delta', 'two'), ('done', None)]
+
+
+def test_unknown_run_id_replays_from_the_start():
+    stream = AnalysisStream('s')
+    stream.publish_delta('abc')
+    stream.finish('completed')
+    frames = parse_frames(list(stream.iter_sse(last_event_id='otherrun-1', max_duration=5)))
+    assert frames[0][1:] == ('delta', {'text': 'abc'})
+
+
+def test_subscriber_behind_the_window_gets_a_snapshot():
+    stream = AnalysisStream('s', buffer_size=4)
+    for index in range(10):
+        stream.publish_delta(str(index))
+    events = stream.read(0, timeout=0)
+    assert [event['event'] for event in events] == ['snapshot']
+    assert events[0]['data']['text'] == '0123456789'
+    assert events[0]['id'] == stream.last_seq
+
+
+def test_registry_replaces_and_cancels_runs():
+    registry = AnalysisStreamRegistry()
+    first, created = registry.get_or_start('s', 'job-1')
+    assert created and registry.get_or_start('s', 'job-1') == (first, False)
+    second, created = registry.get_or_start('s', 'job-2')
+    assert created and second is not first
+
+    registry.remove('s')
+    assert registry.get('s') is None
+    assert second.final_event['data']['analysis_status'] == 'cancelled'
@@ -0,0 +1,66 @@
+import asyncio
+import logging
+
+import pytest
+
+import asgi
+from analysis_stream import AnalysisStream
+
+
+@pytest.fixture
+def stream(monkeypatch):
+    stream = AnalysisStream('session-1')
+    monkeypatch.setattr(asgi, 'refresh_analysis_state', lambda session_id: {'analysis_status': 'running'})
+    monkeypatch.setattr(asgi, 'find_analysis_stream', lambda session_id, session_data: stream)
+    return stream
+
+
+def run_stream(stream, client):
+    """Serve /api/stream/session-1 to client(receive_queue, sent) and return the messages sent"""
+    sent = []
+
+    async def main():
+        incoming = asyncio.Queue()
+        scope = {'type': 'http', 'method': 'GET', 'path': '/api/stream/session-1', 'headers': [],
+                 'query_string': b''}
+
+        async def send(message):
+            sent.append(message)
+
+        route = asyncio.ensure_future(asgi.application(scope, incoming.get, send))
+        await client(incoming, sent)
+        await asyncio.wait_for(route, 5)
+
+    asyncio.run(main())
+    return sent
+
+
+def body(sent):
+    return b''.join(m.get('body', b'') for m in sent if m['type'] == 'http.response.body').decode()
+
+
+def test_stream_until_finished(stream):
+    async def client(incoming, sent):
+        await asyncio.sleep(0.05)
+        stream.publish_delta('{"summary": "ok"}')
+        stream.finish('completed', {'summary': 'ok'})
+
+    sent = run_stream(stream, client)
+    assert sent[0]['status'] == 200
+    assert 'event: done' in body(sent)
+    assert sent[-1] == {'type': 'http.response.body', 'body': b''}
+
+
+def test_disconnect_mid_stream(stream, caplog):
+    async def client(incoming, sent):
+        stream.publish_delta('{"summary": "pa')
+        while 'pa' not in body(sent):
+            await asyncio.sleep(0.01)
+        # Disconnect while the route waits for the next event
+        await incoming.put({'type': 'http.disconnect'})
+
+    with caplog.at_level(logging.ERROR):
+        sent = run_stream(stream, client)
+    assert sent[-1].get('more_body')
+    assert not stream.async_waiters
+    assert not [r for r in caplog.records if r.exc_info]
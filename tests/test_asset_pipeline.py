@@ -0,0 +1,87 @@
+import os
+import gzip
+import json
+import shutil
+import subprocess
+
+import pytest
+from werkzeug.datastructures import Accept
+
+import app as app_module
+from asset_pipeline import ASSETS, STATIC_FOLDER, AssetManifest, build, minify_css, minify_js
+
+CSS = "/* theme */\nbody {\n  color: red;\n  content: \"a  ;  b\";\n}\n" * 20
+JS = "// setup\nconst re = /a  b/g;\nfunction greet(name) {\n  return `hi  ${name}`; /* note */\n}\n" * 20
+
+
+@pytest.fixture
+def static(tmp_path):
+    for logical, text in (('css/manus_style.css', CSS), ('js/manus_app.js', JS)):
+        os.makedirs(tmp_path / os.path.dirname(logical), exist_ok=True)
+        (tmp_path / logical).write_text(text)
+    return tmp_path
+
+
+def test_minifiers_keep_strings_regexes_and_templates():
+    assert minify_css(CSS[:len(CSS) // 20]) == 'body{color:red;content:"a  ;  b"}\n'
+    minified = minify_js(JS[:len(JS) // 20])
+    assert '/a  b/g' in minified and '`hi  ${name}`' in minified
+    assert 'setup' not in minified and 'note' not in minified
+
+
+@pytest.mark.skipif(shutil.which('node') is None, reason='node is not installed')
+def test_minified_app_script_still_parses(tmp_path):
+    with open(os.path.join(STATIC_FOLDER, 'js/manus_app.js')) as f:
+        (tmp_path / 'app.js').write_text(minify_js(f.read()))
+    subprocess.run(['node', '--check', str(tmp_path / 'app.js')], check=True)
+
+
+def test_build_writes_fingerprinted_and_compressed_files(static):
+    manifest = build(str(static), ASSETS)
+    dist = static / 'dist'
+    assert json.loads((dist / 'manifest.json').read_text()) == manifest
+
+    for logical in ASSETS:
+        hashed = manifest['assets'][logical]['path']
+        root, extension = os.path.splitext(logical)
+        assert hashed.startswith(root + '.') and hashed.endswith(extension)
+        data = (dist / hashed).read_bytes()
+        assert gzip.decompress((dist / (hashed + '.gz')).read_bytes()) == data
+        assert (dist / (hashed + '.br')).exists()
+        assert manifest['files'][hashed]['encodings'] == ['br', 'gzip']
+
+    # Same sources, same names; a changed source gets a new one
+    assert build(str(static), ASSETS)['assets'] == manifest['assets']
+    (static / 'css/manus_style.css').write_text(CSS + 'p { margin: 0 }\n')
+    assert build(str(static), ASSETS)['assets']['css/manus_style.css'] != manifest['assets']['css/manus_style.css']
+
+
+def test_manifest_ignores_assets_changed_since_the_build(static):
+    manifest = build(str(static), ASSETS)
+    (static / 'js/manus_app.js').write_text(JS + 'greet("again");\n')
+    assets = AssetManifest(str(static))
+    assert assets.lookup('js/manus_app.js') is None
+    assert assets.lookup('css/manus_style.css') == manifest['assets']['css/manus_style.css']['path']
+
+
+def test_negotiate_prefers_brotli(static):
+    build(str(static), ASSETS)
+    assets = AssetManifest(str(static))
+    hashed = assets.lookup('css/manus_style.css')
+    assert assets.negotiate(hashed, Accept([('gzip', 1), ('br', 1)])) == (hashed + '.br', 'br')
+    assert assets.negotiate(hashed, Accept([('gzip', 1)])) == (hashed + '.gz', 'gzip')
+    assert assets.negotiate(hashed, Accept([])) == (hashed, None)
+    assert assets.negotiate('css/unknown.css', Accept([])) is None
+
+
+def test_assets_are_served_immutable(static, monkeypatch):
+    build(str(static), ASSETS)
+    monkeypatch.setattr(app_module, 'asset_manifest', AssetManifest(str(static)))
+    hashed = app_module.asset_manifest.lookup('js/manus_app.js')
+    response = app_module.app.test_client().get(f'/assets/{hashed}', headers={'Accept-Encoding': 'gzip'})
+    assert response.status_code == 200
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert response.headers['Vary'] == 'Accept-Encoding'
+    assert 'immutable' in response.headers['Cache-Control']
+    assert response.mimetype in ('text/javascript', 'application/javascript')
+    assert gzip.decompress(response.get_data()) == (static / 'dist' / hashed).read_bytes()
@@ -0,0 +1,66 @@
+import time
+import asyncio
+import threading
+
+import pytest
+
+from cancellation import AnalysisCancelled, CancelToken
+
+
+def test_deadline_cancels_the_token():
+    token = CancelToken.with_timeout(0.05)
+    assert not token.cancelled and 0 < token.remaining() <= 0.05
+    time.sleep(0.06)
+    with pytest.raises(AnalysisCancelled) as raised:
+        token.check()
+    assert raised.value.reason == 'deadline exceeded'
+    assert token.remaining() == 0
+
+
+def test_callbacks_run_once_and_can_be_removed():
+    token = CancelToken()
+    calls = []
+    token.add_callback(calls.append)
+    unregister = token.add_callback(lambda reason: calls.append('removed'))
+    unregister()
+    token.cancel('first')
+    token.cancel('second')
+    assert calls == ['first'] and token.reason == 'first'
+
+    # Registered after the fact: runs immediately
+    token.add_callback(calls.append)
+    assert calls == ['first', 'first']
+
+
+def test_run_aborts_the_awaitable_on_cancel_from_another_thread():
+    token = CancelToken()
+    cancelled = []
+
+    async def upstream():
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+
+    async def main():
+        threading.Timer(0.05, token.cancel, args=('client went away',)).start()
+        with pytest.raises(AnalysisCancelled) as raised:
+            await token.run(upstream())
+        return raised.value.reason
+
+    assert asyncio.run(main()) == 'client went away'
+    assert cancelled == [True]
+
+
+def test_run_stops_at_the_deadline():
+    token = CancelToken.with_timeout(0.05)
+
+    async def main():
+        await token.run(asyncio.sleep(10))
+
+    start = time.monotonic()
+    with pytest.raises(AnalysisCancelled, match='deadline exceeded'):
+        asyncio.run(main())
+    assert time.monotonic() - start < 1
+    assert token.cancelled
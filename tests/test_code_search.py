@@ -0,0 +1,82 @@
+import pytest
+
+from code_search import QueryError, TrigramIndex, query_trigrams, trigrams
+
+FILES = {
+    'a/alpha.py': b'def parse_header(line):\n    return line.split(":")\n',
+    'a/beta.py': b'def render(template):\n    return Template(template).render()\n',
+    'b/gamma.py': b'ERROR_CODE = 404\nprint("Parse failed", ERROR_CODE)\n',
+    'b/delta.py': b'x = 1\n' * 10 + b'value = parse_header(raw)\n',
+}
+
+
+@pytest.fixture
+def index():
+    index = TrigramIndex()
+    for path, data in FILES.items():
+        index.add_document(path, data, (len(data), 0))
+    return index
+
+
+def search(index, pattern, **kwargs):
+    return index.search(pattern, FILES.__getitem__, **kwargs)
+
+
+def test_trigrams_are_case_folded():
+    assert trigrams(b'AbCd') == {(97, 98, 99), (98, 99, 100)}
+
+
+def test_literal_search_only_reads_candidates(index):
+    page = search(index, 'parse_header')
+    assert [r['path'] for r in page['results']] == ['a/alpha.py', 'b/delta.py']
+    assert page['filtered'] and page['candidates'] == 2
+    match = page['results'][1]['matches'][0]
+    assert match['line'] == 11
+    assert match['text'][slice(*match['ranges'][0])] == 'parse_header'
+
+
+def test_literal_search_is_case_insensitive_by_default(index):
+    assert [r['path'] for r in search(index, 'PARSE')['results']] == ['a/alpha.py', 'b/delta.py', 'b/gamma.py']
+    assert [r['path'] for r in search(index, 'Parse', case_sensitive=True)['results']] == ['b/gamma.py']
+
+
+def test_regex_alternation_filters_on_each_branch(index):
+    page = search(index, r'(render|ERROR_\w+)\(?', regex=True)
+    assert page['filtered']
+    assert page['candidates'] == 2
+    assert [r['path'] for r in page['results']] == ['a/beta.py', 'b/gamma.py']
+
+
+def test_regex_without_literal_scans_every_file(index):
+    assert query_trigrams(r'\d\d\d', regex=True) is None
+    page = search(index, r'\d\d\d', regex=True)
+    assert not page['filtered']
+    assert page['candidates'] == len(FILES)
+    assert [r['path'] for r in page['results']] == ['b/gamma.py']
+
+
+def test_pages_resume_from_cursor(index):
+    first = search(index, 'return', limit=1)
+    assert [r['path'] for r in first['results']] == ['a/alpha.py']
+    second = search(index, 'return', limit=1, cursor=first['next_cursor'])
+    assert [r['path'] for r in second['results']] == ['a/beta.py']
+    assert second['next_cursor'] is None
+
+
+def test_more_matches_flag(index):
+    result = search(index, 'x = 1', max_matches=3)['results'][0]
+    assert len(result['matches']) == 3 and result['more_matches']
+
+
+def test_invalid_queries(index):
+    with pytest.raises(QueryError):
+        search(index, '(unclosed', regex=True)
+    with pytest.raises(QueryError):
+        search(index, 'a*', regex=True)
+
+
+def test_binary_and_removed_files_are_not_candidates(index):
+    assert not index.add_document('b/gamma.py', b'\0ERROR_CODE')
+    index.remove_document('a/alpha.py')
+    assert search(index, 'ERROR_CODE')['results'] == []
+    assert [r['path'] for r in search(index, 'parse_header')['results']] == ['b/delta.py']
@@ -0,0 +1,147 @@
+import time
+import threading
+
+import pytest
+
+from cancellation import AnalysisCancelled, CancelToken
+from job_scheduler import JobScheduler, SchedulerFull
+
+TIMEOUT = 5
+
+
+@pytest.fixture
+def make_scheduler():
+    schedulers = []
+
+    def make(**kwargs):
+        kwargs.setdefault('max_workers', 1)
+        kwargs.setdefault('per_session_limit', 1)
+        kwargs.setdefault('overflow_policy', 'reject')
+        scheduler = JobScheduler(**kwargs)
+        schedulers.append(scheduler)
+        return scheduler
+
+    yield make
+    for scheduler in schedulers:
+        scheduler.drain(timeout=1)
+
+
+def occupy(scheduler, session_id='busy', priority='high'):
+    """Submit a job that holds a worker until the returned event is set"""
+    started, release = threading.Event(), threading.Event()
+
+    def block():
+        started.set()
+        release.wait(TIMEOUT)
+
+    scheduler.submit(session_id, block, priority)
+    assert started.wait(TIMEOUT)
+    return release
+
+
+def test_higher_priority_runs_first(make_scheduler):
+    scheduler = make_scheduler()
+    release = occupy(scheduler)
+    order, done = [], threading.Event()
+    for session_id, priority in (('low', 'low'), ('normal', 'normal'), ('high', 'high')):
+        scheduler.submit(session_id, lambda s=session_id: order.append(s) or (len(order) == 3 and done.set()),
+                         priority)
+    release.set()
+    assert done.wait(TIMEOUT)
+    assert order == ['high', 'normal', 'low']
+
+
+def test_busy_session_does_not_hold_up_others(make_scheduler):
+    scheduler = make_scheduler(max_workers=2)
+    release = occupy(scheduler, 'a')
+    other_ran = threading.Event()
+    waiting = scheduler.submit('a', lambda: None)
+    scheduler.submit('b', other_ran.set)
+    # Session a is at its limit, so the free worker takes session b's job
+    assert other_ran.wait(TIMEOUT)
+    assert waiting.status == 'queued'
+    release.set()
+
+
+def test_newer_job_supersedes_queued_one(make_scheduler):
+    scheduler = make_scheduler()
+    release = occupy(scheduler)
+    discarded = []
+    old = scheduler.submit('s', lambda: None, on_discard=lambda job, reason: discarded.append((job, reason)))
+    scheduler.submit('s', lambda: None)
+    assert discarded == [(old, 'superseded')]
+    assert scheduler.stats()['queued'] == 1
+    release.set()
+
+
+def test_full_queue_rejects(make_scheduler):
+    scheduler = make_scheduler(max_queue=1)
+    release = occupy(scheduler)
+    scheduler.submit('s1', lambda: None)
+    with pytest.raises(SchedulerFull):
+        scheduler.submit('s2', lambda: None, 'high')
+    assert scheduler.stats()['rejected'] == 1
+    release.set()
+
+
+def test_full_queue_sheds_oldest_lower_priority_job(make_scheduler):
+    scheduler = make_scheduler(max_queue=2, overflow_policy='shed')
+    release = occupy(scheduler)
+    discarded = []
+    on_discard = lambda job, reason: discarded.append((job, reason))
+    oldest = scheduler.submit('s1', lambda: None, 'low', on_discard=on_discard)
+    scheduler.submit('s2', lambda: None, 'low', on_discard=on_discard)
+
+    scheduler.submit('s3', lambda: None, 'normal')
+    assert discarded == [(oldest, 'shed')]
+    assert oldest.status == 'shed'
+
+    # Nothing of lower priority is left to shed for another low job
+    with pytest.raises(SchedulerFull):
+        scheduler.submit('s4', lambda: None, 'low')
+    assert scheduler.stats()['shed'] == 1
+    release.set()
+
+
+def test_cancel_queued_job(make_scheduler):
+    scheduler = make_scheduler()
+    release = occupy(scheduler)
+    discarded = []
+    job = scheduler.submit('s', lambda: None, on_discard=lambda job, reason: discarded.append(reason))
+    assert scheduler.cancel(job)
+    assert discarded == ['cancelled']
+    assert job.cancel_token.cancelled
+    assert not scheduler.cancel(job)
+    release.set()
+
+
+def test_job_past_its_deadline_is_never_started(make_scheduler):
+    scheduler = make_scheduler()
+    release = occupy(scheduler)
+    ran, discarded = [], []
+    job = scheduler.submit('s', lambda: ran.append(True), cancel_token=CancelToken.with_timeout(0.01),
+                           on_discard=lambda job, reason: discarded.append(reason))
+    time.sleep(0.02)
+    release.set()
+    scheduler.drain(timeout=TIMEOUT)
+    assert (ran, discarded, job.status) == ([], ['cancelled'], 'cancelled')
+    assert scheduler.stats()['cancelled'] == 1
+
+
+def test_cancel_running_job_frees_its_slot(make_scheduler):
+    scheduler = make_scheduler()
+    started, token = threading.Event(), CancelToken()
+
+    def run_until_cancelled():
+        started.set()
+        while not token.cancelled:
+            time.sleep(0.01)
+        raise AnalysisCancelled(token.reason)
+
+    job = scheduler.submit('s', run_until_cancelled, cancel_token=token)
+    assert started.wait(TIMEOUT)
+    assert scheduler.cancel(job, 'user cancelled')
+    next_ran = threading.Event()
+    scheduler.submit('s', next_ran.set)
+    assert next_ran.wait(TIMEOUT)
+    assert job.status == 'cancelled'
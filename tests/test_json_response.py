@@ -0,0 +1,75 @@
+import gzip
+import json
+import datetime
+
+import pytest
+from flask import Response
+from werkzeug.datastructures import Accept
+
+import app as app_module
+from config import Config
+from json_response import ENCODINGS, compress_response, dumps, iter_json, stream_jsonify
+
+PAYLOAD = {
+    'session_id': 'abc',
+    'project_structure': {
+        'files': [{'path': f'src/file_{n}.py', 'size': n} for n in range(1200)],
+        'content': {f'src/file_{n}.py': f'print({n})\n' for n in range(900)},
+        'total_files': 1200,
+    },
+    'empty': {},
+}
+
+
+@pytest.mark.parametrize('chunk_items, min_items', [(7, 7), (100, 50), (5000, 5000)])
+def test_streamed_encoding_matches_plain_json(chunk_items, min_items):
+    encoded = b''.join(iter_json(PAYLOAD, chunk_items, min_items))
+    assert json.loads(encoded) == PAYLOAD
+
+
+def test_dumps_handles_dates_and_non_string_keys():
+    value = {1: datetime.datetime(2024, 1, 2, 3, 4, 5, tzinfo=datetime.timezone.utc), 'text': 'ü'}
+    assert json.loads(dumps(value)) == {'1': 'Tue, 02 Jan 2024 03:04:05 GMT', 'text': 'ü'}
+
+
+def test_large_payloads_are_streamed(monkeypatch):
+    monkeypatch.setattr(Config, 'JSON_STREAM_MIN_ITEMS', 1000)
+    with app_module.app.app_context():
+        streamed = stream_jsonify(PAYLOAD)
+        small = stream_jsonify({'status': 'ok'})
+    assert streamed.is_streamed and not small.is_streamed
+    assert json.loads(b''.join(streamed.response)) == PAYLOAD
+
+
+def json_response(size):
+    return Response(json.dumps({'data': 'x' * size}), mimetype='application/json')
+
+
+def test_gzip_above_the_threshold_only():
+    response = compress_response(json_response(5000), Accept([('gzip', 1)]))
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert json.loads(gzip.decompress(response.get_data()))['data'] == 'x' * 5000
+    assert 'Accept-Encoding' in response.vary
+
+    small = compress_response(json_response(10), Accept([('gzip', 1)]))
+    assert 'Content-Encoding' not in small.headers
+
+
+def test_client_preference_decides_the_coding():
+    assert 'Content-Encoding' not in compress_response(json_response(5000), Accept([])).headers
+    if 'zstd' in ENCODINGS:
+        preferred = compress_response(json_response(5000), Accept([('gzip', 0.5), ('zstd', 1)]))
+        assert preferred.headers['Content-Encoding'] == 'zstd'
+    refused = compress_response(json_response(5000), Accept([('gzip', 1), ('zstd', 0)]))
+    assert refused.headers['Content-Encoding'] == 'gzip'
+
+
+def test_streamed_bodies_are_compressed_but_events_are_not():
+    streamed = Response(iter([b'[', b'1,' * 2000, b'1]']), mimetype='application/json')
+    streamed.headers['Content-Length'] = '4003'
+    streamed = compress_response(streamed, Accept([('gzip', 1)]))
+    assert 'Content-Length' not in streamed.headers
+    assert len(json.loads(gzip.decompress(b''.join(streamed.response)))) == 2001
+
+    events = Response(iter([b'data: {}\n\n' * 500]), mimetype='text/event-stream')
+    assert 'Content-Encoding' not in compress_response(events, Accept([('gzip', 1)])).headers
@@ -0,0 +1,72 @@
+import json
+import random
+
+from json_stream import IncrementalJSONParser, parse_json_tolerant
+
+DOCUMENT = {
+    'summary': 'Handles "quoted" text, escapes \\ and braces { } [ ]',
+    'recommendations': [
+        {'title': 'Cache lookups', 'details': {'impact': 'high', 'files': ['a.py', 'b.py']}},
+        {'title': 'Batch writes', 'details': {'impact': 'low', 'files': []}},
+    ],
+    'code_changes': [{'file': 'app.py', 'diff': '- x\n+ y'}],
+    'confidence': 0.8,
+    'done': True,
+}
+
+
+def feed_all(text, sizes):
+    parser = IncrementalJSONParser()
+    events, pos = [], 0
+    for size in sizes:
+        events.extend(parser.feed(text[pos:pos + size]))
+        pos += size
+    events.extend(parser.feed(text[pos:]))
+    return events, parser.close()
+
+
+def test_fields_and_items_in_order():
+    events, result = feed_all("```json\n" + json.dumps(DOCUMENT, indent=2) + "\n```", [])
+    assert result == DOCUMENT
+    assert [e for e in events if e[0] == 'item'] == [
+        ('item', 'recommendations', 0, DOCUMENT['recommendations'][0]),
+        ('item', 'recommendations', 1, DOCUMENT['recommendations'][1]),
+        ('item', 'code_changes', 0, DOCUMENT['code_changes'][0]),
+    ]
+    assert [(e[1], e[3]) for e in events if e[0] == 'field'] == list(DOCUMENT.items())
+
+
+def test_chunking_does_not_change_events():
+    text = json.dumps(DOCUMENT)
+    expected, _ = feed_all(text, [])
+    rng = random.Random(7)
+    for _ in range(50):
+        sizes = [rng.randint(1, 12) for _ in range(len(text))]
+        events, result = feed_all(text, sizes)
+        assert events == expected
+        assert result == DOCUMENT
+
+
+def test_trailing_commas_are_tolerated():
+    assert parse_json_tolerant('{"a": [1, 2,], "b": {"c": 3,},}') == {'a': [1, 2], 'b': {'c': 3}}
+
+
+def test_truncated_string_value_is_kept():
+    assert parse_json_tolerant('{"summary": "Partial sent') == {'summary': 'Partial sent'}
+
+
+def test_truncated_document_is_cut_at_last_complete_value():
+    result = parse_json_tolerant('{"summary": "ok", "recommendations": [{"title": "a"}, {"title": "b", "det')
+    assert result['summary'] == 'ok'
+    assert result['recommendations'][0] == {'title': 'a'}
+
+
+def test_text_after_root_is_ignored():
+    parser = IncrementalJSONParser()
+    parser.feed('{"a": 1}')
+    assert parser.feed(' and some trailing prose {"b": 2}') == []
+    assert parser.close() == {'a': 1}
+
+
+def test_no_object():
+    assert parse_json_tolerant('no json here') is None
@@ -0,0 +1,77 @@
+import os
+import json
+import logging
+import threading
+
+import pytest
+
+from log_pipeline import LogPipeline, bind_request_id, reset_request_id
+
+
+@pytest.fixture
+def make_pipeline(tmp_path):
+    def make(name):
+        pipeline = LogPipeline(logging.INFO, str(tmp_path / 'app.log'), 1024 * 1024, 2, 100, console=False)
+        logger = logging.getLogger(f'tests.log_pipeline.{name}')
+        logger.handlers = [pipeline.handler]
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+        return pipeline, logger
+
+    return make
+
+
+def read_log(tmp_path):
+    with open(tmp_path / 'app.log') as f:
+        return [json.loads(line) for line in f]
+
+
+def test_unstarted_process_writes_without_threads(make_pipeline, tmp_path):
+    before = set(threading.enumerate())
+    pipeline, logger = make_pipeline('direct')
+    token = bind_request_id('req-1')
+    try:
+        logger.info("Extracted %s files", 3, extra={'archive': 'a.zip'})
+    finally:
+        reset_request_id(token)
+    assert set(threading.enumerate()) == before
+    assert pipeline.writer_pid is None
+    [entry] = read_log(tmp_path)
+    assert (entry['message'], entry['request_id'], entry['archive']) == ('Extracted 3 files', 'req-1', 'a.zip')
+
+
+def test_one_writer_for_several_pipelines(make_pipeline, tmp_path):
+    writer, writer_logger = make_pipeline('writer')
+    writer.start()
+    sender, sender_logger = make_pipeline('sender')
+    sender.start()
+    # Both stand for election; only the first holds the lock
+    assert writer.writer_pid == os.getpid() and sender.writer_pid is None
+
+    writer_logger.info("from the writer")
+    sender_logger.info("from a sender")
+    sender.flush()
+    writer.flush()
+    assert sorted(entry['message'] for entry in read_log(tmp_path)) == ['from a sender', 'from the writer']
+
+
+def test_unstarted_process_sends_to_the_writer(make_pipeline, tmp_path):
+    writer, _ = make_pipeline('writer')
+    writer.start()
+    direct, logger = make_pipeline('direct')
+    logger.warning("sent on the calling thread")
+    writer.flush()
+    assert [entry['message'] for entry in read_log(tmp_path)] == ['sent on the calling thread']
+
+
+def test_forked_child_of_unstarted_process_logs(make_pipeline, tmp_path):
+    pipeline, logger = make_pipeline('fork')
+    logger.info("parent")
+    pid = os.fork()
+    if pid == 0:
+        try:
+            logger.info("child")
+        finally:
+            os._exit(0)
+    os.waitpid(pid, 0)
+    assert [entry['message'] for entry in read_log(tmp_path)] == ['parent', 'child']
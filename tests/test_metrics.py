@@ -0,0 +1,55 @@
+import re
+import multiprocessing
+
+import app as app_module
+from metrics import ACTIVE_SESSIONS, CACHE_LOOKUPS, UPLOAD_SECONDS, mark_process_dead, render_metrics, timed
+
+
+def sample(name, labels=''):
+    """Value of one sample in the aggregated exposition (0 when absent)"""
+    match = re.search(rf'^{re.escape(name + labels)} (\S+)$', render_metrics().decode(), re.M)
+    return float(match.group(1)) if match else 0.0
+
+
+def in_child(target):
+    process = multiprocessing.get_context('fork').Process(target=target)
+    process.start()
+    process.join(10)
+    assert process.exitcode == 0
+    return process.pid
+
+
+def test_counters_are_summed_across_processes():
+    labels = '{cache="test",result="hit"}'
+    before = sample('manus_cache_lookups_total', labels)
+    CACHE_LOOKUPS.labels('test', 'hit').inc()
+    in_child(lambda: CACHE_LOOKUPS.labels('test', 'hit').inc(2))
+    assert sample('manus_cache_lookups_total', labels) == before + 3
+
+
+def test_live_gauges_of_dead_workers_are_dropped():
+    def hold_sessions():
+        ACTIVE_SESSIONS.inc(5)
+
+    before = sample('manus_active_sessions')
+    pid = in_child(hold_sessions)
+    assert sample('manus_active_sessions') == before + 5
+    mark_process_dead(pid)
+    assert sample('manus_active_sessions') == before
+
+
+def test_timed_observes_the_block():
+    before = sample('manus_upload_duration_seconds_count')
+    with timed(UPLOAD_SECONDS):
+        pass
+    assert sample('manus_upload_duration_seconds_count') == before + 1
+
+
+def test_metrics_endpoint_reports_requests():
+    client = app_module.app.test_client()
+    client.get('/api/health')
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    assert response.mimetype == 'text/plain'
+    body = response.get_data(as_text=True)
+    assert re.search(r'manus_http_request_duration_seconds_count\{[^}]*method="GET"[^}]*status="200"', body)
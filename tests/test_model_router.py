@@ -0,0 +1,132 @@
+import asyncio
+import contextvars
+from types import SimpleNamespace
+
+import pytest
+
+from cancellation import CancelToken
+from config import Config
+from model_router import LatencyHistogram, ModelRouter, classify_task
+from openai_service import OpenAIService
+
+
+@pytest.fixture
+def routing(monkeypatch):
+    for name, value in (('OPENAI_MODEL', 'default'), ('OPENAI_SMALL_MODEL', 'small'),
+                        ('OPENAI_LARGE_MODEL', 'large'), ('OPENAI_TASK_MODELS', 'security_review=careful'),
+                        ('OPENAI_FALLBACK_MODELS', 'backup-a,backup-b'), ('ROUTING_SMALL_CONTEXT', 100),
+                        ('ROUTING_LARGE_CONTEXT', 1000), ('HEDGE_MIN_SAMPLES', 2),
+                        ('HEDGE_DEFAULT_DELAY', 2.0), ('HEDGE_MIN_DELAY', 0.05), ('HEDGE_MAX_DELAY', 10.0)):
+        monkeypatch.setattr(Config, name, value)
+
+
+def test_route_by_context_size_and_task(routing):
+    router = ModelRouter()
+    assert router.candidates(50, 'general_review')[0] == 'small'
+    assert router.candidates(500, 'general_review')[0] == 'default'
+    assert router.candidates(500, classify_task('Review for security holes'))[0] == 'careful'
+    # Large prompts go to the large model whatever the task
+    assert router.candidates(5000, 'security_review')[0] == 'large'
+
+
+def test_fallbacks_ordered_by_observed_latency(routing):
+    router = ModelRouter()
+    assert router.candidates(500, 'general_review') == ['default', 'backup-a', 'backup-b']
+    for _ in range(2):
+        router.record_first_token('backup-b', 0.2)
+        router.record_first_token('backup-a', 3.0)
+    assert router.candidates(50, 'general_review') == ['small', 'backup-b', 'backup-a', 'default']
+
+
+def test_hedge_delay_is_the_clamped_p95(routing):
+    router = ModelRouter()
+    assert router.hedge_delay('default') == 2.0
+    router.record_first_token('default', 0.5)
+    assert router.hedge_delay('default') == 2.0
+    router.record_first_token('default', 0.5)
+    assert 0.5 <= router.hedge_delay('default') <= 0.55
+    for _ in range(40):
+        router.record_first_token('slow', 60)
+    assert router.hedge_delay('slow') == 10.0
+
+
+def test_histogram_quantiles_within_a_bucket():
+    histogram = LatencyHistogram()
+    for value in range(1, 101):
+        histogram.observe(value / 100)
+    assert histogram.quantile(0.5) == pytest.approx(0.5, rel=0.1)
+    assert histogram.quantile(0.99) == pytest.approx(0.99, rel=0.1)
+    assert histogram.snapshot()['count'] == 100
+
+
+class FakeStream:
+    def __init__(self, deltas):
+        self.deltas = list(deltas)
+        self.closed = False
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if not self.deltas:
+            raise StopAsyncIteration
+        return SimpleNamespace(choices=[SimpleNamespace(delta={'content': self.deltas.pop(0)})])
+
+    async def aclose(self):
+        self.closed = True
+
+
+@pytest.fixture
+def service(routing, monkeypatch):
+    """OpenAIService with scripted upstream streams: model -> (seconds to first token, text or exception)"""
+    service = OpenAIService()
+    service._client = SimpleNamespace(aiosession=contextvars.ContextVar('aiosession'))
+    monkeypatch.setattr(service, '_http_session', lambda: None)
+    service.script = {}
+    service.launched = []
+
+    async def open_stream(model, messages, cancel_token, hedge=False):
+        service.launched.append((model, hedge))
+        service.router.record_start(model, hedge)
+        delay, outcome = service.script[model]
+        await asyncio.sleep(delay)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return FakeStream(outcome[1:]), outcome[0], 0.0
+
+    monkeypatch.setattr(service, '_open_stream', open_stream)
+    return service
+
+
+def stream(service, models):
+    deltas = []
+    text = asyncio.run(service._stream_completion([], deltas.append, CancelToken(), models))
+    assert text == ''.join(deltas)
+    return text
+
+
+def test_slow_primary_is_hedged(service, monkeypatch):
+    monkeypatch.setattr(Config, 'HEDGE_ENABLED', True)
+    monkeypatch.setattr(Config, 'HEDGE_DEFAULT_DELAY', 0.05)
+    service.script = {'default': (5, 'slow'), 'backup-a': (0, 'fast')}
+    assert stream(service, ['default', 'backup-a']) == 'fast'
+    assert service.launched == [('default', False), ('backup-a', True)]
+    stats = service.router.stats()
+    assert stats['default']['cancelled'] == 1
+    assert (stats['backup-a']['hedges'], stats['backup-a']['hedge_wins']) == (1, 1)
+
+
+def test_no_hedge_when_disabled(service, monkeypatch):
+    monkeypatch.setattr(Config, 'HEDGE_ENABLED', False)
+    monkeypatch.setattr(Config, 'HEDGE_DEFAULT_DELAY', 0.01)
+    service.script = {'default': (0.1, 'slow'), 'backup-a': (0, 'fast')}
+    assert stream(service, ['default', 'backup-a']) == 'slow'
+    assert service.launched == [('default', False)]
+
+
+def test_failed_model_falls_back_to_the_next(service, monkeypatch):
+    monkeypatch.setattr(Config, 'HEDGE_ENABLED', False)
+    service.script = {'default': (0, ConnectionError('refused')), 'backup-a': (0, 'ok')}
+    assert stream(service, ['default', 'backup-a']) == 'ok'
+    assert service.launched == [('default', False), ('backup-a', False)]
+    assert service.router.stats()['default']['errors'] == 1
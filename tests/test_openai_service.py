@@ -0,0 +1,59 @@
+import asyncio
+import threading
+
+import pytest
+
+from cancellation import AnalysisCancelled, CancelToken
+from openai_service import OpenAIService
+
+
+@pytest.fixture
+def service():
+    service = OpenAIService()
+    service._client = object()
+    yield service
+    service.shutdown()
+
+
+def test_messages_are_built_off_the_event_loop(service, monkeypatch):
+    threads = {}
+    build_messages = service._build_messages
+
+    def record(task_description, project_structure):
+        threads['context'] = threading.current_thread()
+        return build_messages(task_description, project_structure)
+
+    async def stream_completion(messages, on_delta, cancel_token, models):
+        threads['loop'] = threading.current_thread()
+        return '{"summary": "ok"}'
+
+    monkeypatch.setattr(service, '_build_messages', record)
+    monkeypatch.setattr(service, '_stream_completion', stream_completion)
+    result = asyncio.run(service.analyze_code_async('explain', {'total_files': 1}, on_delta=lambda delta: None))
+
+    assert result['summary'] == 'ok'
+    assert threads['context'] is not threads['loop']
+
+
+def test_cancel_while_building_context(service, monkeypatch):
+    token = CancelToken()
+    started = threading.Event()
+    release = threading.Event()
+
+    def slow_build(task_description, project_structure):
+        started.set()
+        release.wait(5)
+        return []
+
+    async def main():
+        task = asyncio.ensure_future(service.analyze_code_async('explain', {}, cancel_token=token))
+        await asyncio.get_running_loop().run_in_executor(None, started.wait, 5)
+        token.cancel('client went away')
+        try:
+            with pytest.raises(AnalysisCancelled):
+                await task
+        finally:
+            release.set()
+
+    monkeypatch.setattr(service, '_build_messages', slow_build)
+    asyncio.run(main())
@@ -0,0 +1,62 @@
+from search_index import BM25Index, tokenize
+
+
+def test_tokenize_splits_identifiers():
+    assert tokenize('parseHTTPResponse_v2') == ['parsehttpresponse_v2', 'parsehttpresponse', 'parse', 'http',
+                                                'response', 'v2']
+
+
+def build(documents, **kwargs):
+    index = BM25Index(**kwargs)
+    for path, content in documents.items():
+        index.add_document(path, content)
+    return index
+
+
+def test_most_relevant_document_first():
+    index = build({
+        'auth/login.py': 'def login(user, password): check_password(user, password)',
+        'auth/session.py': 'def create_session(user): return token',
+        'utils/strings.py': 'def pad(text): return text',
+    })
+    results = index.query('password check')
+    assert results[0][0] == 'auth/login.py'
+    assert [path for path, _ in results] == ['auth/login.py']
+
+
+def test_rare_terms_outweigh_common_ones():
+    documents = {f'common_{i}.py': 'return value' for i in range(20)}
+    documents['rare.py'] = 'return tokenizer'
+    results = build(documents).query('return tokenizer', k=3)
+    assert results[0][0] == 'rare.py'
+    assert results[0][1] > results[1][1]
+
+
+def test_reindex_replaces_terms_and_remove_drops_document():
+    index = build({'a.py': 'alpha beta', 'b.py': 'beta gamma'})
+    index.add_document('a.py', 'delta')
+    assert index.query('alpha') == []
+    assert [path for path, _ in index.query('delta')] == ['a.py']
+
+    index.remove_document('b.py')
+    assert index.query('gamma') == []
+    assert len(index) == 1
+
+    index.retain([])
+    assert index.stats() == {'documents': 0, 'terms': 0, 'postings': 0}
+
+
+def test_signature_tracks_changes():
+    index = BM25Index()
+    index.add_document('a.py', 'alpha', signature=(5, 100))
+    assert index.is_current('a.py', (5, 100))
+    assert not index.is_current('a.py', (5, 200))
+
+
+def test_pruned_posting_lists_keep_the_best_matches():
+    # Every document has 'shared'; the shortest ones with the most occurrences score highest
+    documents = {f'doc_{i:03d}.py': 'shared ' * (1 + i % 7) + 'filler ' * (i % 13) for i in range(300)}
+    exact = build(documents).query('shared', k=10)
+    pruned = build(documents, prune_limit=50)
+    pruned.optimize()
+    assert pruned.query('shared', k=10) == exact
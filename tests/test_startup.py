@@ -0,0 +1,18 @@
+from benchmarks import startup
+
+
+def test_wsgi_cold_start_within_budget():
+    # Median import of wsgi:application under the script's default --budget-ms (300ms)
+    assert startup.main(['--runs', '5', '--top', '0']) == 0
+
+
+def test_parse_importtime():
+    rows = startup.parse_importtime(
+        "import time: self [us] | cumulative | imported package\n"
+        "import time:       120 |        120 |     json.decoder\n"
+        "import time:       300 |        420 |   json\n"
+    )
+    assert rows == [
+        {'module': 'json.decoder', 'depth': 2, 'self_us': 120, 'cumulative_us': 120},
+        {'module': 'json', 'depth': 1, 'self_us': 300, 'cumulative_us': 420},
+    ]
@@ -0,0 +1,125 @@
+import json
+import time
+import asyncio
+import threading
+
+import pytest
+
+import app as app_module
+import asgi
+from config import Config
+from status_board import StatusBoard
+
+
+@pytest.fixture
+def session_id():
+    session_id = app_module.session_manager.create_session()
+    yield session_id
+    app_module.session_manager.remove_session(session_id)
+
+
+def get_status(path):
+    """GET path from the ASGI app; returns (status code, JSON body, seconds taken)"""
+    sent = []
+
+    async def main():
+        scope = {'type': 'http', 'method': 'GET', 'path': path.split('?')[0], 'headers': [],
+                 'query_string': path.partition('?')[2].encode()}
+
+        async def receive():
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+        async def send(message):
+            sent.append(message)
+
+        await asgi.application(scope, receive, send)
+
+    start = time.perf_counter()
+    asyncio.run(main())
+    body = b''.join(m.get('body', b'') for m in sent if m['type'] == 'http.response.body')
+    return sent[0]['status'], json.loads(body), time.perf_counter() - start
+
+
+def test_long_poll_args():
+    assert app_module.long_poll_args({'since': '5', 'wait': '60'}, 25) == (5, 25)
+    assert app_module.long_poll_args({'since': '5'}, 0) == (5, 0)
+    assert app_module.long_poll_args({}, 25) == (None, 25)
+    assert app_module.long_poll_args({'since': 'x'}, 25) == (None, 0.0)
+
+
+def test_sync_route_does_not_hold_the_worker(session_id):
+    client = app_module.app.test_client()
+    revision = client.get(f'/api/status/{session_id}').get_json()['revision']
+    start = time.perf_counter()
+    response = client.get(f'/api/status/{session_id}?since={revision}&wait=25')
+    assert time.perf_counter() - start < 1
+    assert response.get_json()['long_poll'] == {'max_wait': Config.STATUS_LONGPOLL_SYNC_TIMEOUT,
+                                                'poll_interval': Config.STATUS_POLL_INTERVAL}
+
+
+def test_sync_route_waits_up_to_its_own_cap(session_id, monkeypatch):
+    monkeypatch.setattr(Config, 'STATUS_LONGPOLL_SYNC_TIMEOUT', 0.3)
+    client = app_module.app.test_client()
+    revision = client.get(f'/api/status/{session_id}').get_json()['revision']
+    start = time.perf_counter()
+    payload = client.get(f'/api/status/{session_id}?since={revision}&wait=25').get_json()
+    assert 0.3 <= time.perf_counter() - start < 2
+    assert payload['long_poll']['max_wait'] == 0.3
+
+
+def test_asgi_route_long_polls_until_a_change(session_id):
+    status, payload, _ = get_status(f'/api/status/{session_id}')
+    assert status == 200
+    assert payload['long_poll'] == {'max_wait': Config.STATUS_LONGPOLL_TIMEOUT, 'poll_interval': 0}
+
+    threading.Timer(0.2, app_module.status_board.bump, (session_id,)).start()
+    status, changed, elapsed = get_status(f'/api/status/{session_id}?since={payload["revision"]}&wait=5')
+    assert changed['revision'] > payload['revision']
+    assert 0.2 <= elapsed < 3
+
+
+def test_waiters_wake_on_bump():
+    board = StatusBoard()
+    since = board.bump('s')
+    threading.Timer(0.1, board.bump, ('s',)).start()
+    assert board.wait('s', since, 5) > since
+
+    async def wait_async():
+        threading.Timer(0.1, board.bump, ('s',)).start()
+        return await board.await_change('s', board.revision('s'), 5)
+
+    assert asyncio.run(wait_async()) > since
+
+
+def test_progress_bumps_are_folded():
+    board = StatusBoard()
+    first = board.bump('s', min_interval=10)
+    assert first and board.bump('s', min_interval=10) == 0
+    assert board.bump('s') > first
+
+
+def test_removal_wakes_waiters():
+    board = StatusBoard()
+    since = board.bump('s')
+    threading.Timer(0.1, board.remove, ('s',)).start()
+    start = time.perf_counter()
+    assert board.wait('s', since, 5) > since
+    assert time.perf_counter() - start < 2
+
+    # A waiter arriving after the removal sees the change too
+    assert board.wait('s', since, 5) > since
+
+    async def wait_async():
+        return await board.await_change('s', since, 5)
+
+    assert asyncio.run(wait_async()) > since
+
+
+def test_tombstones_expire():
+    board = StatusBoard(tombstone_ttl=0)
+    board.bump('old')
+    board.remove('old')
+    time.sleep(0.01)
+    board.remove('new')
+    assert board.revision('old') == 0
+    assert board.revision('new') > 0
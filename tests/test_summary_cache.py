@@ -0,0 +1,48 @@
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from summary_cache import SummaryStore, content_hash, summarize_file, summarize_project
+
+
+@pytest.fixture
+def store(tmp_path):
+    return SummaryStore(str(tmp_path / 'summaries.db'), max_age=3600, max_entries=3)
+
+
+def test_summarize_file_lists_definitions():
+    summary = summarize_file('pkg/mod.py', '"""Parses things."""\n\ndef parse():\n    pass\n\nclass Parser:\n    pass\n')
+    assert summary.startswith('7 lines')
+    assert 'Parses things.' in summary
+    assert 'defines parse, Parser' in summary
+
+
+def test_summarize_project_reuses_stored_summaries(store):
+    contents = {'a.py': 'def a():\n    pass\n', 'lib/b.py': 'def b():\n    pass\n'}
+    first = summarize_project(contents, store)
+    assert (first['cache_hits'], first['cache_misses']) == (0, 2)
+
+    contents['lib/c.py'] = 'def c():\n    pass\n'
+    second = summarize_project(contents, store)
+    assert (second['cache_hits'], second['cache_misses']) == (2, 1)
+    assert second['files']['a.py'] == first['files']['a.py']
+    assert second['directories']['lib'].startswith('2 files')
+
+
+def test_prune_drops_expired_entries(store):
+    store.put_many({'old': 'old summary'})
+    removed = store.prune(now=time.time() + 7200)
+    assert removed == 1
+    assert store.get_many(['old']) == {}
+
+
+def test_prune_keeps_newest_entries_under_the_cap(store, monkeypatch):
+    clock = iter(range(1000, 1005))
+    monkeypatch.setattr('summary_cache.time', SimpleNamespace(time=lambda: next(clock)))
+    for name in ('h1', 'h2', 'h3', 'h4', 'h5'):
+        store.put_many({content_hash(name): name})
+
+    assert store.prune(now=1005) == 2
+    kept = store.get_many([content_hash(name) for name in ('h1', 'h2', 'h3', 'h4', 'h5')])
+    assert sorted(kept.values()) == ['h3', 'h4', 'h5']
@@ -0,0 +1,131 @@
+import os
+
+import pytest
+
+from symbol_index import SymbolExtractor, SymbolTable, extract_symbols
+
+PYTHON = '''import os
+from .models import Session
+
+class Store(Base, metaclass=Meta):
+    """Keeps sessions."""
+
+    def load(self, session_id: str) -> Session:
+        return Session(self.read(session_id))
+
+    async def save(self, session):
+        await write(session)
+
+try:
+    import orjson
+except ImportError:
+    def fallback():
+        return os.getcwd()
+
+def main():
+    store = Store()
+    store.load('abc')
+'''
+
+JS = '''import { api } from './api';
+class Store {
+  load(id) {
+    return api.get(id);
+  }
+}
+export async function boot() {
+  new Store().load(1);
+}
+'''
+
+GO = '''package main
+
+import (
+    "fmt"
+    "os"
+)
+
+type Server struct{}
+
+func (s *Server) Start(port int) error {
+    fmt.Println(port)
+    return nil
+}
+'''
+
+
+def test_python_definitions_imports_and_calls():
+    symbols, imports, calls = extract_symbols('pkg/store.py', PYTHON)
+    assert [(name, kind, line, parent) for name, kind, line, _, parent in symbols] == [
+        ('Store', 'class', 4, ''), ('load', 'method', 7, 'Store'), ('save', 'method', 10, 'Store'),
+        ('fallback', 'function', 16, ''), ('main', 'function', 19, ''),
+    ]
+    assert symbols[0][3] == 'class Store(Base, metaclass=Meta)'
+    assert symbols[1][3] == 'def load(self, session_id: str) -> Session'
+    assert symbols[2][3] == 'async def save(self, session)'
+    assert imports == ('os', '.models', 'orjson')
+    # Definitions are not calls of themselves
+    assert calls['Store'] == (20,) and calls['load'] == (21,) and 'main' not in calls
+    assert calls['Session'] == (8,) and calls['getcwd'] == (17,)
+
+
+def test_line_parsers_for_other_languages():
+    symbols, imports, calls = extract_symbols('web/app.js', JS)
+    assert [(s[0], s[1], s[4]) for s in symbols] == [('Store', 'class', ''), ('load', 'method', 'Store'),
+                                                     ('boot', 'function', '')]
+    assert imports == ('./api',) and calls['load'] == (8,)
+
+    symbols, imports, calls = extract_symbols('cmd/server.go', GO)
+    assert [(s[0], s[1], s[4]) for s in symbols] == [('Server', 'class', ''), ('Start', 'method', 'Server')]
+    assert symbols[1][3] == 'func (s *Server) Start(port int) error'
+    assert imports == ('fmt', 'os') and calls == {'Println': (11,)}
+
+
+def test_unparsable_python_falls_back_to_line_patterns():
+    symbols, _, _ = extract_symbols('broken.py', 'def half(:\n    pass\n\nclass Whole:\n    pass\n')
+    assert [(s[0], s[1]) for s in symbols] == [('half', 'function'), ('Whole', 'class')]
+    assert extract_symbols('notes.txt', 'def not_code():') is None
+
+
+@pytest.fixture
+def workspace(tmp_path):
+    files = {'pkg/store.py': PYTHON, 'web/app.js': JS, 'cmd/server.go': GO, 'pkg/cli.py': 'main()\nmain()\n',
+             'README.md': '# Store\n'}
+    for path, text in files.items():
+        os.makedirs(tmp_path / os.path.dirname(path), exist_ok=True)
+        (tmp_path / path).write_text(text)
+    return str(tmp_path), {path: (len(text), (len(text), 1)) for path, text in files.items()}
+
+
+def test_symbol_table_lookups(workspace):
+    root, files = workspace
+    table = SymbolTable()
+    table.update(root, files, SymbolExtractor(workers=1))
+    assert len(table) == 4 and table.is_current('pkg/store.py', (len(PYTHON), 1))
+
+    assert [(d['path'], d['line']) for d in table.definitions('Store')] == [('pkg/store.py', 4), ('web/app.js', 2)]
+    assert [d['name'] for d in table.find('st')] == ['Start', 'Store', 'Store']
+    assert [d['name'] for d in table.find('stor')] == ['Store', 'Store']
+    assert [d['name'] for d in table.find('s', kind='method')] == ['save', 'Start']
+    assert table.call_sites('main') == [{'path': 'pkg/cli.py', 'line': 1}, {'path': 'pkg/cli.py', 'line': 2}]
+    assert table.outline('pkg/store.py')['imports'] == ['os', '.models', 'orjson']
+
+    context = table.context(['pkg/store.py', 'README.md'])
+    assert list(context['outlines']) == ['pkg/store.py']
+    assert context['outlines']['pkg/store.py'][1] == '7:   def load(self, session_id: str) -> Session'
+    # Only names defined once in the project get call sites
+    assert context['call_sites'] == {'main': ['pkg/cli.py:1']}
+
+    table.retain(['web/app.js'])
+    assert [d['path'] for d in table.definitions('Store')] == ['web/app.js']
+    assert table.stats()['files'] == 1
+
+
+def test_process_pool_matches_inline_extraction(workspace):
+    root, files = workspace
+    sizes = {path: size for path, (size, _) in files.items()}
+    pooled = SymbolExtractor(workers=2, parallel_min_bytes=0)
+    try:
+        assert pooled.extract(root, sizes) == SymbolExtractor(workers=1).extract(root, sizes)
+    finally:
+        pooled.shutdown()
@@ -0,0 +1,84 @@
+import os
+import time
+import threading
+import importlib.util
+
+import pytest
+
+from cancellation import AnalysisCancelled, CancelToken
+from job_scheduler import JobScheduler, SchedulerFull
+from workspace_reaper import WorkspaceReaper
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_drain_lets_running_jobs_finish():
+    scheduler = JobScheduler(max_workers=1, per_session_limit=1)
+    finished = threading.Event()
+    scheduler.submit('s1', lambda: time.sleep(0.1) or finished.set())
+    assert scheduler.drain(timeout=5) == {'cancelled_queued': 0, 'cancelled_running': 0}
+    assert finished.is_set()
+    with pytest.raises(SchedulerFull):
+        scheduler.submit('s2', lambda: None)
+
+
+def test_drain_cancels_what_is_left_at_the_timeout():
+    scheduler = JobScheduler(max_workers=1, per_session_limit=1)
+    started, token = threading.Event(), CancelToken()
+
+    def run_until_cancelled():
+        started.set()
+        while not token.cancelled:
+            time.sleep(0.01)
+        raise AnalysisCancelled(token.reason)
+
+    running = scheduler.submit('s1', run_until_cancelled, cancel_token=token)
+    assert started.wait(5)
+    discarded = []
+    queued = scheduler.submit('s2', lambda: None, on_discard=lambda job, reason: discarded.append(reason))
+
+    assert scheduler.drain(timeout=0.2) == {'cancelled_queued': 1, 'cancelled_running': 1}
+    assert (running.status, token.reason) == ('cancelled', 'worker shutting down')
+    assert queued.status == 'cancelled' and discarded == ['cancelled']
+    assert not any(worker.is_alive() for worker in scheduler.workers)
+
+
+def make_workspaces(root, ages):
+    now = time.time()
+    for name, age in ages.items():
+        os.makedirs(os.path.join(root, name))
+        os.utime(os.path.join(root, name), (now - age, now - age))
+
+
+def test_sweep_removes_only_idle_workspaces(tmp_path):
+    make_workspaces(str(tmp_path), {'idle': 3600, 'live': 10, '.status': 3600})
+    reaper = WorkspaceReaper(str(tmp_path), max_age=600, interval=60)
+    assert reaper.sweep() == 1
+    assert sorted(os.listdir(tmp_path)) == ['.status', 'live']
+
+
+def test_one_reaper_sweeps_per_host(tmp_path):
+    first = WorkspaceReaper(str(tmp_path), max_age=600, interval=60)
+    second = WorkspaceReaper(str(tmp_path), max_age=600, interval=60)
+    assert first._is_leader()
+    assert not second._is_leader()
+    # The lock goes with its holder (a worker exiting closes it)
+    first.lock_file.close()
+    assert second._is_leader()
+    second.lock_file.close()
+
+
+def test_gunicorn_master_starts_no_threads(monkeypatch):
+    spec = importlib.util.spec_from_file_location('gunicorn_conf', os.path.join(ROOT, 'gunicorn.conf.py'))
+    conf = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(conf)
+
+    class Server:
+        address = [('127.0.0.1', 5001)]
+
+        class log:
+            info = staticmethod(lambda *args: None)
+
+    before = set(threading.enumerate())
+    conf.when_ready(Server())
+    assert set(threading.enumerate()) == before
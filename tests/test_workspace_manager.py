@@ -0,0 +1,88 @@
+import os
+import time
+import multiprocessing
+
+import pytest
+
+from host_state import locked_json
+from workspace_manager import WorkspaceFull, WorkspaceManager
+
+
+@pytest.fixture
+def manager(tmp_path):
+    os.makedirs(tmp_path / 'root')
+    # A 1000-byte budget: eviction starts above 900 bytes and goes down to 750
+    return WorkspaceManager(str(tmp_path / 'root'), str(tmp_path / 'state.json'), max_bytes=1000,
+                            high_watermark=0.9, low_watermark=0.75, idle_seconds=60, min_free_disk=0)
+
+
+def workspace(manager, session_id, nbytes, idle_for=3600):
+    """Claim and write nbytes for session_id, last used idle_for seconds ago"""
+    os.makedirs(os.path.join(manager.root, session_id))
+    manager.claim(session_id, nbytes)
+    with open(os.path.join(manager.root, session_id, 'data'), 'wb') as f:
+        f.write(b'x' * nbytes)
+    with locked_json(manager.state_path) as state:
+        state['sessions'][session_id]['used'] = time.time() - idle_for
+
+
+def test_claim_evicts_least_recently_used_idle_workspaces(manager):
+    workspace(manager, 'oldest', 300, idle_for=3000)
+    workspace(manager, 'older', 300, idle_for=2000)
+    workspace(manager, 'recent', 200, idle_for=10)
+
+    manager.claim('new', 200)
+    # 1000 would cross 900: evict oldest first until the claim fits under 750
+    assert sorted(os.listdir(manager.root)) == ['older', 'recent']
+    stats = manager.stats()
+    assert (stats['used_bytes'], stats['evicted'], stats['evicted_bytes']) == (700, 1, 300)
+
+
+def test_claim_that_cannot_fit_evicts_nothing(manager):
+    workspace(manager, 'idle', 300)
+    workspace(manager, 'pinned', 300)
+    workspace(manager, 'active', 300, idle_for=10)
+    pin = manager.pin('pinned')
+
+    with pytest.raises(WorkspaceFull) as refused:
+        manager.claim('new', 500)
+    assert refused.value.status == 503
+    assert sorted(os.listdir(manager.root)) == ['active', 'idle', 'pinned']
+    assert manager.stats()['used_bytes'] == 900 and manager.stats()['refused'] == 1
+
+    # A smaller claim fits once the idle workspace goes; releasing the pin counts as a use
+    pin.release()
+    manager.claim('new', 300)
+    assert sorted(os.listdir(manager.root)) == ['active', 'pinned']
+    assert manager.stats()['used_bytes'] == 900
+
+
+def test_pins_of_dead_processes_are_dropped(manager):
+    workspace(manager, 'orphan', 600)
+
+    def pin_and_crash():
+        manager.pin('orphan')
+        os._exit(0)
+
+    process = multiprocessing.get_context('fork').Process(target=pin_and_crash)
+    process.start()
+    process.join(10)
+    assert manager.stats()['pinned'] == 0
+    manager.claim('new', 400)
+    assert not os.path.exists(os.path.join(manager.root, 'orphan'))
+
+
+def test_reconcile_and_enforce(manager):
+    workspace(manager, 'known', 400)
+    os.makedirs(os.path.join(manager.root, 'unknown'))
+    with open(os.path.join(manager.root, 'unknown', 'data'), 'wb') as f:
+        f.write(b'x' * 550)
+    os.utime(os.path.join(manager.root, 'unknown'), (time.time() - 7200,) * 2)
+    with locked_json(manager.state_path) as state:
+        state['sessions']['gone'] = {'bytes': 100, 'used': time.time() - 60, 'pins': {}}
+
+    manager.reconcile()
+    assert manager.stats()['used_bytes'] == 950
+    assert manager.enforce() == 1
+    assert manager.stats()['used_bytes'] == 400
+    assert os.listdir(manager.root) == ['known']
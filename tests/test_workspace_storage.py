@@ -0,0 +1,103 @@
+import os
+import time
+import uuid
+
+import pytest
+
+import app as app_module
+from config import Config
+from status_board import SharedStatus
+from workspace_storage import FilesystemStorage
+
+FILES = {'main.py': 'def main():\n    return 1\n', 'lib/util.py': 'def helper():\n    pass\n'}
+
+
+@pytest.fixture
+def upload(tmp_path):
+    """A workspace as another node wrote it: its files and their manifest"""
+    source = tmp_path / 'upload'
+    for path, text in FILES.items():
+        os.makedirs(source / os.path.dirname(path), exist_ok=True)
+        (source / path).write_text(text)
+    manifest = {'created_at': time.time(), 'files': {path: len(text) for path, text in FILES.items()},
+                'uploaded_files': ['project.zip'], 'extracted_files': sorted(FILES)}
+    return str(source), manifest
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.time() + timeout
+    while not condition() and time.time() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def test_publish_fetch_and_expire(tmp_path, upload):
+    source, manifest = upload
+    storage = FilesystemStorage(str(tmp_path / 'shared'), cache_root=str(tmp_path / 'cache'))
+    assert not storage.local and storage.manifest('s1') is None
+
+    storage.publish('s1', source, manifest)
+    assert storage.manifest('s1') == manifest and storage.sessions() == ['s1']
+    storage.fetch('s1', ['lib/util.py'], str(tmp_path / 'cache' / 's1'))
+    assert (tmp_path / 'cache' / 's1' / 'lib' / 'util.py').read_text() == FILES['lib/util.py']
+
+    os.utime(storage._manifest_path('s1'), (time.time() - 3600,) * 2)
+    storage.touch('s1')
+    assert storage.expire(600) == 0
+    os.utime(storage._manifest_path('s1'), (time.time() - 3600,) * 2)
+    assert storage.expire(600) == 1
+    assert storage.sessions() == [] and not (tmp_path / 'shared' / 's1').exists()
+
+
+def test_status_records_keep_the_newest_run(tmp_path):
+    storage = FilesystemStorage(str(tmp_path / 'shared'))
+    storage.save_status('s1', '0001', {'run': '0001', 'revision': 5})
+    storage.save_status('s1', '0002', {'run': '0002', 'revision': 1})
+    assert storage.status('s1') == {'run': '0002', 'revision': 1}
+    storage.prune_status('s1', '0002')
+    assert os.listdir(tmp_path / 'shared' / '.status' / 's1') == ['0002.json']
+
+
+def test_shared_status_is_seen_by_other_processes(tmp_path):
+    storage = FilesystemStorage(str(tmp_path / 'shared'))
+    writer, reader = SharedStatus(storage), SharedStatus(storage)
+    writer.publish('s1', '0001', {'run': '0001', 'revision': 1, 'analysis_status': 'running'})
+    writer.publish('s1', '0001', {'run': '0001', 'revision': 2, 'analysis_status': 'completed'})
+    # The writer sees its own record at once; others once it is stored
+    assert writer.read('s1')['revision'] == 2
+    assert wait_for(lambda: (reader.read('s1') or {}).get('revision') == 2)
+
+    # A cached read is reused until it is max_age old
+    writer.publish('s1', '0002', {'run': '0002', 'revision': 1, 'analysis_status': 'running'})
+    assert wait_for(lambda: storage.status('s1')['run'] == '0002')
+    assert reader.read('s1', max_age=60)['run'] == '0001'
+    assert reader.read('s1')['run'] == '0002'
+
+
+def test_another_node_adopts_a_published_session(tmp_path, upload, monkeypatch):
+    source, manifest = upload
+    storage = FilesystemStorage(str(tmp_path / 'shared'))
+    monkeypatch.setattr(app_module, 'workspace_storage', storage)
+    session_id = str(uuid.uuid4())
+    storage.publish(session_id, source, manifest)
+
+    session = app_module.session_manager.get_session(session_id)
+    try:
+        assert session is not None
+        cache = os.path.join(Config.WORKSPACE_FOLDER, session_id)
+        assert session['workspace_path'] == cache
+        with open(os.path.join(cache, 'lib', 'util.py')) as f:
+            assert f.read() == FILES['lib/util.py']
+        assert session['extracted_files'] == sorted(FILES)
+        assert 'main.py' in session['project_structure']['content']
+        assert session['search_index'] is not None and session['symbols'] is not None
+        assert app_module.session_manager.get_session(session_id) is session
+    finally:
+        app_module.session_manager.remove_session(session_id)
+    assert storage.manifest(session_id) is None
+
+
+def test_unknown_sessions_are_not_adopted(tmp_path, monkeypatch):
+    monkeypatch.setattr(app_module, 'workspace_storage', FilesystemStorage(str(tmp_path / 'shared')))
+    assert app_module.session_manager.get_session(str(uuid.uuid4())) is None
+    assert app_module.session_manager.get_session('../not-a-session') is None
@@ -0,0 +1,223 @@
+import os
+import json
+import time
+import queue
+import logging
+import secrets
+import threading
+import contextvars
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+
+class Span:
+    """One timed phase of a trace"""
+
+    __slots__ = ('name', 'span_id', 'parent_id', 'start_ns', 'end_ns', 'attributes')
+
+    def __init__(self, name: str, parent_id: Optional[str], attributes: Dict):
+        self.name = name
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.attributes = attributes
+
+    @property
+    def duration_ms(self) -> float:
+        return ((self.end_ns or time.time_ns()) - self.start_ns) / 1e6
+
+
+class Trace:
+    """Spans recorded for one request or background analysis"""
+
+    def __init__(self, name: str, attributes: Optional[Dict] = None):
+        self.trace_id = secrets.token_hex(16)
+        self.root = Span(name, None, attributes or {})
+        self.spans: List[Span] = []
+
+    def finish(self):
+        self.root.end_ns = time.time_ns()
+
+    def phases(self) -> Dict[str, float]:
+        """Total milliseconds per span name (a phase repeated per file is summed)"""
+        totals: Dict[str, float] = {}
+        for span in self.spans:
+            if span.end_ns is not None:
+                totals[span.name] = totals.get(span.name, 0.0) + span.duration_ms
+        return totals
+
+    def server_timing(self) -> str:
+        """Server-Timing header value: one entry per phase plus the total"""
+        entries = [f"{name};dur={ms:.1f}" for name, ms in self.phases().items()]
+        entries.append(f"total;dur={self.root.duration_ms:.1f}")
+        return ", ".join(entries)
+
+    def record(self) -> Dict:
+        """Structured timing record for logs"""
+        return {
+            'trace_id': self.trace_id,
+            'name': self.root.name,
+            'duration_ms': round(self.root.duration_ms, 2),
+            'attributes': self.root.attributes,
+            'phases': {name: round(ms, 2) for name, ms in self.phases().items()}
+        }
+
+
+_current_trace: contextvars.ContextVar[Optional[Trace]] = contextvars.ContextVar('trace', default=None)
+_current_span: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar('span', default=None)
+
+
+def current_trace() -> Optional[Trace]:
+    return _current_trace.get()
+
+
+def start_trace(name: str, **attributes) -> Trace:
+    """Begin a trace in the current context; spans opened in it (and in tasks it starts) join it"""
+    trace = Trace(name, attributes)
+    _current_trace.set(trace)
+    _current_span.set(trace.root)
+    return trace
+
+
+def finish_trace(trace: Trace):
+    """Close the trace, log it if slow and hand it to the exporter"""
+    trace.finish()
+    if trace.root.duration_ms >= Config.TRACE_SLOW_MS:
+        logger.info("Trace %s %.1fms", trace.root.name, trace.root.duration_ms, extra={'trace': trace.record()})
+    if exporter is not None:
+        exporter.export(trace)
+
+
+@contextmanager
+def traced(name: str, **attributes):
+    """Run the block as its own trace (for work outside a request, such as analyses)"""
+    trace_token = _current_trace.set(None)
+    span_token = _current_span.set(None)
+    trace = start_trace(name, **attributes)
+    try:
+        yield trace
+    finally:
+        finish_trace(trace)
+        _current_trace.reset(trace_token)
+        _current_span.reset(span_token)
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """Time a phase of the current trace; a no-op outside one"""
+    trace = _current_trace.get()
+    if trace is None:
+        yield None
+        return
+    parent = _current_span.get()
+    current = Span(name, parent.span_id if parent else trace.root.span_id, attributes)
+    trace.spans.append(current)
+    token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.attributes['error'] = type(e).__name__
+        raise
+    finally:
+        current.end_ns = time.time_ns()
+        _current_span.reset(token)
+
+
+class OTLPExporter:
+    """
+    Ships finished traces to an OpenTelemetry collector as OTLP/HTTP JSON
+    (POST <endpoint>/v1/traces). Spans are batched on a background thread;
+    when the collector is slow or down they are dropped rather than queued
+    without bound, so requests never wait on it.
+    """
+
+    def __init__(self, endpoint: str, service_name: str, batch_size: int = 256, flush_interval: float = 2.0):
+        self.url = endpoint.rstrip('/') + '/v1/traces'
+        self.service_name = service_name
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue: queue.Queue = queue.Queue(maxsize=10000)
+        self.dropped = 0
+        self.pid = None
+        self.lock = threading.Lock()
+
+    def export(self, trace: Trace):
+        self._ensure_thread()
+        for item in [trace.root] + trace.spans:
+            try:
+                self.queue.put_nowait((trace.trace_id, item))
+            except queue.Full:
+                self.dropped += 1
+
+    def _ensure_thread(self):
+        # Threads do not survive fork: start one per worker process on first use
+        if self.pid == os.getpid():
+            return
+        with self.lock:
+            if self.pid != os.getpid():
+                self.pid = os.getpid()
+                threading.Thread(target=self._run, daemon=True).start()
+
+    def _run(self):
+        while True:
+            batch = [self.queue.get()]
+            deadline = time.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self.queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            try:
+                self._send(batch)
+            except Exception as e:
+                logger.warning("Trace export to %s failed, dropped %s spans: %s", self.url, len(batch), e)
+
+    def _send(self, batch):
+        import urllib.request
+        body = {'resourceSpans': [{
+            'resource': {'attributes': [_attribute('service.name', self.service_name)]},
+            'scopeSpans': [{
+                'scope': {'name': 'manus-platform'},
+                'spans': [_otlp_span(trace_id, item) for trace_id, item in batch if item.end_ns is not None]
+            }]
+        }]}
+        request = urllib.request.Request(self.url, data=json.dumps(body).encode('utf-8'),
+                                         headers={'Content-Type': 'application/json'})
+        with urllib.request.urlopen(request, timeout=5) as response:
+            response.read()
+
+
+def _attribute(key: str, value) -> Dict:
+    if isinstance(value, bool):
+        return {'key': key, 'value': {'boolValue': value}}
+    if isinstance(value, int):
+        return {'key': key, 'value': {'intValue': str(value)}}
+    if isinstance(value, float):
+        return {'key': key, 'value': {'doubleValue': value}}
+    return {'key': key, 'value': {'stringValue': str(value)}}
+
+
+def _otlp_span(trace_id: str, item: Span) -> Dict:
+    otlp = {
+        'traceId': trace_id,
+        'spanId': item.span_id,
+        'name': item.name,
+        'kind': 2 if item.parent_id is None else 1,  # SERVER for roots, INTERNAL otherwise
+        'startTimeUnixNano': str(item.start_ns),
+        'endTimeUnixNano': str(item.end_ns),
+        'attributes': [_attribute(key, value) for key, value in item.attributes.items()]
+    }
+    if item.parent_id:
+        otlp['parentSpanId'] = item.parent_id
+    return otlp
+
+
+exporter = OTLPExporter(Config.OTEL_EXPORTER_ENDPOINT, Config.OTEL_SERVICE_NAME) \
+    if Config.OTEL_EXPORTER_ENDPOINT else None
@@ -0,0 +1,293 @@
+"""
+Disk budget for session workspaces.
+
+Workspaces used to be removed only when their session timed out, so a burst
+of large uploads inside one SESSION_TIMEOUT could fill the disk however old
+the other workspaces were, and the next write failed mid-extraction.
+WorkspaceManager keeps a host-wide account of the bytes each workspace holds
+and makes every ingest claim its bytes before writing them. Once usage
+crosses the high watermark of the budget, the least recently used idle
+workspaces are evicted until it is back under the low watermark; a claim
+that still does not fit is refused with WorkspaceFull before anything is
+written.
+
+The budget is WORKSPACE_MAX_BYTES, or less when the disk itself cannot hold
+that much while keeping MIN_FREE_DISK_BYTES free. A workspace is idle when
+no ingest is writing to it (pins) and its session has not been used for
+WORKSPACE_IDLE_SECONDS. The account lives in a flock-guarded JSON file
+shared by every process on the host; pins record their owner's pid and are
+dropped once that process is gone.
+"""
+
+import os
+import time
+import uuid
+import shutil
+import logging
+from contextlib import contextmanager
+from typing import Dict, List, Tuple
+
+from config import Config
+from admission import AdmissionRejected
+from metrics import WORKSPACE_EVICTIONS
+from host_state import locked_json, pid_alive
+
+logger = logging.getLogger(__name__)
+
+EVICTING_PREFIX = '.evicting-'
+
+
+class WorkspaceFull(AdmissionRejected):
+    """Raised when a claim does not fit in the workspace budget even after eviction"""
+
+    def __init__(self, message: str, retry_after: int = 30):
+        super().__init__(message, 'INSUFFICIENT_STORAGE', 503, retry_after)
+
+
+def directory_size(path: str) -> int:
+    """Bytes held by the files under path"""
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.lstat(os.path.join(root, name)).st_size
+            except OSError:
+                continue
+    return total
+
+
+class WorkspacePin:
+    """Keeps a workspace from being evicted while it is written; release() is idempotent"""
+
+    def __init__(self, manager: 'WorkspaceManager', session_id: str, token: str):
+        self.manager = manager
+        self.session_id = session_id
+        self.token = token
+        self.released = False
+
+    def release(self):
+        if self.released:
+            return
+        self.released = True
+        self.manager._unpin(self.session_id, self.token)
+
+
+class WorkspaceManager:
+    """Host-wide disk accounting and LRU eviction for the workspaces under root"""
+
+    def __init__(self, root: str = Config.WORKSPACE_FOLDER,
+                 state_path: str = Config.WORKSPACE_STATE_PATH,
+                 max_bytes: int = Config.WORKSPACE_MAX_BYTES,
+                 high_watermark: float = Config.WORKSPACE_HIGH_WATERMARK,
+                 low_watermark: float = Config.WORKSPACE_LOW_WATERMARK,
+                 idle_seconds: float = Config.WORKSPACE_IDLE_SECONDS,
+                 min_free_disk: int = Config.MIN_FREE_DISK_BYTES):
+        self.root = root
+        self.state_path = state_path
+        self.max_bytes = max_bytes
+        self.high_watermark = high_watermark
+        self.low_watermark = low_watermark
+        self.idle_seconds = idle_seconds
+        self.min_free_disk = min_free_disk
+
+    @contextmanager
+    def _locked(self):
+        with locked_json(self.state_path) as state:
+            sessions = state.setdefault('sessions', {})
+            for entry in sessions.values():
+                pins = entry.get('pins', {})
+                for token in [token for token, pid in pins.items() if not pid_alive(pid)]:
+                    del pins[token]
+            yield state
+
+    def _budget(self, used: int) -> int:
+        """Bytes workspaces may hold: the configured maximum, or what the disk has room for"""
+        try:
+            free = shutil.disk_usage(self.root).free
+        except OSError:
+            return self.max_bytes
+        # Claimed bytes not written yet are still free on disk; the overestimate
+        # is bounded by the uploads in flight (see admission.py)
+        return max(0, min(self.max_bytes, used + free - self.min_free_disk))
+
+    def _idle(self, sessions: Dict, now: float, keep: str = None) -> List[str]:
+        """Sessions whose workspace may be evicted, least recently used first"""
+        return [session_id for _, session_id in sorted(
+            (entry['used'], session_id) for session_id, entry in sessions.items()
+            if session_id != keep and not entry.get('pins') and now - entry['used'] >= self.idle_seconds)]
+
+    def _evictable(self, sessions: Dict, now: float, keep: str = None) -> int:
+        return sum(sessions[session_id]['bytes'] for session_id in self._idle(sessions, now, keep))
+
+    def _evict(self, state: Dict, target: int, now: float, keep: str = None) -> List[Tuple[str, int]]:
+        """
+        Drop idle workspaces from the account, least recently used first, until
+        usage is at most target. Their directories are only renamed here, under
+        the lock; the caller removes them after releasing it.
+        """
+        sessions = state['sessions']
+        used = sum(entry['bytes'] for entry in sessions.values())
+        evicted = []
+        for session_id in self._idle(sessions, now, keep):
+            if used <= target:
+                break
+            source = os.path.join(self.root, session_id)
+            doomed = os.path.join(self.root, EVICTING_PREFIX + session_id)
+            try:
+                os.replace(source, doomed)
+            except FileNotFoundError:
+                doomed = None
+            except OSError as e:
+                logger.warning("Failed to evict workspace %s: %s", session_id, e)
+                continue
+            entry = sessions.pop(session_id)
+            used -= entry['bytes']
+            evicted.append((doomed, entry['bytes']))
+            state['evicted'] = state.get('evicted', 0) + 1
+            state['evicted_bytes'] = state.get('evicted_bytes', 0) + entry['bytes']
+        return evicted
+
+    def _remove_evicted(self, evicted: List[Tuple[str, int]], reason: str):
+        for doomed, nbytes in evicted:
+            WORKSPACE_EVICTIONS.labels(reason).inc()
+            if doomed is not None:
+                shutil.rmtree(doomed, ignore_errors=True)
+        if evicted:
+            logger.info("Evicted %s idle workspaces (%s bytes, %s)", len(evicted),
+                        sum(nbytes for _, nbytes in evicted), reason)
+
+    def claim(self, session_id: str, nbytes: int):
+        """
+        Charge nbytes about to be written to session_id's workspace, evicting
+        idle workspaces when usage would cross the high watermark. Raises
+        WorkspaceFull, charging nothing, when the bytes do not fit.
+        """
+        now = time.time()
+        with self._locked() as state:
+            sessions = state['sessions']
+            entry = sessions.setdefault(session_id, {'bytes': 0, 'used': now, 'pins': {}})
+            entry['used'] = now
+            used = sum(entry['bytes'] for entry in sessions.values())
+            budget = self._budget(used)
+            evicted = []
+            # Evicting is pointless, and loses other sessions' files, if the claim cannot fit anyway
+            fits = used - self._evictable(sessions, now, keep=session_id) + nbytes <= budget
+            if fits and used + nbytes > budget * self.high_watermark:
+                evicted = self._evict(state, budget * self.low_watermark - nbytes, now, keep=session_id)
+                used -= sum(size for _, size in evicted)
+                fits = used + nbytes <= budget
+            if fits:
+                sessions[session_id]['bytes'] += nbytes
+            else:
+                state['refused'] = state.get('refused', 0) + 1
+        self._remove_evicted(evicted, 'pressure')
+        if not fits:
+            raise WorkspaceFull(f"Not enough workspace storage for {nbytes} more bytes "
+                                f"({used} of {budget} in use)")
+
+    def adjust(self, session_id: str, delta: int):
+        """Change session_id's charge by delta bytes (negative once files are removed)"""
+        with self._locked() as state:
+            entry = state['sessions'].get(session_id)
+            if entry is not None:
+                entry['bytes'] = max(0, entry['bytes'] + delta)
+
+    def settle(self, session_id: str, nbytes: int):
+        """Replace session_id's charge, estimated while it was written, with the bytes it holds"""
+        with self._locked() as state:
+            entry = state['sessions'].get(session_id)
+            if entry is not None:
+                entry['bytes'] = nbytes
+
+    def pin(self, session_id: str) -> WorkspacePin:
+        """Protect session_id's workspace from eviction until the pin is released"""
+        token = uuid.uuid4().hex
+        with self._locked() as state:
+            entry = state['sessions'].setdefault(session_id, {'bytes': 0, 'used': time.time(), 'pins': {}})
+            entry.setdefault('pins', {})[token] = os.getpid()
+        return WorkspacePin(self, session_id, token)
+
+    def _unpin(self, session_id: str, token: str):
+        with self._locked() as state:
+            entry = state['sessions'].get(session_id)
+            if entry is not None:
+                entry.get('pins', {}).pop(token, None)
+                entry['used'] = time.time()
+
+    def touch(self, session_id: str):
+        """Mark session_id's workspace as just used"""
+        with self._locked() as state:
+            entry = state['sessions'].get(session_id)
+            if entry is not None:
+                entry['used'] = time.time()
+
+    def forget(self, session_id: str):
+        """Stop accounting for a workspace its session has removed"""
+        with self._locked() as state:
+            state['sessions'].pop(session_id, None)
+
+    def reconcile(self):
+        """
+        Bring the account in line with the directories under root: measure
+        workspaces it does not know (left by a restart or a crashed worker) and
+        drop entries whose directory is gone. Leftover evictions are removed.
+        """
+        started = time.time()
+        try:
+            names = {entry.name: entry for entry in os.scandir(self.root) if entry.is_dir(follow_symlinks=False)}
+        except FileNotFoundError:
+            return
+        for name, entry in names.items():
+            if name.startswith(EVICTING_PREFIX):
+                shutil.rmtree(entry.path, ignore_errors=True)
+        with self._locked() as state:
+            known = set(state['sessions'])
+        # Measured outside the lock; a walk over a big workspace is slow
+        found = {name: (directory_size(entry.path), entry.stat().st_mtime) for name, entry in names.items()
+                 if not name.startswith('.') and name not in known}
+        with self._locked() as state:
+            sessions = state['sessions']
+            for session_id in list(sessions):
+                entry = sessions[session_id]
+                if session_id not in names and not entry.get('pins') and entry['used'] < started:
+                    del sessions[session_id]
+            for session_id, (nbytes, mtime) in found.items():
+                if session_id not in sessions and os.path.isdir(os.path.join(self.root, session_id)):
+                    sessions[session_id] = {'bytes': nbytes, 'used': mtime, 'pins': {}}
+
+    def enforce(self) -> int:
+        """Evict idle workspaces while usage is above the high watermark; returns how many"""
+        now = time.time()
+        with self._locked() as state:
+            used = sum(entry['bytes'] for entry in state['sessions'].values())
+            budget = self._budget(used)
+            evicted = []
+            if used > budget * self.high_watermark:
+                evicted = self._evict(state, budget * self.low_watermark, now)
+        self._remove_evicted(evicted, 'sweep')
+        return len(evicted)
+
+    def stats(self) -> Dict:
+        with self._locked() as state:
+            sessions = state['sessions']
+            used = sum(entry['bytes'] for entry in sessions.values())
+            pinned = sum(1 for entry in sessions.values() if entry.get('pins'))
+            counters = {key: state.get(key, 0) for key in ('evicted', 'evicted_bytes', 'refused')}
+        budget = self._budget(used)
+        try:
+            free = shutil.disk_usage(self.root).free
+        except OSError:
+            free = None
+        return dict({
+            'workspaces': len(sessions),
+            'pinned': pinned,
+            'used_bytes': used,
+            'budget_bytes': budget,
+            'high_watermark_bytes': int(budget * self.high_watermark),
+            'low_watermark_bytes': int(budget * self.low_watermark),
+            'disk_free_bytes': free,
+        }, **counters)
+
+
+# One account per host; every process talks to it through the state file
+workspace_manager = WorkspaceManager()
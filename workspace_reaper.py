@@ -0,0 +1,118 @@
+import os
+import time
+import fcntl
+import shutil
+import logging
+import threading
+from typing import Optional
+from config import Config
+from workspace_manager import WorkspaceManager, workspace_manager
+from workspace_storage import WorkspaceStorage, workspace_storage
+from summary_cache import SummaryStore, summary_store
+
+logger = logging.getLogger(__name__)
+
+
+class WorkspaceReaper:
+    """
+    Host-wide sweep of session workspaces that no process owns any more.
+
+    Every web worker expires its own in-memory sessions, but a worker that is
+    recycled or killed takes its session table with it and leaves the
+    workspaces behind. The reaper removes workspace directories untouched for
+    longer than max_age. Every worker starts one; only the holder of an
+    flock on root/.reaper.lock sweeps, so a host has a single active reaper
+    and the others stand by. When that worker exits, the lock is released
+    and another takes over on its next interval.
+    With a WorkspaceManager, each sweep also reconciles its disk account with
+    the directories left and evicts idle workspaces above the high watermark.
+    With a WorkspaceStorage, it deletes stored sessions idle for max_age too,
+    and with a SummaryStore it prunes the host's summary cache.
+    """
+
+    def __init__(self, root: str, max_age: float, interval: float, manager: Optional[WorkspaceManager] = None,
+                 storage: Optional[WorkspaceStorage] = None, summaries: Optional[SummaryStore] = None):
+        self.root = root
+        self.manager = manager
+        self.storage = storage
+        self.summaries = summaries
+        self.max_age = max_age
+        self.interval = interval
+        self.lock_file = None
+        self.lock_pid = None
+        self.thread_pid = None
+        self.stopping = threading.Event()
+        self.guard = threading.Lock()
+
+    def start(self):
+        # Threads do not survive fork: one per process, started on request
+        with self.guard:
+            if self.thread_pid == os.getpid():
+                return
+            self.thread_pid = os.getpid()
+            self.stopping = threading.Event()
+            threading.Thread(target=self._run, name='workspace-reaper', daemon=True).start()
+
+    def stop(self):
+        self.stopping.set()
+
+    def _run(self):
+        while not self.stopping.is_set():
+            try:
+                if self._is_leader():
+                    self.sweep()
+                    if self.storage is not None:
+                        self.storage.expire(self.max_age)
+                    if self.manager is not None:
+                        self.manager.reconcile()
+                        self.manager.enforce()
+                    if self.summaries is not None:
+                        self.summaries.prune()
+            except Exception as e:
+                logger.error("Workspace sweep failed: %s", e)
+            self.stopping.wait(self.interval)
+
+    def _is_leader(self) -> bool:
+        if self.lock_file is not None and self.lock_pid == os.getpid():
+            return True
+        if self.lock_file is not None:
+            # Inherited across fork: the lock belongs to the parent's open file
+            self.lock_file.close()
+            self.lock_file = None
+        os.makedirs(self.root, exist_ok=True)
+        lock_file = open(os.path.join(self.root, '.reaper.lock'), 'a')
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        self.lock_file, self.lock_pid = lock_file, os.getpid()
+        logger.info("Workspace reaper active in process %s", self.lock_pid)
+        return True
+
+    def sweep(self, now: Optional[float] = None) -> int:
+        """Remove workspace directories idle for longer than max_age; returns how many"""
+        cutoff = (now or time.time()) - self.max_age
+        removed = 0
+        with os.scandir(self.root) as entries:
+            for entry in entries:
+                try:
+                    # Dot-entries are bookkeeping (locks, manifests), not workspaces
+                    if (entry.name.startswith('.') or not entry.is_dir(follow_symlinks=False)
+                            or entry.stat().st_mtime > cutoff):
+                        continue
+                    shutil.rmtree(entry.path)
+                    removed += 1
+                except FileNotFoundError:
+                    continue
+                except OSError as e:
+                    logger.warning("Failed to remove idle workspace %s: %s", entry.name, e)
+        if removed:
+            logger.info("Removed %s idle workspaces", removed)
+        return removed
+
+
+# A live session refreshes its workspace's mtime (see SessionManager.get_session),
+# so anything older than a session timeout plus one cleanup pass has no owner
+reaper = WorkspaceReaper(Config.WORKSPACE_FOLDER, Config.SESSION_TIMEOUT + Config.CLEANUP_INTERVAL,
+                         Config.CLEANUP_INTERVAL, workspace_manager, workspace_storage, summary_store)
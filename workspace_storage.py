@@ -0,0 +1,335 @@
+"""
+Where session workspaces are kept, so that any node can serve any session.
+
+A workspace used to exist only as a directory on the node that received the
+upload, which forced sticky routing behind a load balancer. A
+WorkspaceStorage backend now holds each session's files plus a manifest, and
+the local workspace directory (WORKSPACE_FOLDER/<session_id>) is that node's
+read-through cache of it:
+
+- FilesystemStorage on WORKSPACE_FOLDER itself (`local`, the default): the
+  cache is the store, as before. The manifest still lets another worker
+  process on the host take over a session whose worker was recycled.
+- FilesystemStorage on a mount shared by the nodes (`shared`, e.g. NFS).
+- S3Storage on an S3-compatible object store (`s3`; AWS, or MinIO and other
+  stand-ins through WORKSPACE_S3_ENDPOINT). Needs boto3.
+
+An upload is written to the cache, then published: files first, manifest
+last, so a session is visible to other nodes only once complete. Each access
+refreshes a touch marker (at most once a minute per session and process);
+expire() deletes sessions whose marker is older than the session timeout.
+The store also keeps each analysis run's status record (see
+status_board.SharedStatus), so every process reports the same status.
+"""
+
+import os
+import json
+import time
+import shutil
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+
+class WorkspaceStorage:
+    """Interface of a workspace backend; paths are relative to the workspace, with forward slashes"""
+
+    # Whether the store is the local cache directory itself
+    local = False
+
+    def publish(self, session_id: str, workspace_path: str, manifest: Dict):
+        """Store the files under workspace_path listed in manifest['files'], then the manifest"""
+        raise NotImplementedError
+
+    def manifest(self, session_id: str) -> Optional[Dict]:
+        """The published manifest of a session, or None if it has none (yet)"""
+        raise NotImplementedError
+
+    def fetch(self, session_id: str, paths: Iterable[str], workspace_path: str):
+        """Copy the stored files at paths into workspace_path"""
+        raise NotImplementedError
+
+    def touch(self, session_id: str):
+        """Record that the session is in use, postponing its expiry"""
+        raise NotImplementedError
+
+    def touched(self, session_id: str) -> Optional[float]:
+        """When the session was last in use on any node, or None if it is not stored"""
+        raise NotImplementedError
+
+    def save_status(self, session_id: str, run: str, record: Dict):
+        """Store the analysis status record of one run; runs are named so that newer ones sort last"""
+        raise NotImplementedError
+
+    def status(self, session_id: str) -> Optional[Dict]:
+        """The status record of the session's newest run, or None if no analysis was started"""
+        raise NotImplementedError
+
+    def prune_status(self, session_id: str, keep: str):
+        """Delete the status records of runs older than keep"""
+        raise NotImplementedError
+
+    def delete(self, session_id: str):
+        raise NotImplementedError
+
+    def sessions(self) -> List[str]:
+        raise NotImplementedError
+
+    def expire(self, max_age: float) -> int:
+        """Delete sessions nobody has touched for max_age seconds; returns how many"""
+        cutoff = time.time() - max_age
+        expired = 0
+        for session_id in self.sessions():
+            touched = self.touched(session_id)
+            if touched is not None and touched < cutoff:
+                self.delete(session_id)
+                expired += 1
+        if expired:
+            logger.info("Expired %s stored workspaces", expired)
+        return expired
+
+
+class FilesystemStorage(WorkspaceStorage):
+    """
+    Workspaces as directories under root (root/<session_id>/...) with manifests
+    in root/.manifests/<session_id>.json; the manifest's mtime is the touch marker.
+    Analysis status records are root/.status/<session_id>/<run>.json.
+    """
+
+    def __init__(self, root: str, cache_root: str = Config.WORKSPACE_FOLDER):
+        self.root = root
+        self.local = os.path.realpath(root) == os.path.realpath(cache_root)
+
+    def _manifest_path(self, session_id: str) -> str:
+        return os.path.join(self.root, '.manifests', session_id + '.json')
+
+    def publish(self, session_id: str, workspace_path: str, manifest: Dict):
+        if not self.local:
+            target = os.path.join(self.root, session_id)
+            for path in manifest['files']:
+                destination = os.path.join(target, path)
+                os.makedirs(os.path.dirname(destination), exist_ok=True)
+                shutil.copyfile(os.path.join(workspace_path, path), destination)
+        manifest_path = self._manifest_path(session_id)
+        os.makedirs(os.path.dirname(manifest_path), exist_ok=True)
+        with open(manifest_path + '.tmp', 'w') as f:
+            json.dump(manifest, f)
+        os.replace(manifest_path + '.tmp', manifest_path)
+
+    def manifest(self, session_id: str) -> Optional[Dict]:
+        try:
+            with open(self._manifest_path(session_id)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def fetch(self, session_id: str, paths: Iterable[str], workspace_path: str):
+        if self.local:
+            return
+        source = os.path.join(self.root, session_id)
+        for path in paths:
+            destination = os.path.join(workspace_path, path)
+            os.makedirs(os.path.dirname(destination), exist_ok=True)
+            shutil.copyfile(os.path.join(source, path), destination)
+
+    def touch(self, session_id: str):
+        try:
+            os.utime(self._manifest_path(session_id))
+        except FileNotFoundError:
+            pass
+
+    def touched(self, session_id: str) -> Optional[float]:
+        try:
+            return os.stat(self._manifest_path(session_id)).st_mtime
+        except FileNotFoundError:
+            return None
+
+    def _status_dir(self, session_id: str) -> str:
+        return os.path.join(self.root, '.status', session_id)
+
+    def save_status(self, session_id: str, run: str, record: Dict):
+        path = os.path.join(self._status_dir(session_id), run + '.json')
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temporary = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temporary, 'w') as f:
+            json.dump(record, f)
+        os.replace(temporary, path)
+
+    def status(self, session_id: str) -> Optional[Dict]:
+        try:
+            runs = sorted(name for name in os.listdir(self._status_dir(session_id)) if name.endswith('.json'))
+        except FileNotFoundError:
+            return None
+        for name in reversed(runs):
+            try:
+                with open(os.path.join(self._status_dir(session_id), name)) as f:
+                    return json.load(f)
+            except FileNotFoundError:
+                continue  # pruned meanwhile
+        return None
+
+    def prune_status(self, session_id: str, keep: str):
+        try:
+            names = os.listdir(self._status_dir(session_id))
+        except FileNotFoundError:
+            return
+        for name in names:
+            if name.endswith('.json') and name[:-len('.json')] < keep:
+                try:
+                    os.remove(os.path.join(self._status_dir(session_id), name))
+                except FileNotFoundError:
+                    pass
+
+    def delete(self, session_id: str):
+        try:
+            os.remove(self._manifest_path(session_id))
+        except FileNotFoundError:
+            pass
+        shutil.rmtree(os.path.join(self.root, session_id), ignore_errors=True)
+        shutil.rmtree(self._status_dir(session_id), ignore_errors=True)
+
+    def sessions(self) -> List[str]:
+        try:
+            names = os.listdir(os.path.join(self.root, '.manifests'))
+        except FileNotFoundError:
+            return []
+        return [name[:-len('.json')] for name in names if name.endswith('.json')]
+
+
+class S3Storage(WorkspaceStorage):
+    """
+    Workspaces as objects in an S3-compatible bucket: <prefix><session_id>/files/<path>,
+    <prefix><session_id>/manifest.json, and an empty <prefix><session_id>/touched
+    whose LastModified is the touch marker.
+    """
+
+    def __init__(self, bucket: str, prefix: str = '', endpoint_url: Optional[str] = None,
+                 threads: int = Config.WORKSPACE_STORAGE_THREADS):
+        # Imported here: boto3 is optional and slow to import (see the cold-start budget)
+        try:
+            import boto3
+        except ImportError:
+            raise RuntimeError("WORKSPACE_STORAGE=s3 needs boto3 (pip install boto3)")
+        self.boto3 = boto3
+        self.bucket = bucket
+        self.prefix = prefix
+        self.endpoint_url = endpoint_url or None
+        self.threads = threads
+        self._client = None
+        self._client_pid = None
+
+    @property
+    def client(self):
+        # Created on first use: boto3 clients are slow to build and not fork-safe
+        if self._client is None or self._client_pid != os.getpid():
+            self._client = self.boto3.client('s3', endpoint_url=self.endpoint_url)
+            self._client_pid = os.getpid()
+        return self._client
+
+    def _key(self, session_id: str, name: str) -> str:
+        return f"{self.prefix}{session_id}/{name}"
+
+    def _parallel(self, function, items: Iterable):
+        # boto3 clients are thread-safe; transfers are latency-bound
+        with ThreadPoolExecutor(max_workers=self.threads) as pool:
+            for _ in pool.map(function, items):
+                pass
+
+    def publish(self, session_id: str, workspace_path: str, manifest: Dict):
+        client = self.client
+        self._parallel(lambda path: client.upload_file(
+            os.path.join(workspace_path, path), self.bucket, self._key(session_id, 'files/' + path)),
+            manifest['files'])
+        client.put_object(Bucket=self.bucket, Key=self._key(session_id, 'manifest.json'),
+                          Body=json.dumps(manifest).encode('utf-8'), ContentType='application/json')
+        self.touch(session_id)
+
+    def manifest(self, session_id: str) -> Optional[Dict]:
+        try:
+            response = self.client.get_object(Bucket=self.bucket, Key=self._key(session_id, 'manifest.json'))
+        except self.client.exceptions.NoSuchKey:
+            return None
+        return json.loads(response['Body'].read())
+
+    def fetch(self, session_id: str, paths: Iterable[str], workspace_path: str):
+        client = self.client
+
+        def download(path):
+            destination = os.path.join(workspace_path, path)
+            os.makedirs(os.path.dirname(destination), exist_ok=True)
+            client.download_file(self.bucket, self._key(session_id, 'files/' + path), destination)
+
+        self._parallel(download, paths)
+
+    def touch(self, session_id: str):
+        self.client.put_object(Bucket=self.bucket, Key=self._key(session_id, 'touched'), Body=b'')
+
+    def touched(self, session_id: str) -> Optional[float]:
+        try:
+            response = self.client.head_object(Bucket=self.bucket, Key=self._key(session_id, 'touched'))
+        except self.client.exceptions.ClientError:
+            return None
+        return response['LastModified'].timestamp()
+
+    def _status_runs(self, session_id: str) -> List[str]:
+        paginator = self.client.get_paginator('list_objects_v2')
+        prefix = self._key(session_id, 'status/')
+        return sorted(item['Key'] for page in paginator.paginate(Bucket=self.bucket, Prefix=prefix)
+                      for item in page.get('Contents', []))
+
+    def save_status(self, session_id: str, run: str, record: Dict):
+        self.client.put_object(Bucket=self.bucket, Key=self._key(session_id, f'status/{run}.json'),
+                               Body=json.dumps(record).encode('utf-8'), ContentType='application/json')
+
+    def status(self, session_id: str) -> Optional[Dict]:
+        for key in reversed(self._status_runs(session_id)):
+            try:
+                response = self.client.get_object(Bucket=self.bucket, Key=key)
+            except self.client.exceptions.NoSuchKey:
+                continue  # pruned meanwhile
+            return json.loads(response['Body'].read())
+        return None
+
+    def prune_status(self, session_id: str, keep: str):
+        keep_key = self._key(session_id, f'status/{keep}.json')
+        keys = [{'Key': key} for key in self._status_runs(session_id) if key < keep_key]
+        if keys:
+            self.client.delete_objects(Bucket=self.bucket, Delete={'Objects': keys, 'Quiet': True})
+
+    def delete(self, session_id: str):
+        client = self.client
+        paginator = client.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=self._key(session_id, '')):
+            keys = [{'Key': item['Key']} for item in page.get('Contents', [])]
+            if keys:
+                client.delete_objects(Bucket=self.bucket, Delete={'Objects': keys, 'Quiet': True})
+
+    def sessions(self) -> List[str]:
+        paginator = self.client.get_paginator('list_objects_v2')
+        sessions = []
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=self.prefix, Delimiter='/'):
+            for common in page.get('CommonPrefixes', []):
+                sessions.append(common['Prefix'][len(self.prefix):].rstrip('/'))
+        return sessions
+
+
+def create_storage(kind: str = Config.WORKSPACE_STORAGE) -> WorkspaceStorage:
+    if kind == 'local':
+        return FilesystemStorage(Config.WORKSPACE_FOLDER)
+    if kind == 'shared':
+        if not Config.WORKSPACE_SHARED_ROOT:
+            raise RuntimeError("WORKSPACE_STORAGE=shared needs WORKSPACE_SHARED_ROOT")
+        return FilesystemStorage(Config.WORKSPACE_SHARED_ROOT)
+    if kind == 's3':
+        if not Config.WORKSPACE_S3_BUCKET:
+            raise RuntimeError("WORKSPACE_STORAGE=s3 needs WORKSPACE_S3_BUCKET")
+        return S3Storage(Config.WORKSPACE_S3_BUCKET, Config.WORKSPACE_S3_PREFIX, Config.WORKSPACE_S3_ENDPOINT)
+    raise ValueError(f"Unknown WORKSPACE_STORAGE: {kind}")
+
+
+workspace_storage = create_storage()
@@ -7,6 +7,7 @@ Optimized for Render.com deployment
 import os
 import sys
 import logging
+import importlib.util
 from pathlib import Path
 
 # Add current directory to Python path
@@ -39,11 +40,11 @@ def setup_production_environment():
     logger.info("Production environment setup completed")
     
     # Log configuration
-    logger.info(f"Host: {Config.HOST}")
-    logger.info(f"Port: {Config.PORT}")
-    logger.info(f"Debug: {Config.DEBUG}")
-    logger.info(f"Max upload size: {Config.MAX_CONTENT_LENGTH // (1024*1024)}MB")
-    logger.info(f"OpenAI configured: {bool(Config.OPENAI_API_KEY)}")
+    logger.info("Host: %s", Config.HOST)
+    logger.info("Port: %s", Config.PORT)
+    logger.info("Debug: %s", Config.DEBUG)
+    logger.info("Max upload size: %sMB", Config.MAX_CONTENT_LENGTH // (1024 * 1024))
+    logger.info("OpenAI configured: %s", bool(Config.OPENAI_API_KEY))
     
     return logger
 
@@ -54,12 +55,8 @@ def check_dependencies():
         'werkzeug', 'pathlib', 'uuid', 'threading'
     ]
     
-    missing_packages = []
-    for package in required_packages:
-        try:
-            __import__(package)
-        except ImportError:
-            missing_packages.append(package)
+    # find_spec locates a package without importing it, so the check adds nothing to startup
+    missing_packages = [package for package in required_packages if importlib.util.find_spec(package) is None]
     
     if missing_packages:
         print(f"Missing required packages: {', '.join(missing_packages)}")
@@ -97,7 +94,7 @@ def main():
             )
     
     except Exception as e:
-        logger.error(f"Failed to start application: {str(e)}")
+        logger.error("Failed to start application: %s", e)
         sys.exit(1)
 
 if __name__ == '__main__':